@@ -3,18 +3,17 @@
 """
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Optional, Dict, Any, Tuple
+from collections import OrderedDict
 from jose import JWTError, jwt
 from bson import ObjectId
-from pathlib import Path
+import logging
+import time
 
 from backend.core.database import get_database
 from backend.core.config import settings
 
-# Определяем путь к корню проекта динамически
-PROJECT_ROOT = Path(__file__).parent.parent
-DEBUG_LOG_PATH = PROJECT_ROOT / ".cursor" / "debug.log"
-DEBUG_LOG_PATH.parent.mkdir(exist_ok=True)
+logger = logging.getLogger(__name__)
 
 # HTTPBearer с auto_error=False для OPTIONS запросов
 security = HTTPBearer(auto_error=False)
@@ -24,60 +23,89 @@ SECRET_KEY = settings.get_secret_key()
 ALGORITHM = settings.JWT_ALGORITHM
 
 
+class UserCache:
+    """
+    Документы пользователей по sub токена на время ttl секунд (LRU, не больше max_entries).
+
+    Изменения пользователя (блокировка, роль, удаление) сбрасывают запись
+    через invalidate; другие процессы сервера увидят их не позже чем через ttl.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._users: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] >= self.ttl:
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        # Копия: обработчики могут менять current_user
+        return dict(entry[1])
+
+    def put(self, user_id: str, user: Dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+        self._users[user_id] = (time.monotonic(), dict(user))
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_entries:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id: Any = None) -> None:
+        """Сбросить пользователя (None - всех)"""
+        if user_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(str(user_id), None)
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_TTL, settings.AUTH_USER_CACHE_MAX_ENTRIES)
+
+
+async def load_user(db, user_id: str) -> Optional[Dict[str, Any]]:
+    """Пользователь по sub токена: из кэша или из db.users"""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    if user is not None:
+        user_cache.put(user_id, user)
+    return user
+
+
 async def get_current_user(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
     """
     Получить текущего пользователя из JWT токена
     ВАЖНО: auto_error=False позволяет OPTIONS запросам проходить без токена
+
+    Время проверки (мс) сохраняется в request.state.auth_ms (заголовок Server-Timing)
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    # #region agent log
-    import json
-    import time
-    try:
-        with open(str(DEBUG_LOG_PATH), 'a', encoding='utf-8') as f:
-            f.write(json.dumps({"id":"log_get_current_user_called","timestamp":int(time.time()*1000),"location":"auth_utils.py:25","message":"get_current_user called","data":{"method":request.method,"has_credentials":credentials is not None},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + '\n')
-    except Exception as e:
-        logger.error(f"Failed to write debug log: {e}")
-    # #endregion
-    
     # КРИТИЧНО: Для OPTIONS запросов НЕ требуем авторизацию - CORS middleware обработает их
     # Но если запрос все равно дошел сюда, значит явный OPTIONS endpoint не сработал
     if request.method == "OPTIONS":
-        # #region agent log
-        try:
-            with open(str(DEBUG_LOG_PATH), 'a', encoding='utf-8') as f:
-                f.write(json.dumps({"id":"log_options_in_auth","timestamp":int(time.time()*1000),"location":"auth_utils.py:45","message":"OPTIONS request reached auth - should not happen","data":{},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + '\n')
-        except Exception as e:
-            pass
-        # #endregion
-        # Это не должно происходить, но на всякий случай возвращаем None
+        logger.debug("OPTIONS request reached auth")
         return None
-    
+
     # Для всех остальных запросов требуем авторизацию
     if not credentials:
-        # #region agent log
-        try:
-            with open(str(DEBUG_LOG_PATH), 'a', encoding='utf-8') as f:
-                f.write(json.dumps({"id":"log_no_credentials","timestamp":int(time.time()*1000),"location":"auth_utils.py:45","message":"No credentials provided for non-OPTIONS request","data":{"method":request.method},"sessionId":"debug-session","runId":"run1","hypothesisId":"A"}) + '\n')
-        except Exception as e:
-            pass
-        # #endregion
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    db = await get_database()
-    
+
+    started = time.perf_counter()
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -95,17 +123,20 @@ async def get_current_user(request: Request, credentials: Optional[HTTPAuthoriza
     except jwt.JWTError as e:
         logger.warning(f"JWT validation error: {str(e)}")
         raise credentials_exception
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error validating token: {str(e)}")
         raise credentials_exception
-    
+
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
-        if user is None:
-            logger.warning(f"User not found: {user_id}")
-            raise credentials_exception
+        user = await load_user(await get_database(), user_id)
     except Exception as e:
         logger.error(f"Error finding user: {str(e)}")
         raise credentials_exception
-    
+    if user is None:
+        logger.warning(f"User not found: {user_id}")
+        raise credentials_exception
+
+    request.state.auth_ms = (time.perf_counter() - started) * 1000
     return user
@@ -3,16 +3,26 @@
 
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from datetime import datetime, timedelta
 from collections import defaultdict
+from contextlib import aclosing
 from io import BytesIO
 import aiohttp
+import asyncio
+import httpx
 import os
 import xlsxwriter
+from pymongo import UpdateOne
 
+from backend.core.config import settings
 from backend.core.database import get_database
+from backend.core.http_client import get_http_client
+from backend.core.locks import LockBusy
+from backend.core.windowed import gather_or_cancel, iter_windows
 from backend.auth_utils import get_current_user
+from backend.services.sku_economics_service import SkuEconomicsService, summarize_operations
+from backend.services.credentials import CredentialRegistry
 
 router = APIRouter(prefix="/api/business-analytics", tags=["business-analytics"])
 
@@ -227,7 +237,7 @@ async def get_ozon_credentials(seller_id: str) -> Dict[str, str]:
         if key.get("marketplace") == "ozon":
             return {
                 "client_id": key.get("client_id"),
-                "api_key": key.get("api_key")
+                "api_key": CredentialRegistry.api_key(seller_id, key) or ""
             }
     
     raise HTTPException(status_code=404, detail="Ozon API ключ не найден")
@@ -379,69 +389,183 @@ async def sync_realization(
         raise HTTPException(status_code=500, detail=f"Ошибка синхронизации: {str(e)}")
 
 
-async def fetch_ozon_operations(
+OZON_OPERATIONS_URL = "https://api-seller.ozon.ru/v3/finance/transaction/list"
+OZON_OPERATIONS_PAGE_SIZE = 1000
+# Ozon отдаёт не больше 100 страниц на один фильтр
+OZON_OPERATIONS_MAX_PAGES = 100
+
+
+def _split_period(date_from: datetime, date_to: datetime, max_days: int) -> List[tuple]:
+    """Разбить период на окна по max_days дней (границы - включительно по дням)"""
+    windows = []
+    current_start = date_from
+    while current_start < date_to:
+        current_end = min(current_start + timedelta(days=max_days - 1), date_to)
+        windows.append((current_start, current_end))
+        current_start = current_end + timedelta(days=1)
+    return windows
+
+
+async def _fetch_operations_page(
     client_id: str,
     api_key: str,
-    date_from: datetime,
-    date_to: datetime
-) -> List[Dict]:
+    window_start: datetime,
+    window_end: datetime,
+    page: int
+) -> Dict[str, Any]:
     """
-    Fetch all operations from Ozon Finance API.
-    ВАЖНО: Ozon API ограничивает запрос периодом в 1 месяц (31 день).
-    При необходимости разбиваем период на части.
+    Одна страница операций с повтором при 429/5xx и сетевых ошибках.
+    
+    Повторяется только упавшая страница - уже полученные не запрашиваются заново.
     """
-    url = "https://api-seller.ozon.ru/v3/finance/transaction/list"
     headers = {
         "Client-Id": client_id,
         "Api-Key": api_key,
         "Content-Type": "application/json"
     }
+    body = {
+        "filter": {
+            "date": {
+                "from": window_start.strftime("%Y-%m-%dT00:00:00.000Z"),
+                "to": window_end.strftime("%Y-%m-%dT23:59:59.999Z")
+            },
+            "operation_type": [],
+            "transaction_type": "all"
+        },
+        "page": page,
+        "page_size": OZON_OPERATIONS_PAGE_SIZE
+    }
     
-    all_operations = []
+    client = get_http_client(OZON_OPERATIONS_URL)
+    retries = settings.OZON_OPERATIONS_PAGE_RETRIES
+    last_error = ""
+    
+    for attempt in range(retries + 1):
+        try:
+            resp = await client.post(OZON_OPERATIONS_URL, headers=headers, json=body)
+        except httpx.TransportError as e:
+            last_error = f"{type(e).__name__}: {e}"
+        else:
+            if resp.status_code == 200:
+                return resp.json().get("result", {})
+            if resp.status_code != 429 and resp.status_code < 500:
+                raise HTTPException(status_code=resp.status_code, detail=f"Ozon API error: {resp.text}")
+            last_error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+        
+        if attempt < retries:
+            delay = settings.MARKETPLACE_RATE_LIMIT_BACKOFF * (2 ** attempt)
+            print(f"[OZON OPERATIONS] page {page} of {window_start.date()}..{window_end.date()} failed ({last_error}), retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    
+    raise HTTPException(status_code=502, detail=f"Ozon API error after {retries + 1} attempts: {last_error}")
+
+
+async def _fetch_operations_window(
+    client_id: str,
+    api_key: str,
+    window_start: datetime,
+    window_end: datetime,
+    queue: asyncio.Queue,
+    report: Dict[str, Any]
+) -> None:
+    """
+    Выгрузить все страницы окна в очередь.
+    
+    Если в окне больше 100 страниц, окно делится пополам, чтобы не терять
+    операции. Однодневное окно разделить нельзя - оно попадает в
+    report["truncated_windows"].
+    """
+    result = await _fetch_operations_page(client_id, api_key, window_start, window_end, 1)
+    page_count = result.get("page_count")
+    
+    if page_count and page_count > OZON_OPERATIONS_MAX_PAGES and window_end.date() > window_start.date():
+        days = (window_end.date() - window_start.date()).days
+        middle = window_start + timedelta(days=days // 2)
+        await gather_or_cancel(
+            _fetch_operations_window(client_id, api_key, window_start, middle, queue, report),
+            _fetch_operations_window(client_id, api_key, middle + timedelta(days=1), window_end, queue, report)
+        )
+        return
+    
+    page = 1
+    while True:
+        operations = result.get("operations", [])
+        if not operations:
+            break
+        
+        await queue.put(operations)
+        
+        if page_count and page >= page_count:
+            break
+        if page >= OZON_OPERATIONS_MAX_PAGES:
+            if not page_count or page_count > OZON_OPERATIONS_MAX_PAGES:
+                report["truncated_windows"].append({
+                    "from": window_start.strftime("%Y-%m-%d"),
+                    "to": window_end.strftime("%Y-%m-%d"),
+                    "page_count": page_count
+                })
+                print(f"[OZON OPERATIONS] ⚠️ {window_start.date()}..{window_end.date()} truncated at {OZON_OPERATIONS_MAX_PAGES} pages")
+            break
+        
+        page += 1
+        result = await _fetch_operations_page(client_id, api_key, window_start, window_end, page)
+
+
+async def iter_ozon_operations(
+    client_id: str,
+    api_key: str,
+    date_from: datetime,
+    date_to: datetime,
+    report: Optional[Dict[str, Any]] = None
+) -> AsyncIterator[List[Dict]]:
+    """
+    Stream operations from Ozon Finance API page by page.
+    ВАЖНО: Ozon API ограничивает запрос периодом в 1 месяц (31 день).
+    Период разбивается на окна по 30 дней, окна выгружаются параллельно
+    (не больше OZON_OPERATIONS_WINDOW_CONCURRENCY одновременно).
+    
+    Страницы отдаются в порядке получения; очередь ограничена, поэтому
+    память не растёт с длиной периода.
+    
+    Args:
+        report: если передан, в report["truncated_windows"] попадут дни,
+            где операций больше лимита Ozon в 100 страниц
+    """
+    if report is None:
+        report = {}
+    report.setdefault("truncated_windows", [])
     
     # Разбиваем период на части по 30 дней (Ozon ограничивает 1 месяцем)
-    MAX_DAYS = 30
-    current_start = date_from
+    windows = _split_period(date_from, date_to, 30)
     
-    async with aiohttp.ClientSession() as session:
-        while current_start < date_to:
-            # Определяем конец текущего периода (максимум 30 дней)
-            current_end = min(current_start + timedelta(days=MAX_DAYS - 1), date_to)
-            
-            page = 1
-            while True:
-                body = {
-                    "filter": {
-                        "date": {
-                            "from": current_start.strftime("%Y-%m-%dT00:00:00.000Z"),
-                            "to": current_end.strftime("%Y-%m-%dT23:59:59.999Z")
-                        },
-                        "operation_type": [],
-                        "transaction_type": "all"
-                    },
-                    "page": page,
-                    "page_size": 1000
-                }
-                
-                async with session.post(url, headers=headers, json=body, ssl=False) as resp:
-                    if resp.status != 200:
-                        error_text = await resp.text()
-                        raise HTTPException(status_code=resp.status, detail=f"Ozon API error: {error_text}")
-                    
-                    data = await resp.json()
-                    operations = data.get("result", {}).get("operations", [])
-                    
-                    if not operations:
-                        break
-                    
-                    all_operations.extend(operations)
-                    page += 1
-                    
-                    if page > 100:
-                        break
-            
-            # Переходим к следующему периоду
-            current_start = current_end + timedelta(days=1)
+    async def fetch_window(window_start: datetime, window_end: datetime, queue: asyncio.Queue):
+        await _fetch_operations_window(client_id, api_key, window_start, window_end, queue, report)
+    
+    # aclosing: при остановке потребителя выгрузка окон отменяется сразу
+    async with aclosing(iter_windows(windows, fetch_window, settings.OZON_OPERATIONS_WINDOW_CONCURRENCY)) as pages:
+        async for operations in pages:
+            yield operations
+
+
+async def fetch_ozon_operations(
+    client_id: str,
+    api_key: str,
+    date_from: datetime,
+    date_to: datetime
+) -> List[Dict]:
+    """
+    Fetch all operations from Ozon Finance API.
+    
+    Собирает все страницы в список; для больших периодов используйте
+    iter_ozon_operations.
+    """
+    report: Dict[str, Any] = {}
+    all_operations = []
+    async for operations in iter_ozon_operations(client_id, api_key, date_from, date_to, report):
+        all_operations.extend(operations)
+    
+    if report["truncated_windows"]:
+        print(f"[OZON OPERATIONS] ⚠️ Result is incomplete, truncated days: {report['truncated_windows']}")
     
     return all_operations
 
@@ -920,13 +1044,146 @@ async def get_detailed_operations(
     }
 
 
+def build_operation_document(op: Dict, seller_id: str) -> Dict[str, Any]:
+    """Convert Ozon finance operation to ozon_operations document"""
+    # Parse services into breakdown
+    services = op.get("services", [])
+    breakdown = {
+        "logistics": 0,
+        "acquiring": 0,
+        "storage": 0,
+        "loyalty_points": 0,
+        "other": 0
+    }
+    
+    for service in services:
+        service_name = service.get("name", "")
+        price = abs(service.get("price", 0))
+        
+        service_mapping = SERVICE_TYPE_MAPPING.get(service_name, {})
+        category = service_mapping.get("category", "other")
+        
+        if category in breakdown:
+            breakdown[category] += price
+        else:
+            breakdown["other"] += price
+    
+    return {
+        "seller_id": seller_id,
+        "marketplace": "ozon",
+        "operation_id": str(op.get("operation_id", "")),
+        "operation_type": op.get("operation_type", ""),
+        "operation_type_name": op.get("operation_type_name", ""),
+        "operation_date": datetime.fromisoformat(op.get("operation_date", "").replace(" ", "T")),
+        "amount": op.get("amount", 0),
+        "posting_number": op.get("posting", {}).get("posting_number", ""),
+        "items": op.get("items", []),
+        "services": services,
+        "breakdown": breakdown,
+        "raw_data": op,
+        "updated_at": datetime.utcnow()
+    }
+
+
+async def ingest_ozon_operations(
+    db,
+    seller_id: str,
+    pages: AsyncIterator[List[Dict]],
+    report: Optional[Dict[str, Any]] = None
+) -> Dict[str, int]:
+    """
+    Upsert operations into ozon_operations page by page via bulk_write.
+    
+    Прогресс пишется в ozon_operations_sync_status (см. GET /sync-operations/status).
+    report - тот же dict, что передан в iter_ozon_operations (обрезанные окна).
+    Идёт под SkuEconomicsService.lock продавца (свёртка меняется вместе с операциями).
+    
+    Raises:
+        LockBusy: операции продавца уже загружаются или дозаполняется свёртка
+    """
+    async with SkuEconomicsService.lock(db, seller_id):
+        stats = {"pages": 0, "total_fetched": 0, "saved": 0, "updated": 0}
+        
+        await db.ozon_operations_sync_status.update_one(
+            {"seller_id": seller_id},
+            {"$set": {"status": "running", "started_at": datetime.utcnow(), "finished_at": None, "error": None, **stats}},
+            upsert=True
+        )
+        
+        try:
+            async for operations in pages:
+                now = datetime.utcnow()
+                transactions = [build_operation_document(op, seller_id) for op in operations]
+                
+                # Свёртка sku_daily_economics: вычитаем уже учтённые версии операций, прибавляем новые
+                await SkuEconomicsService.resolve_posting_skus(db, seller_id, transactions)
+                previous = await db.ozon_operations.find(
+                    {
+                        "seller_id": seller_id,
+                        "operation_id": {"$in": [t["operation_id"] for t in transactions]},
+                        "rollup_applied": True
+                    },
+                    {
+                        "operation_type": 1, "operation_date": 1, "amount": 1,
+                        "items.sku": 1, "items.name": 1, "rollup_posting_sku": 1
+                    }
+                ).to_list(length=None)
+                
+                requests = []
+                for transaction in transactions:
+                    transaction.setdefault("rollup_posting_sku", None)
+                    transaction["rollup_applied"] = True
+                    requests.append(UpdateOne(
+                        {
+                            "seller_id": seller_id,
+                            "operation_id": transaction["operation_id"]
+                        },
+                        {
+                            "$set": transaction,
+                            "$setOnInsert": {"created_at": now}
+                        },
+                        upsert=True
+                    ))
+                
+                if requests:
+                    result = await db.ozon_operations.bulk_write(requests, ordered=False)
+                    stats["saved"] += result.upserted_count
+                    stats["updated"] += len(requests) - result.upserted_count
+                    await SkuEconomicsService.apply(db, seller_id, transactions, previous)
+                
+                stats["pages"] += 1
+                stats["total_fetched"] += len(operations)
+                
+                await db.ozon_operations_sync_status.update_one(
+                    {"seller_id": seller_id},
+                    {"$set": {**stats, "updated_at": datetime.utcnow()}}
+                )
+                print(f"[OZON OPERATIONS] seller {seller_id}: page {stats['pages']}, {stats['total_fetched']} operations ingested")
+        except Exception as e:
+            await db.ozon_operations_sync_status.update_one(
+                {"seller_id": seller_id},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}}
+            )
+            raise
+        
+        await db.ozon_operations_sync_status.update_one(
+            {"seller_id": seller_id},
+            {"$set": {
+                "status": "completed",
+                "finished_at": datetime.utcnow(),
+                "truncated_windows": (report or {}).get("truncated_windows", [])
+            }}
+        )
+    return stats
+
+
 @router.post("/sync-operations")
 async def sync_ozon_operations(
     date_from: str = Query(...),
     date_to: str = Query(...),
     current_user: dict = Depends(get_current_user)
 ):
-    """Sync operations from Ozon API and save to database"""
+    """Sync operations from Ozon API and save to database (streaming, bulk upserts)"""
     seller_id = str(current_user["_id"])
     
     try:
@@ -937,85 +1194,48 @@ async def sync_ozon_operations(
     
     credentials = await get_ozon_credentials(seller_id)
     
-    operations = await fetch_ozon_operations(
-        credentials["client_id"],
-        credentials["api_key"],
-        period_start,
-        period_end
-    )
-    
     db = await get_database()
-    saved = 0
-    updated = 0
-    
-    for op in operations:
-        # Parse services into breakdown
-        services = op.get("services", [])
-        breakdown = {
-            "logistics": 0,
-            "acquiring": 0,
-            "storage": 0,
-            "loyalty_points": 0,
-            "other": 0
-        }
-        
-        for service in services:
-            service_name = service.get("name", "")
-            price = abs(service.get("price", 0))
-            
-            service_mapping = SERVICE_TYPE_MAPPING.get(service_name, {})
-            category = service_mapping.get("category", "other")
-            
-            if category in breakdown:
-                breakdown[category] += price
-            else:
-                breakdown["other"] += price
-        
-        # Create transaction document
-        transaction = {
-            "seller_id": seller_id,
-            "marketplace": "ozon",
-            "operation_id": str(op.get("operation_id", "")),
-            "operation_type": op.get("operation_type", ""),
-            "operation_type_name": op.get("operation_type_name", ""),
-            "operation_date": datetime.fromisoformat(op.get("operation_date", "").replace(" ", "T")),
-            "amount": op.get("amount", 0),
-            "posting_number": op.get("posting", {}).get("posting_number", ""),
-            "items": op.get("items", []),
-            "services": services,
-            "breakdown": breakdown,
-            "raw_data": op,
-            "updated_at": datetime.utcnow()
-        }
-        
-        result = await db.ozon_operations.update_one(
-            {
-                "seller_id": seller_id,
-                "operation_id": transaction["operation_id"]
-            },
-            {
-                "$set": transaction,
-                "$setOnInsert": {"created_at": datetime.utcnow()}
-            },
-            upsert=True
+    report: Dict[str, Any] = {}
+    try:
+        stats = await ingest_ozon_operations(
+            db,
+            seller_id,
+            iter_ozon_operations(
+                credentials["client_id"],
+                credentials["api_key"],
+                period_start,
+                period_end,
+                report
+            ),
+            report
         )
-        
-        if result.upserted_id:
-            saved += 1
-        else:
-            updated += 1
+    except LockBusy:
+        raise HTTPException(status_code=409, detail="Синхронизация операций уже выполняется")
     
     return {
         "status": "success",
         "period": {"from": date_from, "to": date_to},
         "statistics": {
-            "total_fetched": len(operations),
-            "saved": saved,
-            "updated": updated
-        }
+            "total_fetched": stats["total_fetched"],
+            "saved": stats["saved"],
+            "updated": stats["updated"]
+        },
+        # Дни, где у Ozon больше 100 страниц операций - данные по ним неполные
+        "truncated_windows": report["truncated_windows"]
     }
 
 
+@router.get("/sync-operations/status")
+async def get_sync_operations_status(current_user: dict = Depends(get_current_user)):
+    """Progress of the last operations sync for current seller"""
+    db = await get_database()
+    status = await db.ozon_operations_sync_status.find_one(
+        {"seller_id": str(current_user["_id"])},
+        {"_id": 0}
+    )
+    return status or {"status": "never_run"}
+
+
 # Tax system settings endpoints
 TAX_SYSTEMS = {
     "usn_6": {"name": "УСН 6% (доходы)", "rate": 0.06, "description": "Упрощённая система, 6% от всех доходов"},
@@ -1356,31 +1576,14 @@ async def _calculate_from_sales_report(db, seller_id: str, sales_data: List[Dict
     tax_system = profile.get("tax_system", "usn_6") if profile else "usn_6"
     tax_rate = TAX_SYSTEMS.get(tax_system, {}).get("rate", 0.06)
     
-    # === ЗАГРУЖАЕМ ДОПОЛНИТЕЛЬНЫЕ ОПЕРАЦИИ ИЗ FINANCE API ===
-    # Это штрафы, реклама, компенсации и прочее
-    finance_ops = await db.ozon_operations.find({
-        "seller_id": seller_id,
-        "operation_date": {
-            "$gte": period_start,
-            "$lte": period_end
-        }
-    }).to_list(50000)
+    # === ДОПОЛНИТЕЛЬНЫЕ ОПЕРАЦИИ ИЗ FINANCE API ===
+    # Это штрафы, реклама, компенсации и прочее - берём из свёртки sku_daily_economics
+    finance_rows = await SkuEconomicsService.load_rows(db, seller_id, period_start, period_end)
     
-    # Строим маппинг posting_number -> article (из операций с товарами)
-    posting_to_article = {}
-    for op in finance_ops:
-        items = op.get("items", [])
-        if items:
-            posting = op.get("posting_number") or op.get("raw_data", {}).get("posting", {}).get("posting_number")
-            if posting:
-                # Ищем артикул через SKU маппинг
-                sku = str(items[0].get("sku", ""))
-                if sku:
-                    # Пытаемся найти артикул в sales_data
-                    for item in sales_data:
-                        if item.get("sku") == sku:
-                            posting_to_article[posting] = item.get("article", "")
-                            break
+    # Маппинг SKU -> артикул из отчёта о реализации (первое совпадение)
+    article_by_sku = {}
+    for item in sales_data:
+        article_by_sku.setdefault(item.get("sku"), item.get("article", ""))
     
     # Собираем дополнительные расходы по артикулам
     extra_expenses_by_article = defaultdict(lambda: {
@@ -1401,61 +1604,55 @@ async def _calculate_from_sales_report(db, seller_id: str, sales_data: List[Dict
         "other": 0,             # Прочее
     }
     
-    for op in finance_ops:
-        op_type = op.get("operation_type", "")
-        amount = op.get("amount", 0)
-        items = op.get("items", [])
-        posting = op.get("posting_number") or op.get("raw_data", {}).get("posting", {}).get("posting_number")
+    for row in finance_rows:
+        op_type = row["operation_type"]
+        attribution = row["attribution"]
         
         # Пропускаем основные операции (они уже в отчёте о реализации)
         if op_type in ("OperationAgentDeliveredToCustomer", "ClientReturnAgentOperation", "OperationItemReturn"):
             continue
         
-        # Определяем артикул
+        # Артикул определяется по первому товару операции
+        if attribution == "extra_item":
+            continue
+        
+        # Определяем артикул: из товара операции или через номер отправления
         article = None
-        if items:
-            # Из операции напрямую
-            sku = str(items[0].get("sku", ""))
-            for item in sales_data:
-                if item.get("sku") == sku:
-                    article = item.get("article", "")
-                    break
-        elif posting and posting in posting_to_article:
-            article = posting_to_article[posting]
+        if attribution in ("item", "posting"):
+            article = article_by_sku.get(row["sku"])
+        
+        expenses = row["neg_amount"]
+        income = row["pos_amount"]
         
         # Распределяем расходы
-        if article and amount < 0:
-            abs_amount = abs(amount)
-            if "DefectRate" in op_type or "Cancellation" in op_type or "ShipmentDelay" in op_type:
-                extra_expenses_by_article[article.lower()]["penalties"] += abs_amount
-            elif "CostPerClick" in op_type or "Promotion" in op_type:
-                extra_expenses_by_article[article.lower()]["advertising"] += abs_amount
-            # ЛОГИСТИКУ НЕ ДОБАВЛЯЕМ! Она уже в "Базовом вознаграждении Ozon" из Sales Report
-            # elif any(x in op_type for x in ["Delivery", "Redistribution", "Logistic", "AgencyFee", "3pl"]):
-            #     extra_expenses_by_article[article.lower()]["logistics_extra"] += abs_amount
-            elif not any(x in op_type for x in ["Delivery", "Redistribution", "Logistic", "AgencyFee", "3pl"]):
-                # Добавляем только НЕ-логистические расходы
-                extra_expenses_by_article[article.lower()]["other"] += abs_amount
-        elif article and amount > 0:
-            if "Reexposure" in op_type or "Compensation" in op_type:
-                extra_expenses_by_article[article.lower()]["compensations"] += amount
-        elif not article and amount < 0:
+        if article:
+            if expenses:
+                if "DefectRate" in op_type or "Cancellation" in op_type or "ShipmentDelay" in op_type:
+                    extra_expenses_by_article[article.lower()]["penalties"] += expenses
+                elif "CostPerClick" in op_type or "Promotion" in op_type:
+                    extra_expenses_by_article[article.lower()]["advertising"] += expenses
+                # ЛОГИСТИКУ НЕ ДОБАВЛЯЕМ! Она уже в "Базовом вознаграждении Ozon" из Sales Report
+                elif not any(x in op_type for x in ["Delivery", "Redistribution", "Logistic", "AgencyFee", "3pl"]):
+                    # Добавляем только НЕ-логистические расходы
+                    extra_expenses_by_article[article.lower()]["other"] += expenses
+            if income and ("Reexposure" in op_type or "Compensation" in op_type):
+                extra_expenses_by_article[article.lower()]["compensations"] += income
+        elif expenses:
             # Общие расходы (без привязки к товару)
-            abs_amount = abs(amount)
             if "Subscription" in op_type or "Premium" in op_type:
-                general_expenses["subscription"] += abs_amount
+                general_expenses["subscription"] += expenses
             elif "DefectRate" in op_type:
-                general_expenses["penalties"] += abs_amount
+                general_expenses["penalties"] += expenses
             elif "CostPerClick" in op_type or "Promotion" in op_type:
-                general_expenses["advertising"] += abs_amount
+                general_expenses["advertising"] += expenses
             elif "Storage" in op_type:
-                general_expenses["storage"] += abs_amount
+                general_expenses["storage"] += expenses
             elif "EarlyPayment" in op_type or "FlexiblePayment" in op_type:
-                general_expenses["early_payment"] += abs_amount
+                general_expenses["early_payment"] += expenses
             elif "Points" in op_type or "Reviews" in op_type:
-                general_expenses["points"] += abs_amount
+                general_expenses["points"] += expenses
             else:
-                general_expenses["other"] += abs_amount
+                general_expenses["other"] += expenses
     
     general_expenses_total = sum(general_expenses.values())
     
@@ -1703,17 +1900,11 @@ async def get_products_economics(
         return await _calculate_from_sales_report(db, seller_id, sales_report_data, tag, period_start, period_end, date_from, date_to)
     
     # ПРИОРИТЕТ 2: Данные из Finance API (менее точные)
-    # Получаем операции из КЭША (база данных), а не напрямую из API
-    operations = await db.ozon_operations.find({
-        "seller_id": seller_id,
-        "operation_date": {
-            "$gte": period_start,
-            "$lte": period_end
-        }
-    }).to_list(50000)
+    # Берём предрассчитанную свёртку sku_daily_economics (операции из КЭША), а не API
+    rows = await SkuEconomicsService.load_rows(db, seller_id, period_start, period_end)
     
     # Если в кэше нет данных за период, пробуем загрузить из API
-    if not operations:
+    if not rows:
         try:
             credentials = await get_ozon_credentials(seller_id)
             operations = await fetch_ozon_operations(
@@ -1722,11 +1913,10 @@ async def get_products_economics(
                 period_start,
                 period_end
             )
+            rows = summarize_operations(operations)
         except Exception as e:
             # Если API недоступен, используем все данные из кэша
-            operations = await db.ozon_operations.find({
-                "seller_id": seller_id
-            }).to_list(50000)
+            rows = await SkuEconomicsService.load_rows(db, seller_id)
     
     # Загружаем товары с закупочными ценами и тегами
     products_cursor = db.product_catalog.find(
@@ -1778,26 +1968,22 @@ async def get_products_economics(
     # Собираем статистику по товарам - ГРУППИРОВКА ПО SKU (точная)
     product_stats = {}  # sku -> stats
     
-    for op in operations:
-        op_type = op.get("operation_type", "")
-        amount = op.get("amount", 0)
-        items = op.get("items", [])
-        posting_number = op.get("posting", {}).get("posting_number", "")
-        
+    for row in rows:
         # Обрабатываем только операции с товарами
-        if not items:
+        if row["attribution"] not in ("item", "extra_item"):
             continue
         
-        for item in items:
-            item_name = item.get("name", "")
-            item_sku = str(item.get("sku", ""))
-            
-            if not item_name or not item_sku:
-                continue
-            
-            # Используем SKU как ключ (точная группировка!)
-            key = item_sku
-            
+        op_type = row["operation_type"]
+        item_name = row["name"]
+        item_sku = row["sku"]
+        
+        if not item_name or not item_sku:
+            continue
+        
+        # Используем SKU как ключ (точная группировка!)
+        key = item_sku
+        
+        if key not in product_stats:
             # === ПОИСК ЗАКУПОЧНОЙ ЦЕНЫ (приоритетный порядок) ===
             purchase_price = 0
             found_article = ""
@@ -1820,77 +2006,54 @@ async def get_products_economics(
                     found_article = article_by_name.get(name_key, "")
                     found_tags = tags_by_name.get(name_key, [])
             
-            if key not in product_stats:
-                product_stats[key] = {
-                    "name": item_name,
-                    "sku": item_sku,
-                    "article": found_article,
-                    "tags": found_tags,
-                    "purchase_price": purchase_price,
-                    "delivered_count": 0,      # Доставлено (реальные продажи)
-                    "returned_count": 0,       # Возвращено
-                    "sales_revenue": 0,        # Выручка (уже за вычетом комиссии Ozon!)
-                    "return_costs": 0,         # Возвраты клиентам
-                    "logistics": 0,            # Логистика и доставка
-                    "other_expenses": 0,       # Прочие расходы (кэшбэк, баллы и т.д.)
-                    "compensations": 0,        # Компенсации от МП
-                    "postings": set()          # Уникальные заказы
-                }
-            
-            stats = product_stats[key]
-            stats["postings"].add(posting_number)
-            
-            # === КАТЕГОРИЗАЦИЯ ОПЕРАЦИЙ ===
-            # ВАЖНО: amount в OperationAgentDeliveredToCustomer УЖЕ содержит выручку
-            # за вычетом комиссии Ozon! Не нужно считать комиссию отдельно.
-            
-            # 1. ПРОДАЖИ — amount УЖЕ за вычетом комиссии!
-            if op_type == "OperationAgentDeliveredToCustomer":
-                if amount > 0:
-                    stats["delivered_count"] += 1
-                    stats["sales_revenue"] += amount  # Это выручка ПОСЛЕ комиссии
-            
-            # 2. ВОЗВРАТЫ ТОВАРА (реальный возврат денег клиенту)
-            elif op_type in ("ClientReturnAgentOperation", "OperationItemReturn"):
-                if amount < 0:
-                    stats["returned_count"] += 1
-                    stats["return_costs"] += abs(amount)
-                elif amount > 0:
-                    stats["compensations"] += amount
-            
-            # 3. ЛОГИСТИКА (все виды доставки, возвраты, хранение)
-            elif any(x in op_type for x in [
-                "Delivery", "Redistribution", "Logistic", "ReturnGoods", 
-                "Crossdocking", "Storage", "AgencyFee", "3pl"
-            ]):
-                if amount < 0:
-                    stats["logistics"] += abs(amount)
-                elif amount > 0:
-                    stats["compensations"] += amount
-            
-            # 4. КОМПЕНСАЦИИ ОТ МП (за возвраты и т.д.)
-            elif "Reexposure" in op_type or "Compensation" in op_type:
-                if amount > 0:
-                    stats["compensations"] += amount
-                elif amount < 0:
-                    stats["other_expenses"] += abs(amount)
-            
-            # 5. ПРОЧИЕ РАСХОДЫ (кэшбэк, баллы, эквайринг и т.д.)
-            # Эквайринг — это дополнительная комиссия за способ оплаты
-            elif any(x in op_type for x in [
-                "Acquiring", "Cashback", "Points", "Premium", "Installment"
-            ]):
-                if amount < 0:
-                    stats["other_expenses"] += abs(amount)
-                elif amount > 0:
-                    stats["compensations"] += amount
-            
-            # 6. ВСЕ ОСТАЛЬНОЕ
-            else:
-                if amount < 0:
-                    stats["other_expenses"] += abs(amount)
-                elif amount > 0 and op_type != "OperationAgentDeliveredToCustomer":
-                    stats["compensations"] += amount
+            product_stats[key] = {
+                "name": item_name,
+                "sku": item_sku,
+                "article": found_article,
+                "tags": found_tags,
+                "purchase_price": purchase_price,
+                "delivered_count": 0,      # Доставлено (реальные продажи)
+                "returned_count": 0,       # Возвращено
+                "sales_revenue": 0,        # Выручка (уже за вычетом комиссии Ozon!)
+                "return_costs": 0,         # Возвраты клиентам
+                "logistics": 0,            # Логистика и доставка
+                "other_expenses": 0,       # Прочие расходы (кэшбэк, баллы и т.д.)
+                "compensations": 0,        # Компенсации от МП
+            }
+        
+        stats = product_stats[key]
+        # Суммы начислений (> 0) и списаний (< 0, по модулю) за период
+        income = row["pos_amount"]
+        expenses = row["neg_amount"]
+        
+        # === КАТЕГОРИЗАЦИЯ ОПЕРАЦИЙ ===
+        # ВАЖНО: amount в OperationAgentDeliveredToCustomer УЖЕ содержит выручку
+        # за вычетом комиссии Ozon! Не нужно считать комиссию отдельно.
+        
+        # 1. ПРОДАЖИ — amount УЖЕ за вычетом комиссии!
+        if op_type == "OperationAgentDeliveredToCustomer":
+            stats["delivered_count"] += row["pos_count"]
+            stats["sales_revenue"] += income  # Это выручка ПОСЛЕ комиссии
+        
+        # 2. ВОЗВРАТЫ ТОВАРА (реальный возврат денег клиенту)
+        elif op_type in ("ClientReturnAgentOperation", "OperationItemReturn"):
+            stats["returned_count"] += row["neg_count"]
+            stats["return_costs"] += expenses
+            stats["compensations"] += income
+        
+        # 3. ЛОГИСТИКА (все виды доставки, возвраты, хранение)
+        elif any(x in op_type for x in [
+            "Delivery", "Redistribution", "Logistic", "ReturnGoods", 
+            "Crossdocking", "Storage", "AgencyFee", "3pl"
+        ]):
+            stats["logistics"] += expenses
+            stats["compensations"] += income
+        
+        # 4. КОМПЕНСАЦИИ ОТ МП, ПРОЧИЕ РАСХОДЫ (кэшбэк, баллы, эквайринг) и ВСЁ ОСТАЛЬНОЕ:
+        # начисления - компенсации, списания - прочие расходы
+        else:
+            stats["compensations"] += income
+            stats["other_expenses"] += expenses
     
     # Рассчитываем финальные метрики для каждого товара
     products_result = []
@@ -1907,19 +2070,16 @@ async def get_products_economics(
     }
     
     # Считаем операции БЕЗ привязки к товарам
-    for op in operations:
-        items = op.get("items", [])
-        if items:  # Пропускаем операции с товарами
+    for row in rows:
+        if row["attribution"] in ("item", "extra_item"):  # Пропускаем операции с товарами
             continue
         
-        op_type = op.get("operation_type", "")
-        amount = op.get("amount", 0)
+        op_type = row["operation_type"]
+        abs_amount = row["neg_amount"]  # Считаем только расходы
         
-        if amount >= 0:  # Считаем только расходы
+        if not abs_amount:
             continue
         
-        abs_amount = abs(amount)
-        
         if "Subscription" in op_type or "Premium" in op_type:
             general_expenses["subscription"] += abs_amount
         elif "DefectRate" in op_type or "Cancellation" in op_type or "ShipmentDelay" in op_type:
@@ -8,6 +8,8 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
 from backend.connectors import get_connector, MarketplaceError
+from backend.services.category_search import CategorySearch, catalog_source
+from backend.services.category_preload import apply_category_diff
 
 logger = logging.getLogger(__name__)
 
@@ -33,51 +35,43 @@ class CategorySystem:
             
             logger.info(f"[CategorySystem] Loaded {len(all_categories)} categories from {marketplace}")
             
-            # Сохранить в БД
-            inserted_count = 0
-            updated_count = 0
-            
-            for category in all_categories:
-                cat_id = category.get('id')
-                
-                # Уникальный ключ: marketplace + category_id
-                existing = await self.db.marketplace_categories.find_one({
-                    "marketplace": marketplace,
-                    "category_id": cat_id
-                })
-                
-                category_doc = {
+            # Сохранить в БД: только новые, изменённые и удалённые категории, одним bulk_write
+            category_docs = [
+                {
                     "marketplace": marketplace,
-                    "category_id": cat_id,
+                    "category_id": category.get('id'),
                     "category_name": category.get('name', ''),
                     "type_id": category.get('type_id'),
                     "type_name": category.get('type_name'),
                     "disabled": category.get('disabled', False),
                     "is_visible": category.get('is_visible', True),
                     "parent_id": category.get('parent_id'),
-                    "raw_data": category,
-                    "updated_at": datetime.utcnow()
+                    "raw_data": category
                 }
-                
-                if existing:
-                    await self.db.marketplace_categories.update_one(
-                        {"_id": existing["_id"]},
-                        {"$set": category_doc}
-                    )
-                    updated_count += 1
-                else:
-                    category_doc["created_at"] = datetime.utcnow()
-                    await self.db.marketplace_categories.insert_one(category_doc)
-                    inserted_count += 1
+                for category in all_categories
+            ]
+            result = await apply_category_diff(
+                self.db,
+                'marketplace_categories',
+                category_docs,
+                key_fields=('marketplace', 'category_id'),
+                scope={"marketplace": marketplace}
+            )
+            inserted_count = result['inserted']
+            updated_count = result['updated']
             
-            logger.info(f"[CategorySystem] Inserted: {inserted_count}, Updated: {updated_count}")
+            logger.info(f"[CategorySystem] Inserted: {inserted_count}, Updated: {updated_count}, Deleted: {result['deleted']}")
+            
+            await CategorySearch.load(self.db, catalog_source(marketplace))
             
             return {
                 "success": True,
                 "marketplace": marketplace,
                 "total_categories": len(all_categories),
                 "inserted": inserted_count,
-                "updated": updated_count
+                "updated": updated_count,
+                "deleted": result['deleted'],
+                "unchanged": result['unchanged']
             }
             
         except MarketplaceError as e:
@@ -89,19 +83,11 @@ class CategorySystem:
     
     async def search_categories(self, marketplace: str, query: str, limit: int = 50) -> List[Dict[str, Any]]:
         """
-        Поиск категорий по названию в предзагруженных данных
+        Поиск категорий по названию в предзагруженных данных (индекс в памяти)
         """
         logger.info(f"[CategorySystem] Searching {marketplace} categories: '{query}'")
         
-        # Поиск по названию (case-insensitive)
-        categories = await self.db.marketplace_categories.find(
-            {
-                "marketplace": marketplace,
-                "category_name": {"$regex": query, "$options": "i"},
-                "disabled": False
-            },
-            {"_id": 0}
-        ).limit(limit).to_list(length=limit)
+        categories = await CategorySearch.search(self.db, catalog_source(marketplace), query, limit=limit)
         
         logger.info(f"[CategorySystem] Found {len(categories)} matching categories")
         
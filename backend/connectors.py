@@ -2,11 +2,15 @@
 # Complete implementation with CORS-compatible headers
 
 import httpx
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import asyncio
+import time
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from datetime import datetime, timedelta, timezone
 import logging
 import json
+from contextlib import aclosing
 import gzip
+import base64
 import brotli  # For Brotli decompression
 from tenacity import (
     retry,
@@ -17,17 +21,82 @@ from tenacity import (
     RetryCallState
 )
 
+from backend.core.config import settings
+from backend.core.http_client import get_http_client
+from backend.core.windowed import iter_windows
+
 logger = logging.getLogger(__name__)
 
 class MarketplaceError(Exception):
     """Custom exception for marketplace API errors"""
-    def __init__(self, marketplace: str, status_code: int, message: str, details: Any = None):
+    def __init__(self, marketplace: str, status_code: int, message: str, details: Any = None,
+                 retry_after: Optional[float] = None):
         self.marketplace = marketplace
         self.status_code = status_code
         self.message = message
         self.details = details
+        self.retry_after = retry_after  # секунды из заголовка Retry-After (для 429)
         super().__init__(f"{marketplace} API Error [{status_code}]: {message}")
 
+
+class AccountThrottle:
+    """
+    Ограничение параллельных запросов одного аккаунта маркетплейса.
+    
+    Семафор ограничивает число одновременных запросов, а после ответа 429
+    все запросы аккаунта ждут общую паузу (Retry-After или экспоненциальную).
+    """
+    
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.paused_until = 0.0
+        self.loop = asyncio.get_running_loop()
+    
+    async def wait_if_paused(self) -> None:
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+_account_throttles: Dict[str, AccountThrottle] = {}
+
+
+# Ozon: account key -> (время загрузки, offer_id), см. OzonConnector.get_offer_ids
+_ozon_offer_ids_cache: Dict[str, Tuple[float, List[str]]] = {}
+
+
+# Ozon /v3/posting/{fbs,fbo}/list: размер страницы и максимальный offset
+OZON_POSTINGS_PAGE_SIZE = 1000
+OZON_POSTINGS_MAX_OFFSET = 20000
+
+# Ozon /v2/posting/fbs/package-label: отправлений в одном запросе
+OZON_LABELS_PER_REQUEST = 20
+
+
+def _parse_ozon_time(value: Optional[str]) -> Optional[datetime]:
+    """ISO-время Ozon ("2024-01-01T10:00:00.123Z") -> naive UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def get_account_throttle(account_key: str, concurrency: int) -> AccountThrottle:
+    """Общий throttle на аккаунт в пределах процесса (пересоздаётся при смене event loop)"""
+    throttle = _account_throttles.get(account_key)
+    if throttle is None or throttle.loop is not asyncio.get_running_loop():
+        throttle = AccountThrottle(concurrency)
+        _account_throttles[account_key] = throttle
+    return throttle
+
 class BaseConnector:
     """Base class for marketplace connectors"""
     
@@ -74,95 +143,102 @@ class BaseConnector:
             logger.warning(f"[{self.marketplace_name}] Retry attempt {attempt}/3 for {url}")
         
         try:
-            async with httpx.AsyncClient(
-                timeout=self.timeout, 
-                verify=True,
-                follow_redirects=True
-            ) as client:
-                logger.info(f"[{self.marketplace_name}] {method} {url}")
-                logger.info(f"[{self.marketplace_name}] Headers: {list(headers.keys())}")
-                
-                if method == "GET":
-                    response = await client.get(url, headers=headers, params=params)
-                elif method == "POST":
-                    logger.info(f"[{self.marketplace_name}] POST JSON data: {json_data}")
-                    response = await client.post(url, headers=headers, json=json_data, params=params)
-                elif method == "PUT":
-                    response = await client.put(url, headers=headers, json=json_data)
-                else:
-                    raise ValueError(f"Unsupported HTTP method: {method}")
+            # Общий keep-alive клиент на хост (см. backend/core/http_client.py)
+            client = get_http_client(url)
+            
+            logger.info(f"[{self.marketplace_name}] {method} {url}")
+            logger.info(f"[{self.marketplace_name}] Headers: {list(headers.keys())}")
+            
+            if method == "GET":
+                response = await client.get(url, headers=headers, params=params, timeout=self.timeout)
+            elif method == "POST":
+                logger.info(f"[{self.marketplace_name}] POST JSON data: {json_data}")
+                response = await client.post(url, headers=headers, json=json_data, params=params, timeout=self.timeout)
+            elif method == "PUT":
+                response = await client.put(url, headers=headers, json=json_data, timeout=self.timeout)
+            else:
+                raise ValueError(f"Unsupported HTTP method: {method}")
+            
+            logger.info(f"[{self.marketplace_name}] Response status: {response.status_code}")
+            
+            # Handle non-200 responses
+            if response.status_code not in [200, 201, 204]:
+                error_text = response.text
+                try:
+                    error_json = response.json()
+                    error_message = error_json.get('message') or error_json.get('error') or error_json.get('detail') or str(error_json)
+                    logger.error(f"[{self.marketplace_name}] API Error JSON: {error_json}")
+                except:
+                    error_message = error_text[:200] if error_text else "Unknown error"
                 
-                logger.info(f"[{self.marketplace_name}] Response status: {response.status_code}")
+                logger.error(f"[{self.marketplace_name}] API Error [{response.status_code}]: {error_message}")
                 
-                # Handle non-200 responses
-                if response.status_code not in [200, 201, 204]:
-                    error_text = response.text
+                retry_after = None
+                if response.status_code == 429:
                     try:
-                        error_json = response.json()
-                        error_message = error_json.get('message') or error_json.get('error') or error_json.get('detail') or str(error_json)
-                        logger.error(f"[{self.marketplace_name}] API Error JSON: {error_json}")
-                    except:
-                        error_message = error_text[:200] if error_text else "Unknown error"
-                    
-                    logger.error(f"[{self.marketplace_name}] API Error [{response.status_code}]: {error_message}")
-                    raise MarketplaceError(
-                        marketplace=self.marketplace_name,
-                        status_code=response.status_code,
-                        message=error_message,
-                        details=error_text
-                    )
+                        retry_after = float(response.headers.get('retry-after', ''))
+                    except ValueError:
+                        retry_after = None
                 
-                # Handle 204 No Content (success with empty body)
-                if response.status_code == 204:
-                    logger.info(f"[{self.marketplace_name}] Success (204 No Content)")
-                    return {"success": True, "message": "Updated successfully"}
+                raise MarketplaceError(
+                    marketplace=self.marketplace_name,
+                    status_code=response.status_code,
+                    message=error_message,
+                    details=error_text,
+                    retry_after=retry_after
+                )
+            
+            # Handle 204 No Content (success with empty body)
+            if response.status_code == 204:
+                logger.info(f"[{self.marketplace_name}] Success (204 No Content)")
+                return {"success": True, "message": "Updated successfully"}
+            
+            # Try to parse as JSON
+            try:
+                return response.json()
+            except Exception as json_error:
+                # If JSON parsing fails, check if response is compressed
+                # Check Content-Encoding header first
+                content_encoding = response.headers.get('content-encoding', '').lower()
+                content = response.content
+                gzip_magic = b'\x1f\x8b'
                 
-                # Try to parse as JSON
-                try:
-                    return response.json()
-                except Exception as json_error:
-                    # If JSON parsing fails, check if response is compressed
-                    # Check Content-Encoding header first
-                    content_encoding = response.headers.get('content-encoding', '').lower()
-                    content = response.content
-                    gzip_magic = b'\x1f\x8b'
-                    
-                    logger.info(f"[{self.marketplace_name}] JSON parsing failed: {json_error}")
-                    logger.info(f"[{self.marketplace_name}] Content-Encoding header: '{content_encoding}'")
-                    logger.info(f"[{self.marketplace_name}] First 2 bytes: {content[:2].hex() if len(content) >= 2 else 'N/A'}")
-                    
-                    # Check for compression type
-                    has_gzip_header = content_encoding == 'gzip'
-                    has_gzip_magic = content[:2] == gzip_magic
-                    has_brotli_header = content_encoding == 'br'
-                    is_compressed = has_gzip_header or has_gzip_magic or has_brotli_header
-                    
-                    logger.info(f"[{self.marketplace_name}] Compression check: gzip_header={has_gzip_header}, gzip_magic={has_gzip_magic}, brotli={has_brotli_header}")
-                    
-                    if is_compressed:
-                        try:
-                            # Try Brotli first if header indicates it
-                            if has_brotli_header:
-                                logger.info(f"[{self.marketplace_name}] Detected Brotli-compressed response, decompressing...")
-                                decompressed = brotli.decompress(content)
-                                decoded = decompressed.decode('utf-8')
-                                logger.info(f"[{self.marketplace_name}] Successfully decompressed Brotli: {len(content)} -> {len(decoded)} bytes")
-                                return json.loads(decoded)
-                            # Try gzip
-                            elif has_gzip_header or has_gzip_magic:
-                                logger.info(f"[{self.marketplace_name}] Detected gzip-compressed response, decompressing...")
-                                decompressed = gzip.decompress(content)
-                                decoded = decompressed.decode('utf-8')
-                                logger.info(f"[{self.marketplace_name}] Successfully decompressed gzip: {len(content)} -> {len(decoded)} bytes")
-                                return json.loads(decoded)
-                        except Exception as decompress_error:
-                            logger.error(f"[{self.marketplace_name}] Failed to decompress: {decompress_error}")
-                            # Fall through to return raw response
-                    
-                    # Not compressed or decompression failed, return text
-                    logger.warning(f"[{self.marketplace_name}] Response is not JSON and not compressed: {response.text[:100]}")
-                    return {"raw_response": response.text}
+                logger.info(f"[{self.marketplace_name}] JSON parsing failed: {json_error}")
+                logger.info(f"[{self.marketplace_name}] Content-Encoding header: '{content_encoding}'")
+                logger.info(f"[{self.marketplace_name}] First 2 bytes: {content[:2].hex() if len(content) >= 2 else 'N/A'}")
                 
+                # Check for compression type
+                has_gzip_header = content_encoding == 'gzip'
+                has_gzip_magic = content[:2] == gzip_magic
+                has_brotli_header = content_encoding == 'br'
+                is_compressed = has_gzip_header or has_gzip_magic or has_brotli_header
+                
+                logger.info(f"[{self.marketplace_name}] Compression check: gzip_header={has_gzip_header}, gzip_magic={has_gzip_magic}, brotli={has_brotli_header}")
+                
+                if is_compressed:
+                    try:
+                        # Try Brotli first if header indicates it
+                        if has_brotli_header:
+                            logger.info(f"[{self.marketplace_name}] Detected Brotli-compressed response, decompressing...")
+                            decompressed = brotli.decompress(content)
+                            decoded = decompressed.decode('utf-8')
+                            logger.info(f"[{self.marketplace_name}] Successfully decompressed Brotli: {len(content)} -> {len(decoded)} bytes")
+                            return json.loads(decoded)
+                        # Try gzip
+                        elif has_gzip_header or has_gzip_magic:
+                            logger.info(f"[{self.marketplace_name}] Detected gzip-compressed response, decompressing...")
+                            decompressed = gzip.decompress(content)
+                            decoded = decompressed.decode('utf-8')
+                            logger.info(f"[{self.marketplace_name}] Successfully decompressed gzip: {len(content)} -> {len(decoded)} bytes")
+                            return json.loads(decoded)
+                    except Exception as decompress_error:
+                        logger.error(f"[{self.marketplace_name}] Failed to decompress: {decompress_error}")
+                        # Fall through to return raw response
+                
+                # Not compressed or decompression failed, return text
+                logger.warning(f"[{self.marketplace_name}] Response is not JSON and not compressed: {response.text[:100]}")
+                return {"raw_response": response.text}
+            
         except httpx.TimeoutException as e:
             logger.error(f"[{self.marketplace_name}] Request timeout after {self.timeout}s: {str(e)}")
             logger.error(f"[{self.marketplace_name}] URL: {url}")
@@ -191,6 +267,101 @@ class BaseConnector:
                 message=f"Internal error: {str(e)}"
             )
 
+    async def iter_products(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Товары страницами. По умолчанию - одна страница из get_products();
+        коннекторы с курсорной пагинацией переопределяют его.
+        """
+        yield await self.get_products()
+
+    async def _make_raw_request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        json_data: Optional[Dict] = None
+    ) -> httpx.Response:
+        """Запрос без разбора тела ответа (PDF и другие бинарные ответы)"""
+        try:
+            response = await get_http_client(url).request(method, url, headers=headers, json=json_data, timeout=self.timeout)
+        except httpx.TimeoutException as e:
+            raise MarketplaceError(
+                marketplace=self.marketplace_name,
+                status_code=408,
+                message=f"Таймаут запроса к {self.marketplace_name} API (превышено {self.timeout}s)",
+                details=str(e)
+            )
+        except httpx.TransportError as e:
+            raise MarketplaceError(
+                marketplace=self.marketplace_name,
+                status_code=503,
+                message=f"Не удалось подключиться к {self.marketplace_name} API",
+                details=str(e)
+            )
+        
+        if response.status_code not in [200, 201]:
+            try:
+                error_json = response.json()
+                error_message = error_json.get('message') or error_json.get('error') or str(error_json)
+            except Exception:
+                error_message = response.text[:200] or "Unknown error"
+            
+            retry_after = None
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get('retry-after', ''))
+                except ValueError:
+                    retry_after = None
+            
+            raise MarketplaceError(
+                marketplace=self.marketplace_name,
+                status_code=response.status_code,
+                message=error_message,
+                details=response.text[:500],
+                retry_after=retry_after
+            )
+        
+        return response
+    
+    def _account_key(self) -> str:
+        """Ключ аккаунта для общих на процесс лимитов и кэшей"""
+        return f"{self.marketplace_name}:{self.client_id}:{self.api_key[-8:]}"
+
+    async def _throttled_request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        json_data: Optional[Dict] = None,
+        params: Optional[Dict] = None,
+        raw: bool = False
+    ) -> Any:
+        """
+        _make_request с лимитом параллельности на аккаунт и backoff при 429.
+        Используется там, где коннектор сам запускает запросы параллельно.
+        
+        raw=True - вернуть httpx.Response как есть (для бинарных ответов, см. _make_raw_request)
+        """
+        throttle = get_account_throttle(self._account_key(), settings.MARKETPLACE_ACCOUNT_CONCURRENCY)
+        delay = settings.MARKETPLACE_RATE_LIMIT_BACKOFF
+        
+        for attempt in range(1, settings.MARKETPLACE_RATE_LIMIT_RETRIES + 1):
+            await throttle.wait_if_paused()
+            async with throttle.semaphore:
+                try:
+                    if raw:
+                        return await self._make_raw_request(method, url, headers, json_data=json_data)
+                    return await self._make_request(method, url, headers, json_data=json_data, params=params)
+                except MarketplaceError as e:
+                    if e.status_code != 429 or attempt == settings.MARKETPLACE_RATE_LIMIT_RETRIES:
+                        raise
+                    pause = e.retry_after or delay
+            
+            logger.warning(f"[{self.marketplace_name}] Rate limited (429), pause {pause:.1f}s (attempt {attempt})")
+            throttle.pause(pause)
+            delay = min(delay * 2, 60)
+
+
 class OzonConnector(BaseConnector):
     """Ozon marketplace connector - REAL API with full headers"""
     
@@ -212,154 +383,132 @@ class OzonConnector(BaseConnector):
         return headers
     
     async def get_products(self) -> List[Dict[str, Any]]:
-        """Get products from Ozon with full details (images, attributes) - WITH PAGINATION"""
+        """
+        Get products from Ozon with full details (images, attributes) - WITH PAGINATION
+        
+        Детали (/v3/product/info/list) запрашиваются пачками по 100 параллельно,
+        не дожидаясь конца пагинации списка. Параллельность ограничена на аккаунт.
+        """
         logger.info("[Ozon] Fetching ALL products with full details (pagination enabled)")
         
-        # Step 1: Get list of all products with pagination
         list_url = f"{self.base_url}/v3/product/list"
+        info_url = f"{self.base_url}/v3/product/info/list"
         headers = self._get_headers()
+        batch_size = 100  # API limit for /v3/product/info/list
         
-        logger.info("[Ozon] Step 1: Getting product list with pagination")
-        
-        all_items = []
+        async def fetch_batch(batch: List[str], batch_no: int) -> List[Dict[str, Any]]:
+            logger.info(f"[Ozon] Processing batch {batch_no}: {len(batch)} products")
+            try:
+                info_response = await self._throttled_request(
+                    "POST", info_url, headers, json_data={"offer_id": batch}
+                )
+            except MarketplaceError as e:
+                # If batch fails, log and continue with next batch
+                logger.warning(f"[Ozon] Failed to get full info for batch {batch_no}: {e.message}, skipping batch")
+                return []
+            
+            # v3 API returns items directly, not in result.items
+            detailed_items = info_response.get('items', []) or info_response.get('result', {}).get('items', [])
+            logger.info(f"[Ozon] Batch {batch_no} received full info for {len(detailed_items)} products")
+            return [self._format_product_info(detailed) for detailed in detailed_items]
+        
+        tasks: List[asyncio.Task] = []
+        pending: List[str] = []
+        total_items = 0
         last_id = ""
         page = 1
         
-        # Pagination loop to get ALL products
-        while True:
-            list_payload = {
-                "filter": {
-                    "visibility": "ALL"
-                },
-                "last_id": last_id,
-                "limit": 1000  # Max limit per request
-            }
-            
-            logger.info(f"[Ozon] Fetching page {page}, last_id: {last_id}")
-            
-            list_response = await self._make_request("POST", list_url, headers, json_data=list_payload)
-            items = list_response.get('result', {}).get('items', [])
-            
-            logger.info(f"[Ozon] Page {page}: Received {len(items)} products")
-            
-            if not items:
-                break
-            
-            all_items.extend(items)
-            
-            # Check if there are more pages
-            last_id = list_response.get('result', {}).get('last_id', '')
-            if not last_id:
-                break
-            
-            page += 1
-        
-        logger.info(f"[Ozon] Total products fetched: {len(all_items)}")
-        
-        all_products = []
-        
         try:
-            if not all_items:
-                return all_products
-            
-            # Step 2: Get full info for each product (in batches)
-            # Use v3 API which returns images correctly
-            info_url = f"{self.base_url}/v3/product/info/list"
-            
-            # Prepare offer IDs from ALL items
-            offer_ids = [item.get('offer_id') for item in all_items if item.get('offer_id')]
-            
-            logger.info(f"[Ozon] Step 2: Getting full info for {len(offer_ids)} products via v3 API (in batches)")
-            
-            # Process in batches of 100 (API limit)
-            batch_size = 100
-            for i in range(0, len(offer_ids), batch_size):
-                batch = offer_ids[i:i + batch_size]
-                logger.info(f"[Ozon] Processing batch {i//batch_size + 1}: {len(batch)} products")
-                
-                # Get full info - v3 API uses simpler payload
-                info_payload = {
-                    "offer_id": batch
+            # Pagination loop to get ALL products; detail batches start as soon as they fill up
+            while True:
+                list_payload = {
+                    "filter": {
+                        "visibility": "ALL"
+                    },
+                    "last_id": last_id,
+                    "limit": 1000  # Max limit per request
                 }
                 
-                try:
-                    info_response = await self._make_request("POST", info_url, headers, json_data=info_payload)
-                    # v3 API returns items directly, not in result.items
-                    detailed_items = info_response.get('items', []) or info_response.get('result', {}).get('items', [])
-                    logger.info(f"[Ozon] Batch received full info for {len(detailed_items)} products")
-                    
-                    # Transform to standard format
-                    for detailed in detailed_items:
-                        # Extract images - v3 API returns images as array of URLs directly
-                        images = []
-                        images_data = detailed.get('images', [])
-                        
-                        # Handle both formats: array of strings or array of objects
-                        for img in images_data:
-                            if isinstance(img, str):
-                                images.append(img)
-                            elif isinstance(img, dict):
-                                img_url = img.get('file_name') or img.get('url')
-                                if img_url:
-                                    images.append(img_url)
-                        
-                        # Extract primary image (v3 returns it as array)
-                        primary_image = detailed.get('primary_image', [])
-                        if isinstance(primary_image, list) and primary_image:
-                            for pi in primary_image:
-                                if pi and pi not in images:
-                                    images.insert(0, pi)
-                        elif isinstance(primary_image, str) and primary_image:
-                            if primary_image not in images:
-                                images.insert(0, primary_image)
-                        
-                        logger.debug(f"[Ozon] Product {detailed.get('offer_id')}: found {len(images)} images")
-                        
-                        all_products.append({
-                            "id": str(detailed.get('id', '')),
-                            "sku": detailed.get('offer_id', ''),
-                            "name": detailed.get('name', 'Unnamed product'),
-                            "description": detailed.get('description', ''),
-                            "price": float(detailed.get('price', 0) or 0),
-                            "stock": 0,
-                            "images": images,
-                            "attributes": detailed.get('attributes', []),
-                            "category": detailed.get('category_name', ''),
-                            "marketplace": "ozon",
-                            "status": 'archived' if detailed.get('is_archived') else 'active',
-                            "barcode": detailed.get('barcodes', [''])[0] if detailed.get('barcodes') else ''
-                        })
-                    
-                except MarketplaceError as e:
-                    # If batch fails, log and continue with next batch
-                    logger.warning(f"[Ozon] Failed to get full info for batch: {e.message}, skipping batch")
-                    continue
+                logger.info(f"[Ozon] Fetching page {page}, last_id: {last_id}")
+                
+                list_response = await self._throttled_request("POST", list_url, headers, json_data=list_payload)
+                items = list_response.get('result', {}).get('items', [])
+                
+                logger.info(f"[Ozon] Page {page}: Received {len(items)} products")
+                
+                if not items:
+                    break
+                
+                total_items += len(items)
+                for item in items:
+                    if item.get('offer_id'):
+                        pending.append(item['offer_id'])
+                    if len(pending) >= batch_size:
+                        tasks.append(asyncio.create_task(fetch_batch(pending, len(tasks) + 1)))
+                        pending = []
+                
+                # Check if there are more pages
+                last_id = list_response.get('result', {}).get('last_id', '')
+                if not last_id:
+                    break
+                
+                page += 1
             
-            logger.info(f"[Ozon] Successfully transformed {len(all_products)} products with full details")
-            return all_products
+            if pending:
+                tasks.append(asyncio.create_task(fetch_batch(pending, len(tasks) + 1)))
             
-        except MarketplaceError as e:
-            # If /v3/product/info/list fails completely, fallback to basic data
-            logger.warning(f"[Ozon] Failed to get full info: {e.message}, using basic data")
-            
-            for item in all_items:
-                all_products.append({
-                    "id": str(item.get('product_id', '')),
-                    "sku": item.get('offer_id', ''),
-                    "name": item.get('offer_id', 'Unnamed product'),
-                    "description": '',
-                    "price": 0,
-                    "stock": 0,
-                    "images": [],
-                    "attributes": {},
-                    "category": '',
-                    "marketplace": "ozon",
-                    "status": 'archived' if item.get('archived') else 'active',
-                    "barcode": ''
-                })
+            logger.info(f"[Ozon] Total products fetched: {total_items}, detail batches: {len(tasks)}")
             
-            logger.info(f"[Ozon] Successfully transformed {len(all_products)} products (basic info only)")
-            return all_products
+            batches = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        all_products = [product for batch in batches for product in batch]
+        logger.info(f"[Ozon] Successfully transformed {len(all_products)} products with full details")
+        return all_products
+    
+    @staticmethod
+    def _format_product_info(detailed: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform /v3/product/info/list item to standard format"""
+        # Extract images - v3 API returns images as array of URLs directly
+        images = []
+        images_data = detailed.get('images', [])
+        
+        # Handle both formats: array of strings or array of objects
+        for img in images_data:
+            if isinstance(img, str):
+                images.append(img)
+            elif isinstance(img, dict):
+                img_url = img.get('file_name') or img.get('url')
+                if img_url:
+                    images.append(img_url)
+        
+        # Extract primary image (v3 returns it as array)
+        primary_image = detailed.get('primary_image', [])
+        if isinstance(primary_image, list) and primary_image:
+            for pi in primary_image:
+                if pi and pi not in images:
+                    images.insert(0, pi)
+        elif isinstance(primary_image, str) and primary_image:
+            if primary_image not in images:
+                images.insert(0, primary_image)
+        
+        return {
+            "id": str(detailed.get('id', '')),
+            "sku": detailed.get('offer_id', ''),
+            "name": detailed.get('name', 'Unnamed product'),
+            "description": detailed.get('description', ''),
+            "price": float(detailed.get('price', 0) or 0),
+            "stock": 0,
+            "images": images,
+            "attributes": detailed.get('attributes', []),
+            "category": detailed.get('category_name', ''),
+            "marketplace": "ozon",
+            "status": 'archived' if detailed.get('is_archived') else 'active',
+            "barcode": detailed.get('barcodes', [''])[0] if detailed.get('barcodes') else ''
+        }
     
     async def get_warehouses(self) -> List[Dict[str, Any]]:
         """Get FBS warehouses from Ozon (seller's own warehouses)"""
@@ -781,10 +930,56 @@ class OzonConnector(BaseConnector):
             logger.error(f"[Ozon] Failed to update stock: {e.message}")
             raise
 
+    async def get_offer_ids(self, use_cache: bool = True) -> List[str]:
+        """
+        Все offer_id аккаунта только через /v3/product/list (без деталей товаров)
+        
+        Результат кэшируется на аккаунт на OZON_OFFER_IDS_CACHE_TTL секунд.
+        
+        Args:
+            use_cache: False - всегда перечитать список из API
+        """
+        cache_key = self._account_key()
+        cached = _ozon_offer_ids_cache.get(cache_key)
+        if use_cache and cached and time.monotonic() - cached[0] < settings.OZON_OFFER_IDS_CACHE_TTL:
+            logger.info(f"[Ozon] Using cached offer_id list ({len(cached[1])} items)")
+            return list(cached[1])
+        
+        url = f"{self.base_url}/v3/product/list"
+        headers = self._get_headers()
+        offer_ids: List[str] = []
+        last_id = ""
+        
+        while True:
+            payload = {
+                "filter": {
+                    "visibility": "ALL"
+                },
+                "last_id": last_id,
+                "limit": 1000  # Max limit per request
+            }
+            response = await self._throttled_request("POST", url, headers, json_data=payload)
+            items = response.get('result', {}).get('items', [])
+            if not items:
+                break
+            
+            offer_ids.extend(item['offer_id'] for item in items if item.get('offer_id'))
+            
+            last_id = response.get('result', {}).get('last_id', '')
+            if not last_id:
+                break
+        
+        _ozon_offer_ids_cache[cache_key] = (time.monotonic(), offer_ids)
+        logger.info(f"[Ozon] Listed {len(offer_ids)} offer_ids")
+        return list(offer_ids)
+    
     async def get_stocks(self, warehouse_id: str = None) -> List[Dict[str, Any]]:
         """
         Получить остатки с Ozon для FBS склада
         
+        Артикулы берутся из get_offer_ids (только список товаров, с кэшем),
+        пачки stocks-by-warehouse/fbs запрашиваются параллельно.
+        
         Args:
             warehouse_id: ID склада FBS (обязательно для FBS)
         
@@ -793,9 +988,7 @@ class OzonConnector(BaseConnector):
         """
         logger.info(f"[Ozon] Getting stocks for warehouse {warehouse_id}")
         
-        # Сначала получаем список всех товаров
-        products = await self.get_products()
-        offer_ids = [p.get('sku') for p in products if p.get('sku')]
+        offer_ids = await self.get_offer_ids()
         
         logger.info(f"[Ozon] Found {len(offer_ids)} products with offer_id")
         
@@ -807,13 +1000,11 @@ class OzonConnector(BaseConnector):
         url = f"{self.base_url}/v1/product/info/stocks-by-warehouse/fbs"
         headers = self._get_headers()
         
-        all_stocks = []
-        
         # Делаем батч-запросы по 100 товаров
         batch_size = 100
-        for i in range(0, len(offer_ids), batch_size):
-            batch = offer_ids[i:i+batch_size]
-            
+        batches_total = (len(offer_ids) - 1) // batch_size + 1
+        
+        async def fetch_batch(batch: List[str], batch_no: int) -> List[Dict[str, Any]]:
             payload = {
                 "offer_id": batch
             }
@@ -823,13 +1014,20 @@ class OzonConnector(BaseConnector):
                 payload["warehouse_id"] = [int(warehouse_id)]
             
             try:
-                response = await self._make_request("POST", url, headers, json_data=payload)
-                result = response.get('result', [])
-                all_stocks.extend(result)
-                logger.info(f"[Ozon] Batch {i//batch_size + 1}/{(len(offer_ids)-1)//batch_size + 1}: got {len(result)} stock records")
+                response = await self._throttled_request("POST", url, headers, json_data=payload)
             except MarketplaceError as e:
-                logger.error(f"[Ozon] Batch {i//batch_size + 1} failed: {e.message}")
-                continue
+                logger.error(f"[Ozon] Batch {batch_no} failed: {e.message}")
+                return []
+            
+            result = response.get('result', [])
+            logger.info(f"[Ozon] Batch {batch_no}/{batches_total}: got {len(result)} stock records")
+            return result
+        
+        batches = await asyncio.gather(*(
+            fetch_batch(offer_ids[i:i + batch_size], i // batch_size + 1)
+            for i in range(0, len(offer_ids), batch_size)
+        ))
+        all_stocks = [stock for batch in batches for stock in batch]
         
         logger.info(f"[Ozon] ✅ Total: {len(all_stocks)} stock records")
         
@@ -989,52 +1187,25 @@ class OzonConnector(BaseConnector):
     
     # ========== МЕТОДЫ ДЛЯ РАБОТЫ С ЗАКАЗАМИ ==========
     
-    async def get_fbs_orders(self, date_from: datetime, date_to: datetime) -> List[Dict[str, Any]]:
+    async def get_fbs_orders(
+        self,
+        date_from: datetime,
+        date_to: datetime,
+        changed_since: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
         """
         Получить заказы FBS (со своего склада) за период
         
         API: POST /v3/posting/fbs/list
         Docs: https://docs.ozon.ru/api/seller/#operation/PostingAPI_GetFbsPostingList
-        """
-        url = f"{self.base_url}/v3/posting/fbs/list"
-        headers = self._get_headers()
-        
-        payload = {
-            "dir": "ASC",
-            "filter": {
-                "since": date_from.isoformat() + "Z",
-                "to": date_to.isoformat() + "Z",
-                "status": ""  # Все статусы
-            },
-            "limit": 1000,
-            "offset": 0,
-            "with": {
-                "analytics_data": False,
-                "financial_data": False
-            }
-        }
         
-        try:
-            response = await self._make_request("POST", url, headers, json_data=payload)
-            
-            # ДЕТАЛЬНОЕ ЛОГИРОВАНИЕ
-            logger.info(f"[Ozon FBS] RAW Response: {json.dumps(response, ensure_ascii=False)[:500]}")
-            
-            result = response.get("result", {})
-            postings = result.get("postings", [])
-            
-            logger.info(f"[Ozon] Получено {len(postings)} FBS заказов")
-            logger.info(f"[Ozon] Response keys: {list(response.keys())}")
-            logger.info(f"[Ozon] Result keys: {list(result.keys()) if result else 'EMPTY'}")
-            
-            if len(postings) > 0:
-                logger.info(f"[Ozon] Пример заказа: {json.dumps(postings[0], ensure_ascii=False)[:300]}")
-            
-            return postings
-            
-        except MarketplaceError as e:
-            logger.error(f"[Ozon] Ошибка получения FBS заказов: {e.message}")
-            raise
+        Args:
+            changed_since: только отправления, статус которых менялся
+                после этого момента (filter.last_changed_status_date)
+        """
+        postings = await self._collect_postings(self.iter_fbs_orders(date_from, date_to, changed_since))
+        logger.info(f"[Ozon] Получено {len(postings)} FBS заказов")
+        return postings
     
     async def get_fbo_orders(self, date_from: datetime, date_to: datetime) -> List[Dict[str, Any]]:
         """
@@ -1043,35 +1214,150 @@ class OzonConnector(BaseConnector):
         API: POST /v3/posting/fbo/list
         Docs: https://docs.ozon.ru/api/seller/#operation/PostingAPI_GetFboPostingList
         """
-        url = f"{self.base_url}/v3/posting/fbo/list"
+        postings = await self._collect_postings(self.iter_fbo_orders(date_from, date_to))
+        logger.info(f"[Ozon] Получено {len(postings)} FBO заказов")
+        return postings
+    
+    def iter_fbs_orders(
+        self,
+        date_from: datetime,
+        date_to: datetime,
+        changed_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream FBS postings page by page (см. _iter_postings)"""
+        return self._iter_postings("fbs", date_from, date_to, changed_since)
+    
+    def iter_fbo_orders(self, date_from: datetime, date_to: datetime) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream FBO postings page by page (см. _iter_postings)"""
+        return self._iter_postings("fbo", date_from, date_to)
+    
+    @staticmethod
+    async def _collect_postings(pages: AsyncIterator[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Собрать страницы в список без дублей на границах окон"""
+        postings: List[Dict[str, Any]] = []
+        seen = set()
+        async for page in pages:
+            for posting in page:
+                posting_number = posting.get("posting_number")
+                if posting_number in seen:
+                    continue
+                if posting_number:
+                    seen.add(posting_number)
+                postings.append(posting)
+        return postings
+    
+    async def _iter_postings(
+        self,
+        flow: str,
+        date_from: datetime,
+        date_to: datetime,
+        changed_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream postings (flow = fbs | fbo) page by page
+        
+        Период делится на окна по OZON_POSTINGS_WINDOW_HOURS, окна выгружаются
+        параллельно (не больше MARKETPLACE_ACCOUNT_CONCURRENCY одновременно,
+        запросы идут через общий throttle аккаунта). Внутри окна - offset/has_next.
+        Страницы отдаются в порядке получения; на границах окон возможны
+        повторы отправлений, потребитель должен быть идемпотентен по posting_number.
+        
+        С changed_since (только FBS) на окна делится интервал изменения статуса
+        [changed_since, date_to], а since/to задают весь период date_from - date_to.
+        """
+        step = timedelta(hours=max(1, settings.OZON_POSTINGS_WINDOW_HOURS))
+        windows = []
+        window_start = changed_since or date_from
+        while window_start < date_to:
+            window_end = min(window_start + step, date_to)
+            windows.append((window_start, window_end))
+            window_start = window_end
+        
+        async def fetch_window(start: datetime, end: datetime, queue: asyncio.Queue):
+            if changed_since:
+                await self._fetch_postings_window(flow, date_from, date_to, queue, (start, end))
+            else:
+                await self._fetch_postings_window(flow, start, end, queue)
+        
+        # aclosing: при остановке потребителя выгрузка окон отменяется сразу
+        async with aclosing(iter_windows(windows, fetch_window, settings.MARKETPLACE_ACCOUNT_CONCURRENCY)) as pages:
+            async for page in pages:
+                yield page
+    
+    async def _fetch_postings_window(
+        self,
+        flow: str,
+        date_from: datetime,
+        date_to: datetime,
+        queue: asyncio.Queue,
+        status_changed: Optional[Tuple[datetime, datetime]] = None
+    ) -> None:
+        """
+        Выгрузить одно окно: страницы по OZON_POSTINGS_PAGE_SIZE через offset
+        до has_next = false. Ozon не принимает offset больше OZON_POSTINGS_MAX_OFFSET,
+        поэтому при его достижении окно продолжается с даты последнего
+        отправления (сортировка ASC) с нулевым offset.
+        
+        status_changed - окно по дате изменения статуса (last_changed_status_date)
+        """
+        url = f"{self.base_url}/v3/posting/{flow}/list"
         headers = self._get_headers()
+        since = date_from
+        offset = 0
         
-        payload = {
-            "dir": "ASC",
-            "filter": {
-                "since": date_from.isoformat() + "Z",
-                "to": date_to.isoformat() + "Z",
-                "status": ""  # Все статусы
-            },
-            "limit": 1000,
-            "offset": 0,
-            "with": {
-                "analytics_data": False,
-                "financial_data": False
+        while True:
+            payload = {
+                "dir": "ASC",
+                "filter": {
+                    "since": since.isoformat() + "Z",
+                    "to": date_to.isoformat() + "Z",
+                    "status": ""  # Все статусы
+                },
+                "limit": OZON_POSTINGS_PAGE_SIZE,
+                "offset": offset,
+                "with": {
+                    "analytics_data": False,
+                    "financial_data": False
+                }
             }
-        }
-        
-        try:
-            response = await self._make_request("POST", url, headers, json_data=payload)
-            result = response.get("result", {})
-            postings = result.get("postings", [])
-            
-            logger.info(f"[Ozon] Получено {len(postings)} FBO заказов")
-            return postings
+            if status_changed:
+                payload["filter"]["last_changed_status_date"] = {
+                    "from": status_changed[0].isoformat() + "Z",
+                    "to": status_changed[1].isoformat() + "Z"
+                }
             
-        except MarketplaceError as e:
-            logger.error(f"[Ozon] Ошибка получения FBO заказов: {e.message}")
-            raise
+            try:
+                response = await self._throttled_request("POST", url, headers, json_data=payload)
+            except MarketplaceError as e:
+                logger.error(f"[Ozon] Ошибка получения {flow.upper()} заказов: {e.message}")
+                raise
+            
+            # FBS: {"result": {"postings": [...], "has_next": bool}}, FBO: {"result": [...]}
+            result = response.get("result") or {}
+            if isinstance(result, list):
+                postings = result
+                has_next = len(postings) == OZON_POSTINGS_PAGE_SIZE
+            else:
+                postings = result.get("postings", [])
+                has_next = result.get("has_next", len(postings) == OZON_POSTINGS_PAGE_SIZE)
+            
+            if postings:
+                await queue.put(postings)
+            if not has_next or not postings:
+                return
+            
+            offset += len(postings)
+            if offset + OZON_POSTINGS_PAGE_SIZE > OZON_POSTINGS_MAX_OFFSET:
+                last = postings[-1]
+                next_since = _parse_ozon_time(last.get("in_process_at") or last.get("created_at"))
+                if status_changed or next_since is None or next_since <= since:
+                    logger.warning(
+                        f"[Ozon] {flow.upper()} окно {since.isoformat()} - {date_to.isoformat()}: "
+                        f"больше {OZON_POSTINGS_MAX_OFFSET} отправлений, остаток не загружен"
+                    )
+                    return
+                since = next_since
+                offset = 0
     
     async def get_order_status(self, posting_number: str) -> Dict[str, Any]:
         """
@@ -1212,6 +1498,43 @@ class OzonConnector(BaseConnector):
         except MarketplaceError as e:
             logger.error(f"[Ozon] Failed to get label: {e.message}")
             raise
+    
+    async def get_labels(self, posting_numbers: List[str]) -> Optional[bytes]:
+        """
+        Получить PDF с этикетками нескольких FBS отправлений одним запросом
+        (не больше OZON_LABELS_PER_REQUEST за запрос)
+        
+        API: POST /v2/posting/fbs/package-label
+        
+        Returns:
+            Содержимое PDF или None, если этикетки не готовы
+        """
+        logger.info(f"[Ozon] Getting labels for {len(posting_numbers)} postings")
+        
+        url = f"{self.base_url}/v2/posting/fbs/package-label"
+        headers = self._get_headers()
+        
+        try:
+            response = await self._throttled_request(
+                "POST", url, headers, json_data={"posting_number": posting_numbers}, raw=True
+            )
+        except MarketplaceError as e:
+            logger.error(f"[Ozon] Failed to get labels: {e.message}")
+            raise
+        
+        # Обычно ответ - сам PDF; старый формат - JSON с url или base64 в result
+        if "application/json" not in response.headers.get("content-type", ""):
+            return response.content
+        
+        result = response.json().get("result") or {}
+        if result.get("file"):
+            return base64.b64decode(result["file"])
+        if result.get("url"):
+            file_response = await self._make_raw_request("GET", result["url"], {})
+            return file_response.content
+        
+        logger.warning(f"[Ozon] No labels found in response")
+        return None
 
 
 
@@ -1238,100 +1561,131 @@ class WildberriesConnector(BaseConnector):
         return headers
     
     async def get_products(self) -> List[Dict[str, Any]]:
-        """Get products from Wildberries with FULL INFO - REAL API CALL"""
+        """Get ALL products from Wildberries with FULL INFO (см. iter_products)"""
+        all_products = []
+        async for page in self.iter_products():
+            all_products.extend(page)
+        
+        logger.info(f"[WB] Successfully transformed {len(all_products)} products with full details")
+        return all_products
+    
+    async def iter_products(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream products from Wildberries Content API page by page - REAL API CALL
+        
+        Идём по курсору cards/list (updatedAt + nmID) до конца каталога,
+        каждая страница (до 100 карточек) отдаётся сразу после нормализации.
+        """
         logger.info("[WB] Fetching products with full details from Content API")
         
         url = f"{self.content_api_url}/content/v2/get/cards/list"
         headers = self._get_headers()
+        limit = 100
+        cursor: Dict[str, Any] = {"limit": limit}
+        page = 1
         
-        payload = {
-            "settings": {
-                "cursor": {
-                    "limit": 100
-                },
-                "filter": {
-                    "withPhoto": -1
+        while True:
+            payload = {
+                "settings": {
+                    "cursor": cursor,
+                    "filter": {
+                        "withPhoto": -1
+                    }
                 }
             }
-        }
-        
-        all_products = []
-        
-        try:
-            response_data = await self._make_request("POST", url, headers, json_data=payload)
+            
+            try:
+                response_data = await self._throttled_request("POST", url, headers, json_data=payload)
+            except MarketplaceError as e:
+                logger.error(f"[WB] Failed to fetch products (page {page}): {e.message}")
+                raise
             
             cards = response_data.get('cards', [])
-            logger.info(f"[WB] Received {len(cards)} product cards")
+            logger.info(f"[WB] Page {page}: received {len(cards)} product cards")
             
-            for card in cards:
-                # Extract vendor code (артикул продавца)
-                vendor_code = card.get('vendorCode', '')
-                
-                # Extract photos
-                photos = []
-                for photo in card.get('photos', []):
-                    photos.append(photo.get('big', photo.get('c516x688', '')))
-                
-                # Extract characteristics (характеристики)
-                characteristics = []
-                for char in card.get('characteristics', []):
-                    characteristics.append({
-                        "name": char.get('name', ''),
-                        "value": char.get('value', '')
-                    })
-                
-                # Extract description
-                description = card.get('description', '')
-                
-                # ИСПРАВЛЕНО: Используем subjectID и subjectName вместо object
-                subject_id = card.get('subjectID')
-                subject_name = card.get('subjectName', '')
-                
-                # Extract sizes if available
-                sizes = card.get('sizes', [])
-                if sizes:
-                    for size in sizes:
-                        all_products.append({
-                            "id": str(card.get('nmID', '')),
-                            "sku": vendor_code,  # Артикул продавца
-                            "barcode": size.get('skus', [''])[0],  # Баркод
-                            "name": card.get('title', 'Unnamed product'),
-                            "description": description,
-                            "photos": photos,
-                            "characteristics": characteristics,
-                            "price": 0,
-                            "stock": 0,
-                            "marketplace": "wb",
-                            "size": size.get('techSize', ''),
-                            "category": subject_name,  # ИСПРАВЛЕНО
-                            "category_id": str(subject_id) if subject_id else '',  # ДОБАВЛЕНО!
-                            "brand": card.get('brand', '')
-                        })
-                else:
-                    # Single product without sizes
-                    all_products.append({
-                        "id": str(card.get('nmID', '')),
-                        "sku": vendor_code,
-                        "barcode": '',
-                        "name": card.get('title', 'Unnamed product'),
-                        "description": description,
-                        "photos": photos,
-                        "characteristics": characteristics,
-                        "price": 0,
-                        "stock": 0,
-                        "marketplace": "wb",
-                        "size": '',
-                        "category": subject_name,  # ИСПРАВЛЕНО
-                        "category_id": str(subject_id) if subject_id else '',  # ДОБАВЛЕНО!
-                        "brand": card.get('brand', '')
-                    })
+            if cards:
+                yield [product for card in cards for product in self._format_card(card)]
             
-            logger.info(f"[WB] Successfully transformed {len(all_products)} products with full details")
-            return all_products
+            # Последняя страница: карточек меньше лимита
+            next_cursor = response_data.get('cursor') or {}
+            if len(cards) < limit or not next_cursor.get('nmID'):
+                break
             
-        except MarketplaceError as e:
-            logger.error(f"[WB] Failed to fetch products: {e.message}")
-            raise
+            cursor = {
+                "limit": limit,
+                "updatedAt": next_cursor.get('updatedAt'),
+                "nmID": next_cursor.get('nmID')
+            }
+            page += 1
+    
+    @staticmethod
+    def _format_card(card: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Transform cards/list card to standard format (one product per size)"""
+        # Extract vendor code (артикул продавца)
+        vendor_code = card.get('vendorCode', '')
+        
+        # Extract photos
+        photos = []
+        for photo in card.get('photos', []):
+            photos.append(photo.get('big', photo.get('c516x688', '')))
+        
+        # Extract characteristics (характеристики)
+        characteristics = []
+        for char in card.get('characteristics', []):
+            characteristics.append({
+                "name": char.get('name', ''),
+                "value": char.get('value', '')
+            })
+        
+        # Extract description
+        description = card.get('description', '')
+        
+        # ИСПРАВЛЕНО: Используем subjectID и subjectName вместо object
+        subject_id = card.get('subjectID')
+        subject_name = card.get('subjectName', '')
+        
+        products = []
+        
+        # Extract sizes if available
+        sizes = card.get('sizes', [])
+        if sizes:
+            for size in sizes:
+                products.append({
+                    "id": str(card.get('nmID', '')),
+                    "sku": vendor_code,  # Артикул продавца
+                    "barcode": size.get('skus', [''])[0],  # Баркод
+                    "name": card.get('title', 'Unnamed product'),
+                    "description": description,
+                    "photos": photos,
+                    "characteristics": characteristics,
+                    "price": 0,
+                    "stock": 0,
+                    "marketplace": "wb",
+                    "size": size.get('techSize', ''),
+                    "category": subject_name,  # ИСПРАВЛЕНО
+                    "category_id": str(subject_id) if subject_id else '',  # ДОБАВЛЕНО!
+                    "brand": card.get('brand', '')
+                })
+        else:
+            # Single product without sizes
+            products.append({
+                "id": str(card.get('nmID', '')),
+                "sku": vendor_code,
+                "barcode": '',
+                "name": card.get('title', 'Unnamed product'),
+                "description": description,
+                "photos": photos,
+                "characteristics": characteristics,
+                "price": 0,
+                "stock": 0,
+                "marketplace": "wb",
+                "size": '',
+                "category": subject_name,  # ИСПРАВЛЕНО
+                "category_id": str(subject_id) if subject_id else '',  # ДОБАВЛЕНО!
+                "brand": card.get('brand', '')
+            })
+        
+        return products
     
     async def get_warehouses(self) -> List[Dict[str, Any]]:
         """Get seller's FBS warehouses from Wildberries (Seller Warehouses API)"""
@@ -1933,43 +2287,65 @@ class YandexMarketConnector(BaseConnector):
         return headers
     
     async def get_products(self) -> List[Dict[str, Any]]:
-        """Get products from Yandex.Market - REAL API CALL"""
+        """Get ALL products from Yandex.Market (см. iter_products)"""
+        all_products = []
+        async for page in self.iter_products():
+            all_products.extend(page)
+        
+        logger.info(f"[Yandex] Successfully transformed {len(all_products)} products")
+        return all_products
+    
+    async def iter_products(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Stream products from Yandex.Market page by page - REAL API CALL
+        
+        Следуем paging.nextPageToken до конца, каждая страница (до 200 офферов)
+        отдаётся сразу после нормализации.
+        """
         logger.info(f"[Yandex] Fetching products for campaign {self.campaign_id}")
         
         url = f"{self.base_url}/campaigns/{self.campaign_id}/offers"
         headers = self._get_headers()
+        page_token = ""
+        page = 1
         
-        params = {
-            "limit": 200,
-            "page_token": ""
-        }
-        
-        all_products = []
-        
-        try:
-            response_data = await self._make_request("GET", url, headers, params=params)
-            
-            offers = response_data.get('result', {}).get('offers', [])
-            logger.info(f"[Yandex] Received {len(offers)} products")
-            
-            for offer in offers:
-                all_products.append({
-                    "id": offer.get('id', ''),
-                    "sku": offer.get('shopSku', ''),
-                    "name": offer.get('name', 'Unnamed product'),
-                    "price": float(offer.get('price', 0)),
-                    "stock": offer.get('stock', {}).get('count', 0) if isinstance(offer.get('stock'), dict) else 0,
-                    "marketplace": "yandex",
-                    "status": offer.get('availability', 'UNKNOWN'),
-                    "barcode": offer.get('barcodes', [''])[0] if offer.get('barcodes') else ''
-                })
+        while True:
+            params = {
+                "limit": 200,
+                "page_token": page_token
+            }
+            
+            try:
+                response_data = await self._throttled_request("GET", url, headers, params=params)
+            except MarketplaceError as e:
+                logger.error(f"[Yandex] Failed to fetch products (page {page}): {e.message}")
+                raise
             
-            logger.info(f"[Yandex] Successfully transformed {len(all_products)} products")
-            return all_products
+            result = response_data.get('result', {})
+            offers = result.get('offers', [])
+            logger.info(f"[Yandex] Page {page}: received {len(offers)} products")
             
-        except MarketplaceError as e:
-            logger.error(f"[Yandex] Failed to fetch products: {e.message}")
-            raise
+            if offers:
+                yield [self._format_offer(offer) for offer in offers]
+            
+            page_token = (result.get('paging') or {}).get('nextPageToken')
+            if not offers or not page_token:
+                break
+            page += 1
+    
+    @staticmethod
+    def _format_offer(offer: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform campaign offer to standard format"""
+        return {
+            "id": offer.get('id', ''),
+            "sku": offer.get('shopSku', ''),
+            "name": offer.get('name', 'Unnamed product'),
+            "price": float(offer.get('price', 0)),
+            "stock": offer.get('stock', {}).get('count', 0) if isinstance(offer.get('stock'), dict) else 0,
+            "marketplace": "yandex",
+            "status": offer.get('availability', 'UNKNOWN'),
+            "barcode": offer.get('barcodes', [''])[0] if offer.get('barcodes') else ''
+        }
     
     async def get_warehouses(self) -> List[Dict[str, Any]]:
         """Get seller's FBS warehouses from Yandex.Market"""
@@ -12,6 +12,10 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 24
     
+    # Кэш пользователей для проверки JWT: секунды жизни записи (0 - без кэша) и размер
+    AUTH_USER_CACHE_TTL: float = 30.0
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    
     # Ozon
     OZON_CLIENT_ID: str = ""
     OZON_API_KEY: str = ""
@@ -29,6 +33,78 @@ class Settings(BaseSettings):
     RATE_LIMIT_PERIOD: int = 60
     DEBUG: bool = True
     
+    # HTTP клиенты маркетплейсов (пул соединений на каждый хост)
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT: float = 30.0
+    HTTP2_ENABLED: bool = True
+    
+    # Параллельные запросы одного аккаунта маркетплейса и backoff при 429
+    MARKETPLACE_ACCOUNT_CONCURRENCY: int = 4
+    MARKETPLACE_RATE_LIMIT_RETRIES: int = 5
+    MARKETPLACE_RATE_LIMIT_BACKOFF: float = 1.0
+    
+    # Кэш списка offer_id аккаунта Ozon (для выгрузки остатков), секунды
+    OZON_OFFER_IDS_CACHE_TTL: int = 300
+    
+    # Выгрузка финансовых операций Ozon: параллельные 30-дневные окна и повторы страницы
+    OZON_OPERATIONS_WINDOW_CONCURRENCY: int = 4
+    OZON_OPERATIONS_PAGE_RETRIES: int = 3
+    
+    # Блокировка загрузки операций и дозаполнения свёртки sku_daily_economics
+    # продавца (секунды, продлевается пока задача идёт)
+    SKU_ECONOMICS_LOCK_SECONDS: int = 300
+    
+    # Выгрузка отправлений Ozon FBS/FBO: длина параллельно загружаемых окон, часы
+    OZON_POSTINGS_WINDOW_HOURS: int = 24
+    
+    # Инкрементальная синхронизация заказов: перекрытие курсора, глубина первого запуска
+    # и за сколько дней созданные отправления Ozon FBS проверяются на смену статуса
+    ORDER_SYNC_CURSOR_OVERLAP_MINUTES: int = 10
+    ORDER_SYNC_INITIAL_LOOKBACK_HOURS: int = 24
+    ORDER_SYNC_STATUS_LOOKBACK_DAYS: int = 30
+    # WB и Yandex фильтруют заказы только по дате создания: заказы, созданные за столько
+    # часов, перечитываются каждый запуск (смена статуса); период запроса делится на окна
+    ORDER_SYNC_CREATED_STATUS_LOOKBACK_HOURS: int = 72
+    ORDER_SYNC_WINDOW_HOURS: int = 24
+    
+    # Пул фоновой синхронизации продавцов (заказы, остатки): всего задач и на один маркетплейс
+    SYNC_POOL_CONCURRENCY: int = 8
+    SYNC_POOL_HOST_CONCURRENCY: int = 4
+    
+    # Проводки inventory по заказам в транзакции MongoDB (нужен replica set; без него - откат вручную)
+    INVENTORY_TRANSACTIONS_ENABLED: bool = True
+    
+    # Этикетки FBS: сколько запросов пачек этикеток к МП выполняется параллельно
+    LABELS_FETCH_CONCURRENCY: int = 4
+    
+    # Индексы MongoDB из реестра core/indexes.py при старте; проверка планов запросов (explain)
+    DB_ENSURE_INDEXES_ON_STARTUP: bool = True
+    DB_VERIFY_INDEXES_ON_STARTUP: bool = False
+    
+    # Поиск категорий: построить индексы в памяти при старте (иначе - при первом поиске)
+    CATEGORY_SEARCH_PRELOAD_ON_STARTUP: bool = True
+    # Блокировка предзагрузки дерева категорий (секунды, продлевается пока загрузка идёт)
+    CATEGORY_PRELOAD_LOCK_SECONDS: int = 300
+    
+    # Кэш атрибутов категорий и значений атрибутов: записей в памяти процесса и их TTL (секунды),
+    # срок записи в MongoDB и за сколько часов до истечения она обновляется в фоне
+    ATTRIBUTE_CACHE_MEMORY_ENTRIES: int = 2000
+    ATTRIBUTE_CACHE_MEMORY_TTL: float = 600.0
+    ATTRIBUTE_CACHE_MAX_AGE_DAYS: int = 7
+    ATTRIBUTE_CACHE_REFRESH_AHEAD_HOURS: int = 24
+    
+    # Синхронизация остатков: между полными сверками отправляется только дельта
+    STOCK_FULL_RECONCILE_HOURS: int = 24
+    
+    # Очередь изменений остатков (stock_outbox) и фоновый воркер отправки
+    STOCK_OUTBOX_ENABLED: bool = True
+    STOCK_OUTBOX_POLL_SECONDS: float = 2.0
+    STOCK_OUTBOX_COALESCE_SECONDS: float = 5.0
+    STOCK_OUTBOX_BATCH_LIMIT: int = 5000
+    STOCK_OUTBOX_MAX_ATTEMPTS: int = 5
+    
     # Legacy support (для обратной совместимости)
     MONGO_URL: str = ""
     SECRET_KEY: str = ""
@@ -0,0 +1,116 @@
+"""
+Общий пул HTTP клиентов для API маркетплейсов
+Один httpx.AsyncClient с keep-alive пулом на каждый хост (Ozon, WB, Яндекс),
+чтобы не открывать новое TCP+TLS соединение на каждый запрос
+"""
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401 - нужен httpx для HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# host -> (client, event loop в котором клиент создан)
+_clients: Dict[str, Tuple[httpx.AsyncClient, Optional[asyncio.AbstractEventLoop]]] = {}
+
+
+def _host_key(url: str) -> str:
+    """Ключ пула: схема + хост (+ порт)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _build_client() -> httpx.AsyncClient:
+    """Создать клиент с лимитами из настроек"""
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+        limits=limits,
+        timeout=settings.HTTP_TIMEOUT,
+        verify=True,
+        follow_redirects=True,
+    )
+
+
+def _discard_client(key: str, client: httpx.AsyncClient, client_loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    Убрать клиент чужого event loop, не оставляя открытый пул.
+
+    Соединения закрываются в том loop, где созданы: если он ещё работает,
+    aclose() планируется в нём; если остановлен - закрыть пул уже нельзя,
+    клиент просто отбрасывается.
+    """
+    if client.is_closed:
+        return
+    if client_loop is not None and client_loop.is_running() and not client_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+        logger.info(f"[HTTP] Closing pool for {key} from another event loop")
+    else:
+        logger.warning(f"[HTTP] Dropping pool for {key}: its event loop is not running")
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """
+    Получить общий клиент для хоста из url.
+
+    Клиент переиспользуется всеми коннекторами процесса. Соединения httpx
+    привязаны к event loop, поэтому если клиент был создан в другом loop
+    (например, в тестах), создаётся новый, а старый закрывается (_discard_client).
+    """
+    key = _host_key(url)
+    loop = _current_loop()
+    entry = _clients.get(key)
+
+    if entry is not None:
+        client, client_loop = entry
+        if not client.is_closed and client_loop is loop:
+            return client
+        _discard_client(key, client, client_loop)
+
+    client = _build_client()
+    _clients[key] = (client, loop)
+    logger.info(f"[HTTP] New connection pool for {key}")
+    return client
+
+
+async def close_http_clients() -> None:
+    """Закрыть все клиенты (вызывается при остановке приложения)"""
+    loop = _current_loop()
+    entries = list(_clients.items())
+    _clients.clear()
+
+    for key, (client, client_loop) in entries:
+        if client.is_closed:
+            continue
+        if client_loop is not loop:
+            _discard_client(key, client, client_loop)
+            continue
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"[HTTP] Failed to close pool for {key}: {e}")
+
+    if entries:
+        logger.info(f"[HTTP] Closed {len(entries)} connection pools")
+
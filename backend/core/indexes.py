@@ -0,0 +1,277 @@
+"""
+Реестр индексов MongoDB
+
+Все индексы приложения описаны здесь. ensure_indexes создаёт их при старте
+сервера (повторный запуск ничего не меняет), index_report показывает
+недостающие, лишние и неиспользуемые индексы, explain_queries проверяет
+планы основных запросов на полный просмотр коллекции (COLLSCAN).
+
+Проверка вручную: python -m backend.scripts.check_indexes
+"""
+from typing import List, Dict, Any, Tuple, Optional
+from datetime import datetime
+from pymongo import IndexModel, ASCENDING as ASC, DESCENDING as DESC
+from pymongo.errors import OperationFailure
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Коллекция -> индексы
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASC)], unique=True),
+    ],
+    "seller_profiles": [
+        IndexModel([("user_id", ASC)]),
+    ],
+    "products": [
+        IndexModel([("seller_id", ASC)]),
+    ],
+    "product_catalog": [
+        IndexModel([("seller_id", ASC), ("article", ASC)]),
+    ],
+    "inventory": [
+        IndexModel([("seller_id", ASC), ("product_id", ASC)]),
+    ],
+    "inventory_history": [
+        IndexModel([("seller_id", ASC), ("created_at", DESC)]),
+        IndexModel([("seller_id", ASC), ("product_id", ASC), ("created_at", DESC)]),
+    ],
+    # Списки заказов: фильтр продавец/маркетплейс/статус, keyset сортировка (дата, _id)
+    "orders": [
+        IndexModel([("seller_id", ASC)]),
+        IndexModel([("seller_id", ASC), ("dates.created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("status", ASC), ("dates.created_at", DESC), ("_id", DESC)]),
+    ],
+    "orders_fbs": [
+        # Защита импорта и синхронизации от дублей заказа
+        IndexModel([("seller_id", ASC), ("external_order_id", ASC)], unique=True),
+        IndexModel([("seller_id", ASC), ("created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("status", ASC), ("created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("marketplace", ASC), ("status", ASC), ("created_at", DESC), ("_id", DESC)]),
+    ],
+    "orders_fbo": [
+        IndexModel([("seller_id", ASC), ("external_order_id", ASC)]),
+        IndexModel([("seller_id", ASC), ("created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("status", ASC), ("created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("marketplace", ASC), ("status", ASC), ("created_at", DESC), ("_id", DESC)]),
+    ],
+    "orders_retail": [
+        IndexModel([("seller_id", ASC), ("created_at", DESC), ("_id", DESC)]),
+        IndexModel([("seller_id", ASC), ("status", ASC), ("created_at", DESC), ("_id", DESC)]),
+    ],
+    "income_orders": [
+        IndexModel([("user_id", ASC), ("created_at", DESC)]),
+    ],
+    "order_sync_cursors": [
+        IndexModel([("seller_id", ASC), ("marketplace", ASC), ("flow", ASC)], unique=True),
+    ],
+    "ozon_operations": [
+        IndexModel([("seller_id", ASC), ("operation_id", ASC)]),
+        IndexModel([("seller_id", ASC), ("posting_number", ASC)]),
+        IndexModel([("seller_id", ASC), ("operation_date", ASC)]),
+    ],
+    "ozon_transactions": [
+        IndexModel([("seller_id", ASC), ("operation_date", DESC)]),
+        IndexModel([("seller_id", ASC), ("posting_number", ASC), ("sku", ASC)]),
+    ],
+    "marketplace_transactions": [
+        IndexModel([("seller_id", ASC), ("operation_date", DESC)]),
+        IndexModel([("seller_id", ASC), ("marketplace", ASC), ("transaction_id", ASC)]),
+    ],
+    "sales_report": [
+        IndexModel([("seller_id", ASC), ("report_period", ASC)]),
+    ],
+    "sku_daily_economics": [
+        IndexModel(
+            [("seller_id", ASC), ("date", ASC), ("sku", ASC), ("operation_type", ASC), ("attribution", ASC)],
+            unique=True
+        ),
+    ],
+    "warehouse_links": [
+        IndexModel([("warehouse_id", ASC)]),
+    ],
+    "stock_sync_history": [
+        IndexModel([("user_id", ASC), ("synced_at", DESC)]),
+    ],
+    "stock_outbox": [
+        IndexModel([("status", ASC), ("created_at", ASC)]),
+        IndexModel([("claim_id", ASC)]),
+    ],
+    # Межпроцессные блокировки (core/locks.py): просроченные записи удаляет TTL
+    "locks": [
+        IndexModel([("expires_at", ASC)], expireAfterSeconds=0),
+    ],
+    "stock_push_snapshots": [
+        IndexModel([("link_id", ASC), ("mp_sku", ASC)], unique=True),
+    ],
+    "ozon_categories_cache": [
+        IndexModel([("marketplace", ASC), ("category_id", ASC), ("type_id", ASC)]),
+        IndexModel([("marketplace", ASC), ("loaded_at", DESC)]),
+    ],
+    "wb_categories_cache": [
+        IndexModel([("marketplace", ASC), ("category_id", ASC)]),
+        IndexModel([("marketplace", ASC), ("is_parent", ASC)]),
+    ],
+    "marketplace_categories": [
+        IndexModel([("marketplace", ASC), ("category_id", ASC)]),
+    ],
+    "category_attributes_cache": [
+        IndexModel([("cache_key", ASC)]),
+    ],
+    "attribute_values_cache": [
+        IndexModel([("cache_key", ASC)]),
+    ],
+}
+
+# Основные запросы для проверки планов: (коллекция, фильтр, сортировка)
+_CHECK_SELLER = "index-check"
+_CHECK_DATE = datetime(2024, 1, 1)
+QUERY_CHECKS: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("orders_fbs", {"seller_id": _CHECK_SELLER}, [("created_at", DESC), ("_id", DESC)]),
+    ("orders_fbs", {"seller_id": _CHECK_SELLER, "marketplace": "ozon", "status": "new"}, [("created_at", DESC), ("_id", DESC)]),
+    ("orders_fbs", {"seller_id": _CHECK_SELLER, "external_order_id": {"$in": ["1", "2"]}}, None),
+    ("orders_fbo", {"seller_id": _CHECK_SELLER, "status": "delivered"}, [("created_at", DESC), ("_id", DESC)]),
+    ("orders_retail", {"seller_id": _CHECK_SELLER}, [("created_at", DESC), ("_id", DESC)]),
+    ("orders", {"seller_id": _CHECK_SELLER, "status": "new"}, [("dates.created_at", DESC), ("_id", DESC)]),
+    ("product_catalog", {"seller_id": _CHECK_SELLER, "article": {"$in": ["A-1", "A-2"]}}, None),
+    ("inventory_history", {"seller_id": _CHECK_SELLER}, [("created_at", DESC)]),
+    ("ozon_operations", {"seller_id": _CHECK_SELLER, "operation_date": {"$gte": _CHECK_DATE}}, None),
+    ("ozon_transactions", {"seller_id": _CHECK_SELLER, "operation_date": {"$gte": _CHECK_DATE}}, [("operation_date", DESC)]),
+    ("marketplace_transactions", {"seller_id": _CHECK_SELLER, "operation_date": {"$gte": _CHECK_DATE}}, [("operation_date", DESC)]),
+    ("sales_report", {"seller_id": _CHECK_SELLER, "report_period": {"$in": ["2024-01"]}}, None),
+    ("warehouse_links", {"warehouse_id": "index-check"}, None),
+    ("stock_sync_history", {"user_id": _CHECK_SELLER}, [("synced_at", DESC)]),
+    ("stock_outbox", {"status": "pending", "created_at": {"$lte": _CHECK_DATE}}, [("created_at", ASC)]),
+    ("stock_push_snapshots", {"link_id": "index-check", "mp_sku": {"$in": ["SKU-1", "SKU-2"]}}, None),
+]
+
+
+def _key(spec) -> Tuple[Tuple[str, Any], ...]:
+    """Ключ индекса для сравнения: ((поле, направление), ...)"""
+    return tuple(
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in spec.items()
+    )
+
+
+async def ensure_indexes(db, registry: Dict[str, List[IndexModel]] = INDEX_REGISTRY) -> Dict[str, Any]:
+    """
+    Создать индексы реестра (существующие с теми же параметрами пропускаются)
+
+    Индексы создаются по одному: ошибка одного (дубли под unique,
+    конфликт параметров со старым индексом) не мешает остальным.
+
+    Returns:
+        {"ensured": число индексов, "failed": [{"collection", "index", "error"}]}
+    """
+    ensured = 0
+    failed = []
+    for collection, models in registry.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+                ensured += 1
+            except OperationFailure as e:
+                name = model.document["name"]
+                logger.error(f"[Indexes] {collection}.{name}: {e}")
+                failed.append({"collection": collection, "index": name, "error": str(e)})
+
+    logger.info(f"[Indexes] Индексов в реестре: {ensured}, ошибок: {len(failed)}")
+    return {"ensured": ensured, "failed": failed}
+
+
+async def index_report(db, registry: Dict[str, List[IndexModel]] = INDEX_REGISTRY) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Сравнить индексы в базе с реестром
+
+    unused - индексы без обращений по $indexStats (счётчики обнуляются
+    при перезапуске MongoDB, смотреть после работы под нагрузкой).
+
+    Returns:
+        {коллекция: {"missing": [...], "extra": [...], "unused": [...]}} - только коллекции с расхождениями
+    """
+    report = {}
+    for collection, models in registry.items():
+        expected = {_key(model.document["key"]): model.document["name"] for model in models}
+        existing = {
+            _key(dict(info["key"])): name
+            for name, info in (await db[collection].index_information()).items()
+            if name != "_id_"
+        }
+
+        try:
+            stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+            unused = sorted(
+                s["name"] for s in stats
+                if s["name"] != "_id_" and not s.get("accesses", {}).get("ops")
+            )
+        except OperationFailure:
+            unused = []
+
+        entry = {
+            "missing": sorted(name for key, name in expected.items() if key not in existing),
+            "extra": sorted(name for key, name in existing.items() if key not in expected),
+            "unused": unused,
+        }
+        if any(entry.values()):
+            report[collection] = entry
+    return report
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Все стадии плана запроса (дерево inputStage / inputStages)"""
+    stages = [plan]
+    for child in [plan.get("inputStage"), plan.get("queryPlan"), *plan.get("inputStages", [])]:
+        if child:
+            stages.extend(_plan_stages(child))
+    return stages
+
+
+async def explain_queries(db, checks=QUERY_CHECKS) -> List[Dict[str, Any]]:
+    """
+    Планы основных запросов (explain, queryPlanner)
+
+    Returns:
+        [{"collection", "filter", "sort", "indexes", "collscan"}]
+    """
+    results = []
+    for collection, query, sort in checks:
+        command: Dict[str, Any] = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = dict(sort)
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        results.append({
+            "collection": collection,
+            "filter": query,
+            "sort": sort,
+            "indexes": [s["indexName"] for s in stages if s.get("indexName")],
+            "collscan": any(s.get("stage") == "COLLSCAN" for s in stages),
+        })
+    return results
+
+
+async def verify_indexes(db) -> bool:
+    """
+    Отчёт по индексам и планам запросов в лог
+
+    Returns:
+        True - все индексы на месте и основные запросы идут по индексам
+    """
+    ok = True
+    for collection, entry in (await index_report(db)).items():
+        if entry["missing"]:
+            ok = False
+            logger.warning(f"[Indexes] {collection}: нет индексов {entry['missing']}")
+        if entry["extra"]:
+            logger.info(f"[Indexes] {collection}: индексы вне реестра {entry['extra']}")
+        if entry["unused"]:
+            logger.info(f"[Indexes] {collection}: без обращений {entry['unused']}")
+
+    for result in await explain_queries(db):
+        if result["collscan"]:
+            ok = False
+            logger.warning(f"[Indexes] COLLSCAN: {result['collection']} {result['filter']} sort={result['sort']}")
+    return ok
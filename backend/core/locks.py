@@ -0,0 +1,70 @@
+"""
+Межпроцессные блокировки на MongoDB (коллекция locks)
+Для фоновых задач, которые не должны идти одновременно в нескольких
+процессах сервера (пересчёт свёрток, загрузка справочников)
+"""
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCKS_COLLECTION = "locks"
+
+
+class LockBusy(Exception):
+    """Блокировку держит другой процесс или задача"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Блокировка {name} занята")
+        self.name = name
+
+
+@asynccontextmanager
+async def mongo_lock(db, name: str, ttl_seconds: float) -> AsyncIterator[None]:
+    """
+    Захватить блокировку name на время блока
+
+    Запись живёт ttl_seconds и продлевается, пока блок выполняется;
+    если процесс упал, блокировка освобождается по истечении срока.
+
+    Raises:
+        LockBusy: блокировку держит кто-то другой
+    """
+    owner = uuid.uuid4().hex
+    collection = db[LOCKS_COLLECTION]
+
+    async def extend() -> None:
+        now = datetime.utcnow()
+        # Чужая живая запись не подходит под фильтр -> upsert на тот же _id -> DuplicateKeyError
+        await collection.update_one(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds), "renewed_at": now}},
+            upsert=True
+        )
+
+    try:
+        await extend()
+    except DuplicateKeyError:
+        raise LockBusy(name)
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(ttl_seconds / 3)
+            try:
+                await extend()
+            except Exception as e:
+                logger.warning(f"[Lock] {name}: не удалось продлить: {e}")
+
+    renewer = asyncio.create_task(heartbeat())
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        await asyncio.gather(renewer, return_exceptions=True)
+        await collection.delete_one({"_id": name, "owner": owner})
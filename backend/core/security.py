@@ -3,6 +3,8 @@
 Использует Fernet (симметричное шифрование) из библиотеки cryptography
 """
 from cryptography.fernet import Fernet
+from functools import lru_cache
+from typing import Optional
 import base64
 import os
 import logging
@@ -41,10 +43,19 @@ def get_encryption_key() -> bytes:
     
     return encryption_key
 
+@lru_cache(maxsize=4)
+def _fernet_for(encryption_key: Optional[str]) -> Fernet:
+    # encryption_key - только ключ кэша (значение ENCRYPTION_KEY), ключ строит get_encryption_key
+    return Fernet(get_encryption_key())
+
 def get_fernet() -> Fernet:
-    """Получить объект Fernet для шифрования/дешифрования"""
-    key = get_encryption_key()
-    return Fernet(key)
+    """
+    Получить объект Fernet для шифрования/дешифрования
+
+    Создаётся один раз на значение ENCRYPTION_KEY (без ключа - один временный
+    ключ на процесс, зашифрованное им расшифровывается до перезапуска)
+    """
+    return _fernet_for(os.getenv("ENCRYPTION_KEY"))
 
 def encrypt_api_key(api_key: str) -> str:
     """
@@ -0,0 +1,71 @@
+"""
+Параллельная выгрузка периода окнами со стримингом страниц
+Окна (например, по дням/месяцам для API маркетплейсов) выгружаются
+параллельно, страницы отдаются потребителю через ограниченную очередь
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Tuple
+
+WindowFetcher = Callable[[Any, Any, asyncio.Queue], Awaitable[None]]
+
+
+async def gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """asyncio.gather, который при ошибке (или отмене) отменяет остальные задачи"""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def iter_windows(
+    windows: Iterable[Tuple[Any, Any]],
+    fetch_window: WindowFetcher,
+    concurrency: int
+) -> AsyncIterator[Any]:
+    """
+    Страницы всех окон в порядке получения
+
+    fetch_window(start, end, queue) кладёт страницы окна в queue; одновременно
+    выгружается не больше concurrency окон, очередь ограничена (concurrency * 2),
+    поэтому память не растёт с длиной периода.
+
+    Ошибка окна отменяет остальные окна и поднимается у потребителя; если
+    потребитель перестал читать (break, исключение), выгрузка отменяется -
+    ни одна задача не остаётся висеть на заполненной очереди.
+    """
+    concurrency = max(1, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    done = object()
+
+    async def run_window(start, end):
+        async with semaphore:
+            await fetch_window(start, end, queue)
+
+    async def produce():
+        try:
+            await gather_or_cancel(*(run_window(start, end) for start, end in windows))
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
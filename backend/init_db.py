@@ -1,6 +1,9 @@
 """
 Database initialization script
 Creates test users and initial data
+
+Run from the repository root:
+    python -m backend.init_db
 """
 import asyncio
 from datetime import datetime
@@ -8,6 +11,8 @@ from passlib.context import CryptContext
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
+from backend.core.indexes import ensure_indexes
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 async def init_database():
@@ -70,11 +75,10 @@ async def init_database():
     else:
         print(f"ℹ️  Admin user already exists: {admin_email}")
     
-    # Create indexes
-    await db.users.create_index("email", unique=True)
-    await db.products.create_index("seller_id")
-    await db.orders.create_index("seller_id")
-    await db.inventory.create_index([("seller_id", 1), ("product_id", 1)])
+    # Indexes - single registry backend/core/indexes.py
+    result = await ensure_indexes(db)
+    for failure in result["failed"]:
+        print(f"⚠️  Index {failure['collection']}.{failure['index']} not created: {failure['error']}")
     print("✅ Created database indexes")
     
     print("✅ Database initialization complete!")
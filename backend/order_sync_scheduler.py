@@ -1,23 +1,31 @@
 import asyncio
 import logging
+from functools import partial
 from datetime import datetime, timedelta
+from typing import List, Dict, Optional, AsyncIterator
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from bson import ObjectId
 
+from backend.core.config import settings
 from backend.core.database import get_database
+from backend.services.sync_pool import SellerJobPool, SyncJob
+from backend.services.inventory_ledger import InventoryLedger
+from backend.services.credentials import CredentialRegistry
 from connectors import get_connector, MarketplaceError
 from backend.schemas.order import OrderItemNew, OrderCustomerNew, OrderTotalsNew
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Статусы заказов Yandex для синхронизации FBS (отмена нужна для возврата резерва)
+YANDEX_FBS_SYNC_STATUSES = "PROCESSING,DELIVERY,PICKUP,DELIVERED,CANCELLED"
+
 
 class OrderSyncScheduler:
     """
     Планировщик автоматической синхронизации заказов с маркетплейсов
     
-    Запускается каждые 5 минут и:
+    Запускается каждые 5 минут (интеграции продавцов - параллельно через SellerJobPool) и:
     1. Получает новые заказы FBS с МП
     2. Создаёт их в БД + резервирует товары
     3. Обновляет статусы существующих заказов
@@ -29,6 +37,7 @@ class OrderSyncScheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler()
         self.is_running = False
+        self.pool = SellerJobPool("OrderSync", settings.SYNC_POOL_CONCURRENCY, settings.SYNC_POOL_HOST_CONCURRENCY)
     
     def start(self):
         """Запустить планировщик"""
@@ -42,7 +51,9 @@ class OrderSyncScheduler:
             trigger=IntervalTrigger(minutes=5),
             id="order_sync_job",
             name="Синхронизация заказов с МП",
-            replace_existing=True
+            replace_existing=True,
+            # Новый запуск не ждёт медленных продавцов прошлого: их задачи пул пропустит
+            max_instances=3
         )
         
         self.scheduler.start()
@@ -72,36 +83,43 @@ class OrderSyncScheduler:
         
         logger.info(f"[OrderSync] Найдено {len(sellers)} продавцов с API ключами")
         
+        # Интеграции продавцов выполняются параллельно через общий пул
+        jobs = []
         for seller in sellers:
             seller_id = str(seller["user_id"])
             
             for api_key_data in seller.get("api_keys", []):
                 marketplace = api_key_data.get("marketplace")
-                
-                logger.info(f"[OrderSync] Синхронизация {marketplace} для продавца {seller_id}")
-                
-                try:
-                    # FBS заказы
-                    await self.sync_fbs_orders_for_seller(
-                        seller_id,
-                        marketplace,
-                        api_key_data.get("client_id", ""),
-                        api_key_data["api_key"]
-                    )
-                    
-                    # FBO заказы
-                    await self.sync_fbo_orders_for_seller(
-                        seller_id,
-                        marketplace,
-                        api_key_data.get("client_id", ""),
-                        api_key_data["api_key"]
-                    )
-                    
-                except Exception as e:
-                    logger.error(f"[OrderSync] Ошибка синхронизации {marketplace} для {seller_id}: {e}")
+                jobs.append(SyncJob(
+                    seller_id=seller_id,
+                    key=f"{seller_id}:{marketplace}:{api_key_data.get('id') or api_key_data.get('client_id', '')}",
+                    host=marketplace,
+                    run=partial(self.sync_integration, seller_id, api_key_data)
+                ))
+        
+        await self.pool.run(jobs)
         
         logger.info("[OrderSync] Синхронизация завершена")
     
+    async def sync_integration(self, seller_id: str, api_key_data: dict):
+        """FBS и FBO заказы одной интеграции продавца"""
+        marketplace = api_key_data.get("marketplace")
+        logger.info(f"[OrderSync] Синхронизация {marketplace} для продавца {seller_id}")
+        
+        # Ключ расшифровывается один раз на интеграцию, не на каждый запуск
+        api_key = CredentialRegistry.api_key(seller_id, api_key_data) or ""
+        
+        # FBS и FBO заказы; ошибка FBS не мешает FBO, а затем поднимается,
+        # чтобы SellerJobPool учёл её в метриках
+        errors = []
+        for sync_orders in (self.sync_fbs_orders_for_seller, self.sync_fbo_orders_for_seller):
+            try:
+                await sync_orders(seller_id, marketplace, api_key_data.get("client_id", ""), api_key)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+    
     async def sync_fbs_orders_for_seller(
         self,
         seller_id: str,
@@ -111,177 +129,161 @@ class OrderSyncScheduler:
     ):
         """
         Синхронизировать FBS заказы для одного продавца с одного МП
+        
+        Инкрементально: запрашиваются только заказы, изменённые после курсора
+        прошлого успешного запуска (с перекрытием ORDER_SYNC_CURSOR_OVERLAP_MINUTES).
+        Первый запуск - за последние ORDER_SYNC_INITIAL_LOOKBACK_HOURS.
+        
+        WB и Yandex не умеют фильтровать по смене статуса: кроме созданных после
+        курсора, каждый запуск перечитываются заказы, созданные за
+        ORDER_SYNC_CREATED_STATUS_LOOKBACK_HOURS (списание при delivering, возврат при отмене).
+        
+        Ошибки логируются и поднимаются дальше (курсор при этом не сдвигается).
         """
         db = await get_database()
         
         try:
             connector = get_connector(marketplace, client_id, api_key)
             
-            # Получить заказы за последние 24 часа
-            date_from = datetime.utcnow() - timedelta(days=1)
             date_to = datetime.utcnow()
+            cursor = await self._get_cursor(db, seller_id, marketplace, "fbs")
+            date_from = self._cursor_start(cursor, date_to)
             
-            # Для Yandex используем отдельный метод get_orders
-            if marketplace == "yandex":
-                mp_orders = await connector.get_orders(date_from, date_to, client_id)
+            if marketplace == "ozon":
+                if cursor:
+                    # Отправления со сменой статуса после курсора, созданные за ORDER_SYNC_STATUS_LOOKBACK_DAYS
+                    pages = connector.iter_fbs_orders(
+                        min(date_from, date_to - timedelta(days=settings.ORDER_SYNC_STATUS_LOOKBACK_DAYS)),
+                        date_to,
+                        changed_since=date_from
+                    )
+                else:
+                    pages = connector.iter_fbs_orders(date_from, date_to)
             else:
-                mp_orders = await connector.get_fbs_orders(date_from, date_to)
+                created_from = min(date_from, date_to - timedelta(hours=settings.ORDER_SYNC_CREATED_STATUS_LOOKBACK_HOURS))
+                # Для Yandex используем отдельный метод get_orders (включая отменённые)
+                if marketplace == "yandex":
+                    fetch = lambda start, end: connector.get_orders(start, end, YANDEX_FBS_SYNC_STATUSES)
+                else:
+                    fetch = connector.get_fbs_orders
+                pages = self._window_pages(fetch, created_from, date_to)
             
-            logger.info(f"[OrderSync FBS] {marketplace}: получено {len(mp_orders)} заказов")
+            total = 0
+            async for mp_orders in pages:
+                total += len(mp_orders)
+                await self._sync_fbs_page(db, connector, seller_id, marketplace, mp_orders)
             
-            for mp_order_data in mp_orders:
-                # Извлечь ID заказа
+            logger.info(f"[OrderSync FBS] {marketplace}: получено {total} заказов")
+            await self._save_cursor(db, seller_id, marketplace, "fbs", date_to)
+        
+        except MarketplaceError as e:
+            logger.error(f"[OrderSync FBS] Ошибка API {marketplace}: {e.message}")
+            raise
+        except Exception as e:
+            logger.error(f"[OrderSync FBS] Ошибка: {e}")
+            raise
+    
+    async def _sync_fbs_page(self, db, connector, seller_id: str, marketplace: str, mp_orders: List[dict]):
+        """Обработать страницу FBS заказов: существующие заказы ищутся одним запросом"""
+        existing_by_id = await self._find_existing_orders(
+            db.orders_fbs,
+            seller_id,
+            [self._external_id(marketplace, o) for o in mp_orders],
+            {"status": 1, "items": 1, "warehouse_id": 1, "order_number": 1}
+        )
+        
+        for mp_order_data in mp_orders:
+            # Извлечь ID заказа
+            if marketplace == "ozon":
+                external_id = mp_order_data.get("posting_number")
+                mp_status = mp_order_data.get("status")
+            elif marketplace == "wb":
+                external_id = str(mp_order_data.get("id"))
+                mp_status = mp_order_data.get("wbStatus")
+            elif marketplace == "yandex":
+                external_id = str(mp_order_data.get("id"))
+                mp_status = mp_order_data.get("status")
+            else:
+                continue
+            
+            if not external_id:
+                continue
+            
+            existing = existing_by_id.get(external_id)
+            
+            if not existing:
+                # СОЗДАТЬ НОВЫЙ ЗАКАЗ
+                logger.info(f"[OrderSync FBS] Создание нового заказа {external_id} от {marketplace}")
+                
+                # Парсинг данных заказа
                 if marketplace == "ozon":
-                    external_id = mp_order_data.get("posting_number")
-                    mp_status = mp_order_data.get("status")
+                    await self._create_ozon_order(db, seller_id, mp_order_data)
                 elif marketplace == "wb":
-                    external_id = str(mp_order_data.get("id"))
-                    mp_status = mp_order_data.get("wbStatus")
+                    await self._create_wb_order(db, seller_id, mp_order_data)
                 elif marketplace == "yandex":
-                    external_id = str(mp_order_data.get("id"))
-                    mp_status = mp_order_data.get("status")
-                else:
-                    continue
-                
-                if not external_id:
-                    continue
+                    await self._create_yandex_order(db, seller_id, mp_order_data)
                 
-                # Проверить существование
-                existing = await db.orders_fbs.find_one({
-                    "external_order_id": external_id,
-                    "seller_id": seller_id
-                })
+            else:
+                # ОБНОВИТЬ СТАТУС
+                internal_status = connector.map_ozon_status_to_internal(mp_status) if marketplace == "ozon" else \
+                                 connector.map_wb_status_to_internal(int(mp_status)) if marketplace == "wb" else \
+                                 connector.map_yandex_status_to_internal(mp_status)
                 
-                if not existing:
-                    # СОЗДАТЬ НОВЫЙ ЗАКАЗ
-                    logger.info(f"[OrderSync FBS] Создание нового заказа {external_id} от {marketplace}")
+                if existing["status"] != internal_status:
+                    old_status = existing["status"]
+                    logger.info(f"[OrderSync FBS] Обновление статуса {external_id}: {old_status} → {internal_status}")
                     
-                    # Парсинг данных заказа
-                    if marketplace == "ozon":
-                        await self._create_ozon_order(db, seller_id, mp_order_data)
-                    elif marketplace == "wb":
-                        await self._create_wb_order(db, seller_id, mp_order_data)
-                    elif marketplace == "yandex":
-                        await self._create_yandex_order(db, seller_id, mp_order_data)
-                    
-                else:
-                    # ОБНОВИТЬ СТАТУС
-                    internal_status = connector.map_ozon_status_to_internal(mp_status) if marketplace == "ozon" else \
-                                     connector.map_wb_status_to_internal(int(mp_status)) if marketplace == "wb" else \
-                                     connector.map_yandex_status_to_internal(mp_status)
+                    # Получить данные заказа для обработки inventory
+                    items = existing.get("items", [])
+                    warehouse_id = existing.get("warehouse_id")
+                    order_number = existing.get("order_number")
                     
-                    if existing["status"] != internal_status:
-                        old_status = existing["status"]
-                        logger.info(f"[OrderSync FBS] Обновление статуса {external_id}: {old_status} → {internal_status}")
+                    # ЛОГИКА СПИСАНИЯ при отправке
+                    if internal_status == "delivering" and old_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
+                        logger.info(f"[OrderSync FBS] 📤 Списание товаров для {order_number} (статус: delivering)")
                         
-                        # Получить данные заказа для обработки inventory
-                        items = existing.get("items", [])
-                        warehouse_id = existing.get("warehouse_id")
-                        order_number = existing.get("order_number")
-                        
-                        # ЛОГИКА СПИСАНИЯ при отправке
-                        if internal_status == "delivering" and old_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
-                            logger.info(f"[OrderSync FBS] 📤 Списание товаров для {order_number} (статус: delivering)")
-                            
-                            for item in items:
-                                if item.get("product_id"):
-                                    try:
-                                        prod_id = ObjectId(item["product_id"]) if isinstance(item["product_id"], str) else item["product_id"]
-                                        quantity = item.get("quantity", 1)
-                                        
-                                        # Списание: quantity ↓, reserved ↓
-                                        result = await db.inventory.update_one(
-                                            {"product_id": prod_id},
-                                            {
-                                                "$inc": {
-                                                    "quantity": -quantity,
-                                                    "reserved": -quantity
-                                                }
-                                            }
-                                        )
-                                        
-                                        if result.modified_count > 0:
-                                            logger.info(f"[OrderSync FBS] ✅ Списан товар {item.get('article')}: {quantity} шт")
-                                            
-                                            # Записать в историю
-                                            await db.inventory_history.insert_one({
-                                                "product_id": prod_id,
-                                                "seller_id": seller_id,
-                                                "operation_type": "sale",
-                                                "quantity_change": -quantity,
-                                                "reason": f"Списание для заказа {order_number} (delivering)",
-                                                "user_id": seller_id,
-                                                "created_at": datetime.utcnow()
-                                            })
-                                        else:
-                                            logger.warning(f"[OrderSync FBS] ⚠️ Не удалось списать {item.get('article')}")
-                                    except Exception as e:
-                                        logger.error(f"[OrderSync FBS] ❌ Ошибка списания {item.get('article')}: {e}")
+                        await InventoryLedger.apply(
+                            db,
+                            seller_id,
+                            "deduct",
+                            self._item_quantities(items),
+                            reason=f"Списание для заказа {order_number} (delivering)",
+                            by="product_id"
+                        )
+                    
+                    # ЛОГИКА ВОЗВРАТА при отмене
+                    elif internal_status == "cancelled" and old_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
+                        logger.info(f"[OrderSync FBS] 🔙 Возврат товаров для {order_number} (статус: cancelled)")
                         
-                        # ЛОГИКА ВОЗВРАТА при отмене
-                        elif internal_status == "cancelled" and old_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
-                            logger.info(f"[OrderSync FBS] 🔙 Возврат товаров для {order_number} (статус: cancelled)")
-                            
-                            # Проверить настройки склада
-                            # ИСПРАВЛЕНО: Поиск по _id (UUID строка), с fallback на id для совместимости
-                            warehouse = None
-                            if warehouse_id:
-                                warehouse = await db.warehouses.find_one({"_id": warehouse_id})
-                                if not warehouse:
-                                    warehouse = await db.warehouses.find_one({"id": warehouse_id})
-                            
-                            if warehouse and warehouse.get("return_on_cancel", True):
-                                for item in items:
-                                    if item.get("product_id"):
-                                        try:
-                                            prod_id = ObjectId(item["product_id"]) if isinstance(item["product_id"], str) else item["product_id"]
-                                            quantity = item.get("quantity", 1)
-                                            
-                                            # Возврат: reserved ↓, available ↑
-                                            result = await db.inventory.update_one(
-                                                {"product_id": prod_id},
-                                                {
-                                                    "$inc": {
-                                                        "reserved": -quantity,
-                                                        "available": quantity
-                                                    }
-                                                }
-                                            )
-                                            
-                                            if result.modified_count > 0:
-                                                logger.info(f"[OrderSync FBS] ✅ Возвращен товар {item.get('article')}: {quantity} шт")
-                                                
-                                                # Записать в историю
-                                                await db.inventory_history.insert_one({
-                                                    "product_id": prod_id,
-                                                    "seller_id": seller_id,
-                                                    "operation_type": "return",
-                                                    "quantity_change": 0,  # quantity не меняется
-                                                    "reason": f"Возврат из заказа {order_number} (cancelled)",
-                                                    "user_id": seller_id,
-                                                    "created_at": datetime.utcnow()
-                                                })
-                                            else:
-                                                logger.warning(f"[OrderSync FBS] ⚠️ Не удалось вернуть {item.get('article')}")
-                                        except Exception as e:
-                                            logger.error(f"[OrderSync FBS] ❌ Ошибка возврата {item.get('article')}: {e}")
-                            else:
-                                logger.info(f"[OrderSync FBS] ⚠️ Возврат отключен для склада или склад не найден")
+                        # Проверить настройки склада
+                        # ИСПРАВЛЕНО: Поиск по _id (UUID строка), с fallback на id для совместимости
+                        warehouse = None
+                        if warehouse_id:
+                            warehouse = await db.warehouses.find_one({"_id": warehouse_id})
+                            if not warehouse:
+                                warehouse = await db.warehouses.find_one({"id": warehouse_id})
                         
-                        # Обновить статус в БД
-                        await db.orders_fbs.update_one(
-                            {"_id": existing["_id"]},
-                            {"$set": {
-                                "status": internal_status,
-                                "updated_at": datetime.utcnow()
-                            }}
-                        )
-        
-        except MarketplaceError as e:
-            logger.error(f"[OrderSync FBS] Ошибка API {marketplace}: {e.message}")
-        except Exception as e:
-            logger.error(f"[OrderSync FBS] Ошибка: {e}")
-    
+                        if warehouse and warehouse.get("return_on_cancel", True):
+                            await InventoryLedger.apply(
+                                db,
+                                seller_id,
+                                "release",
+                                self._item_quantities(items),
+                                reason=f"Возврат из заказа {order_number} (cancelled)",
+                                by="product_id"
+                            )
+                        else:
+                            logger.info(f"[OrderSync FBS] ⚠️ Возврат отключен для склада или склад не найден")
+                    
+                    # Обновить статус в БД
+                    await db.orders_fbs.update_one(
+                        {"_id": existing["_id"]},
+                        {"$set": {
+                            "status": internal_status,
+                            "updated_at": datetime.utcnow()
+                        }}
+                    )
+
     async def sync_fbo_orders_for_seller(
         self,
         seller_id: str,
@@ -292,18 +294,21 @@ class OrderSyncScheduler:
         """
         Синхронизировать FBO заказы для одного продавца с одного МП
         (только для аналитики, без влияния на inventory)
+        
+        Инкрементально по курсору, ошибки поднимаются - как sync_fbs_orders_for_seller.
         """
         db = await get_database()
         
         try:
             connector = get_connector(marketplace, client_id, api_key)
             
-            date_from = datetime.utcnow() - timedelta(days=1)
             date_to = datetime.utcnow()
+            cursor = await self._get_cursor(db, seller_id, marketplace, "fbo")
+            date_from = self._cursor_start(cursor, date_to)
             
             # Получить FBO заказы с МП
             if marketplace == "ozon":
-                mp_orders = await connector.get_fbo_orders(date_from, date_to)
+                pages = connector.iter_fbo_orders(date_from, date_to)
             elif marketplace in ["wb", "wildberries"]:
                 # Wildberries не разделяет FBS/FBO в API, пропускаем
                 logger.info(f"[OrderSync FBO] Wildberries не поддерживает отдельную синхронизацию FBO")
@@ -315,40 +320,99 @@ class OrderSyncScheduler:
             else:
                 return
             
-            logger.info(f"[OrderSync FBO] {marketplace}: получено {len(mp_orders)} заказов")
-            
-            for mp_order_data in mp_orders:
-                # Извлечь ID
-                if marketplace == "ozon":
-                    external_id = mp_order_data.get("posting_number")
-                elif marketplace == "wb":
-                    external_id = str(mp_order_data.get("id"))
-                elif marketplace == "yandex":
-                    external_id = str(mp_order_data.get("id"))
-                else:
-                    continue
-                
-                if not external_id:
-                    continue
+            total = 0
+            async for mp_orders in pages:
+                total += len(mp_orders)
+                external_ids = [self._external_id(marketplace, o) for o in mp_orders]
+                existing_by_id = await self._find_existing_orders(db.orders_fbo, seller_id, external_ids, {"status": 1})
                 
-                # Проверить существование
-                existing = await db.orders_fbo.find_one({
-                    "external_order_id": external_id,
-                    "seller_id": seller_id
-                })
-                
-                if not existing:
-                    # СОЗДАТЬ (без резервов)
-                    logger.info(f"[OrderSync FBO] Создание нового заказа {external_id} от {marketplace}")
-                    # TODO: Парсинг данных
-                else:
-                    # ОБНОВИТЬ (просто статус)
-                    pass
+                for external_id in external_ids:
+                    if not external_id:
+                        continue
+                    
+                    if external_id not in existing_by_id:
+                        # СОЗДАТЬ (без резервов)
+                        logger.info(f"[OrderSync FBO] Создание нового заказа {external_id} от {marketplace}")
+                        # TODO: Парсинг данных
+                    else:
+                        # ОБНОВИТЬ (просто статус)
+                        pass
+            
+            logger.info(f"[OrderSync FBO] {marketplace}: получено {total} заказов")
+            await self._save_cursor(db, seller_id, marketplace, "fbo", date_to)
         
         except MarketplaceError as e:
             logger.error(f"[OrderSync FBO] Ошибка API {marketplace}: {e.message}")
+            raise
         except Exception as e:
             logger.error(f"[OrderSync FBO] Ошибка: {e}")
+            raise
+    
+    @staticmethod
+    def _item_quantities(items: List[dict]) -> List[tuple]:
+        """(product_id, количество) позиций заказа для InventoryLedger"""
+        return [(item.get("product_id"), item.get("quantity", 1)) for item in items if item.get("product_id")]
+    
+    # ========== КУРСОРЫ СИНХРОНИЗАЦИИ ==========
+    
+    @staticmethod
+    async def _get_cursor(db, seller_id: str, marketplace: str, flow: str) -> Optional[datetime]:
+        """Момент прошлой успешной синхронизации (seller, marketplace, flow)"""
+        doc = await db.order_sync_cursors.find_one(
+            {"seller_id": seller_id, "marketplace": marketplace, "flow": flow},
+            {"cursor": 1}
+        )
+        return doc.get("cursor") if doc else None
+    
+    @staticmethod
+    async def _save_cursor(db, seller_id: str, marketplace: str, flow: str, cursor: datetime):
+        await db.order_sync_cursors.update_one(
+            {"seller_id": seller_id, "marketplace": marketplace, "flow": flow},
+            {"$set": {"cursor": cursor, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    
+    @staticmethod
+    def _cursor_start(cursor: Optional[datetime], date_to: datetime) -> datetime:
+        """
+        Начало окна запроса: курсор минус перекрытие (или начальная глубина)
+        
+        После долгого простоя окно не обрезается - заказы за весь пропуск
+        загружаются окнами (см. _window_pages, iter_fbs_orders)
+        """
+        if not cursor:
+            return date_to - timedelta(hours=settings.ORDER_SYNC_INITIAL_LOOKBACK_HOURS)
+        return cursor - timedelta(minutes=settings.ORDER_SYNC_CURSOR_OVERLAP_MINUTES)
+    
+    @staticmethod
+    async def _window_pages(fetch, date_from: datetime, date_to: datetime) -> AsyncIterator[List[dict]]:
+        """Заказы коннектора без пагинации: период по окнам ORDER_SYNC_WINDOW_HOURS, окно - страница"""
+        window = timedelta(hours=max(1, settings.ORDER_SYNC_WINDOW_HOURS))
+        start = date_from
+        while start < date_to:
+            end = min(start + window, date_to)
+            yield await fetch(start, end)
+            start = end
+    
+    @staticmethod
+    def _external_id(marketplace: str, mp_order_data: dict) -> Optional[str]:
+        if marketplace == "ozon":
+            return mp_order_data.get("posting_number")
+        if marketplace in ("wb", "yandex"):
+            return str(mp_order_data.get("id"))
+        return None
+    
+    @staticmethod
+    async def _find_existing_orders(collection, seller_id: str, external_ids: List[Optional[str]], projection: dict) -> Dict[str, dict]:
+        """Заказы страницы, уже сохранённые в БД: один запрос $in вместо find_one на заказ"""
+        ids = list({external_id for external_id in external_ids if external_id})
+        if not ids:
+            return {}
+        docs = await collection.find(
+            {"seller_id": seller_id, "external_order_id": {"$in": ids}},
+            {"external_order_id": 1, **projection}
+        ).to_list(length=None)
+        return {doc["external_order_id"]: doc for doc in docs}
     
     async def _create_ozon_order(self, db, seller_id: str, mp_order_data: dict):
         """Создать заказ Ozon в БД"""
@@ -458,30 +522,18 @@ class OrderSyncScheduler:
             # Резервировать товары если нужно
             # Резервируем для статусов: new, awaiting_packaging, awaiting_deliver, awaiting_shipment
             if internal_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
-                reserved_count = 0
-                for item in items:
-                    if item["product_id"]:
-                        try:
-                            # Конвертируем в ObjectId если это строка
-                            prod_id = ObjectId(item["product_id"]) if isinstance(item["product_id"], str) else item["product_id"]
-                            
-                            result = await db.inventory.update_one(
-                                {"product_id": prod_id},
-                                {
-                                    "$inc": {"reserved": item["quantity"], "available": -item["quantity"]}
-                                }
-                            )
-                            
-                            if result.modified_count > 0:
-                                reserved_count += 1
-                                logger.info(f"[OrderSync FBS] ✅ Зарезервирован товар {item['article']}: {item['quantity']} шт")
-                            else:
-                                logger.warning(f"[OrderSync FBS] ⚠️ Не удалось зарезервировать {item['article']} - inventory не найден")
-                        except Exception as e:
-                            logger.error(f"[OrderSync FBS] ❌ Ошибка резерва товара {item['article']}: {e}")
+                # Заказ уже принят маркетплейсом - резерв без проверки available
+                result = await InventoryLedger.apply(
+                    db,
+                    seller_id,
+                    "reserve",
+                    self._item_quantities(items),
+                    reason=f"Резерв для заказа {posting_number}",
+                    by="product_id"
+                )
                 
-                if reserved_count > 0:
-                    logger.info(f"[OrderSync FBS] ✅ Зарезервировано {reserved_count}/{len(items)} товаров для {posting_number}")
+                if result["applied"]:
+                    logger.info(f"[OrderSync FBS] ✅ Зарезервировано {len(result['applied'])}/{len(items)} товаров для {posting_number}")
                 else:
                     logger.warning(f"[OrderSync FBS] ⚠️ НЕ удалось зарезервировать товары для {posting_number}")
         
@@ -593,29 +645,18 @@ class OrderSyncScheduler:
             
             # Резервировать товары если нужно
             if internal_status in ["new", "awaiting_packaging", "awaiting_deliver", "awaiting_shipment"]:
-                reserved_count = 0
-                for item in items:
-                    if item["product_id"]:
-                        try:
-                            prod_id = ObjectId(item["product_id"]) if isinstance(item["product_id"], str) else item["product_id"]
-                            
-                            result = await db.inventory.update_one(
-                                {"product_id": prod_id},
-                                {
-                                    "$inc": {"reserved": item["quantity"], "available": -item["quantity"]}
-                                }
-                            )
-                            
-                            if result.modified_count > 0:
-                                reserved_count += 1
-                                logger.info(f"[OrderSync FBS] ✅ Зарезервирован товар {item['article']}: {item['quantity']} шт")
-                            else:
-                                logger.warning(f"[OrderSync FBS] ⚠️ Не удалось зарезервировать {item['article']}")
-                        except Exception as e:
-                            logger.error(f"[OrderSync FBS] ❌ Ошибка резерва товара {item['article']}: {e}")
+                # Заказ уже принят маркетплейсом - резерв без проверки available
+                result = await InventoryLedger.apply(
+                    db,
+                    seller_id,
+                    "reserve",
+                    self._item_quantities(items),
+                    reason=f"Резерв для заказа Yandex {order_id}",
+                    by="product_id"
+                )
                 
-                if reserved_count > 0:
-                    logger.info(f"[OrderSync FBS] ✅ Зарезервировано {reserved_count}/{len(items)} товаров для Yandex {order_id}")
+                if result["applied"]:
+                    logger.info(f"[OrderSync FBS] ✅ Зарезервировано {len(result['applied'])}/{len(items)} товаров для Yandex {order_id}")
         
         except Exception as e:
             logger.error(f"[OrderSync FBS] Ошибка создания Yandex заказа: {e}")
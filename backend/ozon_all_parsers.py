@@ -1,9 +1,12 @@
+import numpy as np
 import pandas as pd
 from io import BytesIO
 from datetime import datetime
 from typing import List, Dict, Union
 import logging
 
+from backend.ozon_report_parser import float_column, int_column, str_column, date_column
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,49 +19,46 @@ def parse_ozon_order_realization_report(file_content: Union[bytes, str], seller_
     DATA_START = 15
     transactions = []
     
-    for index in range(DATA_START, len(df)):
-        row = df.iloc[index]
-        article = row[2]
-        
-        if pd.isna(article) or str(article).startswith('Итого'):
-            break
-        
-        def sf(val, d=0.0): return float(val) if pd.notna(val) else d
-        def si(val, d=0): return int(float(val)) if pd.notna(val) else d
-        def ss(val, d=''): return str(val) if pd.notna(val) else d
-        
-        date_val = row[22]
-        op_date = pd.to_datetime(date_val) if pd.notna(date_val) else datetime.utcnow()
-        
-        transactions.append({
-            "seller_id": seller_id,
-            "posting_number": ss(row[21]),
-            "sku": ss(row[3]),
-            "article": ss(row[2]),
-            "product_name": ss(row[1]),
+    # Данные идут до первой пустой или итоговой строки
+    articles = df[2].iloc[DATA_START:]
+    end_of_data = articles.isna() | str_column(articles).str.startswith('Итого')
+    stop = int(np.argmax(end_of_data.to_numpy())) if end_of_data.any() else len(articles)
+    data = df.iloc[DATA_START:DATA_START + stop]
+    
+    if len(data):
+        now = datetime.utcnow()
+        columns = {
+            "posting_number": str_column(data[21]),
+            "sku": str_column(data[3]),
+            "article": str_column(data[2]),
+            "product_name": str_column(data[1]),
             
             # ПРОДАЖИ
-            "quantity": si(row[8]),
-            "realized_amount": sf(row[5]),
-            "loyalty_payments": sf(row[6]),
-            "discount_points": sf(row[7]),
-            "price": sf(row[9]),
-            "ozon_base_commission": sf(row[12]),
-            "total_to_accrue": sf(row[13]),
+            "quantity": int_column(data[8], strict=True),
+            "realized_amount": float_column(data[5], strict=True),
+            "loyalty_payments": float_column(data[6], strict=True),
+            "discount_points": float_column(data[7], strict=True),
+            "price": float_column(data[9], strict=True),
+            "ozon_base_commission": float_column(data[12], strict=True),
+            "total_to_accrue": float_column(data[13], strict=True),
             
             # ВОЗВРАТЫ (колонки 14-20)
-            "returned_amount": sf(row[14]),
-            "returned_loyalty_payments": sf(row[15]),
-            "returned_discount_points": sf(row[16]),
-            "returned_quantity": si(row[17]),
-            "returned_price": sf(row[18]),
-            "returned_commission": sf(row[19]),
-            "total_returned": sf(row[20]),
+            "returned_amount": float_column(data[14], strict=True),
+            "returned_loyalty_payments": float_column(data[15], strict=True),
+            "returned_discount_points": float_column(data[16], strict=True),
+            "returned_quantity": int_column(data[17], strict=True),
+            "returned_price": float_column(data[18], strict=True),
+            "returned_commission": float_column(data[19], strict=True),
+            "total_returned": float_column(data[20], strict=True),
             
-            "operation_date": op_date,
-            "document_type": "order_realization",
-            "created_at": datetime.utcnow()
-        })
+            "operation_date": date_column(data[22], now, strict=True),
+        }
+        names = list(columns)
+        for values in zip(*(column.tolist() for column in columns.values())):
+            transaction = {"seller_id": seller_id, **dict(zip(names, values))}
+            transaction["document_type"] = "order_realization"
+            transaction["created_at"] = now
+            transactions.append(transaction)
     
     # Подсчет продаж
     total_revenue = sum(t["realized_amount"] for t in transactions)
@@ -4,10 +4,12 @@ Ozon Category Preload System
 """
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from datetime import datetime
 from typing import List, Dict, Any
 import logging
 
+from backend.services.category_search import CategorySearch
+from backend.services.category_preload import replace_category_tree, get_tree_version
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,37 +21,44 @@ class OzonCategoryManager:
         self.collection = db.ozon_categories_cache
     
     async def preload_from_api(self, connector) -> Dict[str, Any]:
-        """Предзагрузка категорий с API Ozon"""
+        """
+        Предзагрузка категорий с API Ozon
+        
+        Дерево сравнивается с сохранённым, изменения применяются одним bulk_write
+        на месте, загрузки идут по очереди (см. replace_category_tree)
+        """
         logger.info("[OzonCategoryManager] Preloading categories from API")
         
         try:
             categories = await connector.get_categories()
             
-            saved_count = 0
             for category in categories:
-                category['loaded_at'] = datetime.utcnow()
                 category['source'] = 'api'
                 category['marketplace'] = 'ozon'
-                
                 # ИСПРАВЛЕНО: используем category_id + type_id как уникальный ключ
-                unique_key = {
-                    'marketplace': 'ozon',
-                    'category_id': category['category_id'],
-                    'type_id': category.get('type_id', 0)
-                }
-                
-                await self.collection.replace_one(
-                    unique_key,
-                    category,
-                    upsert=True
-                )
-                saved_count += 1
+                category.setdefault('type_id', 0)
+            
+            result = await replace_category_tree(
+                self.db,
+                'ozon_categories_cache',
+                categories,
+                key_fields=('marketplace', 'category_id', 'type_id'),
+                scope={'marketplace': 'ozon'}
+            )
+            saved_count = result['total']
+            
+            logger.info(f"[OzonCategoryManager] Saved {saved_count} categories to DB (version {result['version']})")
             
-            logger.info(f"[OzonCategoryManager] Saved {saved_count} categories to DB")
+            # Перестроить индекс поиска по новым данным
+            await CategorySearch.load(self.db, 'ozon')
             
             return {
                 'success': True,
                 'loaded': saved_count,
+                'inserted': result['inserted'],
+                'updated': result['updated'],
+                'deleted': result['deleted'],
+                'version': result['version'],
                 'message': f'Загружено {saved_count} категорий Ozon'
             }
             
@@ -77,16 +86,9 @@ class OzonCategoryManager:
             return []
     
     async def search_categories(self, query: str) -> List[Dict[str, Any]]:
-        """Поиск категорий в БД"""
+        """Поиск категорий по индексу в памяти (CategorySearch), без запросов к БД"""
         try:
-            categories = await self.collection.find({
-                'marketplace': 'ozon',
-                'name': {'$regex': query, '$options': 'i'}
-            }).limit(100).to_list(100)
-            
-            for cat in categories:
-                if '_id' in cat:
-                    cat.pop('_id')
+            categories = await CategorySearch.search(self.db, 'ozon', query, limit=100)
             
             logger.info(f"[OzonCategoryManager] Search '{query}': found {len(categories)} categories")
             return categories
@@ -100,14 +102,12 @@ class OzonCategoryManager:
         try:
             total = await self.collection.count_documents({'marketplace': 'ozon'})
             
-            last_updated = await self.collection.find_one(
-                {'marketplace': 'ozon'},
-                sort=[('loaded_at', -1)]
-            )
+            version = await get_tree_version(self.db, 'ozon_categories_cache')
             
             return {
                 'total': total,
-                'last_updated': last_updated.get('loaded_at') if last_updated else None
+                'version': version.get('version'),
+                'last_updated': version.get('loaded_at')
             }
             
         except Exception as e:
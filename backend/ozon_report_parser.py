@@ -9,6 +9,7 @@
 - Формула: Итого = Реализовано + Выплаты_лояльность + Баллы_скидки - Комиссия_Ozon
 """
 
+import numpy as np
 import pandas as pd
 from io import BytesIO
 from datetime import datetime
@@ -18,6 +19,94 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+# Константы структуры файла
+HEADERS_ROW = 13  # Строка с заголовками
+DATA_START_ROW = 15  # Первая строка данных
+
+# Индексы колонок (на основе реального файла)
+COL_INDEX = 0  # № п/п
+COL_NAME = 1  # Название товара
+COL_ARTICLE = 2  # Артикул
+COL_SKU = 3  # SKU
+COL_BARCODE = 4  # Штрих-код
+COL_REALIZED_AMOUNT = 5  # Реализовано на сумму, руб
+COL_LOYALTY_PAYMENTS = 6  # Выплаты по механикам лояльности партнёров
+COL_DISCOUNT_POINTS = 7  # Баллы за скидки
+COL_QUANTITY = 8  # Количество
+COL_PRICE = 9  # Цена реализации
+COL_SALES_REWARD = 10  # Вознаграждение за продажу (справочно)
+COL_PRICE_BEFORE_DISCOUNT = 11  # Цена до скидок (справочно)
+COL_OZON_BASE_COMMISSION = 12  # Базовое вознаграждение Ozon
+COL_TOTAL_TO_ACCRUE = 13  # Итого к начислению
+COL_RETURNED_AMOUNT = 14  # Возвращено на сумму
+COL_POSTING_NUMBER = 21  # Номер отправления
+COL_DATE = 22  # Дата
+
+
+# === Поколоночные преобразования ===
+# Вся колонка обрабатывается за один проход pandas/NumPy вместо df.iloc[index]
+# на каждую строку. Значения совпадают с построчным float()/int()/str().
+
+def _safe_float_cell(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def float_column(col: pd.Series, strict: bool = False) -> pd.Series:
+    """
+    float(value) для каждой ячейки, пустые ячейки -> 0.0
+
+    strict=False: нечисловые значения -> 0.0; strict=True: ValueError
+    """
+    missing = col.isna()
+    try:
+        values = col.astype(float)
+    except (TypeError, ValueError):
+        if strict:
+            raise
+        # В колонке есть "мусор" - только для неё поячеечный разбор
+        values = col.map(_safe_float_cell).astype(float)
+    return values.where(~missing, 0.0)
+
+
+def int_column(col: pd.Series, strict: bool = False) -> pd.Series:
+    """int(float(value)) для каждой ячейки, пустые и нечисловые -> 0"""
+    values = float_column(col, strict=strict)
+    finite = np.isfinite(values)
+    if strict and not finite.all():
+        raise ValueError(f"cannot convert float {values[~finite].iloc[0]} to integer")
+    return pd.Series(np.trunc(values.where(finite, 0.0)).astype(np.int64), index=col.index)
+
+
+def str_column(col: pd.Series) -> pd.Series:
+    """str(value) для каждой ячейки, пустые -> ''"""
+    return col.map(str).where(col.notna(), '')
+
+
+def date_column(col: pd.Series, default: datetime, strict: bool = False) -> pd.Series:
+    """
+    Дата для каждой ячейки (pd.to_datetime), пустые -> default
+
+    strict=False: нераспознанные значения -> default; strict=True: ошибка разбора
+    """
+    if strict:
+        parsed = pd.to_datetime(col, format="mixed")
+    else:
+        try:
+            parsed = pd.to_datetime(col, format="mixed", errors="coerce")
+        except (TypeError, ValueError):
+            # Например, разные часовые пояса в одной колонке
+            def parse_cell(value):
+                try:
+                    return pd.to_datetime(value)
+                except Exception:
+                    return pd.NaT
+            parsed = col.map(parse_cell)
+    return parsed.astype(object).where(parsed.notna(), default)
+
+
 def parse_ozon_order_realization_report(
     file_content: Union[bytes, str],
     seller_id: str
@@ -46,148 +135,116 @@ def parse_ozon_order_realization_report(
         logger.error(f"Ошибка чтения Excel: {str(e)}")
         raise ValueError(f"Не удалось прочитать Excel файл: {str(e)}")
     
-    # Константы структуры файла
-    HEADERS_ROW = 13  # Строка с заголовками
-    DATA_START_ROW = 15  # Первая строка данных
+    return parse_order_realization_frame(df, seller_id)
+
+
+def parse_order_realization_frame(df: pd.DataFrame, seller_id: str) -> Dict:
+    """
+    Разбор уже прочитанного листа отчета (header=None)
+    
+    Строки данных начинаются с DATA_START_ROW и заканчиваются на первой
+    итоговой строке; строки без артикула пропускаются.
+    """
+    articles = df[COL_ARTICLE].iloc[DATA_START_ROW:]
+    present = articles.notna()
+    
+    # Итоговые строки - конец данных
+    article_text = str_column(articles)
+    is_total = present & (article_text.str.startswith('Итого') | article_text.str.startswith('ИТОГО'))
+    stop = len(articles)
+    if is_total.any():
+        stop = int(np.argmax(is_total.to_numpy()))
+        logger.info(f"Найдена итоговая строка на позиции {DATA_START_ROW + stop}")
     
-    # Индексы колонок (на основе реального файла)
-    COL_INDEX = 0  # № п/п
-    COL_NAME = 1  # Название товара
-    COL_ARTICLE = 2  # Артикул
-    COL_SKU = 3  # SKU
-    COL_BARCODE = 4  # Штрих-код
-    COL_REALIZED_AMOUNT = 5  # Реализовано на сумму, руб
-    COL_LOYALTY_PAYMENTS = 6  # Выплаты по механикам лояльности партнёров
-    COL_DISCOUNT_POINTS = 7  # Баллы за скидки
-    COL_QUANTITY = 8  # Количество
-    COL_PRICE = 9  # Цена реализации
-    COL_SALES_REWARD = 10  # Вознаграждение за продажу (справочно)
-    COL_PRICE_BEFORE_DISCOUNT = 11  # Цена до скидок (справочно)
-    COL_OZON_BASE_COMMISSION = 12  # Базовое вознаграждение Ozon
-    COL_TOTAL_TO_ACCRUE = 13  # Итого к начислению
-    COL_RETURNED_AMOUNT = 14  # Возвращено на сумму
-    COL_POSTING_NUMBER = 21  # Номер отправления
-    COL_DATE = 22  # Дата
+    skipped_rows = int((~present.iloc[:stop]).sum())
+    data = df.iloc[DATA_START_ROW:DATA_START_ROW + stop][present.iloc[:stop].to_numpy()]
     
     transactions = []
-    skipped_rows = 0
+    if COL_DATE not in df.columns:
+        if len(data):
+            logger.error(f"Ошибка парсинга строк: в отчете {len(df.columns)} колонок, нужна колонка {COL_DATE}")
+        data = data.iloc[0:0]
     
-    # Парсим данные начиная со строки DATA_START_ROW
-    for index in range(DATA_START_ROW, len(df)):
-        row = df.iloc[index]
+    if len(data):
+        now = datetime.utcnow()
         
-        # Проверяем что это строка с данными (есть артикул)
-        article = row[COL_ARTICLE]
-        if pd.isna(article):
-            skipped_rows += 1
-            continue
+        posting_numbers = str_column(data[COL_POSTING_NUMBER]).tolist()
+        skus = str_column(data[COL_SKU]).tolist()
+        article_values = str_column(data[COL_ARTICLE]).tolist()
+        barcodes = str_column(data[COL_BARCODE]).tolist()
+        names = str_column(data[COL_NAME]).tolist()
+        quantities = int_column(data[COL_QUANTITY]).tolist()
         
-        # Пропускаем итоговые строки
-        if str(article).startswith('Итого') or str(article).startswith('ИТОГО'):
-            logger.info(f"Найдена итоговая строка на позиции {index}")
-            break
+        realized = float_column(data[COL_REALIZED_AMOUNT])
+        loyalty = float_column(data[COL_LOYALTY_PAYMENTS])
+        discounts = float_column(data[COL_DISCOUNT_POINTS])
+        commission = float_column(data[COL_OZON_BASE_COMMISSION])
+        to_accrue = float_column(data[COL_TOTAL_TO_ACCRUE])
+        prices = float_column(data[COL_PRICE]).tolist()
+        returned = float_column(data[COL_RETURNED_AMOUNT]).tolist()
+        dates = date_column(data[COL_DATE], now).tolist()
         
-        try:
-            # Безопасное извлечение значений
-            def safe_float(value, default=0.0):
-                if pd.isna(value):
-                    return default
-                try:
-                    return float(value)
-                except:
-                    return default
-            
-            def safe_int(value, default=0):
-                if pd.isna(value):
-                    return default
-                try:
-                    return int(float(value))
-                except:
-                    return default
-            
-            def safe_str(value, default=''):
-                if pd.isna(value):
-                    return default
-                return str(value)
-            
-            # Парсим дату
-            date_value = row[COL_DATE]
-            if pd.notna(date_value):
-                if isinstance(date_value, datetime):
-                    operation_date = date_value
-                else:
-                    try:
-                        operation_date = pd.to_datetime(date_value)
-                    except:
-                        operation_date = datetime.utcnow()
-            else:
-                operation_date = datetime.utcnow()
-            
+        # Проверка формулы
+        calculated_total = realized + loyalty + discounts - commission
+        
+        # Небольшая погрешность допустима (округление)
+        mismatched = (calculated_total - to_accrue).abs() > 0.1
+        for position in np.flatnonzero(mismatched.to_numpy()):
+            logger.warning(
+                f"Расхождение в расчетах для {article_values[position]}: "
+                f"ожидалось {calculated_total.iloc[position]:.2f}, получено {to_accrue.iloc[position]:.2f}"
+            )
+        
+        for (posting_number, sku, article, barcode, name, quantity, realized_amount, price,
+             loyalty_payments, discount_points, base_commission, total, returned_amount,
+             operation_date) in zip(
+            posting_numbers, skus, article_values, barcodes, names, quantities,
+            realized.tolist(), prices, loyalty.tolist(), discounts.tolist(),
+            commission.tolist(), to_accrue.tolist(), returned, dates
+        ):
             # Создаем транзакцию
-            transaction = {
+            transactions.append({
                 "seller_id": seller_id,
                 "marketplace": "ozon",
                 
                 # Идентификаторы
-                "posting_number": safe_str(row[COL_POSTING_NUMBER]),
-                "order_number": safe_str(row[COL_POSTING_NUMBER]),  # Номер отправления = ID заказа
-                "sku": safe_str(row[COL_SKU]),
-                "article": safe_str(row[COL_ARTICLE]),
-                "barcode": safe_str(row[COL_BARCODE]),
+                "posting_number": posting_number,
+                "order_number": posting_number,  # Номер отправления = ID заказа
+                "sku": sku,
+                "article": article,
+                "barcode": barcode,
                 
                 # Товар
-                "product_name": safe_str(row[COL_NAME]),
+                "product_name": name,
                 
                 # Количество
-                "quantity": safe_int(row[COL_QUANTITY]),
+                "quantity": quantity,
                 
                 # Суммы
-                "realized_amount": safe_float(row[COL_REALIZED_AMOUNT]),  # Реализовано на сумму
-                "price": safe_float(row[COL_PRICE]),  # Цена за единицу
+                "realized_amount": realized_amount,  # Реализовано на сумму
+                "price": price,  # Цена за единицу
                 
                 # БАЛЛЫ (критично важно!)
-                "loyalty_payments": safe_float(row[COL_LOYALTY_PAYMENTS]),  # Выплаты по лояльности
-                "discount_points": safe_float(row[COL_DISCOUNT_POINTS]),  # Баллы за скидки
+                "loyalty_payments": loyalty_payments,  # Выплаты по лояльности
+                "discount_points": discount_points,  # Баллы за скидки
                 
                 # Комиссия Ozon
-                "ozon_base_commission": safe_float(row[COL_OZON_BASE_COMMISSION]),
+                "ozon_base_commission": base_commission,
                 
                 # Итого к начислению (проверочное поле)
-                "total_to_accrue": safe_float(row[COL_TOTAL_TO_ACCRUE]),
+                "total_to_accrue": total,
                 
                 # Возвраты
-                "returned_amount": safe_float(row[COL_RETURNED_AMOUNT]),
+                "returned_amount": returned_amount,
                 
                 # Дата
                 "operation_date": operation_date,
                 
                 # Метаданные
                 "document_type": "order_realization",
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            
-            # Проверка формулы
-            calculated_total = (
-                transaction["realized_amount"] +
-                transaction["loyalty_payments"] +
-                transaction["discount_points"] -
-                transaction["ozon_base_commission"]
-            )
-            
-            # Небольшая погрешность допустима (округление)
-            diff = abs(calculated_total - transaction["total_to_accrue"])
-            if diff > 0.1:
-                logger.warning(
-                    f"Расхождение в расчетах для {transaction['article']}: "
-                    f"ожидалось {calculated_total:.2f}, получено {transaction['total_to_accrue']:.2f}"
-                )
-            
-            transactions.append(transaction)
-            
-        except Exception as e:
-            logger.error(f"Ошибка парсинга строки {index}: {str(e)}")
-            continue
+                "created_at": now,
+                "updated_at": now
+            })
     
     # Подсчитываем итоги
     total_revenue = sum(t["realized_amount"] for t in transactions)
@@ -5,6 +5,7 @@ from bson import ObjectId
 from passlib.context import CryptContext
 
 from backend.core.database import get_database
+from backend.auth_utils import user_cache
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
@@ -150,6 +151,7 @@ async def activate_seller(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Seller not found")
+    user_cache.invalidate(seller_id)
     
     return {"message": "Seller activated successfully"}
 
@@ -170,6 +172,7 @@ async def deactivate_seller(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Seller not found")
+    user_cache.invalidate(seller_id)
     
     return {"message": "Seller deactivated successfully"}
 
@@ -218,6 +221,7 @@ async def delete_seller(
     
     # Delete seller and related data
     await db.users.delete_one({"_id": ObjectId(seller_id)})
+    user_cache.invalidate(seller_id)
     await db.seller_profiles.delete_one({"user_id": seller_id})
     await db.products.delete_many({"seller_id": seller_id})
     await db.inventory.delete_many({"seller_id": seller_id})
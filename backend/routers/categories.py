@@ -11,6 +11,7 @@ from bson import ObjectId
 import logging
 from backend.auth_utils import get_current_user
 from backend.connectors import get_connector, MarketplaceError
+from backend.services.category_search import CategorySearch
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -82,6 +83,16 @@ async def search_marketplace_categories(
     """
     logger.info(f"[Categories] Searching {marketplace} categories: '{query}'")
     
+    # Предзагруженные категории Ozon/WB - поиск по индексу в памяти, без API
+    if marketplace in ('ozon', 'wb'):
+        index = await CategorySearch.get(db, marketplace)
+        if len(index):
+            return {
+                "marketplace": marketplace,
+                "query": query,
+                "categories": index.search(query, limit=50)
+            }
+    
     # Получить API ключи продавца
     profile = await db.seller_profiles.find_one({'user_id': current_user['_id']})
     if not profile:
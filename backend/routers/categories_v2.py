@@ -13,6 +13,9 @@ from backend.category_system import CategorySystem
 from backend.connectors import get_connector, MarketplaceError
 from backend.wb_category_preload import WBCategoryManager
 from backend.ozon_category_preload import OzonCategoryManager
+from backend.services.category_search import CategorySearch
+from backend.services.attribute_cache import category_attributes_cache, attribute_values_cache
+from backend.services.credentials import CredentialRegistry
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -23,6 +26,24 @@ def get_category_system():
     return CategorySystem(db)
 
 
+async def _marketplace_connector(current_user: dict, marketplace: str):
+    """Коннектор маркетплейса по API ключу продавца (для загрузки справочников)"""
+    profile = await db.seller_profiles.find_one({'user_id': current_user['_id']})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Seller profile not found")
+    
+    api_keys = profile.get('api_keys', [])
+    marketplace_key = next((k for k in api_keys if k['marketplace'] == marketplace), None)
+    
+    if not marketplace_key:
+        raise HTTPException(status_code=400, detail=f"No API key for {marketplace}")
+    
+    try:
+        return CredentialRegistry.connector(current_user['_id'], marketplace_key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # ========== ПОЛУЧИТЬ ВСЕ КАТЕГОРИИ МАРКЕТПЛЕЙСА ==========
 
 @router.get("/api/categories/marketplace/{marketplace}/all")
@@ -207,69 +228,59 @@ async def get_category_attributes(
     is_required: Optional[bool] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Получить атрибуты категории"""
-    logger.info(f"[Attributes] Get for {marketplace} cat {category_id}")
+    """
+    Получить атрибуты категории
     
-    category_system = get_category_system()
-    cached_attrs = await category_system.get_cached_attributes(marketplace, category_id, type_id)
+    Кэш в памяти процесса -> category_attributes_cache -> API маркетплейса
+    (одновременные запросы одной категории ждут одну загрузку)
+    """
+    logger.info(f"[Attributes] Get for {marketplace} cat {category_id}")
     
-    if cached_attrs:
-        if is_required is not None:
-            cached_attrs = [a for a in cached_attrs if a.get('is_required') == is_required]
-        
+    if marketplace == 'ozon' and not type_id:
+        logger.warning(f"[Attributes] Ozon type_id missing for category {category_id}, cannot load attributes")
         return {
             "marketplace": marketplace,
             "category_id": category_id,
-            "attributes": cached_attrs,
-            "cached": True
+            "attributes": [],
+            "cached": False,
+            "error": "type_id required for Ozon categories"
         }
     
-    # Load from API
-    profile = await db.seller_profiles.find_one({'user_id': current_user['_id']})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-    
-    api_keys = profile.get('api_keys', [])
-    marketplace_key = next((k for k in api_keys if k['marketplace'] == marketplace), None)
+    cache_key = f"{marketplace}_{category_id}"
+    if type_id:
+        cache_key += f"_{type_id}"
     
-    if not marketplace_key:
-        raise HTTPException(status_code=400, detail=f"No API key for {marketplace}")
+    async def load_attributes() -> List[Dict[str, Any]]:
+        connector = await _marketplace_connector(current_user, marketplace)
+        if marketplace == 'ozon':
+            return await connector.get_category_attributes(int(category_id), type_id)
+        if marketplace == 'wb':
+            return await connector.get_category_characteristics(int(category_id))
+        return []
     
     try:
-        connector = get_connector(marketplace, marketplace_key.get('client_id', ''), marketplace_key['api_key'])
-        
-        if marketplace == 'ozon':
-            if not type_id:
-                logger.warning(f"[Attributes] Ozon type_id missing for category {category_id}, cannot load attributes")
-                return {
-                    "marketplace": marketplace,
-                    "category_id": category_id,
-                    "attributes": [],
-                    "cached": False,
-                    "error": "type_id required for Ozon categories"
-                }
-            attributes = await connector.get_category_attributes(int(category_id), type_id)
-        elif marketplace == 'wb':
-            attributes = await connector.get_category_characteristics(int(category_id))
-        else:
-            attributes = []
-        
-        await category_system.cache_category_attributes(marketplace, category_id, type_id, attributes)
-        
-        if is_required is not None:
-            attributes = [a for a in attributes if a.get('is_required') == is_required]
-        
-        return {
-            "marketplace": marketplace,
-            "category_id": category_id,
-            "attributes": attributes,
-            "cached": False
-        }
-        
+        attributes, cached = await category_attributes_cache.get(
+            db,
+            cache_key,
+            load_attributes,
+            meta={"marketplace": marketplace, "category_id": category_id, "type_id": type_id}
+        )
+    except HTTPException:
+        raise
     except MarketplaceError as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if is_required is not None:
+        attributes = [a for a in attributes if a.get('is_required') == is_required]
+    
+    return {
+        "marketplace": marketplace,
+        "category_id": category_id,
+        "attributes": attributes,
+        "cached": cached
+    }
 
 
 # ========== СОПОСТАВЛЕНИЯ ==========
@@ -324,43 +335,28 @@ async def auto_suggest_category_mapping(
         target_marketplaces = ['ozon', 'wb', 'yandex']
         target_marketplaces.remove(source_marketplace)
         
+        # Ключевые слова названия (короткие слова - предлоги, союзы)
+        keywords = [kw for kw in (source_category_name or '').lower().split() if len(kw) > 3]
+        
         for target_mp in target_marketplaces:
-            # Поиск по названию категории в кэше
-            search_query = {"marketplace": target_mp, "disabled": False}
-            
-            if source_category_name:
-                # Разбиваем название на ключевые слова
-                keywords = source_category_name.lower().split()
-                # Ищем категории, содержащие хотя бы одно из ключевых слов
-                search_query["$or"] = [
-                    {"category_name": {"$regex": kw, "$options": "i"}} for kw in keywords if len(kw) > 3
-                ]
+            # Поиск по индексу категорий в памяти: по каждому слову отдельно,
+            # релевантность - число совпавших слов
+            scored = {}
+            for kw in keywords:
+                for match in await CategorySearch.search(db, target_mp, kw, limit=50):
+                    if match.get('disabled'):
+                        continue
+                    key = (match.get('category_id') or match.get('id'), match.get('type_id'))
+                    entry = scored.setdefault(key, {
+                        "category_id": key[0],
+                        "category_name": match.get('category_name') or match.get('name'),
+                        "type_id": match.get('type_id'),
+                        "score": 0
+                    })
+                    entry["score"] += 1
             
-            if search_query.get("$or"):
-                matches = await db[f"{target_mp}_categories_cache"].find(
-                    search_query
-                ).limit(5).to_list(length=5)
-                
-                if matches:
-                    # Сортируем по релевантности (количество совпадающих слов)
-                    scored_matches = []
-                    for match in matches:
-                        match_name = match.get('category_name', '').lower()
-                        score = sum(1 for kw in keywords if kw.lower() in match_name)
-                        scored_matches.append({
-                            "category_id": match.get('category_id') or match.get('id'),
-                            "category_name": match.get('category_name') or match.get('name'),
-                            "type_id": match.get('type_id'),
-                            "score": score
-                        })
-                    
-                    # Сортируем по score
-                    scored_matches.sort(key=lambda x: x['score'], reverse=True)
-                    suggestions[target_mp] = scored_matches[:3]  # Топ 3
-                else:
-                    suggestions[target_mp] = []
-            else:
-                suggestions[target_mp] = []
+            # Сортируем по score (sorted устойчив - при равном score порядок поиска)
+            suggestions[target_mp] = sorted(scored.values(), key=lambda x: x['score'], reverse=True)[:3]  # Топ 3
         
         return {
             "source": {
@@ -775,54 +771,23 @@ async def get_attribute_values(
     """
     logger.info(f"[AttributeValues] Getting values for {marketplace} attribute {attribute_id}")
     
-    # Проверить кэш
     cache_key = f"{marketplace}_{category_id}_{attribute_id}"
     if type_id:
         cache_key += f"_{type_id}"
     
-    cached = await db.attribute_values_cache.find_one({"cache_key": cache_key})
-    
-    if cached:
-        cache_age = datetime.utcnow() - cached.get('cached_at', datetime.utcnow())
-        if cache_age.days < 7:
-            logger.info(f"[AttributeValues] Returning cached values (age: {cache_age.days} days)")
-            return {
-                "marketplace": marketplace,
-                "attribute_id": attribute_id,
-                "values": cached.get('values', []),
-                "cached": True
-            }
-    
-    # Получить API ключи
-    profile = await db.seller_profiles.find_one({'user_id': current_user['_id']})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Seller profile not found")
-    
-    api_keys = profile.get('api_keys', [])
-    marketplace_key = next(
-        (k for k in api_keys if k['marketplace'] == marketplace),
-        None
-    )
-    
-    if not marketplace_key:
-        raise HTTPException(
-            status_code=400,
-            detail=f"No API key found for {marketplace}"
-        )
-    
-    try:
+    async def load_values() -> List[Dict[str, Any]]:
+        connector = await _marketplace_connector(current_user, marketplace)
         values = []
         
         # Для Ozon используем /v1/description-category/attribute/values
         if marketplace == 'ozon':
             import httpx
             
-            connector = get_connector(marketplace, marketplace_key.get('client_id', ''), marketplace_key['api_key'])
             url = f"{connector.base_url}/v1/description-category/attribute/values"
             
             headers = {
-                "Client-Id": marketplace_key.get('client_id', ''),
-                "Api-Key": marketplace_key['api_key'],
+                "Client-Id": connector.client_id,
+                "Api-Key": connector.api_key,
                 "Content-Type": "application/json"
             }
             
@@ -849,12 +814,6 @@ async def get_attribute_values(
         
         elif marketplace == 'wb':
             # Wildberries возвращает возможные значения в get_category_characteristics
-            connector = get_connector(
-                marketplace,
-                marketplace_key.get('client_id', ''),
-                marketplace_key['api_key']
-            )
-            
             characteristics = await connector.get_category_characteristics(int(category_id))
             
             # Найти нужный атрибут
@@ -866,35 +825,33 @@ async def get_attribute_values(
             if target_char:
                 values = target_char.get('values', [])
         
-        # Сохранить в кэш
-        cache_doc = {
-            "cache_key": cache_key,
-            "marketplace": marketplace,
-            "category_id": category_id,
-            "attribute_id": attribute_id,
-            "type_id": type_id,
-            "values": values,
-            "cached_at": datetime.utcnow()
-        }
-        
-        await db.attribute_values_cache.replace_one(
-            {"cache_key": cache_key},
-            cache_doc,
-            upsert=True
+        logger.info(f"[AttributeValues] Loaded {len(values)} values for attribute {attribute_id}")
+        return values
+    
+    try:
+        values, cached = await attribute_values_cache.get(
+            db,
+            cache_key,
+            load_values,
+            meta={
+                "marketplace": marketplace,
+                "category_id": category_id,
+                "attribute_id": attribute_id,
+                "type_id": type_id
+            }
         )
-        
-        logger.info(f"[AttributeValues] Cached {len(values)} values for attribute {attribute_id}")
-        
-        return {
-            "marketplace": marketplace,
-            "attribute_id": attribute_id,
-            "values": values,
-            "cached": False
-        }
-        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"[AttributeValues] Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "marketplace": marketplace,
+        "attribute_id": attribute_id,
+        "values": values,
+        "cached": cached
+    }
 
 
 # ========== ПОДБОР КАТЕГОРИИ ПО НАЗВАНИЮ ==========
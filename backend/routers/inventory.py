@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
+import logging
 
 from backend.schemas.inventory import Inventory, FBOInventory, InventoryHistory, FBOShipment, FBOShipmentItem, InventoryAdjustment, InventoryResponse, FBOInventoryResponse, InventoryHistoryResponse, FBOShipmentResponse
 from backend.auth_utils import get_current_user
 from backend.core.database import get_database
+from backend.services.stock_outbox import StockOutbox
+from backend.services.inventory_service import InventoryService
 
 router = APIRouter(prefix="/api/inventory", tags=["inventory"])
+logger = logging.getLogger(__name__)
 
 
 # ============================================================================
@@ -58,24 +62,31 @@ async def log_inventory_movement(
 async def sync_stock_to_marketplaces(db, product_id: str, seller_id: str, new_quantity: int):
     """
     Синхронизировать остатки на все маркетплейсы (FBS)
-    TODO: Реализовать вызовы API маркетплейсов через connectors
+    
+    Изменение ставится в очередь stock_outbox; актуальный остаток отправит
+    фоновый воркер на все склады продавца с sends_stock=True.
+    Воркер ищет товары по product_catalog.article, поэтому sku старой
+    коллекции products сопоставляется с артикулом каталога.
     """
     db = await get_database()
-    # Получить список активных маркетплейсов продавца
-    seller_profile = await db.seller_profiles.find_one({"user_id": ObjectId(seller_id)})
-    if not seller_profile:
-        return
     
     # Получить товар
-    product = await db.products.find_one({"_id": ObjectId(product_id)})
+    product = await db.products.find_one({"_id": ObjectId(product_id)}, {"sku": 1})
     if not product:
         return
     
-    # Для каждого маркетплейса, где включен товар
-    marketplaces = product.get("marketplaces", {})
+    catalog_product = await db.product_catalog.find_one(
+        {
+            "seller_id": {"$in": [seller_id] + ([ObjectId(seller_id)] if ObjectId.is_valid(seller_id) else [])},
+            "$or": [{"_id": product["_id"]}, {"article": product.get("sku")}]
+        },
+        {"article": 1}
+    )
+    if not catalog_product:
+        logger.warning(f"[INVENTORY] Товар {product_id} ({product.get('sku')}) не найден в каталоге, остаток на МП не отправлен")
+        return
     
-    # TODO: Вызвать API каждого маркетплейса для обновления остатков
-    print(f"[SYNC] Product {product['sku']} stock updated to {new_quantity} on all marketplaces")
+    await StockOutbox.enqueue(db, seller_id, [catalog_product["article"]], source="inventory_adjustment")
 
 
 # ============================================================================
@@ -84,65 +95,32 @@ async def sync_stock_to_marketplaces(db, product_id: str, seller_id: str, new_qu
 
 @router.get("/fbs", response_model=List[InventoryResponse])
 async def get_fbs_inventory(
+    response: Response,
+    search: Optional[str] = Query(None),
+    low_stock: bool = Query(False),
+    sort_by: str = Query("sku"),
+    sort_order: str = Query("asc", pattern="^(asc|desc)$"),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=5000),
     current_user: dict = Depends(get_current_user)
 ):
-    """Получить все остатки FBS (собственный склад) продавца"""
-    db = await get_database()
-    seller_id = str(current_user["_id"])
-    
-    # Получить все записи inventory
-    cursor = db.inventory.find({"seller_id": seller_id})
-    inventory_list = await cursor.to_list(length=1000)
-    
-    # Обогатить данными о товарах
-    result = []
-    for inv in inventory_list:
-        product_id = inv["product_id"]
-        sku = inv.get("sku", "")
-        
-        # Попробовать найти товар по product_id или по артикулу (sku)
-        product = await db.product_catalog.find_one({"_id": product_id})
-        
-        if not product and sku:
-            # Поиск по артикулу
-            product = await db.product_catalog.find_one({"article": sku, "seller_id": seller_id})
-        
-        if not product:
-            try:
-                product = await db.products.find_one({"_id": ObjectId(product_id) if isinstance(product_id, str) else product_id})
-            except:
-                product = None
-        
-        # Получить имя товара и фото
-        product_name = ""
-        product_image = ""
-        
-        if product:
-            product_name = product.get("name") or product.get("minimalmod", {}).get("name", "")
-            actual_product_id = str(product.get("_id", product_id))
-            
-            # Попробовать загрузить фото из product_photos
-            photo = await db.product_photos.find_one({"product_id": actual_product_id})
-            if photo:
-                product_image = photo.get("url", "")
-            else:
-                # Fallback на старые поля
-                product_image = product.get("photos", [None])[0] or product.get("minimalmod", {}).get("images", [""])[0] or ""
-        
-        result.append(InventoryResponse(
-            id=str(inv["_id"]),
-            product_id=str(inv["product_id"]),
-            seller_id=str(inv["seller_id"]),
-            sku=sku,
-            quantity=inv["quantity"],
-            reserved=inv["reserved"],
-            available=inv["available"],
-            alert_threshold=inv.get("alert_threshold", 10),
-            product_name=product_name,
-            product_image=product_image
-        ))
+    """
+    Получить остатки FBS (собственный склад) продавца
     
-    return result
+    Без limit возвращаются все строки; общее количество по фильтру - в заголовке X-Total-Count.
+    """
+    items, total = await InventoryService.list_fbs_inventory(
+        seller_id=str(current_user["_id"]),
+        search=search,
+        low_stock=low_stock,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        skip=skip,
+        limit=limit,
+        legacy_products=True
+    )
+    response.headers["X-Total-Count"] = str(total)
+    return [InventoryResponse(**item) for item in items]
 
 
 @router.post("/fbs/{product_id}/adjust")
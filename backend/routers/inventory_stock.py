@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
 from typing import List, Dict, Any, Optional
 import json
 from datetime import datetime
@@ -9,18 +9,12 @@ from pathlib import Path
 
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
+from backend.services.inventory_service import InventoryService
 
 # Определяем путь к корню проекта динамически
 PROJECT_ROOT = Path(__file__).parent.parent
 DEBUG_LOG_PATH = PROJECT_ROOT / ".cursor" / "debug.log"
 DEBUG_LOG_PATH.parent.mkdir(exist_ok=True)
-# Ленивый импорт для избежания ошибки при отсутствии tenacity
-def _get_sync_function():
-    try:
-        from backend.routers.stock_sync import sync_product_to_marketplace
-        return sync_product_to_marketplace
-    except ImportError:
-        return None
 
 router = APIRouter(prefix="/api/inventory", tags=["inventory-stock"])
 logger = logging.getLogger(__name__)
@@ -44,65 +38,31 @@ async def test_router():
 
 @router.get("/fbs")
 async def get_fbs_inventory(
+    response: Response,
+    search: Optional[str] = Query(None),
+    low_stock: bool = Query(False),
+    sort_by: str = Query("sku"),
+    sort_order: str = Query("asc", pattern="^(asc|desc)$"),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=5000),
     current_user: dict = Depends(get_current_user)
 ):
-    """Получить все остатки FBS (собственный склад) продавца"""
-    db = await get_database()
-    seller_id = str(current_user["_id"])
-    
-    # Получить все записи inventory
-    cursor = db.inventory.find({"seller_id": seller_id})
-    inventory_list = await cursor.to_list(length=1000)
-    
-    # Обогатить данными о товарах
-    result = []
-    for inv in inventory_list:
-        product_id = inv["product_id"]
-        sku = inv.get("sku", "")
-        
-        # Попробовать найти товар по product_id или по артикулу (sku)
-        product = await db.product_catalog.find_one({"_id": product_id})
-        
-        if not product and sku:
-            # Поиск по артикулу
-            product = await db.product_catalog.find_one({"article": sku, "seller_id": seller_id})
-        
-        if not product:
-            try:
-                product = await db.product_catalog.find_one({"_id": ObjectId(product_id) if isinstance(product_id, str) else product_id})
-            except:
-                product = None
-        
-        # Получить имя товара и фото
-        product_name = ""
-        product_image = ""
-        
-        if product:
-            product_name = product.get("name") or product.get("minimalmod", {}).get("name", "")
-            actual_product_id = str(product.get("_id", product_id))
-            
-            # Попробовать загрузить фото из product_photos
-            photo = await db.product_photos.find_one({"product_id": actual_product_id})
-            if photo:
-                product_image = photo.get("url", "")
-            else:
-                # Fallback на старые поля
-                product_image = product.get("photos", [None])[0] or product.get("minimalmod", {}).get("images", [""])[0] or ""
-        
-        result.append({
-            "id": str(inv["_id"]),
-            "product_id": str(inv["product_id"]),
-            "seller_id": str(inv["seller_id"]),
-            "sku": sku,
-            "quantity": inv.get("quantity", 0),
-            "reserved": inv.get("reserved", 0),
-            "available": inv.get("available", 0),
-            "alert_threshold": inv.get("alert_threshold", 10),
-            "product_name": product_name,
-            "product_image": product_image
-        })
+    """
+    Получить остатки FBS (собственный склад) продавца
     
-    return result
+    Без limit возвращаются все строки; общее количество по фильтру - в заголовке X-Total-Count.
+    """
+    items, total = await InventoryService.list_fbs_inventory(
+        seller_id=str(current_user["_id"]),
+        search=search,
+        low_stock=low_stock,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        skip=skip,
+        limit=limit
+    )
+    response.headers["X-Total-Count"] = str(total)
+    return items
 
 
 @router.put("/update-stock")
@@ -182,61 +142,42 @@ async def update_stock(
     
     logger.info(f"[STOCK UPDATE] Product {article}: {old_quantity} → {new_quantity}")
     
-    # Синхронизация на МП
+    # Синхронизация на МП - через очередь stock_outbox (фоновый воркер)
+    from backend.services.stock_outbox import StockOutbox
+    
     synced_warehouses = []
     
     if warehouse_id:
         # Синхронизация на конкретный склад
-        try:
-            sync_func = _get_sync_function()
-            if sync_func:
-                await sync_func(
-                    db,
-                    current_user["_id"],
-                    warehouse_id,
-                    article,
-                    new_available
-                )
-            
-            # ИСПРАВЛЕНО: Поиск по _id (UUID строка), с fallback на id для совместимости
-            warehouse = await db.warehouses.find_one({"_id": warehouse_id})
-            if not warehouse:
-                warehouse = await db.warehouses.find_one({"id": warehouse_id})
-            warehouse_name = warehouse.get("name") if warehouse else warehouse_id
-            synced_warehouses.append(warehouse_name)
-            
-            logger.info(f"[STOCK UPDATE] ✅ Synced to warehouse: {warehouse_name}")
-        except Exception as e:
-            logger.error(f"[STOCK UPDATE] ❌ Sync failed: {e}")
+        # ИСПРАВЛЕНО: Поиск по _id (UUID строка), с fallback на id для совместимости
+        warehouse = await db.warehouses.find_one({"_id": warehouse_id})
+        if not warehouse:
+            warehouse = await db.warehouses.find_one({"id": warehouse_id})
+        synced_warehouses.append(warehouse.get("name") if warehouse else warehouse_id)
     else:
         # Синхронизация на все склады с sends_stock=True
         warehouses = await db.warehouses.find({
             "seller_id": str(current_user["_id"]),
             "sends_stock": True
-        }).to_list(length=100)
-        
-        for wh in warehouses:
-            try:
-                sync_func = _get_sync_function()
-                if sync_func:
-                    await sync_func(
-                        db,
-                        current_user["_id"],
-                        wh["id"],
-                        article,
-                        new_available
-                    )
-                synced_warehouses.append(wh.get("name"))
-                logger.info(f"[STOCK UPDATE] ✅ Synced to warehouse: {wh.get('name')}")
-            except Exception as e:
-                logger.error(f"[STOCK UPDATE] ❌ Sync to {wh.get('name')} failed: {e}")
+        }, {"name": 1}).to_list(length=100)
+        synced_warehouses = [wh.get("name") for wh in warehouses]
+    
+    await StockOutbox.enqueue(
+        db,
+        current_user["_id"],
+        [article],
+        warehouse_id=warehouse_id,
+        source="manual_stock_update"
+    )
+    logger.info(f"[STOCK UPDATE] Sync queued for warehouses: {synced_warehouses}")
     
     return {
         "message": "Остаток обновлён и синхронизирован",
         "old_quantity": old_quantity,
         "new_quantity": new_quantity,
         "new_available": new_available,
-        "synced_to_warehouses": synced_warehouses
+        "synced_to_warehouses": synced_warehouses,
+        "sync_queued": True
     }
 
 
@@ -523,11 +464,15 @@ async def sync_all_stocks(
     Ручная синхронизация всех остатков на выбранный склад
     ОПТИМИЗИРОВАНО: отправляет батчами для избежания rate limit
     
-    ВАЖНО: Отправляет ВСЕ товары из БД (даже с остатком 0), чтобы синхронизировать МП с базой
+    ВАЖНО: Отправляет товары из БД (даже с остатком 0), чтобы синхронизировать МП с базой
     База данных - источник истины!
     
+    По умолчанию отправляются только остатки, изменившиеся с последней успешной
+    отправки на склад МП; full_sync=true - отправить все товары (полная сверка).
+    
     Body: {
-      warehouse_id: str
+      warehouse_id: str,
+      full_sync: bool (опционально, по умолчанию false)
     }
     """
     # Парсим JSON body
@@ -555,6 +500,7 @@ async def sync_all_stocks(
     db = await get_database()
     
     warehouse_id = body.get("warehouse_id")
+    full_sync = bool(body.get("full_sync", False))
     
     # #region agent log
     try:
@@ -686,16 +632,25 @@ async def sync_all_stocks(
     
     logger.info(f"")
     logger.info(f"[MANUAL SYNC] Всего записей inventory в БД: {len(inventories)}")
-    logger.info(f"[MANUAL SYNC] ⚠️ ВАЖНО: Будут отправлены ВСЕ товары, включая товары с остатком 0")
+    if full_sync:
+        logger.info(f"[MANUAL SYNC] ⚠️ ВАЖНО: Будут отправлены ВСЕ товары, включая товары с остатком 0")
+    else:
+        logger.info(f"[MANUAL SYNC] Будут отправлены только изменившиеся остатки (full_sync=false)")
     logger.info(f"[MANUAL SYNC] База данных = источник истины для МП")
     logger.info(f"")
     
     # Группируем товары по маркетплейсам для батч-отправки
-    from backend.connectors import get_connector, MarketplaceError
+    from backend.connectors import MarketplaceError
+    from backend.routers.stock_sync import filter_changed_stock, save_pushed_stock
+    from backend.services.credentials import CredentialRegistry
+    
+    # API ключи продавца - один раз на все связи
+    profile = await db.seller_profiles.find_one({"user_id": current_user["_id"]})
     
     synced_count = 0
     failed_count = 0
     skipped_count = 0
+    unchanged_count = 0
     
     # Для каждого МП синхронизируем батчами
     for link in links:
@@ -709,7 +664,6 @@ async def sync_all_stocks(
         logger.info(f"[MANUAL SYNC] {'='*60}")
         
         # Получить API ключ
-        profile = await db.seller_profiles.find_one({"user_id": current_user["_id"]})
         if not profile:
             logger.error(f"[MANUAL SYNC] ❌ Профиль пользователя не найден!")
             continue
@@ -725,21 +679,15 @@ async def sync_all_stocks(
         
         logger.info(f"[MANUAL SYNC] ✅ API ключ найден для {marketplace}")
         
-        # Создать коннектор - расшифровываем API ключ
-        from backend.utils import get_decrypted_api_key
-        decrypted_api_key = get_decrypted_api_key(api_key_data)
-        if not decrypted_api_key:
+        # Создать коннектор - API ключ расшифровывается один раз на интеграцию
+        try:
+            connector = CredentialRegistry.connector(current_user["_id"], api_key_data)
+        except ValueError:
             logger.error(f"[MANUAL SYNC] ❌ Не удалось расшифровать API ключ для {marketplace}!")
             continue
         
-        connector = get_connector(
-            marketplace,
-            api_key_data.get("client_id", ""),
-            decrypted_api_key
-        )
-        
-        # Собираем товары для этого МП
-        batch_items = []
+        # Собираем товары для этого МП: (article, mp_sku, остаток)
+        batch_rows = []
         
         logger.info(f"[MANUAL SYNC] Сбор товаров для отправки...")
         
@@ -762,15 +710,26 @@ async def sync_all_stocks(
             # ИЗМЕНЕНО: Отправляем ВСЕ товары, используем article как offer_id
             # Для Ozon offer_id = article продавца
             if marketplace == "ozon":
-                batch_items.append({"offer_id": article, "stock": available})
+                batch_rows.append((article, article, available))
                 logger.debug(f"[MANUAL SYNC] Добавлен: {article} → остаток: {available}")
             elif marketplace in ["wb", "wildberries"]:
                 # Для WB нужен barcode, если его нет - используем article
                 marketplace_data = product.get("marketplace_data", {}).get(marketplace, {})
                 mp_sku = marketplace_data.get("barcode") or marketplace_data.get("id") or article
-                batch_items.append({"sku": mp_sku, "amount": available})
+                batch_rows.append((article, mp_sku, available))
                 logger.debug(f"[MANUAL SYNC] Добавлен: {mp_sku} → остаток: {available}")
         
+        if not full_sync:
+            changed_rows = await filter_changed_stock(db, link, batch_rows)
+            unchanged_count += len(batch_rows) - len(changed_rows)
+            logger.info(f"[MANUAL SYNC] Без изменений с последней отправки: {len(batch_rows) - len(changed_rows)}")
+            batch_rows = changed_rows
+        
+        if marketplace == "ozon":
+            batch_items = [{"offer_id": mp_sku, "stock": available} for _, mp_sku, available in batch_rows]
+        else:
+            batch_items = [{"sku": mp_sku, "amount": available} for _, mp_sku, available in batch_rows]
+        
         logger.info(f"[MANUAL SYNC] Собрано товаров для отправки: {len(batch_items)}")
         logger.info(f"[MANUAL SYNC] Пропущено (не найдены в каталоге): {skipped_count}")
         
@@ -802,6 +761,7 @@ async def sync_all_stocks(
                     
                     await connector.update_stock(mp_warehouse_id, batch)
                     synced_count += len(batch)
+                    await save_pushed_stock(db, link, batch_rows[i:i+batch_size])
                     
                     logger.info(f"[MANUAL SYNC] ✅ Батч {batch_num}/{total_batches} отправлен успешно!")
                     
@@ -824,6 +784,7 @@ async def sync_all_stocks(
     logger.info(f"[MANUAL SYNC] Успешно отправлено: {synced_count}")
     logger.info(f"[MANUAL SYNC] Ошибок: {failed_count}")
     logger.info(f"[MANUAL SYNC] Пропущено: {skipped_count}")
+    logger.info(f"[MANUAL SYNC] Без изменений: {unchanged_count}")
     logger.info(f"{'='*80}")
     logger.info(f"")
     
@@ -832,5 +793,7 @@ async def sync_all_stocks(
         "synced": synced_count,
         "failed": failed_count,
         "skipped": skipped_count,
+        "unchanged": unchanged_count,
+        "full_sync": full_sync,
         "warehouse_name": warehouse.get("name")
     }
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, Response
 from typing import List, Optional
 from datetime import datetime, timedelta
 from bson import ObjectId
@@ -7,6 +7,11 @@ import os
 
 from backend.schemas.order import OrderCreate, OrderResponse, OrderStatusUpdate, CDEKLabelRequest, ReturnCreate, ReturnResponse, OrderTotals, OrderDates
 from backend.core.database import get_database
+from backend.services.inventory_ledger import InventoryLedger, InventoryLedgerError
+from backend.services.order_listing import (
+    list_orders, count_orders, date_range_query, model_projection,
+    ORDER_LIST_DEFAULT_LIMIT, ORDER_LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+)
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
@@ -91,119 +96,72 @@ async def find_warehouse_for_order(db, user_id, required_quantity: int) -> str:
     
     return warehouses[0]["id"] if warehouses else None
 
+def _item_field(item, name: str):
+    """Позиции приходят и моделями (создание заказа), и dict (заказ из БД)"""
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+def _item_quantities(items: list):
+    return [(_item_field(item, "product_id"), _item_field(item, "quantity")) for item in items]
+
+
 async def reserve_inventory(db, items: list, seller_id: str):
     """
     Резервирует товары на складе при создании заказа
+    (все позиции атомарно, см. InventoryLedger)
     """
-    for item in items:
-        # Find inventory record
-        inventory = await db.inventory.find_one({
-            "product_id": item.product_id,
-            "seller_id": seller_id
-        })
-        
-        if not inventory:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Product {item.sku} not found in inventory"
-            )
-        
-        if inventory["available"] < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for {item.sku}. Available: {inventory['available']}, Required: {item.quantity}"
-            )
-        
-        # Reserve stock
-        await db.inventory.update_one(
-            {"_id": inventory["_id"]},
-            {
-                "$inc": {
-                    "reserved": item.quantity,
-                    "available": -item.quantity
-                }
-            }
+    try:
+        await InventoryLedger.apply(
+            db,
+            seller_id,
+            "reserve",
+            _item_quantities(items),
+            reason="Резерв для заказа",
+            by="product_id",
+            strict=True
         )
+    except InventoryLedgerError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 async def release_inventory(db, items: list, seller_id: str):
     """
     Освобождает зарезервированные товары (при отмене заказа)
     """
-    for item in items:
-        await db.inventory.update_one(
-            {
-                "product_id": item.product_id,
-                "seller_id": seller_id
-            },
-            {
-                "$inc": {
-                    "reserved": -item.quantity,
-                    "available": item.quantity
-                }
-            }
-        )
+    await InventoryLedger.apply(
+        db,
+        seller_id,
+        "release",
+        _item_quantities(items),
+        reason="Отмена заказа",
+        by="product_id"
+    )
 
-async def deduct_inventory(db, items: list, seller_id: str):
+async def deduct_inventory(db, items: list, seller_id: str, order_number: str = "N/A", order_id: Optional[str] = None):
     """
     Списывает товары со склада (при отправке заказа)
     """
-    for item in items:
-        inventory = await db.inventory.find_one({
-            "product_id": item.product_id,
-            "seller_id": seller_id
-        })
-        
-        # Deduct from quantity and reserved
-        await db.inventory.update_one(
-            {"_id": inventory["_id"]},
-            {
-                "$inc": {
-                    "quantity": -item.quantity,
-                    "reserved": -item.quantity
-                }
-            }
-        )
-        
-        # Log inventory movement
-        await db.inventory_history.insert_one({
-            "product_id": item.product_id,
-            "seller_id": seller_id,
-            "operation_type": "sale",
-            "quantity_change": -item.quantity,
-            "reason": f"Заказ #{item.get('order_number', 'N/A')}",
-            "user_id": seller_id,
-            "created_at": datetime.utcnow(),
-            "order_id": item.get("order_id")
-        })
+    await InventoryLedger.apply(
+        db,
+        seller_id,
+        "deduct",
+        _item_quantities(items),
+        reason=f"Заказ #{order_number}",
+        by="product_id",
+        history_extra={"order_id": order_id}
+    )
 
 async def return_inventory(db, items: list, seller_id: str, order_number: str):
     """
     Возвращает товары на склад (при возврате)
     """
-    for item in items:
-        await db.inventory.update_one(
-            {
-                "product_id": item.product_id,
-                "seller_id": seller_id
-            },
-            {
-                "$inc": {
-                    "quantity": item.quantity,
-                    "available": item.quantity
-                }
-            }
-        )
-        
-        # Log inventory movement
-        await db.inventory_history.insert_one({
-            "product_id": item.product_id,
-            "seller_id": seller_id,
-            "operation_type": "return",
-            "quantity_change": item.quantity,
-            "reason": f"Возврат заказа #{order_number}",
-            "user_id": seller_id,
-            "created_at": datetime.utcnow()
-        })
+    await InventoryLedger.apply(
+        db,
+        seller_id,
+        "return",
+        _item_quantities(items),
+        reason=f"Возврат заказа #{order_number}",
+        by="product_id"
+    )
 
 # ============================================================================
 # CDEK API INTEGRATION
@@ -287,17 +245,41 @@ async def get_cdek_order_status(uuid: str, token: str) -> dict:
 # ORDER CRUD ENDPOINTS
 # ============================================================================
 
+@router.get("/stats")
+async def get_order_stats(
+    source: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    seller_id: str = Depends(get_current_seller_id)
+):
+    """
+    Количество заказов продавца всего и по статусам
+    """
+    db = await get_database()
+    
+    query = {"seller_id": seller_id}
+    if source:
+        query["source"] = source
+    date_range_query(query, "dates.created_at", date_from, date_to)
+    
+    return await count_orders(db.orders, query)
+
 @router.get("", response_model=List[OrderResponse])
 async def get_orders(
+    response: Response,
     status: Optional[str] = Query(None),
     source: Optional[str] = Query(None),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    limit: int = Query(ORDER_LIST_DEFAULT_LIMIT, ge=1, le=ORDER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
     seller_id: str = Depends(get_current_seller_id)
 ):
     """
     Получить список заказов продавца с фильтрацией
+    
+    Следующая страница - по курсору из заголовка X-Next-Cursor
     """
     db = await get_database()
     
@@ -308,13 +290,7 @@ async def get_orders(
         query["status"] = status
     if source:
         query["source"] = source
-    if date_from:
-        query["dates.created_at"] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        if "dates.created_at" in query:
-            query["dates.created_at"]["$lte"] = datetime.fromisoformat(date_to)
-        else:
-            query["dates.created_at"] = {"$lte": datetime.fromisoformat(date_to)}
+    date_range_query(query, "dates.created_at", date_from, date_to)
     if search:
         query["$or"] = [
             {"order_number": {"$regex": search, "$options": "i"}},
@@ -322,11 +298,22 @@ async def get_orders(
             {"items.sku": {"$regex": search, "$options": "i"}}
         ]
     
-    orders = await db.orders.find(query).sort("dates.created_at", -1).to_list(1000)
+    try:
+        orders, next_cursor = await list_orders(
+            db.orders,
+            query,
+            model_projection(OrderResponse),
+            limit=limit,
+            cursor=cursor,
+            sort_field="dates.created_at"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Convert ObjectId to string
-    for order in orders:
-        order["id"] = str(order.pop("_id"))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not cursor:
+        response.headers[TOTAL_COUNT_HEADER] = str(await db.orders.count_documents(query))
     
     return orders
 
@@ -429,7 +416,7 @@ async def update_order_status(
     if status_update.status == "shipped":
         update_data["dates.shipped_at"] = datetime.utcnow()
         # Deduct inventory
-        await deduct_inventory(db, order["items"], seller_id)
+        await deduct_inventory(db, order["items"], seller_id, order.get("order_number", "N/A"), str(order["_id"]))
     elif status_update.status == "delivered":
         update_data["dates.delivered_at"] = datetime.utcnow()
     elif status_update.status == "cancelled":
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
@@ -8,21 +8,50 @@ from backend.schemas.order import OrderFBO, OrderFBOCreate, OrderFBOResponse, Or
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
 from backend.connectors import get_connector
+from backend.services.order_listing import (
+    list_orders, count_orders, date_range_query, model_projection,
+    ORDER_LIST_DEFAULT_LIMIT, ORDER_LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+)
 
 router = APIRouter(prefix="/api/orders/fbo", tags=["orders-fbo"])
 logger = logging.getLogger(__name__)
 
 
+@router.get("/stats")
+async def get_fbo_order_stats(
+    marketplace: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Количество FBO заказов всего и по статусам
+    """
+    db = await get_database()
+    
+    query = {"seller_id": str(current_user["_id"])}
+    if marketplace:
+        query["marketplace"] = marketplace
+    date_range_query(query, "created_at", date_from, date_to)
+    
+    return await count_orders(db.orders_fbo, query)
+
+
 @router.get("", response_model=List[OrderFBOResponse])
 async def get_fbo_orders(
+    response: Response,
     marketplace: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
+    limit: int = Query(ORDER_LIST_DEFAULT_LIMIT, ge=1, le=ORDER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Получить список FBO заказов (read-only, только аналитика)
+    
+    Следующая страница - по курсору из заголовка X-Next-Cursor
     """
     db = await get_database()
     
@@ -32,18 +61,19 @@ async def get_fbo_orders(
         query["marketplace"] = marketplace
     if status:
         query["status"] = status
-    if date_from:
-        query["created_at"] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = datetime.fromisoformat(date_to)
-        else:
-            query["created_at"] = {"$lte": datetime.fromisoformat(date_to)}
-    
-    orders = await db.orders_fbo.find(query).sort("created_at", -1).to_list(1000)
-    
-    for order in orders:
-        order["id"] = str(order.pop("_id"))
+    date_range_query(query, "created_at", date_from, date_to)
+    
+    try:
+        orders, next_cursor = await list_orders(
+            db.orders_fbo, query, model_projection(OrderFBOResponse), limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not cursor:
+        response.headers[TOTAL_COUNT_HEADER] = str(await db.orders_fbo.count_documents(query))
     
     return orders
 
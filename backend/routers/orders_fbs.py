@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, Response
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import uuid
 import logging
 
@@ -9,7 +11,14 @@ from backend.schemas.order import OrderFBS, OrderFBSCreate, OrderFBSResponse, Or
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
 from backend.connectors import get_connector, MarketplaceError
-from backend.routers.stock_sync import sync_product_to_marketplace
+from backend.services.stock_outbox import StockOutbox
+from backend.services.inventory_ledger import InventoryLedger, InventoryLedgerError
+from backend.services.label_service import LabelService, LabelStore, label_url
+from backend.services.order_listing import (
+    list_orders, count_orders, date_range_query,
+    ORDER_LIST_DEFAULT_LIMIT, ORDER_LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER,
+    FBS_LIST_EXCLUDED_FIELDS
+)
 
 router = APIRouter(prefix="/api/orders/fbs", tags=["orders-fbs"])
 logger = logging.getLogger(__name__)
@@ -27,64 +36,23 @@ async def reserve_inventory_for_order(db, items: List[OrderItemNew], seller_id:
     - reserved += quantity
     - available -= quantity
     - quantity БЕЗ изменений!
+    
+    Все позиции резервируются атомарно (InventoryLedger): при нехватке
+    любой из них заказ не резервируется.
     """
-    for item in items:
-        # Найти товар по артикулу
-        product = await db.product_catalog.find_one({
-            "article": item.article,
-            "seller_id": seller_id
-        })
-        
-        if not product:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Товар {item.article} не найден в каталоге"
-            )
-        
-        product_id = product["_id"]
-        
-        # Найти inventory
-        inventory = await db.inventory.find_one({
-            "product_id": product_id,
-            "seller_id": seller_id
-        })
-        
-        if not inventory:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Остаток для товара {item.article} не найден"
-            )
-        
-        # Проверить доступность
-        if inventory.get("available", 0) < item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Недостаточно остатка для {item.article}. Доступно: {inventory.get('available', 0)}, требуется: {item.quantity}"
-            )
-        
-        # РЕЗЕРВ
-        await db.inventory.update_one(
-            {"_id": inventory["_id"]},
-            {
-                "$inc": {
-                    "reserved": item.quantity,
-                    "available": -item.quantity
-                }
-            }
+    try:
+        await InventoryLedger.apply(
+            db,
+            seller_id,
+            "reserve",
+            [(item.article, item.quantity) for item in items],
+            reason="Резерв для FBS заказа",
+            strict=True
         )
-        
-        # Записать в историю
-        await db.inventory_history.insert_one({
-            "product_id": product_id,
-            "seller_id": seller_id,
-            "operation_type": "reserve",
-            "quantity_change": 0,  # quantity не меняется
-            "reason": f"Резерв для FBS заказа",
-            "user_id": seller_id,
-            "created_at": datetime.utcnow()
-        })
-        
-        logger.info(f"[FBS] Зарезервирован товар {item.article}: {item.quantity} шт")
+    except InventoryLedgerError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    logger.info(f"[FBS] Зарезервировано {len(items)} позиций")
 
 
 async def deduct_inventory_for_order(db, items: List[OrderItemNew], seller_id: str, order_number: str):
@@ -96,52 +64,15 @@ async def deduct_inventory_for_order(db, items: List[OrderItemNew], seller_id: s
     - reserved = 0
     - available БЕЗ изменений (уже уменьшен при резерве)
     """
-    for item in items:
-        # Найти товар
-        product = await db.product_catalog.find_one({
-            "article": item.article,
-            "seller_id": seller_id
-        })
-        
-        if not product:
-            logger.error(f"[FBS] Товар {item.article} не найден при списании")
-            continue
-        
-        product_id = product["_id"]
-        
-        # Найти inventory
-        inventory = await db.inventory.find_one({
-            "product_id": product_id,
-            "seller_id": seller_id
-        })
-        
-        if not inventory:
-            logger.error(f"[FBS] Inventory для {item.article} не найден при списании")
-            continue
-        
-        # СПИСАНИЕ
-        await db.inventory.update_one(
-            {"_id": inventory["_id"]},
-            {
-                "$inc": {
-                    "quantity": -item.quantity,
-                    "reserved": -item.quantity
-                }
-            }
-        )
-        
-        # Записать в историю
-        await db.inventory_history.insert_one({
-            "product_id": product_id,
-            "seller_id": seller_id,
-            "operation_type": "sale",
-            "quantity_change": -item.quantity,
-            "reason": f"Списание для заказа {order_number}",
-            "user_id": seller_id,
-            "created_at": datetime.utcnow()
-        })
-        
-        logger.info(f"[FBS] Списан товар {item.article}: {item.quantity} шт (заказ {order_number})")
+    await InventoryLedger.apply(
+        db,
+        seller_id,
+        "deduct",
+        [(item.article, item.quantity) for item in items],
+        reason=f"Списание для заказа {order_number}"
+    )
+    
+    logger.info(f"[FBS] Списаны товары заказа {order_number}")
 
 
 async def return_inventory_for_order(db, items: List[OrderItemNew], seller_id: str, warehouse_id: str, order_number: str):
@@ -168,113 +99,355 @@ async def return_inventory_for_order(db, items: List[OrderItemNew], seller_id: s
         logger.info(f"[FBS] Возврат при отмене отключен для склада {warehouse.get('name')}")
         return
     
-    for item in items:
-        # Найти товар
-        product = await db.product_catalog.find_one({
-            "article": item.article,
-            "seller_id": seller_id
+    await InventoryLedger.apply(
+        db,
+        seller_id,
+        "release",
+        [(item.article, item.quantity) for item in items],
+        reason=f"Возврат при отмене заказа {order_number}"
+    )
+    
+    logger.info(f"[FBS] Возвращены товары заказа {order_number} (отмена)")
+
+
+async def sync_stocks_after_order_change(db, items: List[OrderItemNew], seller_id: str):
+    """
+    Синхронизировать остатки на все маркетплейсы после изменения заказа
+    
+    Изменения ставятся в очередь stock_outbox, отправку на МП делает фоновый воркер.
+    """
+    await StockOutbox.enqueue(
+        db,
+        seller_id,
+        [item.article for item in items],
+        source="order"
+    )
+
+
+async def _single_page(orders_coro):
+    """Список заказов коннектора без пагинации как одна страница"""
+    yield await orders_coro
+
+
+def _import_external_id(marketplace: str, order_data: dict) -> Optional[str]:
+    if marketplace == "ozon":
+        return order_data.get("posting_number")
+    if marketplace in ["wb", "wildberries", "yandex"]:
+        return str(order_data.get("id"))
+    return None
+
+
+def _import_order_articles(marketplace: str, order_data: dict) -> List[str]:
+    if marketplace == "ozon":
+        return [p.get("offer_id") for p in order_data.get("products", [])]
+    if marketplace == "yandex":
+        return [i.get("offerId") for i in order_data.get("items", [])]
+    return []
+
+
+def _build_import_order(
+    marketplace: str,
+    mp_order_data: dict,
+    external_id: str,
+    products_by_article: Dict[str, dict],
+    seller_id: str,
+    warehouse_id: str,
+    update_stock: bool
+) -> dict:
+    """Документ orders_fbs из заказа маркетплейса (товары уже найдены для всей страницы)"""
+    order_created_at = datetime.utcnow()
+    items = []
+    total_sum = 0
+    
+    def add_item(offer_id, name, price: float, quantity: int):
+        nonlocal total_sum
+        product = products_by_article.get(offer_id)
+        # ВСЕГДА добавляем товар в заказ, даже если не найден в каталоге
+        items.append({
+            "product_id": str(product["_id"]) if product else "",
+            "article": offer_id,
+            "name": name or (product.get("name", "") if product else ""),
+            "price": price,
+            "quantity": quantity,
+            "total": price * quantity
         })
+        total_sum += price * quantity
         
         if not product:
-            logger.error(f"[FBS] Товар {item.article} не найден при возврате")
-            continue
+            logger.warning(f"[FBS Import] Товар {offer_id} не найден в каталоге, но добавлен в заказ")
+    
+    if marketplace == "ozon":
+        # Извлечь реальную дату создания заказа от Ozon
+        order_created_at_str = mp_order_data.get("created_at") or mp_order_data.get("in_process_at")
+        if order_created_at_str:
+            try:
+                # Ozon возвращает дату в ISO формате: "2024-01-15T10:30:00Z"
+                from dateutil import parser as date_parser
+                order_created_at = date_parser.parse(order_created_at_str)
+            except:
+                order_created_at = datetime.utcnow()
         
-        product_id = product["_id"]
+        for prod in mp_order_data.get("products", []):
+            add_item(prod.get("offer_id"), prod.get("name"), float(prod.get("price", 0)), prod.get("quantity", 1))
         
-        # Найти inventory
-        inventory = await db.inventory.find_one({
-            "product_id": product_id,
-            "seller_id": seller_id
-        })
+        customer_data = {
+            "full_name": (mp_order_data.get("customer") or {}).get("name", ""),
+            "phone": (mp_order_data.get("customer") or {}).get("phone", ""),
+            "address": (mp_order_data.get("delivery_method") or {}).get("address", "")
+        }
+    
+    elif marketplace in ["wb", "wildberries"]:
+        # TODO: парсинг WB заказов
+        customer_data = {"full_name": "", "phone": ""}
+    
+    else:
+        # Yandex: реальная дата создания заказа, формат "02-02-2023"
+        created_date_str = mp_order_data.get("creationDate")
+        if created_date_str:
+            try:
+                order_created_at = datetime.strptime(created_date_str, "%d-%m-%Y")
+            except:
+                order_created_at = datetime.utcnow()
         
-        if not inventory:
-            logger.error(f"[FBS] Inventory для {item.article} не найден при возврате")
-            continue
+        for item in mp_order_data.get("items", []):
+            # offerId - артикул продавца
+            add_item(item.get("offerId"), item.get("offerName"), float(item.get("price", 0)), int(item.get("count", 1)))
         
-        # ВОЗВРАТ
-        await db.inventory.update_one(
-            {"_id": inventory["_id"]},
-            {
-                "$inc": {
-                    "reserved": -item.quantity,
-                    "available": item.quantity
-                }
-            }
-        )
+        # Парсинг покупателя
+        buyer = mp_order_data.get("buyer", {})
         
-        # Записать в историю
-        await db.inventory_history.insert_one({
-            "product_id": product_id,
-            "seller_id": seller_id,
-            "operation_type": "return",
-            "quantity_change": 0,  # quantity не меняется
-            "reason": f"Возврат при отмене заказа {order_number}",
-            "user_id": seller_id,
-            "created_at": datetime.utcnow()
-        })
+        # Парсинг адреса доставки
+        delivery = mp_order_data.get("delivery", {})
+        address_obj = delivery.get("address", {})
+        
+        # Формируем полный адрес
+        address_parts = []
+        if address_obj.get("city"):
+            address_parts.append(address_obj["city"])
+        if address_obj.get("street"):
+            address_parts.append(f"ул. {address_obj['street']}")
+        if address_obj.get("house"):
+            address_parts.append(f"д. {address_obj['house']}")
+        if address_obj.get("apartment"):
+            address_parts.append(f"кв. {address_obj['apartment']}")
         
-        logger.info(f"[FBS] Возвращён товар {item.article}: {item.quantity} шт (отмена {order_number})")
+        customer_data = {
+            "full_name": f"{buyer.get('lastName', '')} {buyer.get('firstName', '')} {buyer.get('middleName', '')}".strip(),
+            "phone": buyer.get("phone", ""),
+            "address": ", ".join(address_parts) if address_parts else ""
+        }
+    
+    # СОЗДАЁМ ЗАКАЗ ДАЖЕ ЕСЛИ ТОВАРЫ НЕ НАЙДЕНЫ В СИСТЕМЕ
+    if not items:
+        logger.warning(f"[FBS Import] Заказ {external_id}: товары не найдены в каталоге, создаём с пустым списком")
+    
+    return {
+        "seller_id": seller_id,
+        "warehouse_id": warehouse_id,
+        "marketplace": marketplace,
+        "external_order_id": external_id,
+        "order_number": external_id,  # Используем настоящий номер заказа с маркетплейса
+        "status": "imported",
+        "stock_updated": update_stock,
+        "customer": customer_data,
+        "items": items,
+        "totals": {
+            "subtotal": total_sum,
+            "shipping_cost": 0,
+            "marketplace_commission": 0,
+            "seller_payout": total_sum,
+            "total": total_sum
+        },
+        "created_at": order_created_at,  # Реальная дата от МП (WB - время импорта)
+        "updated_at": datetime.utcnow()
+    }
 
 
-async def sync_stocks_after_order_change(db, items: List[OrderItemNew], seller_id: str):
+async def _import_orders_page(
+    db,
+    marketplace: str,
+    mp_orders: List[dict],
+    seller_id: str,
+    warehouse: Optional[dict],
+    update_stock: bool,
+    seen_external_ids: set,
+    stats: Dict[str, int],
+    errors: List[dict]
+):
     """
-    Синхронизировать остатки на все маркетплейсы после изменения заказа
+    Импорт страницы заказов: товары и существующие заказы - одним $in-запросом
+    каждые, заказы - одним insert_many, остатки - одним bulk_write
     """
-    for item in items:
-        # Получить все склады с sends_stock=True
-        warehouses = await db.warehouses.find({
-            "seller_id": seller_id,
-            "sends_stock": True
-        }).to_list(length=100)
-        
-        # Получить текущий available остаток
-        product = await db.product_catalog.find_one({
-            "article": item.article,
-            "seller_id": seller_id
-        })
-        
-        if not product:
+    # ДЕДУПЛИКАЦИЯ ВНУТРИ ИМПОРТА
+    page_orders = []
+    for order_data in mp_orders:
+        ext_id = _import_external_id(marketplace, order_data)
+        if not ext_id:
+            logger.warning(f"[FBS Import] Пропущен заказ без ID")
             continue
-        
-        inventory = await db.inventory.find_one({
-            "product_id": product["_id"],
-            "seller_id": seller_id
-        })
-        
-        if not inventory:
+        if ext_id in seen_external_ids:
+            logger.warning(f"[FBS Import] ⚠️ Дубликат в батче: {ext_id} (пропускаем)")
             continue
-        
-        available = inventory.get("available", 0)
-        
-        # Отправить на каждый склад МП
-        for wh in warehouses:
-            try:
-                await sync_product_to_marketplace(
-                    db,
-                    seller_id,
-                    wh["id"],
-                    item.article,
-                    available
-                )
-                logger.info(f"[FBS] Синхронизирован остаток {item.article}: {available} на {wh.get('name')}")
-            except Exception as e:
-                logger.error(f"[FBS] Ошибка синхронизации {item.article} на {wh.get('name')}: {e}")
+        seen_external_ids.add(ext_id)
+        page_orders.append((ext_id, order_data))
+    
+    if not page_orders:
+        return
+    
+    # Уже загруженные заказы
+    existing = await db.orders_fbs.find(
+        {"seller_id": seller_id, "external_order_id": {"$in": [ext_id for ext_id, _ in page_orders]}},
+        {"external_order_id": 1}
+    ).to_list(length=None)
+    existing_ids = {doc["external_order_id"] for doc in existing}
+    
+    new_orders = [(ext_id, order_data) for ext_id, order_data in page_orders if ext_id not in existing_ids]
+    stats["updated"] += len(page_orders) - len(new_orders)
+    if not new_orders:
+        return
+    
+    if not warehouse:
+        errors.extend({"order": ext_id, "error": "Склад для заказов не найден"} for ext_id, _ in new_orders)
+        return
+    
+    # Товары всех заказов страницы
+    articles = list({
+        article
+        for _, order_data in new_orders
+        for article in _import_order_articles(marketplace, order_data)
+        if article
+    })
+    products_by_article: Dict[str, dict] = {}
+    if articles:
+        products = await db.product_catalog.find(
+            {"seller_id": seller_id, "article": {"$in": articles}},
+            {"article": 1, "name": 1}
+        ).to_list(length=None)
+        for product in products:
+            products_by_article.setdefault(product["article"], product)
+    
+    order_docs = [
+        _build_import_order(marketplace, order_data, ext_id, products_by_article, seller_id, warehouse["id"], update_stock)
+        for ext_id, order_data in new_orders
+    ]
+    
+    # СОЗДАТЬ ЗАКАЗЫ (с защитой от дубликатов уникальным индексом)
+    failed = set()
+    try:
+        await db.orders_fbs.insert_many(order_docs, ordered=False)
+    except BulkWriteError as bulk_error:
+        for write_error in bulk_error.details.get("writeErrors", []):
+            failed.add(write_error["index"])
+            external_id = order_docs[write_error["index"]]["external_order_id"]
+            if write_error.get("code") == 11000:
+                stats["skipped"] += 1
+                logger.warning(f"[FBS Import] ⚠️ Заказ {external_id} уже существует (защита индекса)")
+            else:
+                logger.error(f"[FBS Import] ❌ Ошибка создания заказа {external_id}: {write_error.get('errmsg')}")
+                errors.append({"order": external_id, "error": write_error.get("errmsg", "")})
+    
+    created = [doc for index, doc in enumerate(order_docs) if index not in failed]
+    stats["imported"] += len(created)
+    logger.info(f"[FBS Import] ✅ Создано заказов: {len(created)}")
+    
+    # ОБНОВИТЬ ОСТАТКИ (если чекбокс включен)
+    if update_stock and created:
+        stats["stock_updated"] += await _deduct_imported_orders(db, seller_id, created)
+
+
+async def _deduct_imported_orders(db, seller_id: str, orders: List[dict]) -> int:
+    """
+    Списать со склада товары импортированных заказов (quantity и available, не ниже 0)
+    
+    Остатки разрешаются одним запросом, списание - один bulk_write
+    с update-пайплайном (без чтения остатка), история - один insert_many.
+    """
+    resolved = await InventoryLedger.resolve(
+        db,
+        seller_id,
+        [item["article"] for order in orders for item in order["items"]]
+    )
+    
+    totals: Dict[str, int] = {}
+    history = []
+    now = datetime.utcnow()
+    for order in orders:
+        for item in order["items"]:
+            entry = resolved.get(item["article"])
+            if not entry or not entry["inventory_id"]:
+                continue
+            totals[item["article"]] = totals.get(item["article"], 0) + item["quantity"]
+            history.append({
+                "product_id": entry["product_id"],
+                "seller_id": seller_id,
+                "operation_type": "fbs_order",
+                "quantity_change": -item["quantity"],
+                "reason": f"FBS заказ {order['order_number']}",
+                "user_id": seller_id,
+                "created_at": now
+            })
+    
+    if not totals:
+        return 0
+    
+    # СПИСАТЬ СО СКЛАДА
+    await db.inventory.bulk_write([
+        UpdateOne(
+            {"_id": resolved[article]["inventory_id"]},
+            [{"$set": {
+                "quantity": {"$max": [0, {"$subtract": [{"$ifNull": ["$quantity", 0]}, quantity]}]},
+                "available": {"$max": [0, {"$subtract": [{"$ifNull": ["$available", 0]}, quantity]}]}
+            }}]
+        )
+        for article, quantity in totals.items()
+    ], ordered=False)
+    await db.inventory_history.insert_many(history)
+    
+    logger.info(f"[FBS Import] Списано позиций: {len(history)}")
+    return len(history)
 
 
 # ============================================================================
 # CRUD ENDPOINTS
 # ============================================================================
 
+@router.get("/stats")
+async def get_fbs_order_stats(
+    marketplace: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Количество FBS заказов всего и по статусам (для фильтров по статусу)
+    """
+    db = await get_database()
+    
+    query = {"seller_id": str(current_user["_id"])}
+    if marketplace:
+        query["marketplace"] = marketplace
+    date_range_query(query, "created_at", date_from, date_to)
+    
+    return await count_orders(db.orders_fbs, query)
+
+
 @router.get("")  # Убрал response_model
 async def get_fbs_orders(
+    response: Response,
     marketplace: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
+    limit: int = Query(ORDER_LIST_DEFAULT_LIMIT, ge=1, le=ORDER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Получить список FBS заказов с фильтрацией
+    
+    Страница без истории статусов и этикетки (они в деталях заказа).
+    Следующая страница - по курсору из заголовка X-Next-Cursor,
+    X-Total-Count (на первой странице) - число заказов по фильтру.
     """
     db = await get_database()
     
@@ -284,19 +457,23 @@ async def get_fbs_orders(
         query["marketplace"] = marketplace
     if status:
         query["status"] = status
-    if date_from:
-        query["created_at"] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = datetime.fromisoformat(date_to)
-        else:
-            query["created_at"] = {"$lte": datetime.fromisoformat(date_to)}
+    date_range_query(query, "created_at", date_from, date_to)
     
-    orders = await db.orders_fbs.find(query).sort("created_at", -1).to_list(1000)
+    try:
+        orders, next_cursor = await list_orders(
+            db.orders_fbs,
+            query,
+            {field: 0 for field in FBS_LIST_EXCLUDED_FIELDS},
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Convert ObjectId to string
-    for order in orders:
-        order["id"] = str(order.pop("_id"))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not cursor:
+        response.headers[TOTAL_COUNT_HEADER] = str(await db.orders_fbs.count_documents(query))
     
     return orders
 
@@ -371,7 +548,7 @@ async def update_fbs_order_status(
         update_data["reserve_status"] = "deducted"
         
         # Синхронизировать остатки на МП
-        background_tasks.add_task(sync_stocks_after_order_change, db, items, str(current_user["_id"]))
+        await sync_stocks_after_order_change(db, items, str(current_user["_id"]))
         
         logger.info(f"[FBS] Заказ {order['order_number']}: статус {old_status} → {new_status}, товары списаны")
     
@@ -384,7 +561,7 @@ async def update_fbs_order_status(
         update_data["cancelled_at"] = datetime.utcnow()
         
         # Синхронизировать остатки на МП
-        background_tasks.add_task(sync_stocks_after_order_change, db, items, str(current_user["_id"]))
+        await sync_stocks_after_order_change(db, items, str(current_user["_id"]))
         
         logger.info(f"[FBS] Заказ {order['order_number']}: статус {old_status} → {new_status}, товары возвращены")
     
@@ -449,11 +626,9 @@ async def import_fbs_orders(
         raise HTTPException(status_code=404, detail="Интеграция не найдена")
     
     marketplace = selected_integration.get("marketplace")
+    seller_id = str(current_user["_id"])
     
-    imported_count = 0
-    updated_count = 0
-    skipped_count = 0
-    stock_updated_count = 0
+    stats = {"imported": 0, "updated": 0, "skipped": 0, "stock_updated": 0}
     errors = []
     
     # Использовать ТОЛЬКО выбранную интеграцию
@@ -464,312 +639,48 @@ async def import_fbs_orders(
             selected_integration["api_key"]
         )
         
-        # Получить FBS заказы
+        # Получить FBS заказы (Ozon - постранично, по мере загрузки)
         if marketplace == "ozon":
-            mp_orders = await connector.get_fbs_orders(date_from, date_to)
+            pages = connector.iter_fbs_orders(date_from, date_to)
         elif marketplace in ["wb", "wildberries"]:
-            mp_orders = await connector.get_orders(date_from, date_to)
+            pages = _single_page(connector.get_orders(date_from, date_to))
         elif marketplace == "yandex":
             # Для Yandex campaign_id это и есть client_id
             campaign_id = selected_integration.get("client_id")
             if not campaign_id:
                 raise HTTPException(status_code=400, detail="client_id (campaign_id) не найден для Yandex")
-            mp_orders = await connector.get_orders(date_from, date_to, campaign_id)
+            pages = _single_page(connector.get_orders(date_from, date_to, campaign_id))
         else:
             raise HTTPException(status_code=400, detail=f"Неизвестный маркетплейс: {marketplace}")
         
-        logger.info(f"[FBS Import] {marketplace}: получено {len(mp_orders)} заказов от API")
-        
-        if len(mp_orders) > 0:
-            logger.info(f"[FBS Import] Первый заказ (пример): {mp_orders[0].get('posting_number', 'NO_ID')}")
+        # Склад с use_for_orders=True - один раз на весь импорт
+        warehouse = await db.warehouses.find_one({
+            "seller_id": seller_id,
+            "use_for_orders": True
+        })
         
-        # ДЕДУПЛИКАЦИЯ ВНУТРИ БАТЧА: проверить уникальность в полученном списке
+        # ДЕДУПЛИКАЦИЯ: external_id, уже встреченные в этом импорте
         seen_external_ids = set()
-        unique_orders = []
-        duplicate_in_batch = 0
+        received = 0
         
-        for order_data in mp_orders:
-            # Извлечь external_id в зависимости от МП
-            if marketplace == "ozon":
-                ext_id = order_data.get("posting_number")
-            elif marketplace in ["wb", "wildberries"]:
-                ext_id = str(order_data.get("id"))
-            elif marketplace == "yandex":
-                ext_id = str(order_data.get("id"))
-            else:
-                ext_id = None
-            
-            if not ext_id:
-                continue
-            
-            # Проверить дубликаты внутри батча
-            if ext_id in seen_external_ids:
-                duplicate_in_batch += 1
-                logger.warning(f"[FBS Import] ⚠️ Дубликат в батче: {ext_id} (пропускаем)")
-                continue
-            
-            seen_external_ids.add(ext_id)
-            unique_orders.append(order_data)
-        
-        if duplicate_in_batch > 0:
-            logger.warning(f"[FBS Import] ⚠️ Обнаружено {duplicate_in_batch} дубликатов внутри батча от API")
-        
-        logger.info(f"[FBS Import] После дедупликации: {len(unique_orders)} уникальных заказов")
+        async for mp_orders in pages:
+            received += len(mp_orders)
+            await _import_orders_page(
+                db, marketplace, mp_orders, seller_id, warehouse, update_stock,
+                seen_external_ids, stats, errors
+            )
         
-        # Обработать каждый УНИКАЛЬНЫЙ заказ
-        for mp_order_data in unique_orders:
-                # Парсинг данных заказа
-                if marketplace == "ozon":
-                    external_id = mp_order_data.get("posting_number")
-                    mp_status = mp_order_data.get("status")
-                    products = mp_order_data.get("products", [])
-                    
-                    # Извлечь реальную дату создания заказа от Ozon
-                    order_created_at_str = mp_order_data.get("created_at") or mp_order_data.get("in_process_at")
-                    if order_created_at_str:
-                        try:
-                            # Ozon возвращает дату в ISO формате: "2024-01-15T10:30:00Z"
-                            from dateutil import parser as date_parser
-                            order_created_at = date_parser.parse(order_created_at_str)
-                        except:
-                            order_created_at = datetime.utcnow()
-                    else:
-                        order_created_at = datetime.utcnow()
-                    
-                    items = []
-                    total_sum = 0
-                    
-                    for prod in products:
-                        offer_id = prod.get("offer_id")
-                        quantity = prod.get("quantity", 1)
-                        price = float(prod.get("price", 0))
-                        
-                        # Найти товар в системе
-                        product = await db.product_catalog.find_one({
-                            "article": offer_id,
-                            "seller_id": str(current_user["_id"])
-                        })
-                        
-                        # ВСЕГДА добавляем товар в заказ, даже если не найден в каталоге
-                        items.append({
-                            "product_id": str(product["_id"]) if product else "",
-                            "article": offer_id,
-                            "name": prod.get("name", product.get("name", "") if product else ""),
-                            "price": price,
-                            "quantity": quantity,
-                            "total": price * quantity
-                        })
-                        total_sum += price * quantity
-                        
-                        if not product:
-                            logger.warning(f"[FBS Import] Товар {offer_id} не найден в каталоге, но добавлен в заказ")
-                    
-                    customer_data = {
-                        "full_name": (mp_order_data.get("customer") or {}).get("name", ""),
-                        "phone": (mp_order_data.get("customer") or {}).get("phone", ""),
-                        "address": (mp_order_data.get("delivery_method") or {}).get("address", "")
-                    }
-                    
-                elif marketplace in ["wb", "wildberries"]:
-                    external_id = str(mp_order_data.get("id"))
-                    mp_status = mp_order_data.get("wbStatus", 0)
-                    
-                    # TODO: парсинг WB заказов
-                    items = []
-                    total_sum = 0
-                    customer_data = {"full_name": "", "phone": ""}
-                    
-                elif marketplace == "yandex":
-                    external_id = str(mp_order_data.get("id"))
-                    mp_status = mp_order_data.get("status")
-                    
-                    # Извлечь реальную дату создания заказа
-                    created_date_str = mp_order_data.get("creationDate")
-                    if created_date_str:
-                        try:
-                            # Yandex формат: "02-02-2023"
-                            order_created_at = datetime.strptime(created_date_str, "%d-%m-%Y")
-                        except:
-                            order_created_at = datetime.utcnow()
-                    else:
-                        order_created_at = datetime.utcnow()
-                    
-                    # Парсинг товаров
-                    items = []
-                    total_sum = 0
-                    
-                    for item in mp_order_data.get("items", []):
-                        offer_id = item.get("offerId")  # Артикул продавца
-                        quantity = int(item.get("count", 1))
-                        price = float(item.get("price", 0))
-                        
-                        # Найти товар в системе
-                        product = await db.product_catalog.find_one({
-                            "article": offer_id,
-                            "seller_id": str(current_user["_id"])
-                        })
-                        
-                        items.append({
-                            "product_id": str(product["_id"]) if product else "",
-                            "article": offer_id,
-                            "name": item.get("offerName", product.get("name", "") if product else ""),
-                            "price": price,
-                            "quantity": quantity,
-                            "total": price * quantity
-                        })
-                        total_sum += price * quantity
-                        
-                        if not product:
-                            logger.warning(f"[FBS Import] Товар {offer_id} не найден в каталоге, но добавлен в заказ")
-                    
-                    # Парсинг покупателя
-                    buyer = mp_order_data.get("buyer", {})
-                    
-                    # Парсинг адреса доставки
-                    delivery = mp_order_data.get("delivery", {})
-                    address_obj = delivery.get("address", {})
-                    
-                    # Формируем полный адрес
-                    address_parts = []
-                    if address_obj.get("city"):
-                        address_parts.append(address_obj["city"])
-                    if address_obj.get("street"):
-                        address_parts.append(f"ул. {address_obj['street']}")
-                    if address_obj.get("house"):
-                        address_parts.append(f"д. {address_obj['house']}")
-                    if address_obj.get("apartment"):
-                        address_parts.append(f"кв. {address_obj['apartment']}")
-                    
-                    full_address = ", ".join(address_parts) if address_parts else ""
-                    
-                    customer_data = {
-                        "full_name": f"{buyer.get('lastName', '')} {buyer.get('firstName', '')} {buyer.get('middleName', '')}".strip(),
-                        "phone": buyer.get("phone", ""),
-                        "address": full_address
-                    }
-                
-                else:
-                    continue
-                
-                if not external_id:
-                    logger.warning(f"[FBS Import] Пропущен заказ без ID")
-                    continue
-                
-                # СОЗДАЁМ ЗАКАЗ ДАЖЕ ЕСЛИ ТОВАРЫ НЕ НАЙДЕНЫ В СИСТЕМЕ
-                if not items:
-                    logger.warning(f"[FBS Import] Заказ {external_id}: товары не найдены в каталоге, создаём с пустым списком")
-                
-                # Проверить существует ли заказ
-                existing = await db.orders_fbs.find_one({
-                    "external_order_id": external_id,
-                    "seller_id": str(current_user["_id"])
-                })
-                
-                if existing:
-                    updated_count += 1
-                    logger.info(f"[FBS Import] Заказ {external_id} уже существует (пропускаем)")
-                    continue
-                
-                # Найти склад с use_for_orders=True
-                warehouse = await db.warehouses.find_one({
-                    "seller_id": str(current_user["_id"]),
-                    "use_for_orders": True
-                })
-                
-                if not warehouse:
-                    errors.append({"order": external_id, "error": "Склад для заказов не найден"})
-                    continue
-                
-                # СОЗДАТЬ ЗАКАЗ
-                order_doc = {
-                    "seller_id": str(current_user["_id"]),
-                    "warehouse_id": warehouse["id"],
-                    "marketplace": marketplace,
-                    "external_order_id": external_id,
-                    "order_number": external_id,  # Используем настоящий номер заказа с маркетплейса
-                    "status": "imported",
-                    "stock_updated": update_stock,
-                    "customer": customer_data,
-                    "items": items,
-                    "totals": {
-                        "subtotal": total_sum,
-                        "shipping_cost": 0,
-                        "marketplace_commission": 0,
-                        "seller_payout": total_sum,
-                        "total": total_sum
-                    },
-                    "created_at": order_created_at if marketplace in ["ozon", "yandex"] else datetime.utcnow(),  # Реальная дата от МП
-                    "updated_at": datetime.utcnow()
-                }
-                
-                # СОЗДАТЬ ЗАКАЗ (с защитой от дубликатов)
-                try:
-                    await db.orders_fbs.insert_one(order_doc)
-                    imported_count += 1
-                    logger.info(f"[FBS Import] ✅ Создан заказ {external_id}")
-                except Exception as insert_error:
-                    # Обработка ошибки дублирования (если индекс уникальности срабатывает)
-                    error_msg = str(insert_error)
-                    if "duplicate key error" in error_msg.lower() or "E11000" in error_msg:
-                        skipped_count += 1
-                        logger.warning(f"[FBS Import] ⚠️ Заказ {external_id} уже существует (защита индекса)")
-                        continue
-                    else:
-                        # Другая ошибка
-                        logger.error(f"[FBS Import] ❌ Ошибка создания заказа {external_id}: {insert_error}")
-                        errors.append({"order": external_id, "error": str(insert_error)})
-                        continue
-                
-                # ОБНОВИТЬ ОСТАТКИ (если чекбокс включен)
-                if update_stock:
-                    for item in items:
-                        product = await db.product_catalog.find_one({
-                            "article": item["article"],
-                            "seller_id": str(current_user["_id"])
-                        })
-                        
-                        if not product:
-                            continue
-                        
-                        inventory = await db.inventory.find_one({
-                            "product_id": product["_id"],
-                            "seller_id": str(current_user["_id"])
-                        })
-                        
-                        if not inventory:
-                            continue
-                        
-                        # СПИСАТЬ СО СКЛАДА
-                        new_qty = max(0, inventory.get("quantity", 0) - item["quantity"])
-                        new_avail = max(0, inventory.get("available", 0) - item["quantity"])
-                        
-                        await db.inventory.update_one(
-                            {"_id": inventory["_id"]},
-                            {"$set": {
-                                "quantity": new_qty,
-                                "available": new_avail
-                            }}
-                        )
-                        
-                        # Записать в историю
-                        await db.inventory_history.insert_one({
-                            "product_id": product["_id"],
-                            "seller_id": str(current_user["_id"]),
-                            "operation_type": "fbs_order",
-                            "quantity_change": -item["quantity"],
-                            "reason": f"FBS заказ {order_doc['order_number']}",
-                            "user_id": str(current_user["_id"]),
-                            "created_at": datetime.utcnow()
-                        })
-                        
-                        stock_updated_count += 1
-                        
-                        logger.info(f"[FBS Import] Списан товар {item['article']}: -{item['quantity']} шт")
+        logger.info(f"[FBS Import] {marketplace}: получено {received} заказов от API, уникальных {len(seen_external_ids)}")
     
     except Exception as e:
         logger.error(f"[FBS Import] Ошибка {marketplace}: {e}")
         errors.append({"marketplace": marketplace, "error": str(e)})
     
+    imported_count = stats["imported"]
+    updated_count = stats["updated"]
+    skipped_count = stats["skipped"]
+    stock_updated_count = stats["stock_updated"]
+    
     return {
         "message": f"Загружено {imported_count} новых заказов, пропущено {updated_count + skipped_count} дубликатов",
         "imported": imported_count,
@@ -1195,6 +1106,28 @@ async def split_fbs_order(
 # ПЕЧАТЬ ЭТИКЕТОК
 # ============================================================================
 
+@router.get("/labels/file/{label_id}")
+async def get_label_file(
+    label_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    PDF этикетки из хранилища (только этикетки своего продавца)
+
+    Фронтенд загружает файл с токеном (blob), ссылка без токена не открывается.
+    """
+    db = await get_database()
+    content = await LabelStore.get(db, label_id, str(current_user["_id"]))
+    if content is None:
+        raise HTTPException(status_code=404, detail="Этикетка не найдена")
+
+    return Response(
+        content=content,
+        media_type="application/pdf",
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+
 @router.get("/{order_id}/label")
 async def get_order_label(
     order_id: str,
@@ -1203,91 +1136,47 @@ async def get_order_label(
     """
     Получить этикетку для заказа
     
-    Если этикетка уже загружена - вернуть из БД
+    Если этикетка уже загружена - вернуть из хранилища
     Иначе - получить с МП и сохранить
     """
     db = await get_database()
+    seller_id = str(current_user["_id"])
     
     # Найти заказ
     order = await db.orders_fbs.find_one({
         "_id": ObjectId(order_id),
-        "seller_id": str(current_user["_id"])
+        "seller_id": seller_id
     })
     
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
-    # Проверить есть ли уже этикетка
-    if order.get("label_url"):
+    # Этикетки, сохранённые до хранилища, - ссылкой в самом заказе
+    if order.get("label_url") and not order.get("label_id"):
         logger.info(f"[Label] Returning cached label for {order['order_number']}")
         return {
             "label_url": order["label_url"],
             "cached": True
         }
     
-    # Загрузить этикетку с МП
-    marketplace = order["marketplace"]
-    external_id = order["external_order_id"]
-    
-    # Получить коннектор
-    profile = await db.seller_profiles.find_one({"user_id": current_user["_id"]})
-    api_keys = profile.get("api_keys", [])
-    integration = next((k for k in api_keys if k["marketplace"] == marketplace), None)
-    
-    if not integration:
-        raise HTTPException(status_code=404, detail=f"Интеграция {marketplace} не найдена")
-    
-    connector = get_connector(
-        marketplace,
-        integration.get("client_id", ""),
-        integration["api_key"]
-    )
+    profile = None
+    if not order.get("label_id"):
+        profile = await db.seller_profiles.find_one({"user_id": current_user["_id"]})
     
     try:
-        label_url = await connector.get_label(external_id)
-        
-        if not label_url:
-            raise HTTPException(status_code=404, detail="Этикетка недоступна")
-        
-        # Сохранить в БД
-        await db.orders_fbs.update_one(
-            {"_id": ObjectId(order_id)},
-            {
-                "$set": {
-                    "label_url": label_url,
-                    "label_updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Добавить в историю
-        await db.orders_fbs.update_one(
-            {"_id": ObjectId(order_id)},
-            {
-                "$push": {
-                    "status_history": {
-                        "status": order["status"],
-                        "action": "label_printed",
-                        "changed_at": datetime.utcnow(),
-                        "changed_by": str(current_user["_id"]),
-                        "comment": "Этикетка загружена"
-                    }
-                }
-            }
-        )
-        
-        logger.info(f"[Label] Label saved for {order['order_number']}")
-        
-        return {
-            "label_url": label_url,
-            "cached": False
-        }
-    
-    except MarketplaceError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.message)
+        labels, errors = await LabelService.fetch_labels(db, profile, seller_id, [order], seller_id)
     except Exception as e:
         logger.error(f"[Label] Unexpected error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    if errors:
+        raise HTTPException(status_code=errors[0]["status_code"], detail=errors[0]["error"])
+    
+    return {
+        "label_id": labels[order_id],
+        "label_url": label_url(labels[order_id]),
+        "cached": bool(order.get("label_id"))
+    }
 
 
 @router.post("/{order_id}/label/refresh")
@@ -1304,7 +1193,7 @@ async def refresh_order_label(
     await db.orders_fbs.update_one(
         {"_id": ObjectId(order_id)},
         {
-            "$unset": {"label_url": "", "label_updated_at": ""}
+            "$unset": {"label_id": "", "label_url": "", "label_updated_at": ""}
         }
     )
     
@@ -1320,35 +1209,72 @@ async def get_bulk_labels(
     """
     Массовая загрузка этикеток
     
+    Заказы читаются одним запросом, этикетки запрашиваются у МП пачками
+    параллельно (LabelService). Все этикетки дополнительно склеиваются
+    в один PDF для печати (merged_label_url).
+    
     Body: {
         order_ids: [str, ...]
     }
     """
     db = await get_database()
+    seller_id = str(current_user["_id"])
     order_ids = data.get("order_ids", [])
     
     if not order_ids:
         raise HTTPException(status_code=400, detail="order_ids обязателен")
     
-    results = []
     errors = []
+    object_ids = []
+    for order_id in order_ids:
+        if ObjectId.is_valid(order_id):
+            object_ids.append(ObjectId(order_id))
+        else:
+            errors.append({"order_id": order_id, "error": "Некорректный ID заказа"})
+    
+    orders = await db.orders_fbs.find(
+        {"_id": {"$in": object_ids}, "seller_id": seller_id},
+        {"marketplace": 1, "external_order_id": 1, "order_number": 1, "status": 1, "label_id": 1, "label_url": 1}
+    ).to_list(length=None)
+    orders_by_id = {str(order["_id"]): order for order in orders}
+    
+    legacy = {
+        order_id: order["label_url"]
+        for order_id, order in orders_by_id.items()
+        if order.get("label_url") and not order.get("label_id")
+    }
+    pending = [order for order_id, order in orders_by_id.items() if order_id not in legacy]
     
+    profile = None
+    if any(not order.get("label_id") for order in pending):
+        profile = await db.seller_profiles.find_one({"user_id": current_user["_id"]})
+    
+    labels, fetch_errors = await LabelService.fetch_labels(db, profile, seller_id, pending, seller_id)
+    errors.extend({"order_id": e["order_id"], "error": e["error"]} for e in fetch_errors)
+    
+    results = []
     for order_id in order_ids:
-        try:
-            label_data = await get_order_label(order_id, current_user)
-            results.append({
-                "order_id": order_id,
-                "label_url": label_data["label_url"]
-            })
-        except Exception as e:
-            errors.append({
-                "order_id": order_id,
-                "error": str(e)
-            })
+        if order_id in labels:
+            results.append({"order_id": order_id, "label_url": label_url(labels[order_id])})
+        elif order_id in legacy:
+            results.append({"order_id": order_id, "label_url": legacy[order_id]})
+        elif ObjectId.is_valid(order_id) and order_id not in orders_by_id:
+            errors.append({"order_id": order_id, "error": "Заказ не найден"})
+    
+    merged_label_url = None
+    try:
+        merged_id = await LabelService.build_print_run(
+            db, seller_id, [labels[order_id] for order_id in order_ids if order_id in labels]
+        )
+        if merged_id:
+            merged_label_url = label_url(merged_id)
+    except Exception as e:
+        logger.error(f"[Label] Failed to merge labels: {e}")
     
     return {
         "message": f"Загружено {len(results)} этикеток",
         "labels": results,
+        "merged_label_url": merged_label_url,
         "errors": errors
     }
 
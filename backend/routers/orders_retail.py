@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks, Response
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
@@ -8,6 +8,10 @@ import logging
 from backend.schemas.order import OrderRetail, OrderRetailCreate, OrderRetailResponse, OrderItemNew, OrderCustomerNew, OrderTotalsNew, OrderStatusUpdateNew, OrderStatusHistory
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
+from backend.services.order_listing import (
+    list_orders, count_orders, date_range_query, model_projection,
+    ORDER_LIST_DEFAULT_LIMIT, ORDER_LIST_MAX_LIMIT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+)
 
 router = APIRouter(prefix="/api/orders/retail", tags=["orders-retail"])
 logger = logging.getLogger(__name__)
@@ -21,15 +25,36 @@ from backend.routers.orders_fbs import (
 )
 
 
+@router.get("/stats")
+async def get_retail_order_stats(
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Количество розничных заказов всего и по статусам
+    """
+    db = await get_database()
+    
+    query = date_range_query({"seller_id": str(current_user["_id"])}, "created_at", date_from, date_to)
+    return await count_orders(db.orders_retail, query)
+
+
 @router.get("", response_model=List[OrderRetailResponse])
 async def get_retail_orders(
+    response: Response,
     status: Optional[str] = Query(None),
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
+    limit: int = Query(ORDER_LIST_DEFAULT_LIMIT, ge=1, le=ORDER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Получить список розничных заказов
+    
+    Страница без истории статусов (она в деталях заказа).
+    Следующая страница - по курсору из заголовка X-Next-Cursor
     """
     db = await get_database()
     
@@ -37,18 +62,23 @@ async def get_retail_orders(
     
     if status:
         query["status"] = status
-    if date_from:
-        query["created_at"] = {"$gte": datetime.fromisoformat(date_from)}
-    if date_to:
-        if "created_at" in query:
-            query["created_at"]["$lte"] = datetime.fromisoformat(date_to)
-        else:
-            query["created_at"] = {"$lte": datetime.fromisoformat(date_to)}
+    date_range_query(query, "created_at", date_from, date_to)
     
-    orders = await db.orders_retail.find(query).sort("created_at", -1).to_list(1000)
+    try:
+        orders, next_cursor = await list_orders(
+            db.orders_retail,
+            query,
+            model_projection(OrderRetailResponse, exclude=("status_history",)),
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    for order in orders:
-        order["id"] = str(order.pop("_id"))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not cursor:
+        response.headers[TOTAL_COUNT_HEADER] = str(await db.orders_retail.count_documents(query))
     
     return orders
 
@@ -201,7 +231,7 @@ async def update_retail_order_status(
         update_data["completed_at"] = datetime.utcnow()
         
         # Синхронизировать остатки на МП
-        background_tasks.add_task(sync_stocks_after_order_change, db, items, str(current_user["_id"]))
+        await sync_stocks_after_order_change(db, items, str(current_user["_id"]))
         
         logger.info(f"[RETAIL] Заказ {order['order_number']}: статус {old_status} → {new_status}, товары списаны")
     
@@ -214,7 +244,7 @@ async def update_retail_order_status(
         update_data["cancelled_at"] = datetime.utcnow()
         
         # Синхронизировать остатки на МП
-        background_tasks.add_task(sync_stocks_after_order_change, db, items, str(current_user["_id"]))
+        await sync_stocks_after_order_change(db, items, str(current_user["_id"]))
         
         logger.info(f"[RETAIL] Заказ {order['order_number']}: статус {old_status} → {new_status}, товары возвращены")
     
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Query
 from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime
+import asyncio
 import logging
 import pandas as pd
 from io import BytesIO
@@ -33,7 +34,7 @@ async def upload_order_realization_report(
     content = await file.read()
     
     try:
-        result = parse_ozon_order_realization_report(content, seller_id)
+        result = await asyncio.to_thread(parse_ozon_order_realization_report, content, seller_id)
     except Exception as e:
         logger.error(f"Parsing error: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Ошибка парсинга: {str(e)}")
@@ -78,7 +79,7 @@ async def upload_loyalty_report(
     content = await file.read()
     
     try:
-        result = parse_loyalty_report(content, seller_id)
+        result = await asyncio.to_thread(parse_loyalty_report, content, seller_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка: {str(e)}")
     
@@ -103,7 +104,7 @@ async def upload_acquiring_report(
     content = await file.read()
     
     try:
-        result = parse_acquiring_report(content, seller_id)
+        result = await asyncio.to_thread(parse_acquiring_report, content, seller_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка: {str(e)}")
     
@@ -124,7 +125,7 @@ async def upload_rfbs_logistics_report(
     content = await file.read()
     
     try:
-        result = parse_rfbs_logistics_report(content, seller_id)
+        result = await asyncio.to_thread(parse_rfbs_logistics_report, content, seller_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка: {str(e)}")
     
@@ -149,7 +150,7 @@ async def upload_fbo_fbs_services_report(
     content = await file.read()
     
     try:
-        result = parse_fbo_fbs_services_report(content, seller_id)
+        result = await asyncio.to_thread(parse_fbo_fbs_services_report, content, seller_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка: {str(e)}")
     
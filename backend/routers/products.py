@@ -193,13 +193,11 @@ async def import_all_marketplace_products(
     Import ALL products from marketplace (Frontend Sync style).
     """
     try:
-        # 1. Fetch all
-        products = await ProductService.get_marketplace_products(marketplace, str(current_user["_id"]), api_key_id)
-        
-        # 2. Import all
+        # Страницы каталога импортируются по мере получения от маркетплейса
+        pages = ProductService.iter_marketplace_products(marketplace, str(current_user["_id"]), api_key_id)
         result = await ProductService.import_from_marketplace(
             marketplace, 
-            products, 
+            pages, 
             str(current_user["_id"])
         )
         return result
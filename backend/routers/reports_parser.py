@@ -8,6 +8,7 @@ from datetime import datetime
 import pandas as pd
 from io import BytesIO
 import uuid
+import asyncio
 
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
@@ -16,106 +17,224 @@ from backend.routers.analytics_profit import OzonFinancialTransaction
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
 
-async def parse_ozon_transaction_excel(file_content: bytes, seller_id: str) -> list:
+def _or_columns(df: pd.DataFrame, names: list, default=None) -> pd.Series:
     """
-    Парсинг Excel отчета о транзакциях от Ozon
+    Поколоночный аналог row.get(names[0]) or row.get(names[1]) or ... [or default]
     
-    Поддерживаемые отчеты:
-    - Отчет о суммах услуг и расходах на реализацию
-    - УПД-1 к отчету о реализации
-    - Отчет о перевыставлении услуг
+    Как и у `or`, берётся первое "истинное" значение, иначе последний операнд.
     """
-    try:
-        df = pd.read_excel(BytesIO(file_content), sheet_name=0)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ошибка чтения Excel файла: {str(e)}")
+    def column(name):
+        if name in df.columns:
+            return df[name].astype(object)
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    
+    operands = [column(name) for name in names]
+    if default is not None:
+        operands.append(pd.Series([default] * len(df), index=df.index, dtype=object))
+    
+    result = operands[-1]
+    for operand in reversed(operands[:-1]):
+        truthy = operand.map(bool).astype(bool)
+        result = operand.where(truthy, result)
+    return result
+
+
+def _convert_column(values: pd.Series, convert, fast_dtype=None):
+    """
+    convert(value) для каждой ячейки
+    
+    Returns:
+        (значения, маска ячеек, где convert упал)
+    """
+    if fast_dtype is not None:
+        try:
+            return values.astype(fast_dtype), pd.Series(False, index=values.index)
+        except (TypeError, ValueError, OverflowError):
+            pass
     
+    def safe(value):
+        try:
+            return convert(value)
+        except Exception:
+            return None
+    
+    converted = values.map(safe)
+    failed = converted.isna() & values.notna()
+    return converted, failed
+
+
+def _operation_date_column(values: pd.Series):
+    """
+    Дата операции: строки - datetime.fromisoformat, остальное - pd.to_datetime
+    
+    Returns:
+        (даты, маска ячеек, которые не удалось разобрать)
+    """
+    is_text = values.map(lambda value: isinstance(value, str)).astype(bool)
+    dates = pd.Series(None, index=values.index, dtype=object)
+    failed = pd.Series(False, index=values.index)
+    
+    if is_text.any():
+        parsed, text_failed = _convert_column(
+            values[is_text],
+            lambda value: datetime.fromisoformat(value.replace('Z', '+00:00'))
+        )
+        dates[is_text] = parsed
+        failed[is_text] = text_failed
+    
+    others = values[~is_text]
+    if len(others):
+        try:
+            dates[~is_text] = pd.to_datetime(others).astype(object)
+        except (TypeError, ValueError):
+            parsed, others_failed = _convert_column(others, pd.to_datetime)
+            dates[~is_text] = parsed
+            failed[~is_text] = others_failed
+    
+    return dates, failed
+
+
+def _money_column(values: pd.Series):
+    """float(value), пустые -> 0.0"""
+    missing = values.isna()
+    amounts, failed = _convert_column(values.where(~missing, 0.0), float, float)
+    return amounts.astype(float), failed
+
+
+def parse_ozon_transaction_frame(df: pd.DataFrame, seller_id: str) -> list:
+    """
+    Разбор прочитанного листа с транзакциями Ozon (поколоночно, без iterrows)
+    
+    Строки без даты или номера отправления пропускаются, строки с
+    некорректными значениями - пропускаются с сообщением в лог.
+    """
     transactions = []
     
     # Попробуем определить тип отчета по колонкам
     columns = [str(col).lower() for col in df.columns]
     
     # Если есть колонки характерные для финансового отчета Ozon
-    if any('постинг' in col or 'posting' in col for col in columns):
-        # Парсим построчно
-        for index, row in df.iterrows():
-            try:
-                # Базовые поля
-                operation_date_str = row.get('Дата операции') or row.get('operation_date')
-                posting_number = row.get('Номер отправления') or row.get('posting_number')
-                amount = row.get('Цена продажи') or row.get('amount') or 0
-                
-                if pd.isna(operation_date_str) or pd.isna(posting_number):
-                    continue
-                
-                # Парсим дату
-                if isinstance(operation_date_str, str):
-                    operation_date = datetime.fromisoformat(operation_date_str.replace('Z', '+00:00'))
-                else:
-                    operation_date = pd.to_datetime(operation_date_str)
-                
-                # Расходы
-                commission = row.get('Комиссия') or row.get('commission') or 0
-                logistics = row.get('Логистика') or row.get('logistics') or 0
-                services = row.get('Услуги') or row.get('services') or 0
-                
-                # Товары
-                product_name = row.get('Товар') or row.get('product_name') or ''
-                sku = row.get('Артикул') or row.get('sku') or ''
-                quantity = row.get('Количество') or row.get('quantity') or 1
-                
-                transaction = {
-                    "seller_id": seller_id,
-                    "marketplace": "ozon",
-                    "transaction_id": f"EXCEL-{uuid.uuid4()}",
-                    "order_id": str(posting_number),
-                    "posting_number": str(posting_number),
-                    "operation_date": operation_date,
-                    "operation_type": "orders",
-                    "amount": float(amount) if not pd.isna(amount) else 0.0,
-                    "breakdown": {
-                        "commission": {
-                            "base_commission": float(commission) if not pd.isna(commission) else 0.0,
-                            "bonus_commission": 0.0,
-                            "total": float(commission) if not pd.isna(commission) else 0.0
-                        },
-                        "logistics": {
-                            "delivery_to_customer": float(logistics) if not pd.isna(logistics) else 0.0,
-                            "last_mile": 0.0,
-                            "returns": 0.0,
-                            "total": float(logistics) if not pd.isna(logistics) else 0.0
-                        },
-                        "services": {
-                            "storage": 0.0,
-                            "acquiring": 0.0,
-                            "pvz_fee": 0.0,
-                            "packaging": 0.0,
-                            "total": float(services) if not pd.isna(services) else 0.0
-                        },
-                        "penalties": {"total": 0.0},
-                        "other_charges": {"total": 0.0}
-                    },
-                    "items": [{
-                        "sku": str(sku),
-                        "name": str(product_name),
-                        "quantity": int(quantity) if not pd.isna(quantity) else 1,
-                        "price": float(amount) if not pd.isna(amount) else 0.0
-                    }],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow(),
-                    "data_source": "excel",
-                    "raw_data": {}
-                }
-                
-                transactions.append(transaction)
-                
-            except Exception as e:
-                print(f"Ошибка парсинга строки {index}: {str(e)}")
-                continue
+    if not any('постинг' in col or 'posting' in col for col in columns) or df.empty:
+        return transactions
+    
+    # Базовые поля
+    operation_dates = _or_columns(df, ['Дата операции', 'operation_date'])
+    posting_numbers = _or_columns(df, ['Номер отправления', 'posting_number'])
+    
+    rows = operation_dates.notna() & posting_numbers.notna()
+    df = df[rows]
+    operation_dates = operation_dates[rows]
+    posting_numbers = posting_numbers[rows]
+    
+    amount = _or_columns(df, ['Цена продажи', 'amount'], 0)
+    
+    # Расходы
+    commission = _or_columns(df, ['Комиссия', 'commission'], 0)
+    logistics = _or_columns(df, ['Логистика', 'logistics'], 0)
+    services = _or_columns(df, ['Услуги', 'services'], 0)
+    
+    # Товары
+    product_name = _or_columns(df, ['Товар', 'product_name'], '')
+    sku = _or_columns(df, ['Артикул', 'sku'], '')
+    quantity = _or_columns(df, ['Количество', 'quantity'], 1)
+    
+    # Парсим дату
+    dates, dates_failed = _operation_date_column(operation_dates)
+    
+    amounts, amount_failed = _money_column(amount)
+    commissions, commission_failed = _money_column(commission)
+    logistics_costs, logistics_failed = _money_column(logistics)
+    services_costs, services_failed = _money_column(services)
+    
+    quantity_missing = quantity.isna()
+    quantities, quantity_failed = _convert_column(quantity.where(~quantity_missing, 1), int)
+    
+    failed = dates_failed | amount_failed | commission_failed | logistics_failed | services_failed | quantity_failed
+    for index in failed[failed].index:
+        print(f"Ошибка парсинга строки {index}: некорректное значение в строке")
+    
+    valid = ~failed
+    now = datetime.utcnow()
+    
+    for (posting_number, operation_date, amount_value, commission_value, logistics_value,
+         services_value, name, sku_value, quantity_value) in zip(
+        posting_numbers[valid].map(str).tolist(),
+        dates[valid].tolist(),
+        amounts[valid].tolist(),
+        commissions[valid].tolist(),
+        logistics_costs[valid].tolist(),
+        services_costs[valid].tolist(),
+        product_name[valid].map(str).tolist(),
+        sku[valid].map(str).tolist(),
+        quantities[valid].tolist()
+    ):
+        transactions.append({
+            "seller_id": seller_id,
+            "marketplace": "ozon",
+            "transaction_id": f"EXCEL-{uuid.uuid4()}",
+            "order_id": posting_number,
+            "posting_number": posting_number,
+            "operation_date": operation_date,
+            "operation_type": "orders",
+            "amount": amount_value,
+            "breakdown": {
+                "commission": {
+                    "base_commission": commission_value,
+                    "bonus_commission": 0.0,
+                    "total": commission_value
+                },
+                "logistics": {
+                    "delivery_to_customer": logistics_value,
+                    "last_mile": 0.0,
+                    "returns": 0.0,
+                    "total": logistics_value
+                },
+                "services": {
+                    "storage": 0.0,
+                    "acquiring": 0.0,
+                    "pvz_fee": 0.0,
+                    "packaging": 0.0,
+                    "total": services_value
+                },
+                "penalties": {"total": 0.0},
+                "other_charges": {"total": 0.0}
+            },
+            "items": [{
+                "sku": sku_value,
+                "name": name,
+                "quantity": int(quantity_value),
+                "price": amount_value
+            }],
+            "created_at": now,
+            "updated_at": now,
+            "data_source": "excel",
+            "raw_data": {}
+        })
     
     return transactions
 
 
+async def parse_ozon_transaction_excel(file_content: bytes, seller_id: str) -> list:
+    """
+    Парсинг Excel отчета о транзакциях от Ozon
+    
+    Поддерживаемые отчеты:
+    - Отчет о суммах услуг и расходах на реализацию
+    - УПД-1 к отчету о реализации
+    - Отчет о перевыставлении услуг
+    
+    Чтение и разбор выполняются в отдельном потоке, чтобы не блокировать event loop.
+    """
+    def parse():
+        try:
+            df = pd.read_excel(BytesIO(file_content), sheet_name=0)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Ошибка чтения Excel файла: {str(e)}")
+        return parse_ozon_transaction_frame(df, seller_id)
+    
+    return await asyncio.to_thread(parse)
+
+
 @router.post("/upload-excel")
 async def upload_excel_report(
     file: UploadFile = File(...),
@@ -1,170 +1,285 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import uuid
 from bson import ObjectId
+from pymongo import UpdateOne
 import logging
 
 from backend.core.database import get_database
 from backend.auth_utils import get_current_user
-from backend.connectors import get_connector, MarketplaceError
+from backend.connectors import MarketplaceError
+from backend.services.credentials import CredentialRegistry
 
 router = APIRouter(prefix="/api/stock-sync", tags=["stock-sync"])
 logger = logging.getLogger(__name__)
 
 
-async def sync_product_to_marketplace(
+# Максимальное число позиций в одном запросе обновления остатков
+STOCK_BATCH_LIMITS = {
+    "ozon": 100,
+    "wb": 1000,
+    "wildberries": 1000,
+    "yandex": 2000,
+}
+
+
+def _resolve_marketplace_sku(product: Dict[str, Any], marketplace: str, product_article: str) -> Optional[str]:
+    """Маркетплейс-специфичный SKU/ID товара (None - товар не выгружен на МП)"""
+    marketplace_data = product.get("marketplace_data", {}).get(marketplace, {})
+    
+    # Если нет данных для этого МП - пропускаем товар
+    if not marketplace_data:
+        return None
+    
+    # Для каждого МП свой идентификатор
+    if marketplace == "ozon":
+        # Для Ozon используем offer_id (артикул продавца)
+        return marketplace_data.get("id") or product_article
+    elif marketplace in ["wb", "wildberries"]:
+        # Для WB используем barcode (штрихкод)
+        return marketplace_data.get("barcode") or marketplace_data.get("id")
+    elif marketplace == "yandex":
+        # Для Yandex используем SKU
+        return marketplace_data.get("id") or product_article
+    return product_article
+
+
+def _stock_item(marketplace: str, mp_sku: str, quantity: int) -> Dict[str, Any]:
+    """Позиция остатка в формате update_stock конкретного МП"""
+    if marketplace == "ozon":
+        return {"offer_id": mp_sku, "stock": quantity}
+    elif marketplace in ["wb", "wildberries"]:
+        return {"sku": mp_sku, "amount": quantity}
+    return {"sku": mp_sku, "count": quantity}
+
+
+def _link_key(link: Dict[str, Any]) -> str:
+    return str(link.get("id") or link.get("_id"))
+
+
+async def filter_changed_stock(
+    db,
+    link: Dict[str, Any],
+    rows: List[Tuple[str, str, int]]
+) -> List[Tuple[str, str, int]]:
+    """
+    Оставить только позиции, остаток которых изменился с последней успешной
+    отправки на этот склад МП (коллекция stock_push_snapshots).
+    
+    Args:
+        rows: [(article, mp_sku, quantity), ...]
+    """
+    if not rows:
+        return rows
+    
+    snapshot = await db.stock_push_snapshots.find(
+        {"link_id": _link_key(link), "mp_sku": {"$in": [mp_sku for _, mp_sku, _ in rows]}},
+        {"mp_sku": 1, "quantity": 1}
+    ).to_list(length=None)
+    last_pushed = {doc["mp_sku"]: doc.get("quantity") for doc in snapshot}
+    
+    return [row for row in rows if last_pushed.get(row[1]) != row[2]]
+
+
+async def save_pushed_stock(
+    db,
+    link: Dict[str, Any],
+    rows: List[Tuple[str, str, int]]
+) -> None:
+    """Запомнить успешно отправленные остатки для (связь склада, SKU МП)"""
+    if not rows:
+        return
+    
+    link_id = _link_key(link)
+    pushed_at = datetime.utcnow()
+    await db.stock_push_snapshots.bulk_write([
+        UpdateOne(
+            {"link_id": link_id, "mp_sku": mp_sku},
+            {"$set": {
+                "quantity": quantity,
+                "product_article": article,
+                "warehouse_id": link.get("warehouse_id"),
+                "marketplace": link.get("marketplace_name"),
+                "marketplace_warehouse_id": link.get("marketplace_warehouse_id"),
+                "pushed_at": pushed_at
+            }},
+            upsert=True
+        )
+        for article, mp_sku, quantity in rows
+    ], ordered=False)
+
+
+async def sync_products_to_marketplace(
     db,
     user_id,
     warehouse_id: str,
-    product_article: str,
-    quantity: int
-):
+    items: List[Tuple[str, int]],
+    only_changed: bool = False,
+    marketplace: Optional[str] = None
+) -> Dict[str, int]:
     """
-    Синхронизировать остаток ОДНОГО товара на ВСЕ связанные склады маркетплейсов
+    Синхронизировать остатки МНОГИХ товаров на ВСЕ связанные склады маркетплейсов
     
-    Логика (как в SelsUp):
-    - Получить все связи склада с МП
-    - Для каждой связи отправить ОДИНАКОВЫЙ остаток
-    - Записать в историю синхронизации
+    Склад, связи, товары и API ключи читаются один раз, остатки уходят
+    батчами максимального размера для каждого МП (Ozon 100, WB 1000).
+    
+    Args:
+        items: [(article, quantity), ...]
+        only_changed: отправлять только позиции, изменившиеся с последней
+            успешной отправки (дельта); иначе - все (полная сверка)
+        marketplace: только связи с этим маркетплейсом (None - все связи склада)
+    
+    Returns:
+        {"synced": int, "failed": int, "skipped": int, "unchanged": int} - количество позиций по всем связям
     """
-    # Получить склад
+    stats = {"synced": 0, "failed": 0, "skipped": 0, "unchanged": 0}
+    if not items:
+        return stats
+    
     # ИСПРАВЛЕНО: В базе данных склад хранится с _id как UUID строка (не ObjectId)
     # warehouse_id из запроса - это UUID строка, которая используется как _id
     warehouse = await db.warehouses.find_one({"_id": warehouse_id})
     
     if not warehouse:
         logger.warning(f"Warehouse {warehouse_id} not found")
-        return
+        return stats
     
     # Проверка: передавать ли остатки?
     # Проверяем оба поля для совместимости: transfer_stock (новое) и sends_stock (старое)
     transfer_enabled = warehouse.get("transfer_stock", warehouse.get("sends_stock", True))
     if not transfer_enabled:
         logger.info(f"[SYNC] Warehouse {warehouse.get('name')} has transfer_stock=False, skipping")
-        return
+        return stats
     
-    # Получить все связи склада
-    links = await db.warehouse_links.find({"warehouse_id": warehouse_id}).to_list(length=100)
+    links_query = {"warehouse_id": warehouse_id}
+    if marketplace:
+        links_query["marketplace_name"] = marketplace
+    links = await db.warehouse_links.find(links_query).to_list(length=100)
     
     if not links:
         logger.warning(f"[SYNC] ⚠️ No warehouse_links found for warehouse {warehouse_id} ({warehouse.get('name')})")
         logger.warning(f"[SYNC] ⚠️ Cannot send stock to marketplaces without warehouse links!")
         logger.warning(f"[SYNC] ⚠️ Please create warehouse links in the 'Warehouses' section")
-        return
+        return stats
     
-    logger.info(f"[SYNC] Found {len(links)} marketplace links for warehouse {warehouse.get('name')}")
+    logger.info(f"[SYNC] Found {len(links)} marketplace links for warehouse {warehouse.get('name')}, {len(items)} products")
     
-    # Получить товар для маппинга SKU
-    product = await db.product_catalog.find_one({"article": product_article})
+    # Последнее значение для артикула побеждает
+    quantities = dict(items)
     
-    if not product:
-        logger.warning(f"[SYNC] Product {product_article} not found")
-        return
+    # Товары для маппинга SKU - одним запросом
+    products = await db.product_catalog.find(
+        {"article": {"$in": list(quantities.keys())}},
+        {"article": 1, "marketplace_data": 1}
+    ).to_list(length=None)
+    products_by_article = {p["article"]: p for p in products}
+    
+    missing = len(quantities) - len(products_by_article)
+    if missing:
+        logger.warning(f"[SYNC] {missing} products not found in catalog")
+    
+    profile = await db.seller_profiles.find_one({"user_id": user_id})
+    api_keys = profile.get("api_keys", []) if profile else []
     
-    # Для каждой связи - отправить остаток
     for link in links:
         marketplace = link.get("marketplace_name")
         mp_warehouse_id = link.get("marketplace_warehouse_id")
         
-        try:
-            # Получить API ключ для МП
-            profile = await db.seller_profiles.find_one({"user_id": user_id})
-            if not profile:
-                continue
-            
-            api_key_data = next(
-                (k for k in profile.get("api_keys", []) if k.get("marketplace") == marketplace),
-                None
-            )
-            
-            if not api_key_data:
-                logger.warning(f"[SYNC] No API key for {marketplace}")
+        api_key_data = next((k for k in api_keys if k.get("marketplace") == marketplace), None)
+        if not api_key_data:
+            logger.warning(f"[SYNC] No API key for {marketplace}")
+            continue
+        
+        # (article, mp_sku, quantity)
+        rows = []
+        for article, quantity in quantities.items():
+            product = products_by_article.get(article)
+            if not product:
                 continue
             
-            # Получить маркетплейс-специфичный SKU/ID из marketplace_data
-            marketplace_data = product.get("marketplace_data", {}).get(marketplace, {})
-            
-            # Если нет данных для этого МП - пропускаем товар
-            if not marketplace_data:
-                logger.warning(f"[SYNC] ⚠️ Product {product_article} not imported to {marketplace}, skipping")
-                logger.warning(f"[SYNC] ⚠️ Import product to {marketplace} first, then try sync again")
+            mp_sku = _resolve_marketplace_sku(product, marketplace, article)
+            if not mp_sku:
+                logger.warning(f"[SYNC] ⚠️ Product {article} not imported to {marketplace}, skipping")
+                stats["skipped"] += 1
                 continue
             
-            # Для каждого МП свой идентификатор
-            if marketplace == "ozon":
-                # Для Ozon используем offer_id (артикул продавца)
-                mp_sku = marketplace_data.get("id") or product_article
-            elif marketplace in ["wb", "wildberries"]:
-                # Для WB используем barcode (штрихкод)
-                mp_sku = marketplace_data.get("barcode") or marketplace_data.get("id")
-                if not mp_sku:
-                    logger.warning(f"[SYNC] No barcode for {product_article} on WB, пропускаем")
-                    continue
-            elif marketplace == "yandex":
-                # Для Yandex используем SKU
-                mp_sku = marketplace_data.get("id") or product_article
-            else:
-                mp_sku = product_article
-            
-            logger.info(f"[SYNC] {marketplace.upper()}: {product_article} → MP SKU: {mp_sku}")
-            
-            # Создать коннектор
-            connector = get_connector(
-                marketplace,
-                api_key_data.get("client_id", ""),
-                api_key_data["api_key"]
-            )
+            rows.append((article, mp_sku, quantity))
+        
+        if only_changed:
+            changed = await filter_changed_stock(db, link, rows)
+            stats["unchanged"] += len(rows) - len(changed)
+            rows = changed
+        
+        if not rows:
+            continue
+        
+        try:
+            connector = CredentialRegistry.connector(user_id, api_key_data)
+        except Exception as e:
+            logger.error(f"[SYNC] ❌ {marketplace.upper()} connector error: {e}")
+            stats["failed"] += len(rows)
+            continue
+        
+        batch_size = STOCK_BATCH_LIMITS.get(marketplace, 100)
+        
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            error_message = None
             
-            # Обновить остаток
-            if marketplace == "ozon":
+            try:
                 await connector.update_stock(
                     mp_warehouse_id,
-                    [{"offer_id": mp_sku, "stock": quantity}]
+                    [_stock_item(marketplace, mp_sku, quantity) for _, mp_sku, quantity in batch]
                 )
-            elif marketplace in ["wb", "wildberries"]:
-                await connector.update_stock(
-                    mp_warehouse_id,
-                    [{"sku": mp_sku, "amount": quantity}]
-                )
-            elif marketplace == "yandex":
-                await connector.update_stock(
-                    mp_warehouse_id,
-                    [{"sku": mp_sku, "count": quantity}]
-                )
-            
-            # Записать успех в историю
-            await db.stock_sync_history.insert_one({
-                "id": str(uuid.uuid4()),
-                "warehouse_id": warehouse_id,
-                "marketplace": marketplace,
-                "marketplace_warehouse_id": mp_warehouse_id,
-                "product_article": product_article,
-                "quantity_sent": quantity,
-                "status": "success",
-                "error_message": None,
-                "synced_at": datetime.utcnow().isoformat(),
-                "user_id": str(user_id)
-            })
+                stats["synced"] += len(batch)
+                logger.info(f"[SYNC] ✅ {marketplace.upper()} {mp_warehouse_id}: {len(batch)} products")
+            except Exception as e:
+                error_message = str(e)
+                stats["failed"] += len(batch)
+                logger.error(f"[SYNC] ❌ {marketplace.upper()} failed for {len(batch)} products: {e}")
             
-            logger.info(f"[SYNC] ✅ {marketplace.upper()} {mp_warehouse_id}: {product_article} = {quantity}")
+            if not error_message:
+                await save_pushed_stock(db, link, batch)
             
-        except Exception as e:
-            # Записать ошибку в историю
-            await db.stock_sync_history.insert_one({
-                "id": str(uuid.uuid4()),
-                "warehouse_id": warehouse_id,
-                "marketplace": marketplace,
-                "marketplace_warehouse_id": mp_warehouse_id,
-                "product_article": product_article,
-                "quantity_sent": quantity,
-                "status": "failed",
-                "error_message": str(e),
-                "synced_at": datetime.utcnow().isoformat(),
-                "user_id": str(user_id)
-            })
-            
-            logger.error(f"[SYNC] ❌ {marketplace.upper()} failed: {e}")
+            synced_at = datetime.utcnow().isoformat()
+            await db.stock_sync_history.insert_many([
+                {
+                    "id": str(uuid.uuid4()),
+                    "warehouse_id": warehouse_id,
+                    "marketplace": marketplace,
+                    "marketplace_warehouse_id": mp_warehouse_id,
+                    "product_article": article,
+                    "quantity_sent": quantity,
+                    "status": "failed" if error_message else "success",
+                    "error_message": error_message,
+                    "synced_at": synced_at,
+                    "user_id": str(user_id)
+                }
+                for article, _, quantity in batch
+            ])
+    
+    return stats
+
+
+async def sync_product_to_marketplace(
+    db,
+    user_id,
+    warehouse_id: str,
+    product_article: str,
+    quantity: int
+):
+    """
+    Синхронизировать остаток ОДНОГО товара на ВСЕ связанные склады маркетплейсов
+    
+    Логика (как в SelsUp):
+    - Получить все связи склада с МП
+    - Для каждой связи отправить ОДИНАКОВЫЙ остаток
+    - Записать в историю синхронизации
+    
+    Для нескольких товаров используйте sync_products_to_marketplace.
+    """
+    return await sync_products_to_marketplace(db, user_id, warehouse_id, [(product_article, quantity)])
 
 
 @router.post("/manual")
@@ -218,18 +333,25 @@ async def manual_sync(
         # Синхронизировать ВСЕ товары склада
         inventories = await db.inventory.find({}).to_list(length=10000)
         
-        synced_count = 0
-        for inv in inventories:
-            product = await db.product_catalog.find_one({"_id": inv["product_id"]})
-            if product:
-                await sync_product_to_marketplace(
-                    db,
-                    current_user["_id"],
-                    warehouse_id,
-                    product["article"],
-                    inv.get("available", 0)
-                )
-                synced_count += 1
+        products = await db.product_catalog.find(
+            {"_id": {"$in": [inv["product_id"] for inv in inventories]}},
+            {"article": 1}
+        ).to_list(length=None)
+        articles = {p["_id"]: p["article"] for p in products}
+        
+        items = [
+            (articles[inv["product_id"]], inv.get("available", 0))
+            for inv in inventories
+            if inv["product_id"] in articles
+        ]
+        
+        await sync_products_to_marketplace(
+            db,
+            current_user["_id"],
+            warehouse_id,
+            items
+        )
+        synced_count = len(items)
         
         return {
             "message": f"Синхронизировано {synced_count} товаров",
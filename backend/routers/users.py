@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from bson import ObjectId
 
 from backend.services.auth_service import AuthService
+from backend.auth_utils import user_cache
 from backend.core.database import get_database
 from backend.schemas.user import User, UserRole
 
@@ -38,6 +39,7 @@ async def approve_user(
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate(user_id)
     return {"message": "User approved successfully"}
 
 @router.put("/{user_id}/block")
@@ -52,6 +54,7 @@ async def block_user(
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate(user_id)
     return {"message": "User blocked successfully"}
 
 @router.put("/{user_id}/commission")
@@ -319,7 +319,7 @@ class OrderRetailResponse(BaseModel):
     totals: OrderTotalsNew
     payment_method: Optional[str]
     notes: Optional[str]
-    status_history: List[OrderStatusHistory]
+    status_history: List[OrderStatusHistory] = []  # В списке заказов не загружается
     created_at: datetime
     updated_at: datetime
     completed_at: Optional[datetime]
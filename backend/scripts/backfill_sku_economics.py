@@ -0,0 +1,53 @@
+"""
+Дозаполнение свёртки sku_daily_economics операциями, загруженными до её появления
+Каждый продавец обрабатывается под SkuEconomicsService.lock; продавец, у
+которого сейчас идёт загрузка операций, пропускается (запустить повторно позже).
+
+Запуск из корня репозитория:
+    python -m backend.scripts.backfill_sku_economics [--seller SELLER_ID]
+
+Код возврата 1 - часть продавцов пропущена из-за занятой блокировки.
+"""
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from backend.core.database import client, db
+from backend.core.locks import LockBusy
+from backend.services.sku_economics_service import SkuEconomicsService
+
+
+async def run(seller_id: Optional[str]) -> bool:
+    if seller_id:
+        sellers = [seller_id]
+    else:
+        sellers = await db.ozon_operations.distinct("seller_id", {"rollup_applied": {"$ne": True}})
+
+    ok = True
+    for seller in sellers:
+        try:
+            async with SkuEconomicsService.lock(db, seller):
+                applied = await SkuEconomicsService.backfill(db, seller)
+        except LockBusy:
+            print(f"{seller}: свёртку обновляет другая задача, пропущен")
+            ok = False
+            continue
+        print(f"{seller}: учтено операций {applied}")
+    if not sellers:
+        print("Все операции уже учтены в свёртке")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seller", help="только этот продавец")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.seller))
+    client.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark парсинга позаказного отчета о реализации Ozon
+Синтетический отчет на 200k строк в структуре реального файла (данные с 15-й строки)
+
+Запуск из корня репозитория:
+    python -m backend.scripts.benchmark_report_parser [--rows 200000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from backend.ozon_report_parser import parse_order_realization_frame, DATA_START_ROW, HEADERS_ROW
+from backend.routers.reports_parser import parse_ozon_transaction_frame
+
+
+def build_realization_report(rows: int) -> pd.DataFrame:
+    """Лист отчета как его читает pd.read_excel(header=None)"""
+    rng = random.Random(42)
+    start = datetime(2025, 11, 1)
+    sheet = [[None] * 23 for _ in range(DATA_START_ROW)]
+    sheet[HEADERS_ROW] = [f"Колонка {i}" for i in range(23)]
+
+    for i in range(rows):
+        row = [None] * 23
+        realized = round(rng.uniform(100, 5000), 2)
+        loyalty = round(rng.uniform(0, 50), 2)
+        points = rng.choice([0, 12.5, None])
+        commission = round(realized * 0.15, 2)
+        row[0] = i + 1
+        row[1] = f"Товар {i % 3000}"
+        row[2] = f"ART-{i % 3000}" if i % 500 else None
+        row[3] = 100000 + i % 3000
+        row[4] = 4600000000000 + i % 3000
+        row[5] = realized
+        row[6] = loyalty
+        row[7] = points
+        row[8] = rng.choice([1, 1, 2, 3])
+        row[9] = round(realized / 2, 2)
+        row[12] = commission
+        row[13] = realized + loyalty + (points or 0) - commission
+        row[14] = rng.choice([0, 0, 0, round(realized, 2)])
+        row[21] = f"{10000000 + i}-0001-1"
+        row[22] = start + timedelta(days=i % 30, minutes=i % 1440)
+        sheet.append(row)
+
+    sheet.append([None, None, "Итого"] + [None] * 20)
+    return pd.DataFrame(sheet)
+
+
+def build_transaction_report(rows: int) -> pd.DataFrame:
+    """Отчет о транзакциях (pd.read_excel с заголовками)"""
+    rng = random.Random(42)
+    start = datetime(2025, 11, 1)
+    return pd.DataFrame({
+        "Дата операции": [start + timedelta(minutes=i) for i in range(rows)],
+        "posting_number": [f"{10000000 + i}-0001-1" for i in range(rows)],
+        "Цена продажи": [round(rng.uniform(100, 5000), 2) for _ in range(rows)],
+        "Комиссия": [round(rng.uniform(10, 500), 2) for _ in range(rows)],
+        "Логистика": [round(rng.uniform(10, 200), 2) for _ in range(rows)],
+        "Услуги": [None] * rows,
+        "Товар": [f"Товар {i % 3000}" for i in range(rows)],
+        "Артикул": [f"ART-{i % 3000}" for i in range(rows)],
+        "Количество": [rng.choice([1, 2, 3]) for _ in range(rows)],
+    })
+
+
+def measure(name: str, func, *args) -> None:
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    count = len(result["transactions"]) if isinstance(result, dict) else len(result)
+    print(f"{name}: {count} транзакций за {elapsed:.2f} c ({count / elapsed:,.0f} строк/с)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"Генерация синтетических отчетов на {args.rows} строк...")
+    realization = build_realization_report(args.rows)
+    transactions = build_transaction_report(args.rows)
+
+    measure("Позаказный отчет о реализации", parse_order_realization_frame, realization, "benchmark-seller")
+    measure("Отчет о транзакциях", parse_ozon_transaction_frame, transactions, "benchmark-seller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Проверка индексов MongoDB по реестру backend/core/indexes.py
+Недостающие/лишние/неиспользуемые индексы и планы основных запросов (explain)
+
+Запуск из корня репозитория:
+    python -m backend.scripts.check_indexes [--apply]
+
+Код возврата 1 - есть недостающие индексы или запросы с COLLSCAN.
+"""
+import argparse
+import asyncio
+import sys
+
+from backend.core.database import client, db
+from backend.core.indexes import ensure_indexes, index_report, explain_queries
+
+
+async def run(apply: bool) -> bool:
+    if apply:
+        result = await ensure_indexes(db)
+        print(f"Индексов в реестре: {result['ensured']}, ошибок: {len(result['failed'])}")
+        for failure in result["failed"]:
+            print(f"  {failure['collection']}.{failure['index']}: {failure['error']}")
+
+    ok = True
+    report = await index_report(db)
+    for collection, entry in report.items():
+        print(f"{collection}:")
+        for kind in ("missing", "extra", "unused"):
+            if entry[kind]:
+                print(f"  {kind}: {', '.join(entry[kind])}")
+        ok = ok and not entry["missing"]
+    if not report:
+        print("Индексы совпадают с реестром")
+
+    print()
+    for result in await explain_queries(db):
+        plan = "COLLSCAN" if result["collscan"] else ", ".join(result["indexes"]) or "EOF"
+        print(f"{result['collection']} {result['filter']} sort={result['sort']}: {plan}")
+        ok = ok and not result["collscan"]
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apply", action="store_true", help="создать недостающие индексы перед проверкой")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.apply))
+    client.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
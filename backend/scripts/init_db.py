@@ -74,7 +74,28 @@ async def init_database():
     await db.users.create_index("email", unique=True)
     await db.products.create_index("seller_id")
     await db.orders.create_index("seller_id")
+    # Списки заказов: фильтр продавец/маркетплейс/статус, keyset сортировка (дата, _id)
+    await db.orders.create_index([("seller_id", 1), ("dates.created_at", -1), ("_id", -1)])
+    await db.orders.create_index([("seller_id", 1), ("status", 1), ("dates.created_at", -1), ("_id", -1)])
+    for collection in (db.orders_fbs, db.orders_fbo):
+        await collection.create_index([("seller_id", 1), ("created_at", -1), ("_id", -1)])
+        await collection.create_index([("seller_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)])
+        await collection.create_index(
+            [("seller_id", 1), ("marketplace", 1), ("status", 1), ("created_at", -1), ("_id", -1)]
+        )
+    await db.orders_retail.create_index([("seller_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.orders_retail.create_index([("seller_id", 1), ("status", 1), ("created_at", -1), ("_id", -1)])
     await db.inventory.create_index([("seller_id", 1), ("product_id", 1)])
+    await db.ozon_operations.create_index([("seller_id", 1), ("operation_id", 1)])
+    await db.ozon_operations.create_index([("seller_id", 1), ("posting_number", 1)])
+    await db.sku_daily_economics.create_index(
+        [("seller_id", 1), ("date", 1), ("sku", 1), ("operation_type", 1), ("attribution", 1)],
+        unique=True
+    )
+    await db.order_sync_cursors.create_index(
+        [("seller_id", 1), ("marketplace", 1), ("flow", 1)],
+        unique=True
+    )
     print("✅ Created database indexes")
     
     print("✅ Database initialization complete!")
@@ -5,6 +5,7 @@ from fastapi.staticfiles import StaticFiles
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import asyncio
 import logging
 from pathlib import Path
 
@@ -61,6 +62,10 @@ async def log_requests(request: Request, call_next):
     # logger.info(f"Request: {request.method} {request.url.path}")
     response = await call_next(request)
     # logger.info(f"Response: {response.status_code}")
+    # Время проверки токена (auth_utils.get_current_user)
+    auth_ms = getattr(request.state, "auth_ms", None)
+    if auth_ms is not None:
+        response.headers["Server-Timing"] = f"auth;dur={auth_ms:.1f}"
     return response
 
 # Security Headers
@@ -72,6 +77,22 @@ async def security_headers(request: Request, call_next):
     response.headers["X-XSS-Protection"] = "1; mode=block"
     return response
 
+# Фоновые задачи старта: loop держит на задачи только слабые ссылки,
+# поэтому они хранятся здесь до завершения и отменяются при остановке
+_background_tasks: set = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def cancel_background_tasks():
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
 # Startup/Shutdown
 @app.on_event("startup")
 async def startup_db_client():
@@ -80,14 +101,43 @@ async def startup_db_client():
     
     # Create default admin
     await create_default_admin()
+    
+    # Индексы из реестра (core/indexes.py) - в фоне, сборка новых не задерживает старт
+    if settings.DB_ENSURE_INDEXES_ON_STARTUP:
+        start_background_task(apply_indexes())
+    
+    # Индексы поиска категорий в памяти (services/category_search.py)
+    if settings.CATEGORY_SEARCH_PRELOAD_ON_STARTUP:
+        from backend.services.category_search import CategorySearch
+        start_background_task(CategorySearch.load_all(db))
+    
+    # Фоновая отправка остатков на МП из очереди stock_outbox
+    if settings.STOCK_OUTBOX_ENABLED:
+        from backend.services.stock_outbox import stock_outbox_worker
+        stock_outbox_worker.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     from backend.core.database import client
+    from backend.core.http_client import close_http_clients
+    from backend.services.stock_outbox import stock_outbox_worker
+    await cancel_background_tasks()
+    await stock_outbox_worker.stop()
+    await close_http_clients()
+    
     if client:
         client.close()
         logger.info("Disconnected from MongoDB")
 
+async def apply_indexes():
+    from backend.core.indexes import ensure_indexes, verify_indexes
+    try:
+        await ensure_indexes(db)
+        if settings.DB_VERIFY_INDEXES_ON_STARTUP and not await verify_indexes(db):
+            logger.warning("Index check failed: missing indexes or collection scans, see [Indexes] log")
+    except Exception as e:
+        logger.error(f"Failed to apply indexes: {e}")
+
 async def create_default_admin():
     from backend.services.auth_service import AuthService
     from backend.schemas.user import UserRole, UserCreate
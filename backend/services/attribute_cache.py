@@ -0,0 +1,152 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class AttributeCache:
+    """
+    Двухуровневый кэш справочников маркетплейсов (атрибуты категорий, значения атрибутов).
+
+    - память процесса: LRU на max_entries ключей, запись живёт memory_ttl секунд
+      (другие процессы сервера обновляют MongoDB, память их догоняет);
+    - MongoDB (collection, по cache_key): запись действительна max_age;
+    - одинаковые одновременные промахи ждут один запрос к маркетплейсу;
+    - запись старше max_age - refresh_ahead отдаётся сразу и обновляется
+      в фоне, поэтому к истечению срока она уже свежая.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        value_field: str,
+        max_entries: Optional[int] = None,
+        memory_ttl: Optional[float] = None,
+        max_age: Optional[timedelta] = None,
+        refresh_ahead: Optional[timedelta] = None
+    ):
+        self.collection = collection
+        self.value_field = value_field
+        self.max_entries = max(1, max_entries or settings.ATTRIBUTE_CACHE_MEMORY_ENTRIES)
+        self.memory_ttl = memory_ttl if memory_ttl is not None else settings.ATTRIBUTE_CACHE_MEMORY_TTL
+        self.max_age = max_age or timedelta(days=settings.ATTRIBUTE_CACHE_MAX_AGE_DAYS)
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else timedelta(hours=settings.ATTRIBUTE_CACHE_REFRESH_AHEAD_HOURS)
+        # cache_key -> (значение, cached_at записи в MongoDB, время помещения в память)
+        self._memory: "OrderedDict[str, Tuple[Any, datetime, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Set[str] = set()
+        self._background: Set[asyncio.Task] = set()
+
+    def _remember(self, cache_key: str, value: Any, cached_at: datetime) -> None:
+        self._memory[cache_key] = (value, cached_at, time.monotonic())
+        self._memory.move_to_end(cache_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, cache_key: str) -> Optional[Tuple[Any, datetime]]:
+        entry = self._memory.get(cache_key)
+        if entry is None:
+            return None
+        value, cached_at, stored = entry
+        if time.monotonic() - stored >= self.memory_ttl or datetime.utcnow() - cached_at >= self.max_age:
+            del self._memory[cache_key]
+            return None
+        self._memory.move_to_end(cache_key)
+        return value, cached_at
+
+    def invalidate(self, cache_key: Optional[str] = None) -> None:
+        """Сбросить ключ (или всю память процесса); MongoDB не трогается"""
+        if cache_key is None:
+            self._memory.clear()
+        else:
+            self._memory.pop(cache_key, None)
+
+    async def _read(self, db, cache_key: str) -> Optional[Tuple[Any, datetime]]:
+        doc = await db[self.collection].find_one({"cache_key": cache_key})
+        if not doc or not doc.get("cached_at"):
+            return None
+        if datetime.utcnow() - doc["cached_at"] >= self.max_age:
+            return None
+        return doc.get(self.value_field, []), doc["cached_at"]
+
+    async def _fetch(self, db, cache_key: str, loader: Loader, meta: Dict[str, Any]) -> Tuple[Any, datetime]:
+        value = await loader()
+        cached_at = datetime.utcnow()
+        await db[self.collection].replace_one(
+            {"cache_key": cache_key},
+            {"cache_key": cache_key, **meta, self.value_field: value, "cached_at": cached_at},
+            upsert=True
+        )
+        self._remember(cache_key, value, cached_at)
+        return value, cached_at
+
+    async def _load(self, db, cache_key: str, loader: Loader, meta: Dict[str, Any]) -> Tuple[Any, bool]:
+        stored = await self._read(db, cache_key)
+        if stored is not None:
+            value, cached_at = stored
+            self._remember(cache_key, value, cached_at)
+            self._refresh_if_expiring(db, cache_key, cached_at, loader, meta)
+            return value, True
+        value, _ = await self._fetch(db, cache_key, loader, meta)
+        return value, False
+
+    def _refresh_if_expiring(self, db, cache_key: str, cached_at: datetime, loader: Loader, meta: Dict[str, Any]) -> None:
+        if cache_key in self._refreshing or datetime.utcnow() - cached_at < self.max_age - self.refresh_ahead:
+            return
+        self._refreshing.add(cache_key)
+        task = asyncio.create_task(self._refresh(db, cache_key, loader, meta))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh(self, db, cache_key: str, loader: Loader, meta: Dict[str, Any]) -> None:
+        try:
+            # Запись могли уже обновить другие процессы сервера
+            stored = await self._read(db, cache_key)
+            if stored is not None and datetime.utcnow() - stored[1] < self.max_age - self.refresh_ahead:
+                self._remember(cache_key, *stored)
+                return
+            await self._fetch(db, cache_key, loader, meta)
+            logger.info(f"[AttributeCache] {self.collection}: обновлён {cache_key}")
+        except Exception as e:
+            logger.warning(f"[AttributeCache] {self.collection}: не удалось обновить {cache_key}: {e}")
+        finally:
+            self._refreshing.discard(cache_key)
+
+    async def get(self, db, cache_key: str, loader: Loader, meta: Optional[Dict[str, Any]] = None) -> Tuple[Any, bool]:
+        """
+        Значение по ключу: память -> MongoDB -> loader (запрос к маркетплейсу)
+
+        Args:
+            loader: корутина загрузки значения с маркетплейса (вызывается при промахе и для фонового обновления)
+            meta: поля документа кэша в MongoDB помимо cache_key, значения и cached_at
+
+        Returns:
+            (значение, True - из кэша / False - загружено с маркетплейса)
+        """
+        meta = meta or {}
+        cached = self._from_memory(cache_key)
+        if cached is not None:
+            value, cached_at = cached
+            self._refresh_if_expiring(db, cache_key, cached_at, loader, meta)
+            return value, True
+
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._load(db, cache_key, loader, meta))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        # shield: отмена одного запроса не отменяет общую загрузку для остальных
+        return await asyncio.shield(task)
+
+
+# Атрибуты категорий и значения словарных атрибутов (routers/categories_v2.py)
+category_attributes_cache = AttributeCache("category_attributes_cache", "attributes")
+attribute_values_cache = AttributeCache("attribute_values_cache", "values")
@@ -5,10 +5,10 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from bson import ObjectId
 
 from backend.core.config import settings
 from backend.core.database import get_database
+from backend.auth_utils import load_user, user_cache
 from backend.schemas.user import UserCreate, UserRole, User
 from backend.schemas.auth import Token
 
@@ -58,7 +58,10 @@ class AuthService:
             raise credentials_exception
         
         db = await get_database()
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        try:
+            user = await load_user(db, user_id)
+        except Exception:
+            raise credentials_exception
         if user is None:
             raise credentials_exception
         return user
@@ -130,5 +133,6 @@ class AuthService:
             {"_id": user["_id"]},
             {"$set": {"last_login_at": datetime.utcnow()}}
         )
+        user_cache.invalidate(user["_id"])
             
         return user
@@ -0,0 +1,198 @@
+from typing import List, Dict, Any, Tuple, Iterable
+from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne, DeleteOne, ReturnDocument
+import hashlib
+import json
+import logging
+
+from backend.core.config import settings
+from backend.core.locks import mongo_lock
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые меняются при каждой загрузке и не входят в хэш содержимого
+VOLATILE_FIELDS = {"_id", "content_hash", "loaded_at", "updated_at", "created_at"}
+
+# Версии загруженных деревьев категорий: {_id: коллекция, version, tree_hash, loaded_at, ...}
+VERSIONS_COLLECTION = "category_versions"
+
+
+def content_hash(doc: Dict[str, Any]) -> str:
+    """Хэш содержимого категории (без служебных полей)"""
+    payload = {k: v for k, v in doc.items() if k not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False).encode()).hexdigest()
+
+
+def _key(doc: Dict[str, Any], key_fields: Tuple[str, ...]) -> Tuple[Any, ...]:
+    return tuple(doc.get(field) for field in key_fields)
+
+
+def _diff(
+    categories: Iterable[Dict[str, Any]],
+    existing: Dict[Tuple[Any, ...], str],
+    key_fields: Tuple[str, ...]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Tuple[Any, ...]], int]:
+    """
+    Returns:
+        (новые, изменённые, ключи удалённых, без изменений)
+    """
+    new, changed = [], []
+    seen = set()
+    for doc in categories:
+        key = _key(doc, key_fields)
+        if key in seen:
+            continue
+        seen.add(key)
+        if key not in existing:
+            new.append(doc)
+        elif existing[key] != doc["content_hash"]:
+            changed.append(doc)
+    removed = [key for key in existing if key not in seen]
+    unchanged = len(seen) - len(new) - len(changed)
+    return new, changed, removed, unchanged
+
+
+async def _existing_hashes(collection, scope: Dict[str, Any], key_fields: Tuple[str, ...]) -> Dict[Tuple[Any, ...], str]:
+    projection = {field: 1 for field in key_fields}
+    projection.update({"content_hash": 1, "_id": 0})
+    docs = await collection.find(scope, projection).to_list(length=None)
+    return {_key(doc, key_fields): doc.get("content_hash") for doc in docs}
+
+
+def _prepare(categories: List[Dict[str, Any]], **stamps: Any) -> List[Dict[str, Any]]:
+    """Копии категорий с хэшем содержимого и отметками времени загрузки"""
+    prepared = []
+    for category in categories:
+        doc = dict(category)
+        doc["content_hash"] = content_hash(doc)
+        doc.update(stamps)
+        prepared.append(doc)
+    return prepared
+
+
+def _tree_hash(docs: List[Dict[str, Any]]) -> str:
+    return hashlib.sha1("".join(sorted(doc["content_hash"] for doc in docs)).encode()).hexdigest()
+
+
+async def replace_category_tree(
+    db,
+    collection_name: str,
+    categories: List[Dict[str, Any]],
+    key_fields: Tuple[str, ...],
+    scope: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Заменить дерево категорий в коллекции кэша
+
+    Новое дерево сравнивается с сохранённым по хэшу содержимого каждой
+    категории. Изменения (новые, изменённые, удалённые в пределах scope)
+    применяются на месте одним bulk_write - документы вне диффа, в том числе
+    записанные параллельно (WBCategoryManager.add_subject_from_product), не
+    затрагиваются. Загрузки одной коллекции идут по очереди под блокировкой
+    category_preload:<коллекция>; номер версии в category_versions растёт
+    после применения, по нему CategorySearch перестраивает индекс.
+
+    Args:
+        key_fields: поля уникального ключа категории
+        scope: категории этой загрузки (остальные документы коллекции не удаляются)
+
+    Returns:
+        {"total", "inserted", "updated", "deleted", "unchanged", "version"}
+
+    Raises:
+        LockBusy: дерево этой коллекции уже загружается
+    """
+    async with mongo_lock(db, f"category_preload:{collection_name}", settings.CATEGORY_PRELOAD_LOCK_SECONDS):
+        now = datetime.utcnow()
+        docs = _prepare(categories, loaded_at=now)
+        live = db[collection_name]
+
+        existing = await _existing_hashes(live, scope, key_fields)
+        new, changed, removed, unchanged = _diff(docs, existing, key_fields)
+        stats = {
+            "total": len(docs),
+            "inserted": len(new),
+            "updated": len(changed),
+            "deleted": len(removed),
+            "unchanged": unchanged,
+        }
+
+        if not new and not changed and not removed:
+            version = await db[VERSIONS_COLLECTION].find_one({"_id": collection_name})
+            stats["version"] = version.get("version", 0) if version else 0
+            logger.info(f"[CategoryPreload] {collection_name}: без изменений ({len(docs)} категорий)")
+            return stats
+
+        operations = [ReplaceOne(dict(zip(key_fields, _key(doc, key_fields))), doc, upsert=True) for doc in new + changed]
+        operations += [DeleteOne(dict(zip(key_fields, key))) for key in removed]
+        await live.bulk_write(operations, ordered=False)
+
+        version = await db[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": collection_name},
+            {
+                "$inc": {"version": 1},
+                "$set": {"tree_hash": _tree_hash(docs), "loaded_at": now, **stats}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        stats["version"] = version["version"]
+
+    logger.info(
+        f"[CategoryPreload] {collection_name} v{stats['version']}: "
+        f"+{stats['inserted']} ~{stats['updated']} -{stats['deleted']} (без изменений {unchanged})"
+    )
+    return stats
+
+
+async def apply_category_diff(
+    db,
+    collection_name: str,
+    categories: List[Dict[str, Any]],
+    key_fields: Tuple[str, ...],
+    scope: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Применить изменения дерева категорий на месте одним bulk_write
+
+    Для общей коллекции нескольких маркетплейсов (marketplace_categories),
+    которую нельзя подменить целиком. created_at сохраняется при обновлении.
+
+    Returns:
+        {"total", "inserted", "updated", "deleted", "unchanged"}
+    """
+    now = datetime.utcnow()
+    docs = _prepare(categories, updated_at=now)
+    collection = db[collection_name]
+
+    existing = await _existing_hashes(collection, scope, key_fields)
+    new, changed, removed, unchanged = _diff(docs, existing, key_fields)
+
+    operations = []
+    for doc in new + changed:
+        operations.append(UpdateOne(
+            dict(zip(key_fields, _key(doc, key_fields))),
+            {"$set": doc, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        ))
+    operations += [DeleteOne(dict(zip(key_fields, key))) for key in removed]
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+
+    stats = {
+        "total": len(docs),
+        "inserted": len(new),
+        "updated": len(changed),
+        "deleted": len(removed),
+        "unchanged": unchanged,
+    }
+    logger.info(
+        f"[CategoryPreload] {collection_name} {scope}: "
+        f"+{stats['inserted']} ~{stats['updated']} -{stats['deleted']} (без изменений {unchanged})"
+    )
+    return stats
+
+
+async def get_tree_version(db, collection_name: str) -> Dict[str, Any]:
+    """Версия и время последней загрузки дерева ({} - ещё не загружалось)"""
+    return await db[VERSIONS_COLLECTION].find_one({"_id": collection_name}) or {}
@@ -0,0 +1,196 @@
+from typing import List, Dict, Any, Optional, Tuple
+from bisect import bisect_left
+from functools import lru_cache
+import asyncio
+import heapq
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Источник индекса -> (коллекция, фильтр, поле названия)
+CATEGORY_SOURCES: Dict[str, Tuple[str, Dict[str, Any], str]] = {
+    "ozon": ("ozon_categories_cache", {"marketplace": "ozon"}, "name"),
+    "wb": ("wb_categories_cache", {"marketplace": "wb"}, "name"),
+    "yandex": ("yandex_categories_cache", {"marketplace": "yandex"}, "category_name"),
+}
+
+
+def catalog_source(marketplace: str) -> str:
+    """Источник для предзагруженных категорий CategorySystem (marketplace_categories)"""
+    return f"catalog:{marketplace}"
+
+
+def _source_config(source: str) -> Tuple[str, Dict[str, Any], str]:
+    if source.startswith("catalog:"):
+        marketplace = source.split(":", 1)[1]
+        return "marketplace_categories", {"marketplace": marketplace, "disabled": False}, "category_name"
+    return CATEGORY_SOURCES[source]
+
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+# Окончания русских слов (длинные раньше коротких): "мыши", "мышь" -> "мыш"
+_RU_ENDINGS = (
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ий", "ый", "ой", "ая", "яя", "ое", "ее", "ие", "ые", "ов", "ев", "ей",
+    "ам", "ям", "ах", "ях", "ом", "ем", "ью", "ия", "ья",
+    "ы", "и", "а", "я", "о", "е", "у", "ю", "ь", "й",
+)
+_MIN_STEM = 3
+
+
+@lru_cache(maxsize=200_000)
+def stem(token: str) -> str:
+    """Лёгкий стемминг: отбросить окончание русского слова, основа не короче 3 букв"""
+    if not _CYRILLIC_RE.search(token):
+        return token
+    for ending in _RU_ENDINGS:
+        if token.endswith(ending) and len(token) - len(ending) >= _MIN_STEM:
+            return token[:-len(ending)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Слова названия: нижний регистр, ё -> е, основы слов"""
+    return [stem(token) for token in _TOKEN_RE.findall((text or "").lower().replace("ё", "е"))]
+
+
+class CategorySearchIndex:
+    """
+    Инвертированный индекс по названиям категорий одного источника.
+
+    Термы - основы слов названия; слово запроса совпадает со всеми термами,
+    которые с него начинаются (набор по мере ввода). Категория должна
+    совпасть со всеми словами запроса. Ранжирование:
+    - точное совпадение основы весит больше продолжения;
+    - совпадение в последнем сегменте пути ("... / Мыши") весит вдвое больше;
+    - при равном весе выше более короткое название.
+    """
+
+    EXACT_WEIGHT = 3
+    PREFIX_WEIGHT = 1
+    LEAF_FACTOR = 2
+    # Слова запроса короче - только точное совпадение (иначе "к" тянет половину словаря)
+    MIN_PREFIX = 2
+
+    def __init__(self, docs: List[Dict[str, Any]], name_field: str = "name"):
+        self.docs = docs
+        self.names: List[str] = []
+        # терм -> {номер категории: вес поля}
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+        for number, doc in enumerate(docs):
+            name = str(doc.get(name_field) or doc.get("category_name") or doc.get("name") or "")
+            self.names.append(name.lower().replace("ё", "е"))
+            leaf = set(tokenize(name.rsplit("/", 1)[-1]))
+            for term in tokenize(name):
+                field_weight = self.LEAF_FACTOR if term in leaf else 1
+                entries = self.postings.setdefault(term, {})
+                entries[number] = max(entries.get(number, 0), field_weight)
+
+        self.vocabulary = sorted(self.postings)
+        # Место названия среди всех (короче и по алфавиту - выше) для ранжирования при равном весе
+        self.rank = [0] * len(docs)
+        for position, number in enumerate(sorted(range(len(docs)), key=lambda n: (len(self.names[n]), self.names[n]))):
+            self.rank[number] = position
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _match(self, term: str) -> Dict[int, int]:
+        """Категории, в названии которых есть терм с этим началом: {номер: вес}"""
+        matched: Dict[int, int] = {}
+        if len(term) < self.MIN_PREFIX:
+            words = [term] if term in self.postings else []
+        else:
+            words = []
+            position = bisect_left(self.vocabulary, term)
+            while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+                words.append(self.vocabulary[position])
+                position += 1
+
+        for word in words:
+            weight = self.EXACT_WEIGHT if word == term else self.PREFIX_WEIGHT
+            for number, field_weight in self.postings[word].items():
+                score = weight * field_weight
+                if score > matched.get(number, 0):
+                    matched[number] = score
+        return matched
+
+    def search(self, query: str, limit: int = 100) -> List[Dict[str, Any]]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        scores: Optional[Dict[int, int]] = None
+        for term in terms:
+            matched = self._match(term)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {number: score + matched[number] for number, score in scores.items() if number in matched}
+            if not scores:
+                return []
+
+        rank = self.rank
+        ranked = heapq.nsmallest(limit, scores, key=lambda number: (-scores[number], rank[number]))
+        return [dict(self.docs[number]) for number in ranked]
+
+
+class CategorySearch:
+    """
+    Индексы поиска категорий в памяти процесса (по источнику).
+
+    Строятся при старте сервера и после предзагрузки категорий,
+    при первом поиске - если ещё не построены. Поиск MongoDB не читает.
+    """
+
+    _indexes: Dict[str, CategorySearchIndex] = {}
+    _locks: Dict[str, asyncio.Lock] = {}
+
+    @classmethod
+    async def load(cls, db, source: str) -> CategorySearchIndex:
+        """Перестроить индекс источника из MongoDB (поиск до замены идёт по старому)"""
+        collection, query, name_field = _source_config(source)
+        started = time.perf_counter()
+        docs = await db[collection].find(query, {"_id": 0}).to_list(length=None)
+        # Построение - CPU работа на десятки тысяч категорий, не в event loop
+        index = await asyncio.to_thread(CategorySearchIndex, docs, name_field)
+        cls._indexes[source] = index
+        logger.info(
+            f"[CategorySearch] {source}: {len(index)} категорий, "
+            f"{len(index.vocabulary)} термов за {time.perf_counter() - started:.2f} c"
+        )
+        return index
+
+    @classmethod
+    async def load_all(cls, db) -> None:
+        for source in CATEGORY_SOURCES:
+            try:
+                await cls.load(db, source)
+            except Exception as e:
+                logger.error(f"[CategorySearch] Не удалось построить индекс {source}: {e}")
+
+    @classmethod
+    def invalidate(cls, source: str) -> None:
+        """Сбросить индекс - перестроится при следующем поиске"""
+        cls._indexes.pop(source, None)
+
+    @classmethod
+    async def get(cls, db, source: str) -> CategorySearchIndex:
+        index = cls._indexes.get(source)
+        if index is not None:
+            return index
+        lock = cls._locks.setdefault(source, asyncio.Lock())
+        async with lock:
+            index = cls._indexes.get(source)
+            if index is None:
+                index = await cls.load(db, source)
+            return index
+
+    @classmethod
+    async def search(cls, db, source: str, query: str, limit: int = 100) -> List[Dict[str, Any]]:
+        return (await cls.get(db, source)).search(query, limit)
@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from backend.connectors import BaseConnector, get_connector
+from backend.utils import get_decrypted_api_key
+
+logger = logging.getLogger(__name__)
+
+
+def integration_id(integration: Dict[str, Any]) -> str:
+    """Id интеграции в seller_profiles.api_keys (старые ключи - _id, совсем старые - только marketplace)"""
+    return str(integration.get("id") or integration.get("_id") or integration.get("marketplace", ""))
+
+
+def _fingerprint(integration: Dict[str, Any]) -> Tuple[Any, ...]:
+    return integration.get("marketplace"), integration.get("client_id", ""), integration.get("api_key")
+
+
+class CredentialRegistry:
+    """
+    Расшифрованные API ключи и коннекторы интеграций по (продавец, id интеграции).
+
+    Ключ расшифровывается один раз; запись действительна, пока в профиле
+    те же маркетплейс, client_id и зашифрованный ключ (изменение ключа
+    в другом процессе сервера не вернёт старый ключ). KeyService сбрасывает
+    записи при добавлении, изменении и удалении ключей.
+    """
+
+    _keys: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], Optional[str]]] = {}
+    _connectors: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], BaseConnector]] = {}
+
+    @classmethod
+    def api_key(cls, seller_id: Any, integration: Dict[str, Any]) -> Optional[str]:
+        """Расшифрованный ключ интеграции (None - ключа нет или не расшифровался)"""
+        key = (str(seller_id), integration_id(integration))
+        fingerprint = _fingerprint(integration)
+        cached = cls._keys.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        decrypted = get_decrypted_api_key(integration)
+        cls._keys[key] = (fingerprint, decrypted)
+        return decrypted
+
+    @classmethod
+    def connector(cls, seller_id: Any, integration: Dict[str, Any]) -> BaseConnector:
+        """
+        Коннектор интеграции (один экземпляр на ключ, см. get_connector)
+
+        Raises:
+            ValueError: API ключ не расшифровался или маркетплейс неизвестен
+        """
+        key = (str(seller_id), integration_id(integration))
+        fingerprint = _fingerprint(integration)
+        cached = cls._connectors.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        api_key = cls.api_key(seller_id, integration)
+        if not api_key:
+            raise ValueError(f"Не удалось расшифровать API ключ {integration.get('marketplace')}")
+        connector = get_connector(integration.get("marketplace"), integration.get("client_id", ""), api_key)
+        cls._connectors[key] = (fingerprint, connector)
+        return connector
+
+    @classmethod
+    def invalidate(cls, seller_id: Any, key_id: Optional[str] = None) -> None:
+        """Сбросить интеграцию продавца (None - все интеграции продавца)"""
+        seller = str(seller_id)
+        for cache in (cls._keys, cls._connectors):
+            for key in [k for k in cache if k[0] == seller and (key_id is None or k[1] == key_id)]:
+                del cache[key]
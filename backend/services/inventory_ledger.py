@@ -0,0 +1,281 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+import logging
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Операция -> (множители $inc полей inventory, множитель quantity_change в истории, operation_type истории)
+LEDGER_OPERATIONS: Dict[str, Tuple[Dict[str, int], int, str]] = {
+    # Резерв под заказ: reserved +, available -, quantity без изменений
+    "reserve": ({"reserved": 1, "available": -1}, 0, "reserve"),
+    # Списание при отгрузке: quantity -, reserved -, available уже уменьшен резервом
+    "deduct": ({"quantity": -1, "reserved": -1}, -1, "sale"),
+    # Снятие резерва при отмене: reserved -, available +
+    "release": ({"reserved": -1, "available": 1}, 0, "return"),
+    # Возврат отгруженного товара: quantity +, available +
+    "return": ({"quantity": 1, "available": 1}, 1, "return"),
+}
+
+# Сервер без поддержки транзакций (standalone MongoDB) - запоминаем, чтобы не пробовать каждый раз
+_transactions_supported: Optional[bool] = None
+
+
+class _ConditionFailed(Exception):
+    """Условие проводки не выполнено - транзакция откатывается"""
+
+
+class InventoryLedgerError(ValueError):
+    """Ошибка проводки: товара/остатка нет или недостаточно available"""
+
+    def __init__(self, message: str, key: str, status_code: int = 400):
+        self.key = key
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def _seller_id_variants(seller_id: Any) -> List[Any]:
+    """seller_id хранится в коллекциях и строкой, и ObjectId"""
+    variants = [str(seller_id)]
+    if ObjectId.is_valid(str(seller_id)):
+        variants.append(ObjectId(str(seller_id)))
+    return variants
+
+
+def _id_variants(values: Iterable[Any]) -> List[Any]:
+    """product_id в inventory бывает и строкой, и ObjectId"""
+    variants: List[Any] = []
+    for value in values:
+        variants.append(value)
+        if isinstance(value, ObjectId):
+            variants.append(str(value))
+        elif isinstance(value, str) and ObjectId.is_valid(value):
+            variants.append(ObjectId(value))
+    return variants
+
+
+def _is_transactions_unsupported(error: OperationFailure) -> bool:
+    return error.code == 20 or "Transaction numbers are only allowed" in str(error)
+
+
+class InventoryLedger:
+    """
+    Проводки по inventory для заказов.
+
+    Все позиции заказа разрешаются одним запросом, изменения остатков
+    применяются одним bulk_write в транзакции, история пишется одним
+    insert_many. Резерв условный (available >= количество): при нехватке
+    любой позиции заказ не резервируется целиком, параллельные заказы
+    не уводят остаток в минус.
+
+    Без поддержки транзакций (standalone MongoDB) позиции применяются
+    условными update_one по очереди, уже применённые откатываются при ошибке.
+    """
+
+    @staticmethod
+    async def resolve(db, seller_id: str, keys: Iterable[Any], by: str = "article") -> Dict[str, Dict[str, Any]]:
+        """
+        Найти inventory для позиций одним запросом
+
+        Args:
+            keys: артикулы (by="article") или product_id (by="product_id")
+
+        Returns:
+            {str(ключ): {"product_id", "inventory_id", "available"}}
+        """
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys:
+            return {}
+        sellers = _seller_id_variants(seller_id)
+
+        if by == "article":
+            # Каталог + inventory через $lookup - один запрос вместо find_one на позицию
+            pipeline = [
+                {"$match": {"seller_id": seller_id, "article": {"$in": keys}}},
+                {"$lookup": {
+                    "from": "inventory",
+                    "let": {"pid": "$_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$in": ["$product_id", ["$$pid", {"$toString": "$$pid"}]]},
+                            {"$in": ["$seller_id", sellers]}
+                        ]}}},
+                        {"$project": {"_id": 1, "available": 1}},
+                        {"$limit": 1}
+                    ],
+                    "as": "inventory"
+                }},
+                {"$project": {"article": 1, "inventory": 1}}
+            ]
+            rows = await db.product_catalog.aggregate(pipeline).to_list(length=None)
+            resolved = {}
+            for row in rows:
+                if row["article"] in resolved:
+                    continue
+                inventory = (row.get("inventory") or [None])[0]
+                resolved[row["article"]] = {
+                    "product_id": row["_id"],
+                    "inventory_id": inventory["_id"] if inventory else None,
+                    "available": inventory.get("available", 0) if inventory else 0
+                }
+            return resolved
+
+        inventories = await db.inventory.find(
+            {"product_id": {"$in": _id_variants(keys)}, "seller_id": {"$in": sellers}},
+            {"product_id": 1, "available": 1}
+        ).to_list(length=None)
+        return {
+            str(inv["product_id"]): {
+                "product_id": inv["product_id"],
+                "inventory_id": inv["_id"],
+                "available": inv.get("available", 0)
+            }
+            for inv in inventories
+        }
+
+    @classmethod
+    async def apply(
+        cls,
+        db,
+        seller_id: str,
+        operation: str,
+        quantities: Iterable[Tuple[Any, int]],
+        reason: str,
+        by: str = "article",
+        strict: bool = False,
+        history_extra: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, List[str]]:
+        """
+        Провести операцию по позициям заказа
+
+        Args:
+            operation: reserve | deduct | release | return (см. LEDGER_OPERATIONS)
+            quantities: [(артикул или product_id, количество)]; повторы суммируются
+            strict: отсутствующий товар/остаток - ошибка (иначе позиция пропускается);
+                для reserve дополнительно проверяется available >= количество
+            history_extra: дополнительные поля строк inventory_history (например, order_id)
+
+        Returns:
+            {"applied": [ключи], "missing": [ключи без товара или остатка]}
+
+        Raises:
+            InventoryLedgerError: strict и позиция не найдена или остатка не хватает
+        """
+        multipliers, history_sign, history_type = LEDGER_OPERATIONS[operation]
+
+        totals: Dict[str, int] = {}
+        for key, quantity in quantities:
+            if key and quantity:
+                totals[str(key)] = totals.get(str(key), 0) + quantity
+
+        resolved = await cls.resolve(db, seller_id, totals.keys(), by=by)
+
+        lines = []
+        missing = []
+        for key, quantity in totals.items():
+            entry = resolved.get(key)
+            if not entry or not entry["inventory_id"]:
+                if strict:
+                    message = f"Товар {key} не найден в каталоге" if not entry else f"Остаток для товара {key} не найден"
+                    raise InventoryLedgerError(message, key, status_code=404)
+                logger.error(f"[LEDGER] {key}: inventory не найден ({operation})")
+                missing.append(key)
+                continue
+            lines.append((key, quantity, entry))
+
+        if not lines:
+            return {"applied": [], "missing": missing}
+
+        conditional = strict and operation == "reserve"
+        writes = []
+        for key, quantity, entry in lines:
+            query: Dict[str, Any] = {"_id": entry["inventory_id"]}
+            if conditional:
+                query["available"] = {"$gte": quantity}
+            writes.append((query, {field: sign * quantity for field, sign in multipliers.items()}))
+
+        now = datetime.utcnow()
+        history = [
+            {
+                "product_id": entry["product_id"],
+                "seller_id": seller_id,
+                "operation_type": history_type,
+                "quantity_change": history_sign * quantity,
+                "reason": reason,
+                "user_id": seller_id,
+                "created_at": now,
+                **(history_extra or {})
+            }
+            for key, quantity, entry in lines
+        ]
+
+        if not await cls._write(db, writes, history):
+            # Позиция, которой не хватило (по остаткам на момент разрешения)
+            key, quantity, entry = next(
+                (line for line in lines if line[2]["available"] < line[1]),
+                lines[0]
+            )
+            raise InventoryLedgerError(
+                f"Недостаточно остатка для {key}. Доступно: {entry['available']}, требуется: {quantity}",
+                key
+            )
+
+        logger.info(f"[LEDGER] {operation}: {len(lines)} позиций ({reason})")
+        return {"applied": [key for key, _, _ in lines], "missing": missing}
+
+    @staticmethod
+    async def _write(db, writes: List[Tuple[Dict[str, Any], Dict[str, int]]], history: List[Dict[str, Any]]) -> bool:
+        """
+        Применить изменения атомарно
+
+        Returns:
+            True - всё применено; False - позиция не прошла условие, ничего не применено
+        """
+        global _transactions_supported
+
+        if settings.INVENTORY_TRANSACTIONS_ENABLED and _transactions_supported is not False:
+            async def transaction(session):
+                result = await db.inventory.bulk_write(
+                    [UpdateOne(query, {"$inc": inc}) for query, inc in writes],
+                    ordered=True,
+                    session=session
+                )
+                if result.matched_count < len(writes):
+                    raise _ConditionFailed()
+                if history:
+                    await db.inventory_history.insert_many(history, session=session)
+
+            try:
+                async with await db.client.start_session() as session:
+                    # with_transaction повторяет транзакцию при TransientTransactionError
+                    await session.with_transaction(transaction)
+                _transactions_supported = True
+                return True
+            except _ConditionFailed:
+                return False
+            except OperationFailure as e:
+                if not _is_transactions_unsupported(e):
+                    raise
+                _transactions_supported = False
+                logger.warning("[LEDGER] MongoDB без поддержки транзакций: проводки без транзакции")
+
+        applied = []
+        for query, inc in writes:
+            result = await db.inventory.update_one(query, {"$inc": inc})
+            if result.matched_count == 0:
+                # Откат уже применённых позиций
+                for applied_query, applied_inc in applied:
+                    await db.inventory.update_one(
+                        {"_id": applied_query["_id"]},
+                        {"$inc": {field: -value for field, value in applied_inc.items()}}
+                    )
+                return False
+            applied.append((query, inc))
+
+        if history:
+            await db.inventory_history.insert_many(history)
+        return True
@@ -0,0 +1,154 @@
+from typing import List, Dict, Any, Optional, Tuple
+from bson import ObjectId
+import re
+
+from backend.core.database import get_database
+
+# Поля inventory, по которым разрешена серверная сортировка
+INVENTORY_SORT_FIELDS = {"sku", "quantity", "reserved", "available", "alert_threshold"}
+
+
+def _as_object_id(value: Any) -> Optional[ObjectId]:
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+def _first_image(product: Dict[str, Any]) -> str:
+    """Fallback на старые поля с фото"""
+    return (product.get("photos") or [None])[0] or (product.get("minimalmod", {}).get("images") or [""])[0] or ""
+
+
+class InventoryService:
+    @staticmethod
+    async def list_fbs_inventory(
+        seller_id: str,
+        search: Optional[str] = None,
+        low_stock: bool = False,
+        sort_by: str = "sku",
+        sort_order: str = "asc",
+        skip: int = 0,
+        limit: Optional[int] = None,
+        legacy_products: bool = False
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Остатки FBS продавца с названием и фото товара
+
+        Фильтрация, сортировка и пагинация выполняются в MongoDB, товары и фото
+        для страницы загружаются пачкой через $in (без запросов на каждую строку).
+
+        Args:
+            search: подстрока артикула или названия товара
+            low_stock: только позиции с available <= alert_threshold
+            legacy_products: искать товары также в старой коллекции products
+
+        Returns:
+            (строки страницы, общее количество строк по фильтру)
+        """
+        db = await get_database()
+
+        query: Dict[str, Any] = {"seller_id": seller_id}
+
+        if search:
+            pattern = {"$regex": re.escape(search), "$options": "i"}
+            matched = await db.product_catalog.find(
+                {"seller_id": seller_id, "$or": [{"name": pattern}, {"minimalmod.name": pattern}, {"article": pattern}]},
+                {"_id": 1}
+            ).to_list(length=None)
+            matched_ids = [p["_id"] for p in matched]
+            query["$or"] = [
+                {"sku": pattern},
+                {"product_id": {"$in": matched_ids + [str(pid) for pid in matched_ids]}}
+            ]
+
+        if low_stock:
+            query["$expr"] = {"$lte": ["$available", {"$ifNull": ["$alert_threshold", 10]}]}
+
+        if sort_by not in INVENTORY_SORT_FIELDS:
+            sort_by = "sku"
+        direction = -1 if sort_order == "desc" else 1
+
+        total = await db.inventory.count_documents(query)
+
+        cursor = db.inventory.find(query).sort([(sort_by, direction), ("_id", 1)]).skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        inventory_list = await cursor.to_list(length=limit)
+
+        if not inventory_list:
+            return [], total
+
+        # Товары по product_id (как есть и как ObjectId)
+        raw_ids = [inv["product_id"] for inv in inventory_list]
+        lookup_ids = raw_ids + [oid for oid in map(_as_object_id, raw_ids) if oid is not None]
+        products = await db.product_catalog.find({"_id": {"$in": lookup_ids}}).to_list(length=None)
+        products_by_id = {str(p["_id"]): p for p in products}
+
+        # Не нашли по id - поиск по артикулу
+        missing_skus = [
+            inv.get("sku") for inv in inventory_list
+            if str(inv["product_id"]) not in products_by_id and inv.get("sku")
+        ]
+        products_by_sku: Dict[str, Dict[str, Any]] = {}
+        if missing_skus:
+            by_sku = await db.product_catalog.find(
+                {"article": {"$in": missing_skus}, "seller_id": seller_id}
+            ).to_list(length=None)
+            products_by_sku = {p["article"]: p for p in by_sku}
+
+        if legacy_products:
+            legacy_ids = [
+                oid for inv in inventory_list
+                if str(inv["product_id"]) not in products_by_id and inv.get("sku") not in products_by_sku
+                for oid in [_as_object_id(inv["product_id"])] if oid is not None
+            ]
+            if legacy_ids:
+                legacy = await db.products.find({"_id": {"$in": legacy_ids}}).to_list(length=None)
+                for p in legacy:
+                    products_by_id.setdefault(str(p["_id"]), p)
+
+        resolved = []
+        for inv in inventory_list:
+            product = products_by_id.get(str(inv["product_id"])) or products_by_sku.get(inv.get("sku", ""))
+            resolved.append((inv, product))
+
+        # Фото - одним запросом, первое фото на товар
+        photo_ids = list({str(product["_id"]) for _, product in resolved if product})
+        photos: Dict[str, str] = {}
+        if photo_ids:
+            photo_docs = await db.product_photos.find(
+                {"product_id": {"$in": photo_ids}},
+                {"product_id": 1, "url": 1}
+            ).to_list(length=None)
+            for photo in photo_docs:
+                photos.setdefault(photo["product_id"], photo.get("url", ""))
+
+        result = []
+        for inv, product in resolved:
+            product_name = ""
+            product_image = ""
+
+            if product:
+                product_name = product.get("name") or product.get("minimalmod", {}).get("name", "")
+                actual_product_id = str(product["_id"])
+                if actual_product_id in photos:
+                    product_image = photos[actual_product_id]
+                else:
+                    product_image = _first_image(product)
+
+            result.append({
+                "id": str(inv["_id"]),
+                "product_id": str(inv["product_id"]),
+                "seller_id": str(inv["seller_id"]),
+                "sku": inv.get("sku", ""),
+                "quantity": inv.get("quantity", 0),
+                "reserved": inv.get("reserved", 0),
+                "available": inv.get("available", 0),
+                "alert_threshold": inv.get("alert_threshold", 10),
+                "product_name": product_name,
+                "product_image": product_image
+            })
+
+        return result, total
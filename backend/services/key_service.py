@@ -8,6 +8,7 @@ import logging
 
 from backend.core.database import get_database
 from backend.core.security import encrypt_api_key
+from backend.services.credentials import CredentialRegistry
 from backend.schemas.api_key import APIKey, APIKeyCreate
 
 logger = logging.getLogger(__name__)
@@ -89,6 +90,7 @@ class KeyService:
         
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to add API key")
+        CredentialRegistry.invalidate(user_id, key_id)
             
         return {
             "message": "API key added successfully",
@@ -125,6 +127,7 @@ class KeyService:
                 
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="API key not found")
+        CredentialRegistry.invalidate(user_id, key_id)
             
         return True
 
@@ -156,5 +159,6 @@ class KeyService:
             {"user_id": ObjectId(user_id)},
             {"$set": {"api_keys": api_keys}}
         )
+        CredentialRegistry.invalidate(user_id, key_id)
         
         return result.modified_count > 0
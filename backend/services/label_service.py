@@ -0,0 +1,257 @@
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+from io import BytesIO
+import asyncio
+import hashlib
+import logging
+import re
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import UpdateOne
+from pypdf import PdfReader, PdfWriter
+
+from backend.core.config import settings
+from backend.connectors import MarketplaceError, OZON_LABELS_PER_REQUEST
+from backend.services.credentials import CredentialRegistry
+
+logger = logging.getLogger(__name__)
+
+# Отправлений в одном запросе этикеток по маркетплейсам (коннектор с get_labels)
+LABELS_PER_REQUEST = {"ozon": OZON_LABELS_PER_REQUEST}
+
+
+def label_url(label_id: str) -> str:
+    """Ссылка на PDF этикетки (см. GET /api/orders/fbs/labels/file/{label_id})"""
+    return f"/api/orders/fbs/labels/file/{label_id}"
+
+
+def _page_pdf(page) -> bytes:
+    writer = PdfWriter()
+    writer.add_page(page)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def split_pdf_pages(content: bytes) -> List[bytes]:
+    """PDF -> отдельный PDF на каждую страницу"""
+    return [_page_pdf(page) for page in PdfReader(BytesIO(content)).pages]
+
+
+def split_labels_by_posting(content: bytes, posting_numbers: List[str]) -> Optional[List[bytes]]:
+    """
+    PDF пачки этикеток -> PDF этикетки каждого отправления (в порядке posting_numbers)
+
+    Страница относится к отправлению, номер которого есть в её тексте; порядок
+    страниц в ответе МП не важен. None - страниц не по одной на отправление
+    или номер на странице не найден (тогда этикетки запрашиваются по одной).
+    """
+    reader = PdfReader(BytesIO(content))
+    if len(reader.pages) != len(posting_numbers):
+        return None
+
+    patterns = {
+        number: re.compile(r"(?<![\w-])" + re.escape(number) + r"(?![\w-])")
+        for number in posting_numbers
+    }
+    by_posting: Dict[str, bytes] = {}
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        matched = [number for number, pattern in patterns.items() if pattern.search(text)]
+        if len(matched) != 1 or matched[0] in by_posting:
+            return None
+        by_posting[matched[0]] = _page_pdf(page)
+    return [by_posting[number] for number in posting_numbers]
+
+
+def merge_pdfs(contents: List[bytes]) -> bytes:
+    """Склеить PDF в один документ (для печати пачки этикеток)"""
+    writer = PdfWriter()
+    for content in contents:
+        writer.append(PdfReader(BytesIO(content)))
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class LabelStore:
+    """
+    Хранилище PDF этикеток в GridFS (bucket labels), адресация по содержимому:
+    id этикетки - sha256 файла, одинаковые PDF продавца хранятся один раз.
+    В заказе хранится только label_id; файл выдаётся только своему продавцу
+    (в этикетках данные покупателя).
+    """
+
+    BUCKET = "labels"
+
+    @classmethod
+    def _bucket(cls, db) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(db, bucket_name=cls.BUCKET)
+
+    @classmethod
+    async def put(cls, db, content: bytes, seller_id: str) -> str:
+        label_id = hashlib.sha256(content).hexdigest()
+        if await db[f"{cls.BUCKET}.files"].find_one({"filename": label_id, "metadata.seller_id": seller_id}, {"_id": 1}):
+            return label_id
+
+        await cls._bucket(db).upload_from_stream(
+            label_id,
+            content,
+            metadata={
+                "content_type": "application/pdf",
+                "seller_id": seller_id,
+                "created_at": datetime.utcnow()
+            }
+        )
+        return label_id
+
+    @classmethod
+    async def get(cls, db, label_id: str, seller_id: str) -> Optional[bytes]:
+        """PDF этикетки продавца (None - нет или принадлежит другому продавцу)"""
+        file = await db[f"{cls.BUCKET}.files"].find_one(
+            {"filename": label_id, "metadata.seller_id": seller_id},
+            {"_id": 1}
+        )
+        if not file:
+            return None
+        try:
+            stream = await cls._bucket(db).open_download_stream(file["_id"])
+        except NoFile:
+            return None
+        return await stream.read()
+
+
+class LabelService:
+    """
+    Загрузка этикеток FBS заказов пачками.
+
+    Отправления одного маркетплейса запрашиваются по LABELS_PER_REQUEST
+    в запросе, запросы идут параллельно (не больше LABELS_FETCH_CONCURRENCY).
+    PDF ответа делится постранично по номерам отправлений на страницах
+    (split_labels_by_posting); если так разделить нельзя, этикетки этой
+    пачки запрашиваются по одной.
+    """
+
+    @staticmethod
+    async def fetch_labels(
+        db,
+        profile: Optional[dict],
+        seller_id: str,
+        orders: List[dict],
+        user_id: str
+    ) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+        """
+        Этикетки заказов: уже загруженные берутся из заказа, остальные - с МП
+
+        Args:
+            orders: документы orders_fbs (нужны _id, marketplace, external_order_id, status, label_id)
+
+        Returns:
+            ({str(order _id): label_id}, [{"order_id", "error", "status_code"}])
+        """
+        labels: Dict[str, str] = {}
+        errors: List[Dict[str, Any]] = []
+
+        by_marketplace: Dict[str, List[dict]] = {}
+        for order in orders:
+            if order.get("label_id"):
+                labels[str(order["_id"])] = order["label_id"]
+            else:
+                by_marketplace.setdefault(order["marketplace"], []).append(order)
+
+        def fail(chunk: List[dict], message: str, status_code: int = 400):
+            errors.extend(
+                {"order_id": str(order["_id"]), "error": message, "status_code": status_code}
+                for order in chunk
+            )
+
+        semaphore = asyncio.Semaphore(max(1, settings.LABELS_FETCH_CONCURRENCY))
+        fetched: List[Tuple[dict, str]] = []
+
+        async def fetch_chunk(connector, chunk: List[dict]):
+            async with semaphore:
+                try:
+                    content = await connector.get_labels([order["external_order_id"] for order in chunk])
+                except MarketplaceError as e:
+                    fail(chunk, e.message, e.status_code)
+                    return
+
+            if not content:
+                fail(chunk, "Этикетка недоступна", 404)
+                return
+
+            if len(chunk) == 1:
+                pages = [content]
+            else:
+                pages = await asyncio.to_thread(
+                    split_labels_by_posting, content, [order["external_order_id"] for order in chunk]
+                )
+                if pages is None:
+                    # Общий PDF нельзя отдать каждому заказу - при печати одного вышла бы вся пачка
+                    logger.warning(f"[Label] PDF пачки из {len(chunk)} отправлений не делится по номерам, запрос по одному")
+                    await asyncio.gather(*(fetch_chunk(connector, [order]) for order in chunk))
+                    return
+            for order, page in zip(chunk, pages):
+                fetched.append((order, await LabelStore.put(db, page, seller_id)))
+
+        tasks = []
+        api_keys = (profile or {}).get("api_keys", [])
+        for marketplace, marketplace_orders in by_marketplace.items():
+            integration = next((k for k in api_keys if k.get("marketplace") == marketplace), None)
+            if not integration:
+                fail(marketplace_orders, f"Интеграция {marketplace} не найдена", 404)
+                continue
+
+            per_request = LABELS_PER_REQUEST.get(marketplace)
+            try:
+                connector = CredentialRegistry.connector(seller_id, integration)
+            except ValueError as e:
+                fail(marketplace_orders, str(e))
+                continue
+            if not per_request or not hasattr(connector, "get_labels"):
+                fail(marketplace_orders, f"Этикетки {marketplace} не поддерживаются")
+                continue
+
+            for start in range(0, len(marketplace_orders), per_request):
+                tasks.append(fetch_chunk(connector, marketplace_orders[start:start + per_request]))
+
+        await asyncio.gather(*tasks)
+
+        if fetched:
+            now = datetime.utcnow()
+            await db.orders_fbs.bulk_write([
+                UpdateOne(
+                    {"_id": order["_id"]},
+                    {
+                        "$set": {"label_id": label_id, "label_updated_at": now},
+                        "$unset": {"label_url": ""},
+                        "$push": {"status_history": {
+                            "status": order.get("status"),
+                            "action": "label_printed",
+                            "changed_at": now,
+                            "changed_by": user_id,
+                            "comment": "Этикетка загружена"
+                        }}
+                    }
+                )
+                for order, label_id in fetched
+            ], ordered=False)
+            for order, label_id in fetched:
+                labels[str(order["_id"])] = label_id
+            logger.info(f"[Label] Загружено этикеток: {len(fetched)}")
+
+        return labels, errors
+
+    @staticmethod
+    async def build_print_run(db, seller_id: str, label_ids: List[str]) -> Optional[str]:
+        """Один PDF со всеми этикетками (в порядке заказов, без повторов)"""
+        unique_ids = list(dict.fromkeys(label_ids))
+        if not unique_ids:
+            return None
+        if len(unique_ids) == 1:
+            return unique_ids[0]
+
+        contents = [content for content in await asyncio.gather(*(LabelStore.get(db, i, seller_id) for i in unique_ids)) if content]
+        merged = await asyncio.to_thread(merge_pdfs, contents)
+        return await LabelStore.put(db, merged, seller_id)
@@ -0,0 +1,120 @@
+from typing import List, Dict, Any, Optional, Tuple, Type
+from datetime import datetime
+from bson import ObjectId
+from pydantic import BaseModel
+import base64
+import json
+
+# Размер страницы списков заказов по умолчанию и максимальный
+ORDER_LIST_DEFAULT_LIMIT = 200
+ORDER_LIST_MAX_LIMIT = 1000
+
+# Заголовки ответа списка: курсор следующей страницы и число заказов по фильтру
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# Поля, которые не нужны в списке FBS заказов (есть в деталях заказа)
+FBS_LIST_EXCLUDED_FIELDS = ("status_history", "label_url")
+
+
+def model_projection(model: Type[BaseModel], exclude: Tuple[str, ...] = ()) -> Dict[str, int]:
+    """Проекция по полям схемы ответа (id -> _id остаётся по умолчанию)"""
+    return {name: 1 for name in model.model_fields if name != "id" and name not in exclude}
+
+
+def date_range_query(query: Dict[str, Any], field: str, date_from: Optional[str], date_to: Optional[str]) -> Dict[str, Any]:
+    """Добавить фильтр по периоду (ISO даты из query параметров)"""
+    if date_from:
+        query[field] = {"$gte": datetime.fromisoformat(date_from)}
+    if date_to:
+        query.setdefault(field, {})["$lte"] = datetime.fromisoformat(date_to)
+    return query
+
+
+def encode_cursor(doc: Dict[str, Any], sort_field: str) -> str:
+    """Курсор - значение поля сортировки и _id последнего заказа страницы"""
+    value: Any = doc
+    for part in sort_field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    payload = {"v": value.isoformat() if isinstance(value, datetime) else None, "id": str(doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    """
+    Raises:
+        ValueError: курсор повреждён
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(payload["v"]) if payload.get("v") else None
+        return value, ObjectId(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+async def list_orders(
+    collection,
+    query: Dict[str, Any],
+    projection: Dict[str, int],
+    limit: int = ORDER_LIST_DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    sort_field: str = "created_at"
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Страница заказов, новые сверху, keyset пагинация по (sort_field, _id)
+
+    В отличие от skip, следующая страница читается по индексу с места
+    остановки, и стоимость не растёт с номером страницы.
+
+    Returns:
+        (заказы с id вместо _id, курсор следующей страницы или None)
+
+    Raises:
+        ValueError: курсор повреждён
+    """
+    limit = max(1, min(limit, ORDER_LIST_MAX_LIMIT))
+
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        if value is None:
+            # Заказы без даты идут в конце (null меньше любой даты)
+            after = {sort_field: None, "_id": {"$lt": last_id}}
+        else:
+            after = {"$or": [
+                {sort_field: {"$lt": value}},
+                {sort_field: value, "_id": {"$lt": last_id}}
+            ]}
+        query = {"$and": [query, after]}
+
+    orders = await collection.find(query, projection).sort(
+        [(sort_field, -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1], sort_field)
+
+    for order in orders:
+        order["id"] = str(order.pop("_id"))
+    return orders, next_cursor
+
+
+async def count_orders(collection, query: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Число заказов по фильтру и по статусам одним запросом
+
+    Returns:
+        {"total": n, "<status>": n, ...}
+    """
+    rows = await collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+
+    counts = {"total": sum(row["count"] for row in rows)}
+    for row in rows:
+        if row["_id"]:
+            counts[row["_id"]] = row["count"]
+    return counts
@@ -1,5 +1,5 @@
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Union
 from datetime import datetime
 from bson import ObjectId
 from backend.core.database import get_database
@@ -284,12 +284,11 @@ class ProductService:
         }
 
     @staticmethod
-    async def get_marketplace_products(marketplace: str, seller_id: str, api_key_id: Optional[str] = None) -> List[dict]:
+    async def _get_marketplace_connector(marketplace: str, seller_id: str, api_key_id: Optional[str] = None):
+        """Коннектор маркетплейса по API ключу продавца"""
         from backend.connectors import get_connector
         db = await get_database()
         
-        db = await get_database()
-        
         # Get API keys
         # Try finding profile by string or ObjectId user_id to be robust
         profile = await db.seller_profiles.find_one({
@@ -326,41 +325,110 @@ class ProductService:
             api_key_data["api_key"]
         )
         
+        if not hasattr(connector, 'get_products'):
+            # WB/Yandex might need generic implementation or specific one
+            raise ValueError(f"Fetching products from {marketplace} is not supported yet.")
+        
+        return connector
+
+    @classmethod
+    async def get_marketplace_products(cls, marketplace: str, seller_id: str, api_key_id: Optional[str] = None) -> List[dict]:
+        connector = await cls._get_marketplace_connector(marketplace, seller_id, api_key_id)
+        
         try:
             # Use the connector to fetch products
-            # Note: For Ozon we implemented get_products in OzonConnector
-            # For others we might need to implement it or it might be missing
-            if hasattr(connector, 'get_products'):
-                return await connector.get_products()
-            else:
-                 # Fallback or error if not implemented
-                 # WB/Yandex might need generic implementation or specific one
-                 raise ValueError(f"Fetching products from {marketplace} is not supported yet.")
+            return await connector.get_products()
+        except Exception as e:
+             raise ValueError(f"Failed to fetch products from {marketplace}: {str(e)}")
+
+    @classmethod
+    async def iter_marketplace_products(
+        cls,
+        marketplace: str,
+        seller_id: str,
+        api_key_id: Optional[str] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Товары маркетплейса страницами (connector.iter_products), без загрузки
+        всего каталога в память
+        """
+        connector = await cls._get_marketplace_connector(marketplace, seller_id, api_key_id)
+        
+        try:
+            async for page in connector.iter_products():
+                yield page
         except Exception as e:
              raise ValueError(f"Failed to fetch products from {marketplace}: {str(e)}")
 
     @classmethod
-    async def import_from_marketplace(cls, marketplace: str, products: List[dict], seller_id: str) -> dict:
+    async def import_from_marketplace(
+        cls,
+        marketplace: str,
+        products: Union[List[dict], AsyncIterator[List[dict]]],
+        seller_id: str
+    ) -> dict:
         """
         Import selected products from marketplace to local catalog
+        
+        products - список товаров или асинхронный итератор страниц
+        (iter_marketplace_products): страницы обрабатываются по мере получения.
         """
         db = await get_database()
-        created_count = 0
-        updated_count = 0
+        stats = {"created": 0, "updated": 0}
         errors = []
         
-        for p in products:
+        if isinstance(products, list):
+            await cls._import_marketplace_page(db, marketplace, products, seller_id, stats, errors)
+        else:
+            async for page in products:
+                await cls._import_marketplace_page(db, marketplace, page, seller_id, stats, errors)
+        
+        created_count = stats["created"]
+        updated_count = stats["updated"]
+        
+        return {
+            "success": True,
+            "created": created_count,
+            "updated": updated_count,
+            "errors": errors
+        }
+
+    @classmethod
+    async def _import_marketplace_page(
+        cls,
+        db,
+        marketplace: str,
+        products: List[dict],
+        seller_id: str,
+        stats: Dict[str, int],
+        errors: List[str]
+    ) -> None:
+        """Импорт одной страницы товаров: существующие ищутся одним запросом на страницу"""
+        skus = [p.get('sku') or p.get('offer_id') or p.get('article') for p in products]
+        skus_to_find = list({sku for sku in skus if sku})
+        
+        existing_by_sku: Dict[str, dict] = {}
+        if skus_to_find:
+            existing_products = await db.product_catalog.find(
+                {
+                    "$or": [{"sku": {"$in": skus_to_find}}, {"article": {"$in": skus_to_find}}],
+                    "seller_id": seller_id
+                },
+                {"_id": 1, "sku": 1, "article": 1}
+            ).to_list(length=None)
+            for existing in existing_products:
+                for key in (existing.get("sku"), existing.get("article")):
+                    if key:
+                        existing_by_sku.setdefault(key, existing)
+        
+        for p, sku in zip(products, skus):
             try:
-                sku = p.get('sku') or p.get('offer_id') or p.get('article')
                 if not sku:
                     errors.append(f"Product {p.get('name')} missing SKU")
                     continue
 
                 # Check existence
-                existing = await db.product_catalog.find_one({
-                    "$or": [{"sku": sku}, {"article": sku}],
-                    "seller_id": seller_id
-                })
+                existing = existing_by_sku.get(sku)
                 
                 # Prepare data
                 product_data = {
@@ -390,7 +458,7 @@ class ProductService:
                         {"_id": existing["_id"]},
                         {"$set": update_fields}
                     )
-                    updated_count += 1
+                    stats["updated"] += 1
                 else:
                     # Create new
                     product_data["seller_id"] = seller_id
@@ -404,6 +472,8 @@ class ProductService:
                     product_data["listing_quality_score"] = cls.calculate_listing_quality_score(product_data).dict()
                     
                     result = await db.product_catalog.insert_one(product_data)
+                    # Следующие строки с тем же артикулом (например, размеры WB) - обновление
+                    existing_by_sku[sku] = {"_id": result.inserted_id}
                     
                     # Init inventory
                     await db.inventory.insert_one({
@@ -417,14 +487,7 @@ class ProductService:
                         "available": p.get('stock', 0),
                         "alert_threshold": 10
                     })
-                    created_count += 1
+                    stats["created"] += 1
                     
             except Exception as e:
                 errors.append(f"Error importing {p.get('sku')}: {str(e)}")
-                
-        return {
-            "success": True,
-            "created": created_count,
-            "updated": updated_count,
-            "errors": errors
-        }
@@ -0,0 +1,289 @@
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from datetime import datetime
+from collections import defaultdict
+import uuid
+from pymongo import UpdateOne
+
+from backend.core.config import settings
+from backend.core.locks import mongo_lock
+
+# Атрибуция операции к SKU в строке свёртки:
+#   item       - первый товар операции
+#   extra_item - остальные товары операции (учитываются только в расчёте по Finance API)
+#   posting    - операция без товаров, SKU найден по номеру отправления
+#   none       - операция без привязки к товару (общие расходы)
+ROLLUP_FIELDS = ("pos_amount", "neg_amount", "pos_count", "neg_count")
+
+# Ключ строки: (день, sku, operation_type, attribution)
+RowKey = Tuple[datetime, str, str, str]
+
+
+def _day(value: Any) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace(" ", "T").replace("Z", ""))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return datetime(value.year, value.month, value.day)
+
+
+def operation_contributions(op: Dict[str, Any]) -> List[Tuple[RowKey, str, Dict[str, float]]]:
+    """
+    Вклад одной операции в строки sku_daily_economics
+
+    Операция может быть документом ozon_operations или сырой операцией API.
+    Для операций без товаров SKU берётся из rollup_posting_sku (проставляется при загрузке).
+
+    Returns:
+        [(ключ строки, название товара, {pos_amount, neg_amount, pos_count, neg_count})]
+    """
+    amount = op.get("amount", 0) or 0
+    delta = {
+        "pos_amount": amount if amount > 0 else 0,
+        "neg_amount": -amount if amount < 0 else 0,
+        "pos_count": 1 if amount > 0 else 0,
+        "neg_count": 1 if amount < 0 else 0,
+    }
+    day = _day(op.get("operation_date"))
+    op_type = op.get("operation_type", "")
+    items = op.get("items") or []
+
+    if items:
+        return [
+            (
+                (day, str(item.get("sku", "")), op_type, "item" if index == 0 else "extra_item"),
+                item.get("name", ""),
+                delta
+            )
+            for index, item in enumerate(items)
+        ]
+
+    posting_sku = op.get("rollup_posting_sku")
+    if posting_sku:
+        return [((day, posting_sku, op_type, "posting"), "", delta)]
+    return [((day, "", op_type, "none"), "", delta)]
+
+
+def summarize_operations(operations: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Свернуть операции в памяти в строки того же вида, что возвращает
+    SkuEconomicsService.load_rows (для операций, полученных напрямую из API)
+    """
+    rows: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    for op in operations:
+        for (_, sku, op_type, attribution), name, delta in operation_contributions(op):
+            row = rows.setdefault((sku, op_type, attribution), {
+                "sku": sku,
+                "operation_type": op_type,
+                "attribution": attribution,
+                "name": "",
+                **{field: 0 for field in ROLLUP_FIELDS}
+            })
+            if name:
+                row["name"] = name
+            for field in ROLLUP_FIELDS:
+                row[field] += delta[field]
+    return list(rows.values())
+
+
+class SkuEconomicsService:
+    """
+    Материализованная свёртка финансовых операций Ozon по SKU и дням
+    (коллекция sku_daily_economics).
+
+    Строка - сумма положительных/отрицательных начислений и их количество
+    по (продавец, день, SKU, тип операции, атрибуция). Категоризация и COGS
+    считаются при запросе уже по свёрнутым строкам, поэтому отчёты за любой
+    период не перечитывают ozon_operations.
+    """
+
+    @staticmethod
+    async def resolve_posting_skus(db, seller_id: str, docs: List[Dict[str, Any]]) -> None:
+        """Проставить rollup_posting_sku операциям без товаров по номеру отправления"""
+        postings = {
+            doc["posting_number"] for doc in docs
+            if not doc.get("items") and doc.get("posting_number")
+        }
+        if not postings:
+            return
+
+        sku_by_posting: Dict[str, str] = {}
+        for doc in docs:
+            if doc.get("items") and doc.get("posting_number") in postings:
+                sku_by_posting.setdefault(doc["posting_number"], str(doc["items"][0].get("sku", "")))
+
+        missing = list(postings - sku_by_posting.keys())
+        if missing:
+            linked = await db.ozon_operations.find(
+                {"seller_id": seller_id, "posting_number": {"$in": missing}, "items.0": {"$exists": True}},
+                {"posting_number": 1, "items.sku": 1}
+            ).to_list(length=None)
+            for op in linked:
+                sku_by_posting.setdefault(op["posting_number"], str(op["items"][0].get("sku", "")))
+
+        for doc in docs:
+            if not doc.get("items") and doc.get("posting_number") in sku_by_posting:
+                doc["rollup_posting_sku"] = sku_by_posting[doc["posting_number"]]
+
+    @staticmethod
+    async def apply(
+        db,
+        seller_id: str,
+        added: Iterable[Dict[str, Any]],
+        removed: Iterable[Dict[str, Any]] = ()
+    ) -> int:
+        """
+        Инкрементально обновить свёртку: прибавить вклад новых версий операций
+        и вычесть вклад заменяемых (уже учтённых) версий
+
+        Returns:
+            Количество изменённых строк
+        """
+        deltas: Dict[RowKey, Dict[str, float]] = defaultdict(lambda: {field: 0 for field in ROLLUP_FIELDS})
+        names: Dict[RowKey, str] = {}
+
+        for sign, ops in ((1, added), (-1, removed)):
+            for op in ops:
+                for key, name, delta in operation_contributions(op):
+                    if key[0] is None:
+                        continue
+                    for field in ROLLUP_FIELDS:
+                        deltas[key][field] += sign * delta[field]
+                    if sign > 0 and name:
+                        names[key] = name
+
+        now = datetime.utcnow()
+        requests = []
+        for key, delta in deltas.items():
+            if not any(delta.values()) and key not in names:
+                continue
+            day, sku, op_type, attribution = key
+            update: Dict[str, Any] = {
+                "$inc": delta,
+                "$set": {"updated_at": now}
+            }
+            if key in names:
+                update["$set"]["name"] = names[key]
+            requests.append(UpdateOne(
+                {
+                    "seller_id": seller_id,
+                    "date": day,
+                    "sku": sku,
+                    "operation_type": op_type,
+                    "attribution": attribution
+                },
+                update,
+                upsert=True
+            ))
+
+        if requests:
+            await db.sku_daily_economics.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    @staticmethod
+    def lock(db, seller_id: str):
+        """
+        Блокировка свёртки продавца: загрузка операций и дозаполнение не идут одновременно
+
+        Raises:
+            LockBusy: (при входе) свёртку продавца уже обновляет другая задача
+        """
+        return mongo_lock(db, f"sku_economics:{seller_id}", settings.SKU_ECONOMICS_LOCK_SECONDS)
+
+    @staticmethod
+    async def backfill(db, seller_id: str, batch_size: int = 1000) -> int:
+        """
+        Учесть в свёртке операции, загруженные до её появления (rollup_applied не True)
+
+        Строки свёртки не удаляются: каждая операция сначала помечается
+        rollup_applied условным обновлением, и прибавляется только теми, кто
+        её пометил, поэтому повторный или параллельный запуск не удваивает суммы.
+        Запускается отдельно (scripts/backfill_sku_economics.py), не из отчётов;
+        вызывающий держит SkuEconomicsService.lock.
+
+        Returns:
+            Количество учтённых операций
+        """
+        projection = {
+            "operation_id": 1, "operation_type": 1, "operation_date": 1, "amount": 1,
+            "posting_number": 1, "items.sku": 1, "items.name": 1
+        }
+        total = 0
+        batch: List[Dict[str, Any]] = []
+
+        async def flush() -> int:
+            ids = [doc["_id"] for doc in batch]
+            claim = uuid.uuid4().hex
+            await db.ozon_operations.update_many(
+                {"_id": {"$in": ids}, "rollup_applied": {"$ne": True}},
+                {"$set": {"rollup_applied": True, "rollup_claim": claim}}
+            )
+            claimed_ids = set(await db.ozon_operations.distinct("_id", {"_id": {"$in": ids}, "rollup_claim": claim}))
+            claimed = [doc for doc in batch if doc["_id"] in claimed_ids]
+            if not claimed:
+                return 0
+
+            await SkuEconomicsService.resolve_posting_skus(db, seller_id, claimed)
+            await SkuEconomicsService.apply(db, seller_id, claimed)
+            await db.ozon_operations.bulk_write([
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {"rollup_posting_sku": doc.get("rollup_posting_sku")}, "$unset": {"rollup_claim": ""}}
+                )
+                for doc in claimed
+            ], ordered=False)
+            return len(claimed)
+
+        async for doc in db.ozon_operations.find({"seller_id": seller_id, "rollup_applied": {"$ne": True}}, projection):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                total += await flush()
+                batch = []
+        if batch:
+            total += await flush()
+
+        return total
+
+    @staticmethod
+    async def load_rows(
+        db,
+        seller_id: str,
+        period_start: Optional[datetime] = None,
+        period_end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Суммы свёртки за период по (sku, operation_type, attribution)
+
+        Границы периода округляются до целых дней. Только чтение: операции,
+        загруженные до появления свёртки, попадают в неё после backfill.
+        """
+        match: Dict[str, Any] = {"seller_id": seller_id}
+        if period_start or period_end:
+            match["date"] = {}
+            if period_start:
+                match["date"]["$gte"] = _day(period_start)
+            if period_end:
+                match["date"]["$lte"] = _day(period_end)
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"date": 1}},
+            {"$group": {
+                "_id": {"sku": "$sku", "operation_type": "$operation_type", "attribution": "$attribution"},
+                "name": {"$max": "$name"},
+                **{field: {"$sum": f"${field}"} for field in ROLLUP_FIELDS}
+            }}
+        ]
+        rows = await db.sku_daily_economics.aggregate(pipeline).to_list(length=None)
+        return [
+            {
+                "sku": row["_id"]["sku"],
+                "operation_type": row["_id"]["operation_type"],
+                "attribution": row["_id"]["attribution"],
+                "name": row.get("name") or "",
+                **{field: row.get(field, 0) for field in ROLLUP_FIELDS}
+            }
+            for row in rows
+        ]
@@ -0,0 +1,219 @@
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime, timedelta
+from collections import defaultdict
+import asyncio
+import logging
+import uuid
+from bson import ObjectId
+
+from backend.core.config import settings
+from backend.core.database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+def _seller_id_variants(seller_id: Any) -> List[Any]:
+    """seller_id хранится в коллекциях и строкой, и ObjectId"""
+    variants = [str(seller_id)]
+    if ObjectId.is_valid(str(seller_id)):
+        variants.append(ObjectId(str(seller_id)))
+    return variants
+
+
+class StockOutbox:
+    """
+    Очередь изменений остатков (коллекция stock_outbox).
+
+    Эндпоинты заказов и склада только записывают событие "остаток артикула
+    изменился", а отправку на маркетплейсы делает StockOutboxWorker.
+    Количество читается из inventory в момент отправки, поэтому несколько
+    изменений одного артикула за окно склеиваются в одну позицию батча.
+    """
+
+    @staticmethod
+    async def enqueue(
+        db,
+        seller_id: Any,
+        articles: Iterable[str],
+        warehouse_id: Optional[str] = None,
+        source: str = ""
+    ) -> int:
+        """
+        Записать изменения остатков в очередь
+
+        Args:
+            warehouse_id: склад для синхронизации; None - все склады продавца с sends_stock=True
+            source: откуда пришло изменение (для диагностики)
+
+        Returns:
+            Количество записанных событий
+        """
+        now = datetime.utcnow()
+        events = [
+            {
+                "seller_id": str(seller_id),
+                "article": article,
+                "warehouse_id": warehouse_id,
+                "source": source,
+                "status": "pending",
+                "attempts": 0,
+                "created_at": now
+            }
+            for article in dict.fromkeys(articles)
+            if article
+        ]
+
+        if events:
+            await db.stock_outbox.insert_many(events)
+            logger.info(f"[OUTBOX] Queued {len(events)} stock changes for seller {seller_id} ({source})")
+
+        return len(events)
+
+    @staticmethod
+    async def process_pending(db, limit: Optional[int] = None) -> int:
+        """
+        Забрать созревшие события и отправить остатки батчами
+
+        Returns:
+            Количество обработанных событий
+        """
+        from backend.routers.stock_sync import sync_products_to_marketplace
+
+        now = datetime.utcnow()
+        limit = limit or settings.STOCK_OUTBOX_BATCH_LIMIT
+
+        # Вернуть в очередь события, "зависшие" у упавшего воркера
+        await db.stock_outbox.update_many(
+            {"status": "processing", "claimed_at": {"$lte": now - timedelta(minutes=10)}},
+            {"$set": {"status": "pending"}, "$unset": {"claim_id": ""}}
+        )
+
+        # События старше окна склейки - более свежие подождут следующих изменений
+        cutoff = now - timedelta(seconds=settings.STOCK_OUTBOX_COALESCE_SECONDS)
+        ready = await db.stock_outbox.find(
+            {"status": "pending", "created_at": {"$lte": cutoff}, "retry_at": {"$not": {"$gt": now}}},
+            {"_id": 1}
+        ).sort("created_at", 1).limit(limit).to_list(length=limit)
+
+        if not ready:
+            return 0
+
+        claim_id = str(uuid.uuid4())
+        await db.stock_outbox.update_many(
+            {"_id": {"$in": [e["_id"] for e in ready]}, "status": "pending"},
+            {"$set": {"status": "processing", "claim_id": claim_id, "claimed_at": now}}
+        )
+        events = await db.stock_outbox.find({"claim_id": claim_id}).to_list(length=None)
+
+        # seller_id -> warehouse_id (None = все склады) -> артикулы
+        grouped: Dict[str, Dict[Optional[str], set]] = defaultdict(lambda: defaultdict(set))
+        for event in events:
+            grouped[event["seller_id"]][event.get("warehouse_id")].add(event["article"])
+
+        for seller_id, by_warehouse in grouped.items():
+            seller_filter = {"$in": _seller_id_variants(seller_id)}
+            try:
+                articles = set().union(*by_warehouse.values())
+
+                # Актуальные остатки на момент отправки
+                products = await db.product_catalog.find(
+                    {"article": {"$in": list(articles)}, "seller_id": seller_filter},
+                    {"article": 1}
+                ).to_list(length=None)
+                article_by_product = {p["_id"]: p["article"] for p in products}
+
+                inventories = await db.inventory.find(
+                    {"product_id": {"$in": list(article_by_product.keys())}, "seller_id": seller_filter},
+                    {"product_id": 1, "available": 1}
+                ).to_list(length=None)
+                available = {
+                    article_by_product[inv["product_id"]]: inv.get("available", 0)
+                    for inv in inventories
+                }
+
+                warehouse_articles: Dict[str, set] = defaultdict(set)
+                if None in by_warehouse:
+                    warehouses = await db.warehouses.find({
+                        "seller_id": seller_filter,
+                        "sends_stock": True
+                    }, {"id": 1}).to_list(length=100)
+                    for wh in warehouses:
+                        warehouse_articles[wh["id"]] |= by_warehouse[None]
+                for warehouse_id, wh_articles in by_warehouse.items():
+                    if warehouse_id is not None:
+                        warehouse_articles[warehouse_id] |= wh_articles
+
+                user_id = ObjectId(seller_id) if ObjectId.is_valid(seller_id) else seller_id
+                failed = 0
+                for warehouse_id, wh_articles in warehouse_articles.items():
+                    items = [(a, available[a]) for a in wh_articles if a in available]
+                    stats = await sync_products_to_marketplace(db, user_id, warehouse_id, items)
+                    logger.info(f"[OUTBOX] Seller {seller_id} warehouse {warehouse_id}: {stats}")
+                    failed += stats.get("failed", 0)
+
+                # Ошибки батчей (429, 5xx) sync_products_to_marketplace не пробрасывает -
+                # события остаются в очереди и отправляются повторно
+                if failed:
+                    raise RuntimeError(f"Не отправлено позиций: {failed}")
+
+                await db.stock_outbox.delete_many({"claim_id": claim_id, "seller_id": seller_id})
+
+            except Exception as e:
+                logger.error(f"[OUTBOX] ❌ Stock push failed for seller {seller_id}: {e}")
+                # Повтор с экспоненциальной паузой по числу попыток
+                attempts = max(ev.get("attempts", 0) for ev in events if ev["seller_id"] == seller_id) + 1
+                retry_at = datetime.utcnow() + timedelta(seconds=settings.STOCK_OUTBOX_POLL_SECONDS * 2 ** attempts)
+                await db.stock_outbox.update_many(
+                    {"claim_id": claim_id, "seller_id": seller_id},
+                    {
+                        "$inc": {"attempts": 1},
+                        "$set": {"status": "pending", "last_error": str(e), "retry_at": retry_at},
+                        "$unset": {"claim_id": ""}
+                    }
+                )
+                await db.stock_outbox.update_many(
+                    {"seller_id": seller_id, "status": "pending", "attempts": {"$gte": settings.STOCK_OUTBOX_MAX_ATTEMPTS}},
+                    {"$set": {"status": "failed"}}
+                )
+
+        return len(events)
+
+
+class StockOutboxWorker:
+    """Фоновая задача, разбирающая stock_outbox (запускается в server.py)"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info("[OUTBOX] ✅ Stock outbox worker started")
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            logger.info("[OUTBOX] Stock outbox worker stopped")
+        self._task = None
+
+    async def _run(self):
+        while True:
+            processed = 0
+            try:
+                db = await get_database()
+                processed = await StockOutbox.process_pending(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[OUTBOX] Worker iteration failed: {e}")
+
+            # Полный батч - сразу берём следующий
+            if processed < settings.STOCK_OUTBOX_BATCH_LIMIT:
+                await asyncio.sleep(settings.STOCK_OUTBOX_POLL_SECONDS)
+
+
+stock_outbox_worker = StockOutboxWorker()
@@ -0,0 +1,165 @@
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Set
+from datetime import datetime
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SyncJob:
+    """
+    Задача фоновой синхронизации
+
+    Args:
+        seller_id: продавец (единица справедливой очереди)
+        key: ключ задачи; задача пропускается, пока предыдущая с тем же ключом не завершилась
+        run: фабрика корутины задачи
+        host: хост маркетплейса для отдельного лимита параллельности (None - без лимита)
+    """
+
+    def __init__(self, seller_id: str, key: str, run: Callable[[], Awaitable[Any]], host: Optional[str] = None):
+        self.seller_id = seller_id
+        self.key = key
+        self.run = run
+        self.host = host
+
+
+class SellerJobPool:
+    """
+    Пул параллельной синхронизации продавцов для планировщиков.
+
+    - не больше concurrency задач одновременно на весь пул
+      и не больше host_concurrency на один хост маркетплейса;
+    - задачи стартуют по кругу между продавцами (по одной задаче каждого),
+      поэтому продавец с множеством интеграций не занимает весь пул;
+    - задача пропускается, если её прошлый запуск ещё идёт
+      (медленный аккаунт не копит очередь из своих запусков);
+    - длительность и результат каждой задачи пишутся в metrics.
+    """
+
+    def __init__(self, name: str, concurrency: int, host_concurrency: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.host_concurrency = max(1, host_concurrency)
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._running: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _bind_loop(self) -> None:
+        """Семафоры привязаны к event loop: пересоздаём при смене loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._host_semaphores = {}
+            self._running = set()
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.host_concurrency)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    @staticmethod
+    def round_robin(jobs: List[SyncJob]) -> List[SyncJob]:
+        """Порядок запуска: по одной задаче каждого продавца по кругу"""
+        by_seller: "OrderedDict[str, List[SyncJob]]" = OrderedDict()
+        for job in jobs:
+            by_seller.setdefault(job.seller_id, []).append(job)
+
+        ordered = []
+        queues = list(by_seller.values())
+        for index in range(max((len(q) for q in queues), default=0)):
+            ordered.extend(q[index] for q in queues if index < len(q))
+        return ordered
+
+    def is_running(self, key: str) -> bool:
+        return key in self._running
+
+    async def run(self, jobs: List[SyncJob]) -> Dict[str, Any]:
+        """
+        Выполнить задачи и дождаться их завершения
+
+        Returns:
+            {"started", "skipped", "failed", "duration", "results": {key: результат задачи}}
+        """
+        self._bind_loop()
+        started_at = time.perf_counter()
+        skipped = 0
+        tasks = []
+
+        # Задачи создаются в порядке round robin; семафоры asyncio пропускают
+        # ожидающих по очереди, так что этот порядок сохраняется при старте
+        for job in self.round_robin(jobs):
+            if job.key in self._running:
+                skipped += 1
+                logger.warning(f"[{self.name}] Пропуск {job.key}: предыдущий запуск ещё выполняется")
+                continue
+            self._running.add(job.key)
+            tasks.append(asyncio.create_task(self._run_job(job)))
+
+        outcomes = await asyncio.gather(*tasks)
+        results = {key: result for key, ok, result in outcomes if ok}
+        failed = sum(1 for _, ok, _ in outcomes if not ok)
+        duration = time.perf_counter() - started_at
+
+        logger.info(
+            f"[{self.name}] Выполнено {len(tasks)} задач за {duration:.1f} c "
+            f"(ошибок: {failed}, пропущено: {skipped})"
+        )
+        return {
+            "started": len(tasks),
+            "skipped": skipped,
+            "failed": failed,
+            "duration": duration,
+            "results": results
+        }
+
+    async def _run_job(self, job: SyncJob):
+        # Сначала лимит хоста, потом общий: задача, ждущая занятый хост,
+        # не держит общий слот
+        host_semaphore = self._host_semaphore(job.host) if job.host else None
+        ok = False
+        result = None
+        duration = 0.0
+        try:
+            if host_semaphore:
+                await host_semaphore.acquire()
+            try:
+                async with self._semaphore:
+                    job_started = time.perf_counter()
+                    try:
+                        result = await job.run()
+                        ok = True
+                    except Exception as e:
+                        logger.error(f"[{self.name}] Ошибка задачи {job.key}: {e}")
+                    duration = time.perf_counter() - job_started
+            finally:
+                if host_semaphore:
+                    host_semaphore.release()
+        finally:
+            self._running.discard(job.key)
+            self._record(job, ok, duration)
+        return job.key, ok, result
+
+    def _record(self, job: SyncJob, ok: bool, duration: float) -> None:
+        metric = self.metrics.setdefault(job.key, {
+            "seller_id": job.seller_id,
+            "host": job.host,
+            "runs": 0,
+            "failures": 0,
+            "max_duration": 0.0
+        })
+        metric["runs"] += 1
+        if not ok:
+            metric["failures"] += 1
+        metric["last_status"] = "ok" if ok else "error"
+        metric["last_duration"] = duration
+        metric["max_duration"] = max(metric["max_duration"], duration)
+        metric["last_finished_at"] = datetime.utcnow()
+        logger.debug(f"[{self.name}] {job.key}: {duration:.2f} c ({metric['last_status']})")
@@ -1,16 +1,28 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
 import logging
 import asyncio
+from functools import partial
+from bson import ObjectId
 
+from backend.core.config import settings
 from backend.core.database import get_database
-from stock_sync_routes import sync_product_to_marketplace
+from backend.routers.stock_sync import sync_products_to_marketplace
+from backend.services.sync_pool import SellerJobPool, SyncJob
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
+# (seller_id, маркетплейс) -> время последней полной сверки (первый запуск после старта - полный)
+_last_full_sync: Dict[Tuple[str, Optional[str]], datetime] = {}
+
+# Параллельная синхронизация продавцов: задача (продавец, маркетплейс) с лимитом
+# на хост маркетплейса; задача пропускается, пока идёт прошлая
+_pool = SellerJobPool("StockSync", settings.SYNC_POOL_CONCURRENCY, settings.SYNC_POOL_HOST_CONCURRENCY)
+
 
 async def sync_all_stocks_job():
     """
@@ -20,6 +32,11 @@ async def sync_all_stocks_job():
     - Берём все товары из inventory
     - Для каждого товара находим склады с sends_stock=True
     - Синхронизируем на все связанные МП склады
+    - Отправляются только изменившиеся остатки; раз в
+      STOCK_FULL_RECONCILE_HOURS - полная сверка всех товаров
+    - Продавцы синхронизируются параллельно через SellerJobPool: отдельная
+      задача на каждый маркетплейс продавца (host - маркетплейс, поэтому
+      действует SYNC_POOL_HOST_CONCURRENCY)
     """
     logger.info("[SCHEDULER] Starting automatic stock synchronization...")
     
@@ -31,60 +48,117 @@ async def sync_all_stocks_job():
             {"$group": {"_id": "$seller_id"}}
         ]
         sellers = await db.inventory.aggregate(pipeline).to_list(length=1000)
+        marketplaces = await seller_marketplaces(db, [seller_doc["_id"] for seller_doc in sellers])
         
-        total_synced = 0
-        total_products = 0
+        jobs = [
+            SyncJob(
+                seller_id=str(seller_doc["_id"]),
+                key=f"{seller_doc['_id']}:{marketplace}",
+                host=marketplace,
+                run=partial(sync_seller_stocks, db, seller_doc["_id"], marketplace)
+            )
+            for seller_doc in sellers
+            for marketplace in marketplaces.get(str(seller_doc["_id"]), [])
+        ]
+        run = await _pool.run(jobs)
         
-        for seller_doc in sellers:
-            seller_id = seller_doc["_id"]
-            
-            # Получить все склады продавца с sends_stock=True
-            warehouses = await db.warehouses.find({
-                "seller_id": str(seller_id),
-                "sends_stock": True
-            }).to_list(length=100)
-            
-            if not warehouses:
-                logger.info(f"[SCHEDULER] No active warehouses for seller {seller_id}")
-                continue
-            
-            # Получить все inventory записи продавца
-            inventories = await db.inventory.find({
-                "seller_id": str(seller_id)
-            }).to_list(length=10000)
-            
-            total_products += len(inventories)
-            
-            # Синхронизировать каждый товар на все активные склады
-            for inv in inventories:
-                product = await db.product_catalog.find_one({"_id": inv["product_id"]})
-                
-                if not product:
-                    continue
-                
-                article = product.get("article")
-                quantity = inv.get("available", 0)
-                
-                # Синхронизировать на каждый активный склад
-                for warehouse in warehouses:
-                    try:
-                        await sync_product_to_marketplace(
-                            db,
-                            seller_id,
-                            warehouse["id"],
-                            article,
-                            quantity
-                        )
-                        total_synced += 1
-                    except Exception as e:
-                        logger.error(f"[SCHEDULER] Failed to sync {article} to warehouse {warehouse.get('name')}: {e}")
+        total_synced = sum(stats["synced"] for stats in run["results"].values())
+        total_unchanged = sum(stats["unchanged"] for stats in run["results"].values())
         
-        logger.info(f"[SCHEDULER] ✅ Automatic sync completed: {total_synced} products synced across all sellers")
+        logger.info(f"[SCHEDULER] ✅ Automatic sync completed: {total_synced} products synced, {total_unchanged} unchanged across all sellers")
         
     except Exception as e:
         logger.error(f"[SCHEDULER] ❌ Automatic sync failed: {e}")
 
 
+async def seller_marketplaces(db, seller_ids) -> Dict[str, List[str]]:
+    """seller_id -> маркетплейсы его API ключей (по ним делятся задачи синхронизации)"""
+    ids = [str(seller_id) for seller_id in seller_ids]
+    ids += [ObjectId(seller_id) for seller_id in ids if ObjectId.is_valid(seller_id)]
+    profiles = await db.seller_profiles.find(
+        {"user_id": {"$in": ids}},
+        {"user_id": 1, "api_keys.marketplace": 1}
+    ).to_list(length=None)
+    
+    result: Dict[str, List[str]] = {}
+    for profile in profiles:
+        marketplaces = result.setdefault(str(profile["user_id"]), [])
+        for key in profile.get("api_keys", []):
+            marketplace = key.get("marketplace")
+            if marketplace and marketplace not in marketplaces:
+                marketplaces.append(marketplace)
+    return result
+
+
+async def sync_seller_stocks(db, seller_id, marketplace: Optional[str] = None) -> Dict[str, int]:
+    """
+    Синхронизировать остатки одного продавца на все его склады с sends_stock=True
+
+    marketplace - только связи складов с этим маркетплейсом (None - все)
+    """
+    totals = {"products": 0, "synced": 0, "unchanged": 0}
+    
+    # Получить все склады продавца с sends_stock=True
+    warehouses = await db.warehouses.find({
+        "seller_id": str(seller_id),
+        "sends_stock": True
+    }).to_list(length=100)
+    
+    if not warehouses:
+        logger.info(f"[SCHEDULER] No active warehouses for seller {seller_id}")
+        return totals
+    
+    # Получить все inventory записи продавца
+    inventories = await db.inventory.find({
+        "seller_id": str(seller_id)
+    }).to_list(length=10000)
+    
+    totals["products"] = len(inventories)
+    
+    # Артикулы всех товаров продавца - одним запросом
+    products = await db.product_catalog.find(
+        {"_id": {"$in": [inv["product_id"] for inv in inventories]}},
+        {"article": 1}
+    ).to_list(length=None)
+    articles = {p["_id"]: p.get("article") for p in products}
+    
+    items = [
+        (articles[inv["product_id"]], inv.get("available", 0))
+        for inv in inventories
+        if articles.get(inv["product_id"])
+    ]
+    
+    now = datetime.utcnow()
+    sync_key = (str(seller_id), marketplace)
+    last_full = _last_full_sync.get(sync_key)
+    full_sync = last_full is None or now - last_full >= timedelta(hours=settings.STOCK_FULL_RECONCILE_HOURS)
+    
+    # Синхронизировать все товары батчами на каждый активный склад
+    all_ok = True
+    for warehouse in warehouses:
+        try:
+            stats = await sync_products_to_marketplace(
+                db,
+                seller_id,
+                warehouse["id"],
+                items,
+                only_changed=not full_sync,
+                marketplace=marketplace
+            )
+            totals["synced"] += stats["synced"]
+            totals["unchanged"] += stats["unchanged"]
+            all_ok = all_ok and stats["failed"] == 0
+        except Exception as e:
+            all_ok = False
+            logger.error(f"[SCHEDULER] Failed to sync warehouse {warehouse.get('name')}: {e}")
+    
+    if full_sync and all_ok:
+        _last_full_sync[sync_key] = now
+        logger.info(f"[SCHEDULER] Full stock reconcile done for seller {seller_id} ({marketplace or 'all'})")
+    
+    return totals
+
+
 def start_scheduler():
     """
     Запустить планировщик автоматической синхронизации
@@ -97,7 +171,9 @@ def start_scheduler():
         trigger=IntervalTrigger(minutes=15),
         id='stock_sync_job',
         name='Automatic stock synchronization',
-        replace_existing=True
+        replace_existing=True,
+        # Новый запуск не ждёт медленных продавцов прошлого: их задачи пул пропустит
+        max_instances=3
     )
     
     scheduler.start()
@@ -0,0 +1,46 @@
+"""Общие заглушки Motor для тестов: курсор, db с коллекциями по имени, поток страниц"""
+from unittest.mock import MagicMock
+
+
+class FakeCursor:
+    """
+    Замена курсора Motor: find(...).sort(...).skip(...).limit(...).to_list()
+
+    sort только запоминается (документы отдаются в переданном порядке),
+    skip и limit применяются как в MongoDB (limit 0 - без ограничения)
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.sort_spec = None
+        self.skip_value = 0
+        self.limit_value = None
+
+    def sort(self, *args, **kwargs):
+        self.sort_spec = args[0] if args else kwargs.get("key_or_list")
+        return self
+
+    def skip(self, value):
+        self.skip_value = value
+        return self
+
+    def limit(self, value):
+        self.limit_value = value or None
+        return self
+
+    async def to_list(self, length=None):
+        docs = self.docs[self.skip_value:]
+        return docs[:self.limit_value] if self.limit_value else docs
+
+
+def fake_db(collections):
+    """Motor db, у которого db[name] отдаёт коллекцию из словаря"""
+    db = MagicMock()
+    db.__getitem__.side_effect = lambda name: collections[name]
+    return db
+
+
+async def pages_of(*pages):
+    """Асинхронный поток страниц (как iter_fbs_orders / iter_ozon_operations)"""
+    for page in pages:
+        yield page
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, AsyncMock
+from backend.services.attribute_cache import AttributeCache
+
+
+def make_db(doc=None):
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=doc)
+    collection.replace_one = AsyncMock()
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    return db, collection
+
+
+def make_cache(**kwargs):
+    params = dict(max_entries=2, memory_ttl=600, max_age=timedelta(days=7), refresh_ahead=timedelta(days=1))
+    params.update(kwargs)
+    return AttributeCache("category_attributes_cache", "attributes", **params)
+
+
+async def test_concurrent_misses_share_one_marketplace_call():
+    db, collection = make_db()
+    cache = make_cache()
+    calls = 0
+    
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [{"id": 1}]
+    
+    results = await asyncio.gather(*(cache.get(db, "ozon_1_10", loader, {"marketplace": "ozon"}) for _ in range(5)))
+    
+    assert calls == 1
+    assert results == [([{"id": 1}], False)] * 5
+    collection.find_one.assert_awaited_once()
+    collection.replace_one.assert_awaited_once()
+    saved = collection.replace_one.call_args.args[1]
+    assert saved["cache_key"] == "ozon_1_10" and saved["marketplace"] == "ozon" and saved["attributes"] == [{"id": 1}]
+    
+    # следующий запрос - из памяти, без MongoDB
+    assert await cache.get(db, "ozon_1_10", loader) == ([{"id": 1}], True)
+    collection.find_one.assert_awaited_once()
+
+
+async def test_mongo_hit_is_kept_in_memory_and_lru_evicts_oldest():
+    db, collection = make_db({"cache_key": "k", "attributes": [{"id": 2}], "cached_at": datetime.utcnow()})
+    cache = make_cache()
+    loader = AsyncMock(return_value=[])
+    
+    for key in ("a", "b", "c"):
+        assert await cache.get(db, key, loader) == ([{"id": 2}], True)
+    loader.assert_not_awaited()
+    
+    # в памяти только 2 последних ключа
+    await cache.get(db, "c", loader)
+    assert collection.find_one.await_count == 3
+    await cache.get(db, "a", loader)
+    assert collection.find_one.await_count == 4
+
+
+async def test_expired_mongo_entry_is_reloaded():
+    db, collection = make_db({"cache_key": "k", "attributes": [{"id": 1}], "cached_at": datetime.utcnow() - timedelta(days=8)})
+    cache = make_cache()
+    loader = AsyncMock(return_value=[{"id": 3}])
+    
+    assert await cache.get(db, "k", loader) == ([{"id": 3}], False)
+    loader.assert_awaited_once()
+
+
+async def test_entry_close_to_expiry_is_served_and_refreshed_in_background():
+    old = {"cache_key": "k", "attributes": [{"id": 1}], "cached_at": datetime.utcnow() - timedelta(days=6, hours=12)}
+    db, collection = make_db(old)
+    cache = make_cache()
+    loader = AsyncMock(return_value=[{"id": 4}])
+    
+    assert await cache.get(db, "k", loader, {"marketplace": "wb"}) == ([{"id": 1}], True)
+    
+    await asyncio.gather(*cache._background)
+    loader.assert_awaited_once()
+    collection.replace_one.assert_awaited_once()
+    assert await cache.get(db, "k", loader) == ([{"id": 4}], True)
+    loader.assert_awaited_once()
+
+
+async def test_loader_error_reaches_all_waiters_and_is_not_cached():
+    db, collection = make_db()
+    cache = make_cache()
+    loader = AsyncMock(side_effect=RuntimeError("429"))
+    
+    results = await asyncio.gather(cache.get(db, "k", loader), cache.get(db, "k", loader), return_exceptions=True)
+    
+    assert all(isinstance(r, RuntimeError) for r in results)
+    loader.assert_awaited_once()
+    collection.replace_one.assert_not_awaited()
+    
+    loader.side_effect = None
+    loader.return_value = [{"id": 5}]
+    assert await cache.get(db, "k", loader) == ([{"id": 5}], False)
@@ -0,0 +1,88 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, AsyncMock, patch
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt
+
+from backend import auth_utils
+from backend.auth_utils import UserCache, get_current_user
+
+
+def make_request(method="GET"):
+    return SimpleNamespace(method=method, state=SimpleNamespace())
+
+
+def make_token(sub):
+    return HTTPAuthorizationCredentials(
+        scheme="Bearer",
+        credentials=jwt.encode({"sub": sub}, auth_utils.SECRET_KEY, algorithm=auth_utils.ALGORITHM)
+    )
+
+
+@pytest.fixture
+def users_db():
+    user_id = ObjectId()
+    db = MagicMock()
+    db.users.find_one = AsyncMock(return_value={"_id": user_id, "email": "a@b.ru", "role": "seller"})
+    cache = UserCache(ttl=60, max_entries=10)
+    with patch.object(auth_utils, "user_cache", cache), \
+         patch.object(auth_utils, "get_database", AsyncMock(return_value=db)):
+        yield db, str(user_id), cache
+
+
+async def test_user_is_read_once_and_auth_time_recorded(users_db):
+    db, user_id, cache = users_db
+    
+    first = await get_current_user(make_request(), make_token(user_id))
+    request = make_request()
+    second = await get_current_user(request, make_token(user_id))
+    
+    assert first == second
+    db.users.find_one.assert_awaited_once()
+    assert request.state.auth_ms >= 0
+    
+    # обработчик меняет свою копию, кэш не меняется
+    second["role"] = "admin"
+    assert (await get_current_user(make_request(), make_token(user_id)))["role"] == "seller"
+
+
+async def test_invalidate_rereads_user(users_db):
+    db, user_id, cache = users_db
+    
+    await get_current_user(make_request(), make_token(user_id))
+    cache.invalidate(ObjectId(user_id))
+    db.users.find_one.return_value = None
+    
+    with pytest.raises(HTTPException) as error:
+        await get_current_user(make_request(), make_token(user_id))
+    assert error.value.status_code == 401
+    assert db.users.find_one.await_count == 2
+
+
+async def test_missing_and_invalid_tokens_are_rejected(users_db):
+    db, user_id, cache = users_db
+    
+    assert await get_current_user(make_request("OPTIONS"), None) is None
+    for credentials in (None, HTTPAuthorizationCredentials(scheme="Bearer", credentials="garbage")):
+        with pytest.raises(HTTPException) as error:
+            await get_current_user(make_request(), credentials)
+        assert error.value.status_code == 401
+    db.users.find_one.assert_not_awaited()
+
+
+def test_cache_expires_and_evicts_least_recent(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(auth_utils.time, "monotonic", lambda: now[0])
+    cache = UserCache(ttl=30, max_entries=2)
+    
+    cache.put("a", {"_id": "a"})
+    cache.put("b", {"_id": "b"})
+    cache.get("a")
+    cache.put("c", {"_id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"_id": "a"}
+    
+    now[0] += 30
+    assert cache.get("a") is None
@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from pymongo import ReplaceOne, DeleteOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from backend.core.locks import LockBusy
+from backend.services.category_preload import (
+    replace_category_tree, apply_category_diff, content_hash, VERSIONS_COLLECTION
+)
+from backend.tests.fakes import FakeCursor, fake_db
+
+
+def make_db(existing, version=1):
+    live = MagicMock()
+    live.find = MagicMock(return_value=FakeCursor(existing))
+    live.bulk_write = AsyncMock()
+    
+    locks = MagicMock()
+    locks.update_one = AsyncMock()
+    locks.delete_one = AsyncMock()
+    
+    versions = MagicMock()
+    versions.find_one = AsyncMock(return_value={"_id": "ozon_categories_cache", "version": version})
+    versions.find_one_and_update = AsyncMock(return_value={"version": version + 1})
+    
+    collections = {
+        "ozon_categories_cache": live,
+        "locks": locks,
+        "marketplace_categories": live,
+        VERSIONS_COLLECTION: versions,
+    }
+    return fake_db(collections), live, locks, versions
+
+
+def category(category_id, name, type_id=0):
+    return {"marketplace": "ozon", "source": "api", "category_id": category_id, "type_id": type_id, "name": name}
+
+
+def stored(doc):
+    return {"marketplace": doc["marketplace"], "category_id": doc["category_id"], "type_id": doc["type_id"], "content_hash": content_hash(doc)}
+
+
+KEY = ("marketplace", "category_id", "type_id")
+
+
+def test_content_hash_ignores_load_timestamps():
+    doc = category(1, "Обувь")
+    assert content_hash(doc) == content_hash({**doc, "loaded_at": "2026-01-01", "_id": "x"})
+    assert content_hash(doc) != content_hash(category(1, "Обувь / Кроссовки"))
+
+
+async def test_replace_tree_writes_only_diff_in_place_under_lock():
+    kept, renamed, removed = category(1, "Обувь"), category(2, "Одежда"), category(3, "Архив")
+    db, live, locks, versions = make_db([stored(kept), stored(renamed), stored(removed)])
+    
+    result = await replace_category_tree(
+        db, "ozon_categories_cache",
+        [kept, category(2, "Одежда / Куртки"), category(4, "Книги")],
+        KEY, {"marketplace": "ozon"}
+    )
+    
+    assert result == {"total": 3, "inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1, "version": 2}
+    
+    # все изменения одним bulk_write в рабочую коллекцию, без копии и подмены
+    live.bulk_write.assert_awaited_once()
+    operations = live.bulk_write.call_args.args[0]
+    assert [type(op) for op in operations] == [ReplaceOne, ReplaceOne, DeleteOne]
+    assert operations[-1]._filter == {"marketplace": "ozon", "category_id": 3, "type_id": 0}
+    update = versions.find_one_and_update.call_args.args[1]
+    assert update["$inc"] == {"version": 1}
+    
+    # загрузка шла под блокировкой коллекции и сняла её
+    assert locks.update_one.call_args.args[0]["_id"] == "category_preload:ozon_categories_cache"
+    locks.delete_one.assert_awaited_once()
+
+
+async def test_replace_tree_without_changes_keeps_collection():
+    docs = [category(1, "Обувь"), category(2, "Одежда")]
+    db, live, locks, versions = make_db([stored(doc) for doc in docs], version=5)
+    
+    result = await replace_category_tree(db, "ozon_categories_cache", docs, KEY, {"marketplace": "ozon"})
+    
+    assert result["unchanged"] == 2
+    assert result["version"] == 5
+    live.bulk_write.assert_not_awaited()
+    versions.find_one_and_update.assert_not_awaited()
+
+
+async def test_replace_tree_refuses_concurrent_preload():
+    db, live, locks, versions = make_db([])
+    locks.update_one.side_effect = DuplicateKeyError("dup")
+    
+    with pytest.raises(LockBusy):
+        await replace_category_tree(db, "ozon_categories_cache", [category(1, "Обувь")], KEY, {"marketplace": "ozon"})
+    
+    live.find.assert_not_called()
+    live.bulk_write.assert_not_awaited()
+
+
+async def test_apply_diff_updates_shared_collection_in_place():
+    kept = category(1, "Обувь")
+    db, live, locks, versions = make_db([stored(kept), stored(category(3, "Архив"))])
+    
+    result = await apply_category_diff(
+        db, "marketplace_categories", [kept, category(2, "Одежда")], KEY, {"marketplace": "ozon"}
+    )
+    
+    assert (result["inserted"], result["updated"], result["deleted"], result["unchanged"]) == (1, 0, 1, 1)
+    live.bulk_write.assert_awaited_once()
+    operations = live.bulk_write.call_args.args[0]
+    assert [type(op) for op in operations] == [UpdateOne, DeleteOne]
+    locks.update_one.assert_not_awaited()
@@ -0,0 +1,54 @@
+import pytest
+from unittest.mock import MagicMock
+from backend.services.category_search import CategorySearch, CategorySearchIndex, tokenize
+from backend.tests.fakes import FakeCursor
+
+
+CATEGORIES = [
+    {"category_id": "1", "type_id": 10, "name": "Электроника / Компьютерная периферия / Мышь"},
+    {"category_id": "1", "type_id": 11, "name": "Электроника / Компьютерная периферия / Клавиатура"},
+    {"category_id": "2", "type_id": 20, "name": "Детские товары / Игрушки / Мышка плюшевая"},
+    {"category_id": "3", "type_id": 30, "name": "Обувь / Кроссовки"},
+    {"category_id": "4", "type_id": 40, "name": "Ёлочные украшения / Игрушки"},
+]
+
+
+def test_tokenize_strips_russian_endings():
+    assert tokenize("Компьютерные мыши") == ["компьютерн", "мыш"]
+    assert tokenize("Мышь") == ["мыш"]
+    assert tokenize("Ёлочные") == ["елочн"]
+
+
+def test_search_matches_word_forms_prefixes_and_ranks_leaf_first():
+    index = CategorySearchIndex(CATEGORIES)
+    
+    # "мыши" -> основа "мыш": точное совпадение в последнем сегменте выше продолжения ("мышк")
+    assert [c["type_id"] for c in index.search("мыши")] == [10, 20]
+    # набор по мере ввода
+    assert [c["type_id"] for c in index.search("крос")] == [30]
+    # все слова запроса должны совпасть
+    assert [c["type_id"] for c in index.search("компьютерные клав")] == [11]
+    assert [c["type_id"] for c in index.search("елочные")] == [40]
+    assert index.search("пылесос") == []
+    # результаты - копии, их можно менять
+    index.search("мышь")[0]["name"] = "changed"
+    assert index.search("мышь")[0]["name"] == CATEGORIES[0]["name"]
+
+
+@pytest.mark.asyncio
+async def test_category_search_builds_once_and_reloads_after_preload():
+    db = MagicMock()
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=FakeCursor(CATEGORIES))
+    db.__getitem__.side_effect = lambda name: collection
+    CategorySearch.invalidate("ozon")
+    
+    await CategorySearch.search(db, "ozon", "мышь")
+    await CategorySearch.search(db, "ozon", "кроссовки")
+    assert collection.find.call_count == 1
+    assert collection.find.call_args.args == ({"marketplace": "ozon"}, {"_id": 0})
+    
+    collection.find = MagicMock(return_value=FakeCursor(CATEGORIES[:1]))
+    await CategorySearch.load(db, "ozon")
+    assert await CategorySearch.search(db, "ozon", "кроссовки") == []
+    CategorySearch.invalidate("ozon")
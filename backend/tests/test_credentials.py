@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from backend.core.security import encrypt_api_key, get_fernet
+from backend.services import credentials
+from backend.services.credentials import CredentialRegistry
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    CredentialRegistry.invalidate("seller-1")
+    yield
+    CredentialRegistry.invalidate("seller-1")
+
+
+def integration(api_key="secret", key_id="key-1"):
+    return {"id": key_id, "marketplace": "ozon", "client_id": "c1", "api_key": encrypt_api_key(api_key)}
+
+
+def test_fernet_is_built_once():
+    assert get_fernet() is get_fernet()
+
+
+def test_key_is_decrypted_once_per_integration():
+    data = integration()
+    with patch.object(credentials, "get_decrypted_api_key", wraps=credentials.get_decrypted_api_key) as decrypt:
+        keys = [CredentialRegistry.api_key("seller-1", dict(data)) for _ in range(1000)]
+    
+    assert set(keys) == {"secret"}
+    assert decrypt.call_count == 1
+
+
+def test_connector_is_reused_until_key_changes():
+    data = integration()
+    with patch.object(credentials, "get_connector", side_effect=lambda *args: MagicMock(args=args)) as factory:
+        first = CredentialRegistry.connector("seller-1", data)
+        assert CredentialRegistry.connector("seller-1", dict(data)) is first
+        
+        # ключ в профиле заменён (например, другим процессом сервера)
+        rotated = CredentialRegistry.connector("seller-1", integration("rotated"))
+    
+    assert rotated is not first
+    assert rotated.args == ("ozon", "c1", "rotated")
+    assert factory.call_count == 2
+
+
+def test_invalidate_drops_only_given_integration():
+    CredentialRegistry.api_key("seller-1", integration(key_id="key-1"))
+    CredentialRegistry.api_key("seller-1", integration(key_id="key-2"))
+    
+    CredentialRegistry.invalidate("seller-1", "key-1")
+    
+    assert ("seller-1", "key-1") not in CredentialRegistry._keys
+    assert ("seller-1", "key-2") in CredentialRegistry._keys
+
+
+def test_connector_without_key_raises():
+    with pytest.raises(ValueError):
+        CredentialRegistry.connector("seller-1", {"id": "key-3", "marketplace": "ozon", "api_key": ""})
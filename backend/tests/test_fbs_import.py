@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from backend.routers.orders_fbs import _import_orders_page
+from backend.tests.fakes import FakeCursor
+
+
+def ozon_posting(number, offer_id, quantity=1):
+    return {
+        "posting_number": number,
+        "status": "awaiting_packaging",
+        "in_process_at": "2024-05-10T10:00:00Z",
+        "products": [{"offer_id": offer_id, "name": "Кружка", "price": "100", "quantity": quantity}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_import_page_batches_lookups_and_writes():
+    """Страница: один $in по заказам, один по товарам, один insert_many и один bulk_write остатков"""
+    product_id = ObjectId()
+    inventory_id = ObjectId()
+    
+    db = MagicMock()
+    db.orders_fbs.find = MagicMock(return_value=FakeCursor([{"external_order_id": "P-1"}]))
+    db.product_catalog.find = MagicMock(return_value=FakeCursor([{"_id": product_id, "article": "ART-1", "name": "Кружка"}]))
+    db.product_catalog.aggregate = MagicMock(return_value=FakeCursor([
+        {"_id": product_id, "article": "ART-1", "inventory": [{"_id": inventory_id, "available": 10}]}
+    ]))
+    # P-3 успели создать параллельно - срабатывает уникальный индекс
+    db.orders_fbs.insert_many = AsyncMock(side_effect=BulkWriteError({
+        "writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"}]
+    }))
+    db.inventory.bulk_write = AsyncMock()
+    db.inventory_history.insert_many = AsyncMock()
+    
+    stats = {"imported": 0, "updated": 0, "skipped": 0, "stock_updated": 0}
+    errors = []
+    seen = set()
+    page = [
+        ozon_posting("P-1", "ART-1"),
+        ozon_posting("P-2", "ART-1", quantity=2),
+        ozon_posting("P-2", "ART-1"),
+        ozon_posting("P-3", "ART-1"),
+    ]
+    
+    await _import_orders_page(db, "ozon", page, "seller-1", {"id": "wh-1"}, True, seen, stats, errors)
+    
+    assert stats == {"imported": 1, "updated": 1, "skipped": 1, "stock_updated": 1}
+    assert errors == []
+    db.orders_fbs.find.assert_called_once()
+    db.product_catalog.find.assert_called_once()
+    
+    docs = db.orders_fbs.insert_many.call_args.args[0]
+    assert [d["external_order_id"] for d in docs] == ["P-2", "P-3"]
+    assert docs[0]["items"][0]["product_id"] == str(product_id)
+    assert docs[0]["warehouse_id"] == "wh-1"
+    
+    update = db.inventory.bulk_write.call_args.args[0][0]
+    assert update._filter == {"_id": inventory_id}
+    assert update._doc[0]["$set"]["available"] == {"$max": [0, {"$subtract": [{"$ifNull": ["$available", 0]}, 2]}]}
+    history = db.inventory_history.insert_many.call_args.args[0]
+    assert [h["reason"] for h in history] == ["FBS заказ P-2"]
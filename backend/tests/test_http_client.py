@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import pytest
+from backend.core import http_client
+from backend.core.http_client import get_http_client, close_http_clients
+
+@pytest.mark.asyncio
+async def test_client_reused_per_host():
+    """Один клиент на хост, разные хосты - разные пулы"""
+    first = get_http_client("https://api-seller.ozon.ru/v3/product/list")
+    second = get_http_client("https://api-seller.ozon.ru/v4/product/info/stocks")
+    other = get_http_client("https://marketplace-api.wildberries.ru/api/v3/stocks/1")
+    
+    assert first is second
+    assert first is not other
+    
+    await close_http_clients()
+    assert first.is_closed
+    assert other.is_closed
+    assert http_client._clients == {}
+
+@pytest.mark.asyncio
+async def test_closed_client_is_recreated():
+    """После закрытия пула следующий запрос получает новый клиент"""
+    client = get_http_client("https://api.partner.market.yandex.ru/campaigns")
+    await close_http_clients()
+    
+    new_client = get_http_client("https://api.partner.market.yandex.ru/campaigns")
+    assert new_client is not client
+    assert not new_client.is_closed
+    
+    await close_http_clients()
+
+@pytest.mark.asyncio
+async def test_client_of_running_foreign_loop_is_closed_there():
+    """Клиент другого (работающего) loop заменяется и закрывается в своём loop"""
+    foreign = asyncio.new_event_loop()
+    thread = threading.Thread(target=foreign.run_forever, daemon=True)
+    thread.start()
+    try:
+        async def create():
+            return get_http_client("https://suppliers-api.wildberries.ru/api/v3/orders")
+        old = asyncio.run_coroutine_threadsafe(create(), foreign).result(timeout=5)
+        
+        new = get_http_client("https://suppliers-api.wildberries.ru/api/v3/orders")
+        assert new is not old
+        for _ in range(100):
+            if old.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        assert old.is_closed
+    finally:
+        foreign.call_soon_threadsafe(foreign.stop)
+        thread.join(timeout=5)
+        foreign.close()
+        await close_http_clients()
+
+@pytest.mark.asyncio
+async def test_client_of_stopped_loop_is_dropped():
+    """Клиент остановленного loop отбрасывается без ошибок"""
+    async def create():
+        return get_http_client("https://api-seller.ozon.ru/v2/posting/fbo/list")
+    old = await asyncio.to_thread(asyncio.run, create())
+    
+    new = get_http_client("https://api-seller.ozon.ru/v2/posting/fbo/list")
+    assert new is not old
+    assert http_client._clients[http_client._host_key("https://api-seller.ozon.ru")][0] is new
+    
+    await close_http_clients()
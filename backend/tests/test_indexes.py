@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+from backend.core.indexes import ensure_indexes, index_report, explain_queries, INDEX_REGISTRY, QUERY_CHECKS
+from backend.tests.fakes import FakeCursor, fake_db
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_each_index_separately():
+    """Ошибка одного индекса (дубли под unique) не мешает остальным"""
+    orders = MagicMock()
+    orders.create_indexes = AsyncMock(side_effect=[None, OperationFailure("E11000 duplicate key", code=11000)])
+    registry = {"orders_fbs": [IndexModel([("seller_id", 1)]), IndexModel([("seller_id", 1), ("external_order_id", 1)], unique=True)]}
+    
+    result = await ensure_indexes(fake_db({"orders_fbs": orders}), registry)
+    
+    assert result["ensured"] == 1
+    assert result["failed"][0]["index"] == "seller_id_1_external_order_id_1"
+    assert orders.create_indexes.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_index_report_lists_missing_extra_and_unused():
+    collection = MagicMock()
+    collection.index_information = AsyncMock(return_value={
+        "_id_": {"key": [("_id", 1)]},
+        "seller_id_1_created_at_-1": {"key": [("seller_id", 1.0), ("created_at", -1.0)]},
+        "legacy_1": {"key": [("legacy", 1)]},
+    })
+    collection.aggregate = MagicMock(return_value=FakeCursor([
+        {"name": "_id_", "accesses": {"ops": 0}},
+        {"name": "seller_id_1_created_at_-1", "accesses": {"ops": 120}},
+        {"name": "legacy_1", "accesses": {"ops": 0}},
+    ]))
+    registry = {"orders_fbs": [IndexModel([("seller_id", 1), ("created_at", -1)]), IndexModel([("status", 1)])]}
+    
+    report = await index_report(fake_db({"orders_fbs": collection}), registry)
+    
+    assert report == {"orders_fbs": {"missing": ["status_1"], "extra": ["legacy_1"], "unused": ["legacy_1"]}}
+
+
+@pytest.mark.asyncio
+async def test_explain_queries_flags_collection_scans():
+    db = MagicMock()
+    db.command = AsyncMock(side_effect=[
+        {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "seller_id_1"}}}},
+        {"queryPlanner": {"winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}},
+    ])
+    checks = [("orders_fbs", {"seller_id": "s"}, None), ("ozon_operations", {"seller_id": "s"}, [("operation_date", -1)])]
+    
+    results = await explain_queries(db, checks)
+    
+    assert [r["collscan"] for r in results] == [False, True]
+    assert results[0]["indexes"] == ["seller_id_1"]
+    assert db.command.await_args_list[1].args[0]["explain"]["sort"] == {"operation_date": -1}
+
+
+def test_query_checks_are_covered_by_registry():
+    """Каждый проверяемый запрос начинается с поля, которое ведёт какой-то индекс его коллекции"""
+    for collection, query, _ in QUERY_CHECKS:
+        prefixes = {next(iter(model.document["key"])) for model in INDEX_REGISTRY[collection]}
+        assert prefixes & set(query), collection
@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+import backend.services.inventory_ledger as ledger_module
+from backend.services.inventory_ledger import InventoryLedger, InventoryLedgerError
+from backend.tests.fakes import FakeCursor
+
+
+class FakeSession:
+    def __init__(self, error=None):
+        self.error = error
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *args):
+        return False
+    
+    async def with_transaction(self, callback):
+        if self.error:
+            raise self.error
+        return await callback(self)
+
+
+def make_db(catalog_rows, session):
+    db = MagicMock()
+    db.product_catalog.aggregate = MagicMock(return_value=FakeCursor(catalog_rows))
+    db.client.start_session = AsyncMock(return_value=session)
+    db.inventory.bulk_write = AsyncMock()
+    db.inventory.update_one = AsyncMock()
+    db.inventory_history.insert_many = AsyncMock()
+    return db
+
+
+def catalog_row(article, available):
+    return {"_id": ObjectId(), "article": article, "inventory": [{"_id": ObjectId(), "available": available}]}
+
+
+@pytest.mark.asyncio
+async def test_reserve_is_one_conditional_bulk_write_in_transaction(monkeypatch):
+    """Один запрос на разрешение, условный bulk_write и история одним insert_many"""
+    monkeypatch.setattr(ledger_module, "_transactions_supported", None)
+    rows = [catalog_row("A", 5), catalog_row("B", 3)]
+    db = make_db(rows, FakeSession())
+    db.inventory.bulk_write.return_value = MagicMock(matched_count=2)
+    
+    result = await InventoryLedger.apply(
+        db, "seller-1", "reserve", [("A", 2), ("B", 1), ("A", 1)], reason="Резерв", strict=True
+    )
+    
+    assert result == {"applied": ["A", "B"], "missing": []}
+    db.product_catalog.aggregate.assert_called_once()
+    requests = db.inventory.bulk_write.call_args.args[0]
+    assert requests[0]._filter == {"_id": rows[0]["inventory"][0]["_id"], "available": {"$gte": 3}}
+    assert requests[0]._doc == {"$inc": {"reserved": 3, "available": -3}}
+    history = db.inventory_history.insert_many.call_args.args[0]
+    assert [h["operation_type"] for h in history] == ["reserve", "reserve"]
+
+
+@pytest.mark.asyncio
+async def test_reserve_without_transactions_rolls_back_on_shortage(monkeypatch):
+    """Standalone MongoDB: позиции по очереди, при нехватке применённые откатываются"""
+    monkeypatch.setattr(ledger_module, "_transactions_supported", None)
+    rows = [catalog_row("A", 5), catalog_row("B", 0)]
+    db = make_db(rows, FakeSession(OperationFailure("Transaction numbers are only allowed on a replica set member", code=20)))
+    db.inventory.update_one.side_effect = [MagicMock(matched_count=1), MagicMock(matched_count=0), MagicMock(matched_count=1)]
+    
+    with pytest.raises(InventoryLedgerError) as error:
+        await InventoryLedger.apply(db, "seller-1", "reserve", [("A", 2), ("B", 1)], reason="Резерв", strict=True)
+    
+    assert error.value.key == "B"
+    rollback = db.inventory.update_one.call_args_list[2].args
+    assert rollback == ({"_id": rows[0]["inventory"][0]["_id"]}, {"$inc": {"reserved": -2, "available": 2}})
+    db.inventory_history.insert_many.assert_not_called()
+    assert ledger_module._transactions_supported is False
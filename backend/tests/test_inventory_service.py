@@ -0,0 +1,34 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from backend.services.inventory_service import InventoryService
+from backend.tests.fakes import FakeCursor
+
+
+@pytest.mark.asyncio
+async def test_list_fbs_inventory_resolves_products_in_batches():
+    """Товары и фото страницы загружаются одним запросом на коллекцию"""
+    oid = ObjectId()
+    inventory = [
+        {"_id": 1, "product_id": str(oid), "seller_id": "s1", "sku": "A1", "quantity": 5, "reserved": 1, "available": 4},
+        {"_id": 2, "product_id": "uuid-2", "seller_id": "s1", "sku": "A2", "quantity": 0, "reserved": 0, "available": 0},
+    ]
+    db = MagicMock()
+    db.inventory.count_documents = AsyncMock(return_value=2)
+    db.inventory.find = MagicMock(return_value=FakeCursor(inventory))
+    db.product_catalog.find = MagicMock(side_effect=[
+        FakeCursor([{"_id": oid, "name": "Product 1", "photos": ["p1.jpg"]}]),
+        FakeCursor([{"_id": "uuid-x", "article": "A2", "minimalmod": {"name": "Product 2", "images": ["p2.jpg"]}}]),
+    ])
+    db.product_photos.find = MagicMock(return_value=FakeCursor([{"product_id": str(oid), "url": "photo1.jpg"}]))
+    
+    with patch("backend.services.inventory_service.get_database", new=AsyncMock(return_value=db)):
+        items, total = await InventoryService.list_fbs_inventory("s1", limit=50)
+    
+    assert total == 2
+    assert [(i["product_name"], i["product_image"]) for i in items] == [
+        ("Product 1", "photo1.jpg"),
+        ("Product 2", "p2.jpg"),
+    ]
+    assert db.product_catalog.find.call_count == 2
+    assert db.product_photos.find.call_count == 1
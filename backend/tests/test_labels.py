@@ -0,0 +1,181 @@
+import hashlib
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+from backend.services.credentials import CredentialRegistry
+from backend.services.label_service import (
+    LabelService, LabelStore, merge_pdfs, split_labels_by_posting, split_pdf_pages
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_credentials():
+    CredentialRegistry.invalidate("seller-1")
+
+
+def pdf(pages, first_width=100):
+    writer = PdfWriter()
+    for index in range(pages):
+        writer.add_blank_page(width=first_width + index, height=100)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def label_pdf(posting_numbers):
+    """PDF этикеток: по странице с номером отправления на каждое"""
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica")
+    }))
+    for number in posting_numbers:
+        page = writer.add_blank_page(width=200, height=100)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        stream = DecodedStreamObject()
+        stream.set_data(f"BT /F1 12 Tf 10 50 Td ({number}) Tj ET".encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def fbs_order(number, label_id=None):
+    order = {"_id": ObjectId(), "marketplace": "ozon", "external_order_id": number, "status": "awaiting_shipment"}
+    if label_id:
+        order["label_id"] = label_id
+    return order
+
+
+@pytest.mark.asyncio
+async def test_fetch_labels_batches_requests_and_splits_pages():
+    """45 отправлений -> запросы по 20, PDF делится по номерам на страницах, один bulk_write; загруженная этикетка не запрашивается"""
+    orders = [fbs_order(f"P-{i}") for i in range(45)]
+    cached = fbs_order("P-cached", label_id="cached-id")
+
+    requested = []
+
+    async def get_labels(posting_numbers):
+        requested.append(list(posting_numbers))
+        # Порядок страниц не совпадает с порядком запроса
+        return label_pdf(list(reversed(posting_numbers)))
+
+    connector = MagicMock()
+    connector.get_labels = get_labels
+
+    stored = {}
+
+    async def put(db, content, seller_id):
+        label_id = hashlib.sha256(content).hexdigest()
+        stored[label_id] = content
+        return label_id
+
+    db = MagicMock()
+    db.orders_fbs.bulk_write = AsyncMock()
+    profile = {"api_keys": [{"marketplace": "ozon", "client_id": "1", "api_key": "key"}]}
+
+    with patch("backend.services.credentials.get_connector", return_value=connector), \
+            patch.object(LabelStore, "put", side_effect=put):
+        labels, errors = await LabelService.fetch_labels(db, profile, "seller-1", orders + [cached], "seller-1")
+
+    assert errors == []
+    assert sorted(len(chunk) for chunk in requested) == [5, 20, 20]
+    assert labels[str(cached["_id"])] == "cached-id"
+    # Своя страница на каждое отправление
+    assert len({labels[str(order["_id"])] for order in orders}) == 45
+    assert all(len(PdfReader(BytesIO(stored[label_id])).pages) == 1 for label_id in stored)
+    for order in orders:
+        text = PdfReader(BytesIO(stored[labels[str(order["_id"])]])).pages[0].extract_text()
+        assert text.strip() == order["external_order_id"]
+
+    db.orders_fbs.bulk_write.assert_awaited_once()
+    updates = db.orders_fbs.bulk_write.await_args.args[0]
+    assert len(updates) == 45
+    assert "label_url" in updates[0]._doc["$unset"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_labels_falls_back_to_single_postings_when_pdf_does_not_split():
+    """PDF пачки не делится по отправлениям - этикетки запрашиваются по одной, общий PDF заказам не достаётся"""
+    orders = [fbs_order(f"P-{i}") for i in range(3)]
+    requested = []
+
+    async def get_labels(posting_numbers):
+        requested.append(list(posting_numbers))
+        if len(posting_numbers) > 1:
+            # Одна страница на всю пачку
+            return label_pdf([" ".join(posting_numbers)])
+        return label_pdf(posting_numbers)
+
+    connector = MagicMock()
+    connector.get_labels = get_labels
+    stored = {}
+
+    async def put(db, content, seller_id):
+        label_id = hashlib.sha256(content).hexdigest()
+        stored[label_id] = content
+        return label_id
+
+    db = MagicMock()
+    db.orders_fbs.bulk_write = AsyncMock()
+    profile = {"api_keys": [{"marketplace": "ozon", "client_id": "1", "api_key": "key"}]}
+
+    with patch("backend.services.credentials.get_connector", return_value=connector), \
+            patch.object(LabelStore, "put", side_effect=put):
+        labels, errors = await LabelService.fetch_labels(db, profile, "seller-1", orders, "seller-1")
+
+    assert errors == []
+    assert requested[0] == ["P-0", "P-1", "P-2"]
+    assert sorted(requested[1:]) == [["P-0"], ["P-1"], ["P-2"]]
+    for order in orders:
+        text = PdfReader(BytesIO(stored[labels[str(order["_id"])]])).pages[0].extract_text()
+        assert text.strip() == order["external_order_id"]
+
+
+def test_split_labels_by_posting_requires_one_page_per_posting():
+    assert split_labels_by_posting(label_pdf(["P-1", "P-2"]), ["P-1", "P-2", "P-3"]) is None
+    # P-1 не должен совпадать с P-10
+    assert split_labels_by_posting(label_pdf(["P-10", "P-2"]), ["P-1", "P-2"]) is None
+    # Страницы без текста (растровые этикетки) не сопоставить
+    assert split_labels_by_posting(pdf(2), ["P-1", "P-2"]) is None
+
+
+@pytest.mark.asyncio
+async def test_label_store_get_is_scoped_to_seller():
+    """Файл этикетки чужого продавца не выдаётся"""
+    db = MagicMock()
+    files = MagicMock()
+    files.find_one = AsyncMock(return_value=None)
+    db.__getitem__.return_value = files
+
+    assert await LabelStore.get(db, "a" * 64, "seller-2") is None
+    files.find_one.assert_awaited_once_with({"filename": "a" * 64, "metadata.seller_id": "seller-2"}, {"_id": 1})
+
+
+@pytest.mark.asyncio
+async def test_fetch_labels_reports_unsupported_marketplace():
+    """Коннектор без get_labels - ошибка по каждому заказу, запросов и записей нет"""
+    order = dict(fbs_order("WB-1"), marketplace="wb")
+    db = MagicMock()
+    db.orders_fbs.bulk_write = AsyncMock()
+    profile = {"api_keys": [{"marketplace": "wb", "api_key": "key"}]}
+
+    with patch("backend.services.credentials.get_connector", return_value=object()):
+        labels, errors = await LabelService.fetch_labels(db, profile, "seller-1", [order], "seller-1")
+
+    assert labels == {}
+    assert errors == [{"order_id": str(order["_id"]), "error": "Этикетки wb не поддерживаются", "status_code": 400}]
+    db.orders_fbs.bulk_write.assert_not_awaited()
+
+
+def test_merge_and_split_pdf_roundtrip():
+    merged = merge_pdfs([pdf(1), pdf(2)])
+    assert len(split_pdf_pages(merged)) == 3
@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import DuplicateKeyError
+from backend.core.locks import LockBusy, mongo_lock
+
+
+def locks_db():
+    db = MagicMock()
+    locks = MagicMock()
+    locks.update_one = AsyncMock()
+    locks.delete_one = AsyncMock()
+    db.__getitem__.side_effect = {"locks": locks}.__getitem__
+    return db, locks
+
+
+@pytest.mark.asyncio
+async def test_lock_released_by_owner_only():
+    """Блокировка снимается только своей записью (по owner), в том числе при ошибке в блоке"""
+    db, locks = locks_db()
+
+    with pytest.raises(RuntimeError):
+        async with mongo_lock(db, "job:1", 60):
+            raise RuntimeError("boom")
+
+    acquire = locks.update_one.call_args
+    owner = acquire.args[1]["$set"]["owner"]
+    assert acquire.args[0]["_id"] == "job:1"
+    assert acquire.kwargs["upsert"] is True
+    locks.delete_one.assert_awaited_once_with({"_id": "job:1", "owner": owner})
+
+
+@pytest.mark.asyncio
+async def test_busy_lock_raises_without_running_block():
+    """Живая чужая запись -> DuplicateKeyError при upsert -> LockBusy, блок не выполняется"""
+    db, locks = locks_db()
+    locks.update_one.side_effect = DuplicateKeyError("dup")
+    entered = False
+
+    with pytest.raises(LockBusy):
+        async with mongo_lock(db, "job:1", 60):
+            entered = True
+
+    assert not entered
+    locks.delete_one.assert_not_called()
@@ -0,0 +1,67 @@
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from bson import ObjectId
+from backend.services.order_listing import list_orders, count_orders, decode_cursor, model_projection
+from backend.schemas.order import OrderRetailResponse
+from backend.tests.fakes import FakeCursor
+
+
+def order(minute):
+    return {"_id": ObjectId(), "created_at": datetime(2024, 5, 10, 10, minute), "status": "new"}
+
+
+@pytest.mark.asyncio
+async def test_list_orders_returns_keyset_cursor_and_resumes_after_it():
+    """Страница limit+1 -> курсор на последний заказ; следующий запрос продолжает с (дата, _id)"""
+    docs = [order(5), order(4), order(3)]
+    last_id = docs[1]["_id"]
+    collection = MagicMock()
+    cursor = FakeCursor(docs)
+    collection.find = MagicMock(return_value=cursor)
+    
+    orders, next_cursor = await list_orders(collection, {"seller_id": "s1"}, {"status_history": 0}, limit=2)
+    
+    assert [o["created_at"].minute for o in orders] == [5, 4]
+    assert "id" in orders[0] and "_id" not in orders[0]
+    assert cursor.sort_spec == [("created_at", -1), ("_id", -1)]
+    assert cursor.limit_value == 3
+    assert decode_cursor(next_cursor) == (docs[1]["created_at"], last_id)
+    
+    collection.find = MagicMock(return_value=FakeCursor([]))
+    await list_orders(collection, {"seller_id": "s1"}, {}, limit=2, cursor=next_cursor)
+    
+    query = collection.find.call_args.args[0]
+    assert query["$and"][0] == {"seller_id": "s1"}
+    assert query["$and"][1]["$or"] == [
+        {"created_at": {"$lt": docs[1]["created_at"]}},
+        {"created_at": docs[1]["created_at"], "_id": {"$lt": last_id}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_list_orders_last_page_has_no_cursor_and_bad_cursor_fails():
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=FakeCursor([order(1)]))
+    
+    orders, next_cursor = await list_orders(collection, {"seller_id": "s1"}, {}, limit=2)
+    assert len(orders) == 1 and next_cursor is None
+    
+    with pytest.raises(ValueError):
+        await list_orders(collection, {"seller_id": "s1"}, {}, cursor="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_count_orders_groups_by_status():
+    collection = MagicMock()
+    collection.aggregate = MagicMock(return_value=FakeCursor([
+        {"_id": "new", "count": 3}, {"_id": "delivered", "count": 2}, {"_id": None, "count": 1}
+    ]))
+    
+    assert await count_orders(collection, {"seller_id": "s1"}) == {"total": 6, "new": 3, "delivered": 2}
+
+
+def test_list_projection_skips_history():
+    projection = model_projection(OrderRetailResponse, exclude=("status_history",))
+    assert "status_history" not in projection and "id" not in projection
+    assert projection["order_number"] == 1
@@ -0,0 +1,126 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+import backend.order_sync_scheduler as sync_module
+from backend.order_sync_scheduler import OrderSyncScheduler
+from backend.tests.fakes import FakeCursor, pages_of
+
+
+@pytest.mark.asyncio
+async def test_fbs_sync_uses_cursor_and_one_lookup_per_page():
+    """Курсор сужает запрос до изменений, существование - один $in на страницу"""
+    cursor = datetime.utcnow() - timedelta(minutes=5)
+    
+    db = MagicMock()
+    db.order_sync_cursors.find_one = AsyncMock(return_value={"cursor": cursor})
+    db.order_sync_cursors.update_one = AsyncMock()
+    db.orders_fbs.find = MagicMock(side_effect=[
+        FakeCursor([{"_id": 1, "external_order_id": "P-1", "status": "awaiting_packaging", "items": []}]),
+        FakeCursor([]),
+    ])
+    db.orders_fbs.update_one = AsyncMock()
+    
+    connector = MagicMock()
+    connector.iter_fbs_orders = MagicMock(return_value=pages_of(
+        [{"posting_number": "P-1", "status": "awaiting_deliver"}, {"posting_number": "P-2", "status": "awaiting_packaging"}],
+        [{"posting_number": "P-3", "status": "awaiting_packaging"}],
+    ))
+    connector.map_ozon_status_to_internal = MagicMock(return_value="awaiting_shipment")
+    
+    scheduler = OrderSyncScheduler()
+    scheduler._create_ozon_order = AsyncMock()
+    
+    with patch.object(sync_module, "get_database", new=AsyncMock(return_value=db)), \
+         patch.object(sync_module, "get_connector", return_value=connector):
+        await scheduler.sync_fbs_orders_for_seller("seller-1", "ozon", "client", "key")
+    
+    changed_since = connector.iter_fbs_orders.call_args.kwargs["changed_since"]
+    assert changed_since == cursor - timedelta(minutes=sync_module.settings.ORDER_SYNC_CURSOR_OVERLAP_MINUTES)
+    
+    assert db.orders_fbs.find.call_count == 2
+    first_query = db.orders_fbs.find.call_args_list[0].args[0]
+    assert sorted(first_query["external_order_id"]["$in"]) == ["P-1", "P-2"]
+    
+    assert scheduler._create_ozon_order.await_count == 2
+    db.orders_fbs.update_one.assert_awaited_once()
+    db.order_sync_cursors.update_one.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_wb_sync_rereads_recent_orders_for_status_changes():
+    """WB фильтрует только по дате создания: старые открытые заказы перечитываются и списываются при delivering"""
+    date_to = datetime.utcnow()
+    cursor = date_to - timedelta(minutes=5)
+    
+    db = MagicMock()
+    db.order_sync_cursors.find_one = AsyncMock(return_value={"cursor": cursor})
+    db.order_sync_cursors.update_one = AsyncMock()
+    db.orders_fbs.find = MagicMock(return_value=FakeCursor([
+        {"_id": 1, "external_order_id": "7", "status": "awaiting_shipment", "items": [], "order_number": "7"}
+    ]))
+    db.orders_fbs.update_one = AsyncMock()
+    
+    requested = []
+    
+    async def get_fbs_orders(date_from, date_to):
+        requested.append((date_from, date_to))
+        # заказ создан два дня назад - окно "после курсора" его бы не вернуло
+        return [{"id": 7, "wbStatus": 2}] if date_from <= cursor - timedelta(days=2) < date_to else []
+    
+    connector = MagicMock()
+    connector.get_fbs_orders = get_fbs_orders
+    connector.map_wb_status_to_internal = MagicMock(return_value="delivering")
+    
+    with patch.object(sync_module, "get_database", new=AsyncMock(return_value=db)), \
+         patch.object(sync_module, "get_connector", return_value=connector), \
+         patch.object(sync_module.InventoryLedger, "apply", new=AsyncMock()) as apply:
+        await OrderSyncScheduler().sync_fbs_orders_for_seller("seller-1", "wb", "", "key")
+    
+    lookback = timedelta(hours=sync_module.settings.ORDER_SYNC_CREATED_STATUS_LOOKBACK_HOURS)
+    assert requested[0][0] <= date_to - lookback + timedelta(seconds=5)
+    # окна подряд без пропусков и не длиннее ORDER_SYNC_WINDOW_HOURS
+    window = timedelta(hours=sync_module.settings.ORDER_SYNC_WINDOW_HOURS)
+    assert all(end - start <= window for start, end in requested)
+    assert all(requested[i][1] == requested[i + 1][0] for i in range(len(requested) - 1))
+    
+    assert apply.await_args.args[2] == "deduct"
+    db.orders_fbs.update_one.assert_awaited_once()
+
+
+def test_cursor_start_is_not_clamped_after_long_downtime():
+    """После простоя дольше начальной глубины окно начинается от курсора"""
+    date_to = datetime.utcnow()
+    cursor = date_to - timedelta(days=3)
+    overlap = timedelta(minutes=sync_module.settings.ORDER_SYNC_CURSOR_OVERLAP_MINUTES)
+    
+    assert OrderSyncScheduler._cursor_start(cursor, date_to) == cursor - overlap
+    assert OrderSyncScheduler._cursor_start(None, date_to) == date_to - timedelta(
+        hours=sync_module.settings.ORDER_SYNC_INITIAL_LOOKBACK_HOURS
+    )
+
+
+@pytest.mark.asyncio
+async def test_integration_error_is_recorded_in_pool_metrics():
+    """Ошибка FBS не пропускает FBO и попадает в метрики пула как error"""
+    db = MagicMock()
+    db.order_sync_cursors.find_one = AsyncMock(return_value=None)
+    connector = MagicMock()
+    connector.iter_fbs_orders = MagicMock(side_effect=sync_module.MarketplaceError("ozon", 429, "Too many requests"))
+    
+    scheduler = OrderSyncScheduler()
+    scheduler.sync_fbo_orders_for_seller = AsyncMock()
+    job = sync_module.SyncJob(
+        seller_id="seller-1",
+        key="seller-1:ozon:1",
+        host="ozon",
+        run=lambda: scheduler.sync_integration("seller-1", {"marketplace": "ozon", "client_id": "1", "api_key": "enc"})
+    )
+    
+    with patch.object(sync_module, "get_database", new=AsyncMock(return_value=db)), \
+            patch.object(sync_module, "get_connector", return_value=connector), \
+            patch.object(sync_module.CredentialRegistry, "api_key", return_value="key"):
+        await scheduler.pool.run([job])
+    
+    scheduler.sync_fbo_orders_for_seller.assert_awaited_once_with("seller-1", "ozon", "1", "key")
+    assert scheduler.pool.metrics["seller-1:ozon:1"]["last_status"] == "error"
+    assert scheduler.pool.metrics["seller-1:ozon:1"]["failures"] == 1
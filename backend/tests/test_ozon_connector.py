@@ -1,4 +1,6 @@
+import asyncio
 import pytest
+from datetime import datetime
 from unittest.mock import AsyncMock, patch
 from connectors import OzonConnector, MarketplaceError
 
@@ -60,3 +62,102 @@ async def test_ozon_update_stock_success(sample_product_data):
         
         assert result["success"] == True
         assert result["updated"] == 1
+
+@pytest.mark.asyncio
+async def test_ozon_get_products_batches_detail_requests():
+    """Детали запрашиваются пачками по 100 с сохранением порядка"""
+    connector = OzonConnector(client_id="test_client", api_key="test_key")
+    
+    offer_ids = [f"SKU-{i}" for i in range(250)]
+    
+    async def fake_request(method, url, headers, json_data=None, params=None):
+        if url.endswith("/v3/product/list"):
+            if json_data["last_id"] == "":
+                return {"result": {"items": [{"offer_id": o} for o in offer_ids[:150]], "last_id": "next"}}
+            return {"result": {"items": [{"offer_id": o} for o in offer_ids[150:]], "last_id": ""}}
+        return {"items": [{"id": 1, "offer_id": o, "name": o} for o in json_data["offer_id"]]}
+    
+    with patch.object(connector, '_make_request', new=AsyncMock(side_effect=fake_request)) as mock:
+        products = await connector.get_products()
+    
+    info_calls = [c for c in mock.call_args_list if c.args[1].endswith("/v3/product/info/list")]
+    assert [len(c.kwargs["json_data"]["offer_id"]) for c in info_calls] == [100, 100, 50]
+    assert [p["sku"] for p in products] == offer_ids
+
+@pytest.mark.asyncio
+async def test_ozon_throttled_request_retries_on_429(monkeypatch):
+    """При 429 запрос повторяется после паузы"""
+    from backend.core.config import settings
+    monkeypatch.setattr(settings, "MARKETPLACE_RATE_LIMIT_BACKOFF", 0.01)
+    connector = OzonConnector(client_id="test_client", api_key="test_key")
+    
+    responses = [MarketplaceError("Ozon", 429, "Too many requests"), {"result": {"items": [], "last_id": ""}}]
+    
+    with patch.object(connector, '_make_request', new=AsyncMock(side_effect=responses)) as mock:
+        products = await connector.get_products()
+    
+    assert products == []
+    assert mock.call_count == 2
+
+@pytest.mark.asyncio
+async def test_ozon_get_stocks_uses_cached_offer_list():
+    """Остатки: только список товаров (без деталей), список кэшируется на аккаунт"""
+    connector = OzonConnector(client_id="stocks_client", api_key="stocks_key")
+    
+    offer_ids = [f"SKU-{i}" for i in range(150)]
+    
+    async def fake_request(method, url, headers, json_data=None, params=None):
+        if url.endswith("/v3/product/list"):
+            return {"result": {"items": [{"offer_id": o} for o in offer_ids], "last_id": ""}}
+        return {"result": [{"offer_id": o, "present": 1} for o in json_data["offer_id"]]}
+    
+    with patch.object(connector, '_make_request', new=AsyncMock(side_effect=fake_request)) as mock:
+        first = await connector.get_stocks(warehouse_id="1")
+        second = await connector.get_stocks(warehouse_id="1")
+    
+    urls = [c.args[1] for c in mock.call_args_list]
+    assert not any(u.endswith("/v3/product/info/list") for u in urls)
+    assert sum(u.endswith("/v3/product/list") for u in urls) == 1
+    assert [s["offer_id"] for s in first] == offer_ids
+    assert first == second
+
+@pytest.mark.asyncio
+async def test_ozon_get_fbs_orders_paginates_windows():
+    """FBS: окна по суткам, страницы по offset до has_next = false"""
+    connector = OzonConnector(client_id="orders_client", api_key="orders_key")
+    
+    async def fake_request(method, url, headers, json_data=None, params=None):
+        day = json_data["filter"]["since"][:10]
+        offset = json_data["offset"]
+        size = 1000 if offset == 0 else 5
+        postings = [{"posting_number": f"{day}-{offset + i}"} for i in range(size)]
+        return {"result": {"postings": postings, "has_next": offset == 0}}
+    
+    with patch.object(connector, '_make_request', new=AsyncMock(side_effect=fake_request)) as mock:
+        orders = await connector.get_fbs_orders(datetime(2024, 1, 1), datetime(2024, 1, 3))
+    
+    assert len(orders) == 2 * 1005
+    assert len({o["posting_number"] for o in orders}) == len(orders)
+    assert mock.call_count == 4
+    assert sorted(c.kwargs["json_data"]["offset"] for c in mock.call_args_list) == [0, 0, 1000, 1000]
+
+
+@pytest.mark.asyncio
+async def test_ozon_fbs_orders_window_error_does_not_leak_tasks():
+    """Ошибка одного окна: исключение у вызывающего, остальные окна отменены"""
+    connector = OzonConnector(client_id="orders_client", api_key="orders_key")
+    
+    async def fake_request(method, url, headers, json_data=None, params=None):
+        day = json_data["filter"]["since"][:10]
+        if day == "2024-01-02":
+            await asyncio.sleep(0.01)
+            raise MarketplaceError("ozon", 500, "Internal error")
+        offset = json_data["offset"]
+        return {"result": {"postings": [{"posting_number": f"{day}-{offset + i}"} for i in range(1000)], "has_next": True}}
+    
+    with patch.object(connector, '_make_request', new=AsyncMock(side_effect=fake_request)):
+        with pytest.raises(MarketplaceError):
+            await connector.get_fbs_orders(datetime(2024, 1, 1), datetime(2024, 1, 8))
+    
+    await asyncio.sleep(0)
+    assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()] == []
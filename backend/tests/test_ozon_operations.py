@@ -0,0 +1,217 @@
+import asyncio
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
+import backend.business_analytics as ba
+from backend.tests.fakes import FakeCursor, pages_of
+
+
+def ozon_response(payload, status_code=200):
+    request = httpx.Request("POST", ba.OZON_OPERATIONS_URL)
+    return httpx.Response(status_code, json=payload, request=request)
+
+
+class FakeOperations:
+    """ozon_operations в памяти: upsert по (seller_id, operation_id)"""
+
+    def __init__(self):
+        self.docs = {}
+        self.batches = []
+
+    def find(self, query, projection=None):
+        ids = set(query["operation_id"]["$in"])
+        return FakeCursor([
+            dict(doc) for (seller_id, operation_id), doc in self.docs.items()
+            if seller_id == query["seller_id"] and operation_id in ids and doc.get("rollup_applied")
+        ])
+
+    async def bulk_write(self, requests, ordered=True):
+        self.batches.append(len(requests))
+        upserted = 0
+        for request in requests:
+            key = (request._filter["seller_id"], request._filter["operation_id"])
+            if key not in self.docs:
+                upserted += 1
+                self.docs[key] = dict(request._doc["$setOnInsert"])
+            self.docs[key].update(request._doc["$set"])
+        return MagicMock(upserted_count=upserted)
+
+
+def operation(operation_id, amount=100):
+    return {"operation_id": operation_id, "operation_type": "OperationAgentDeliveredToCustomer",
+            "operation_date": "2024-01-05 10:00:00", "amount": amount, "posting": {"posting_number": "P-1"}}
+
+
+def ingest_db():
+    db = MagicMock()
+    db.ozon_operations = FakeOperations()
+    db.ozon_operations_sync_status.update_one = AsyncMock()
+    locks = MagicMock()
+    locks.update_one = AsyncMock()
+    locks.delete_one = AsyncMock()
+    db.__getitem__.side_effect = {"locks": locks}.__getitem__
+    return db
+
+
+@pytest.mark.asyncio
+async def test_operations_windows_fetched_with_retry_and_split():
+    """Окна грузятся параллельно, упавшая страница повторяется, окно >100 страниц делится"""
+    calls = []
+    failed_once = set()
+
+    async def post(url, headers=None, json=None):
+        date = json["filter"]["date"]
+        key = (date["from"][:10], date["to"][:10], json["page"])
+        calls.append(key)
+
+        # Первая страница первого окна один раз отвечает 503
+        if key == ("2024-01-01", "2024-01-30", 1) and key not in failed_once:
+            failed_once.add(key)
+            return ozon_response({"message": "unavailable"}, 503)
+
+        # Второе окно целиком слишком большое - должно разделиться
+        if key[:2] == ("2024-01-31", "2024-02-29"):
+            return ozon_response({"result": {"operations": [{"operation_id": 0}], "page_count": 150}})
+
+        operations = [{"operation_id": f"{key[0]}-{key[2]}"}]
+        return ozon_response({"result": {"operations": operations, "page_count": 2}})
+
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=post)
+
+    with patch.object(ba, "get_http_client", return_value=client), \
+         patch.object(ba.asyncio, "sleep", new=AsyncMock()):
+        report = {}
+        pages = [
+            page async for page in ba.iter_ozon_operations(
+                "client", "key", datetime(2024, 1, 1), datetime(2024, 2, 29), report
+            )
+        ]
+
+    ids = sorted(op["operation_id"] for page in pages for op in page)
+    assert ids == sorted([
+        "2024-01-01-1", "2024-01-01-2",
+        "2024-01-31-1", "2024-01-31-2",
+        "2024-02-15-1", "2024-02-15-2",
+    ])
+    assert report["truncated_windows"] == []
+    # Повторилась только упавшая страница
+    assert calls.count(("2024-01-01", "2024-01-30", 1)) == 2
+    assert calls.count(("2024-01-01", "2024-01-30", 2)) == 1
+
+
+@pytest.mark.asyncio
+async def test_operations_single_day_over_limit_reported_as_truncated():
+    """Однодневное окно больше 100 страниц не делится, а попадает в отчёт"""
+    async def post(url, headers=None, json=None):
+        return ozon_response({"result": {"operations": [{"operation_id": json["page"]}], "page_count": 120}})
+
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=post)
+
+    with patch.object(ba, "get_http_client", return_value=client):
+        report = {}
+        pages = [
+            page async for page in ba.iter_ozon_operations(
+                "client", "key", datetime(2024, 3, 1), datetime(2024, 3, 1, 23, 59), report
+            )
+        ]
+
+    assert len(pages) == ba.OZON_OPERATIONS_MAX_PAGES
+    assert report["truncated_windows"] == [{"from": "2024-03-01", "to": "2024-03-01", "page_count": 120}]
+
+
+@pytest.mark.asyncio
+async def test_operations_window_error_does_not_leak_tasks():
+    """Ошибка окна (и половины разделённого окна) отменяет остальные выгрузки"""
+    async def post(url, headers=None, json=None):
+        date = json["filter"]["date"]
+        if date["from"][:10] == "2024-02-15":
+            await asyncio.sleep(0.01)
+            return ozon_response({"message": "bad request"}, 400)
+        # Окно 31.01-29.02 делится пополам, остальные отдают страницы без конца
+        if date["from"][:10] == "2024-01-31" and date["to"][:10] == "2024-02-29":
+            return ozon_response({"result": {"operations": [{"operation_id": 0}], "page_count": 150}})
+        await asyncio.sleep(0)
+        return ozon_response({"result": {"operations": [{"operation_id": json["page"]}], "page_count": 100}})
+
+    client = MagicMock()
+    client.post = AsyncMock(side_effect=post)
+
+    with patch.object(ba, "get_http_client", return_value=client):
+        with pytest.raises(ba.HTTPException):
+            async for _ in ba.iter_ozon_operations("client", "key", datetime(2024, 1, 1), datetime(2024, 4, 30)):
+                await asyncio.sleep(0)
+
+    await asyncio.sleep(0)
+    assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()] == []
+
+
+@pytest.mark.asyncio
+async def test_ingest_operations_is_idempotent_by_operation_id():
+    """Повторная загрузка тех же операций обновляет документы, а свёртка вычитает прежние версии"""
+    db = ingest_db()
+    page = [operation(1), operation(2)]
+
+    with patch.object(ba.SkuEconomicsService, "resolve_posting_skus", new=AsyncMock()), \
+            patch.object(ba.SkuEconomicsService, "apply", new=AsyncMock()) as apply:
+        first = await ba.ingest_ozon_operations(db, "seller-1", pages_of(page))
+        second = await ba.ingest_ozon_operations(db, "seller-1", pages_of([operation(1, amount=150), operation(2)]))
+
+    assert (first["saved"], first["updated"]) == (2, 0)
+    assert (second["saved"], second["updated"]) == (0, 2)
+    assert len(db.ozon_operations.docs) == 2
+    assert db.ozon_operations.docs[("seller-1", "1")]["amount"] == 150
+    # Первая загрузка - без прежних версий, повторная - с ними
+    assert apply.await_args_list[0].args[3] == []
+    assert sorted(doc["amount"] for doc in apply.await_args_list[1].args[3]) == [100, 100]
+
+
+@pytest.mark.asyncio
+async def test_ingest_operations_writes_one_bulk_per_page():
+    """Каждая страница - один bulk_write и обновление прогресса"""
+    db = ingest_db()
+    pages = [[operation(i) for i in range(start, start + size)] for start, size in ((0, 1000), (1000, 1000), (2000, 3))]
+
+    with patch.object(ba.SkuEconomicsService, "resolve_posting_skus", new=AsyncMock()), \
+            patch.object(ba.SkuEconomicsService, "apply", new=AsyncMock()):
+        stats = await ba.ingest_ozon_operations(db, "seller-1", pages_of(*pages))
+
+    assert db.ozon_operations.batches == [1000, 1000, 3]
+    assert stats == {"pages": 3, "total_fetched": 2003, "saved": 2003, "updated": 0}
+    progress = [c.args[1]["$set"]["pages"] for c in db.ozon_operations_sync_status.update_one.await_args_list[1:-1]]
+    assert progress == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_ingest_operations_sync_status_on_success_and_failure():
+    db = ingest_db()
+    report = {"truncated_windows": [{"from": "2024-01-05", "to": "2024-01-05", "page_count": 120}]}
+
+    with patch.object(ba.SkuEconomicsService, "resolve_posting_skus", new=AsyncMock()), \
+            patch.object(ba.SkuEconomicsService, "apply", new=AsyncMock()):
+        await ba.ingest_ozon_operations(db, "seller-1", pages_of([operation(1)]), report)
+
+    calls = db.ozon_operations_sync_status.update_one.await_args_list
+    assert calls[0].args[1]["$set"]["status"] == "running"
+    assert calls[0].kwargs["upsert"] is True
+    assert calls[-1].args[1]["$set"]["status"] == "completed"
+    assert calls[-1].args[1]["$set"]["truncated_windows"] == report["truncated_windows"]
+
+    async def failing_pages():
+        yield [operation(2)]
+        raise RuntimeError("Ozon API error")
+
+    db = ingest_db()
+    with patch.object(ba.SkuEconomicsService, "resolve_posting_skus", new=AsyncMock()), \
+            patch.object(ba.SkuEconomicsService, "apply", new=AsyncMock()):
+        with pytest.raises(RuntimeError):
+            await ba.ingest_ozon_operations(db, "seller-1", failing_pages())
+
+    last = db.ozon_operations_sync_status.update_one.await_args_list[-1].args[1]["$set"]
+    assert last["status"] == "failed"
+    assert last["error"] == "Ozon API error"
+    assert last["finished_at"] is not None
+    # Операции первой страницы уже сохранены
+    assert ("seller-1", "2") in db.ozon_operations.docs
@@ -0,0 +1,42 @@
+import pandas as pd
+from datetime import datetime
+from backend.ozon_report_parser import parse_order_realization_frame, DATA_START_ROW
+
+
+def realization_sheet(rows):
+    sheet = [[None] * 23 for _ in range(DATA_START_ROW)]
+    for values in rows:
+        row = [None] * 23
+        for column, value in values.items():
+            row[column] = value
+        sheet.append(row)
+    return pd.DataFrame(sheet)
+
+
+def test_realization_frame_parses_columns_like_cells():
+    """Пустые строки пропускаются, итоговая строка завершает данные, мусор в числах -> 0"""
+    df = realization_sheet([
+        {1: "Кружка", 2: "ART-1", 3: 123456, 5: 1000.5, 6: 10, 8: 2, 9: "н/д", 12: 150.5, 13: 860, 21: "P-1", 22: datetime(2025, 11, 3)},
+        {1: "Пустая"},
+        {1: "Тарелка", 2: "ART-2", 3: "SKU-654321", 5: 500, 8: "1.9", 13: 500, 21: "P-2", 22: "2025-11-04 10:30:00"},
+        {2: "Итого", 5: 1500.5},
+        {2: "ART-3", 5: 999},
+    ])
+
+    result = parse_order_realization_frame(df, "seller-1")
+
+    first, second = result["transactions"]
+    assert result["summary"]["total_transactions"] == 2
+    assert result["summary"]["skipped_rows"] == 1
+    assert result["summary"]["total_revenue"] == 1500.5
+
+    assert first["sku"] == "123456" and first["article"] == "ART-1"
+    assert first["quantity"] == 2 and type(first["quantity"]) is int
+    assert first["price"] == 0.0
+    assert first["discount_points"] == 0.0
+    assert first["operation_date"] == datetime(2025, 11, 3)
+
+    assert second["sku"] == "SKU-654321"
+    assert second["quantity"] == 1
+    assert second["barcode"] == ""
+    assert second["operation_date"] == datetime(2025, 11, 4, 10, 30)
@@ -0,0 +1,126 @@
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from backend.services.sku_economics_service import SkuEconomicsService, summarize_operations
+
+
+def make_op(operation_id, op_type, amount, items=None, posting="", date=datetime(2024, 5, 10, 13, 45)):
+    return {
+        "operation_id": operation_id,
+        "operation_type": op_type,
+        "operation_date": date,
+        "amount": amount,
+        "posting_number": posting,
+        "items": items or [],
+    }
+
+
+def test_summarize_operations_attribution():
+    """Первый товар - item, остальные - extra_item, без товаров - posting/none"""
+    item = {"sku": 111, "name": "Кружка"}
+    ops = [
+        make_op("1", "OperationAgentDeliveredToCustomer", 500, [item, {"sku": 222, "name": "Блюдце"}]),
+        make_op("2", "OperationAgentDeliveredToCustomer", 300, [item]),
+        make_op("3", "MarketplaceServiceItemDelivToCustomer", -40, [item]),
+        {**make_op("4", "OperationMarketplaceDefectRate", -100), "rollup_posting_sku": "111"},
+        make_op("5", "OperationSubscriptionPremium", -990),
+    ]
+
+    rows = {(r["sku"], r["operation_type"], r["attribution"]): r for r in summarize_operations(ops)}
+
+    delivered = rows[("111", "OperationAgentDeliveredToCustomer", "item")]
+    assert delivered["pos_amount"] == 800 and delivered["pos_count"] == 2 and delivered["name"] == "Кружка"
+    assert rows[("222", "OperationAgentDeliveredToCustomer", "extra_item")]["pos_amount"] == 500
+    assert rows[("111", "MarketplaceServiceItemDelivToCustomer", "item")]["neg_amount"] == 40
+    assert rows[("111", "OperationMarketplaceDefectRate", "posting")]["neg_count"] == 1
+    assert rows[("", "OperationSubscriptionPremium", "none")]["neg_amount"] == 990
+
+
+@pytest.mark.asyncio
+async def test_apply_replaces_previous_version_of_operation():
+    """Повторная загрузка операции не удваивает свёртку: старая версия вычитается"""
+    db = MagicMock()
+    db.sku_daily_economics.bulk_write = AsyncMock()
+
+    item = [{"sku": 111, "name": "Кружка"}]
+    old = make_op("1", "OperationAgentDeliveredToCustomer", 500, item)
+    new = make_op("1", "OperationAgentDeliveredToCustomer", 450, item)
+
+    await SkuEconomicsService.apply(db, "seller-1", [new], [old])
+
+    requests = db.sku_daily_economics.bulk_write.call_args.args[0]
+    assert len(requests) == 1
+    assert requests[0]._filter == {
+        "seller_id": "seller-1",
+        "date": datetime(2024, 5, 10),
+        "sku": "111",
+        "operation_type": "OperationAgentDeliveredToCustomer",
+        "attribution": "item",
+    }
+    assert requests[0]._doc["$inc"] == {"pos_amount": -50, "neg_amount": 0, "pos_count": 0, "neg_count": 0}
+    assert requests[0]._upsert is True
+
+
+class ClaimingOperations:
+    """ozon_operations в памяти: find отдаёт снимок, update_many/distinct - как в MongoDB"""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: dict(doc) for doc in docs}
+        self.snapshot = [dict(doc) for doc in docs]
+        self.bulk_write = AsyncMock()
+        self.delete_many = AsyncMock()
+
+    def find(self, query, projection=None):
+        async def cursor():
+            for doc in self.snapshot:
+                yield dict(doc)
+        return cursor()
+
+    async def update_many(self, query, update):
+        for _id in query["_id"]["$in"]:
+            if not self.docs[_id].get("rollup_applied"):
+                self.docs[_id].update(update["$set"])
+        return SimpleNamespace(modified_count=0)
+
+    async def distinct(self, field, query):
+        return [_id for _id in query["_id"]["$in"] if self.docs[_id].get("rollup_claim") == query["rollup_claim"]]
+
+
+@pytest.mark.asyncio
+async def test_backfill_applies_only_operations_it_claimed():
+    """Операцию, которую уже учла другая задача, backfill не прибавляет повторно и ничего не удаляет"""
+    item = [{"sku": 111, "name": "Кружка"}]
+    ops = [
+        {**make_op("1", "OperationAgentDeliveredToCustomer", 500, item), "_id": 1},
+        {**make_op("2", "OperationAgentDeliveredToCustomer", 300, item), "_id": 2},
+    ]
+    operations = ClaimingOperations(ops)
+    # Между find и пометкой операцию 2 учла параллельная задача
+    operations.docs[2]["rollup_applied"] = True
+
+    db = MagicMock()
+    db.ozon_operations = operations
+    db.sku_daily_economics.bulk_write = AsyncMock()
+
+    assert await SkuEconomicsService.backfill(db, "seller-1") == 1
+
+    requests = db.sku_daily_economics.bulk_write.call_args.args[0]
+    assert requests[0]._doc["$inc"]["pos_amount"] == 500
+    marked = operations.bulk_write.call_args.args[0]
+    assert [r._filter for r in marked] == [{"_id": 1}]
+    assert marked[0]._doc["$unset"] == {"rollup_claim": ""}
+    operations.delete_many.assert_not_called()
+    db.sku_daily_economics.delete_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_load_rows_only_reads_rollup():
+    """Отчёт не запускает пересчёт свёртки"""
+    db = MagicMock()
+    db.sku_daily_economics.aggregate.return_value.to_list = AsyncMock(return_value=[])
+
+    assert await SkuEconomicsService.load_rows(db, "seller-1", datetime(2024, 5, 1), datetime(2024, 5, 31)) == []
+    db.ozon_operations.count_documents.assert_not_called()
+    db.sku_daily_economics.delete_many.assert_not_called()
+    db.sku_daily_economics.bulk_write.assert_not_called()
@@ -0,0 +1,101 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from backend.services.stock_outbox import StockOutbox
+from backend.tests.fakes import FakeCursor
+
+
+@pytest.mark.asyncio
+async def test_enqueue_deduplicates_articles():
+    """Одинаковые артикулы в одном изменении дают одно событие"""
+    db = MagicMock()
+    db.stock_outbox.insert_many = AsyncMock()
+    
+    count = await StockOutbox.enqueue(db, "seller-1", ["A1", "A1", "A2", None], source="order")
+    
+    assert count == 2
+    events = db.stock_outbox.insert_many.call_args.args[0]
+    assert [e["article"] for e in events] == ["A1", "A2"]
+    assert all(e["status"] == "pending" and e["warehouse_id"] is None for e in events)
+
+
+@pytest.mark.asyncio
+async def test_process_pending_coalesces_changes_into_one_push():
+    """Несколько изменений одного артикула отправляются одной позицией с текущим остатком"""
+    seller_id = str(ObjectId())
+    created = datetime.utcnow() - timedelta(minutes=1)
+    events = [
+        {"_id": 1, "seller_id": seller_id, "article": "A1", "warehouse_id": None, "created_at": created},
+        {"_id": 2, "seller_id": seller_id, "article": "A1", "warehouse_id": None, "created_at": created},
+        {"_id": 3, "seller_id": seller_id, "article": "A2", "warehouse_id": None, "created_at": created},
+    ]
+    
+    db = MagicMock()
+    db.stock_outbox.update_many = AsyncMock()
+    db.stock_outbox.delete_many = AsyncMock()
+    db.stock_outbox.find = MagicMock(side_effect=[FakeCursor([{"_id": e["_id"]} for e in events]), FakeCursor(events)])
+    db.product_catalog.find = MagicMock(return_value=FakeCursor([{"_id": "p1", "article": "A1"}, {"_id": "p2", "article": "A2"}]))
+    db.inventory.find = MagicMock(return_value=FakeCursor([{"product_id": "p1", "available": 3}, {"product_id": "p2", "available": 0}]))
+    db.warehouses.find = MagicMock(return_value=FakeCursor([{"id": "wh-1"}]))
+    
+    sync = AsyncMock(return_value={"synced": 2, "failed": 0, "skipped": 0, "unchanged": 0})
+    with patch("backend.routers.stock_sync.sync_products_to_marketplace", new=sync):
+        processed = await StockOutbox.process_pending(db)
+    
+    assert processed == 3
+    sync.assert_called_once()
+    args = sync.call_args.args
+    assert args[1] == ObjectId(seller_id)
+    assert args[2] == "wh-1"
+    assert sorted(args[3]) == [("A1", 3), ("A2", 0)]
+    db.stock_outbox.delete_many.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_push_keeps_events_for_retry():
+    """Ошибка отправки батча (failed > 0) не удаляет события, а возвращает их в очередь"""
+    seller_id = str(ObjectId())
+    created = datetime.utcnow() - timedelta(minutes=1)
+    events = [{"_id": 1, "seller_id": seller_id, "article": "A1", "warehouse_id": "wh-1", "attempts": 1, "created_at": created}]
+    
+    db = MagicMock()
+    db.stock_outbox.update_many = AsyncMock()
+    db.stock_outbox.delete_many = AsyncMock()
+    db.stock_outbox.find = MagicMock(side_effect=[FakeCursor([{"_id": 1}]), FakeCursor(events)])
+    db.product_catalog.find = MagicMock(return_value=FakeCursor([{"_id": "p1", "article": "A1"}]))
+    db.inventory.find = MagicMock(return_value=FakeCursor([{"product_id": "p1", "available": 3}]))
+    
+    sync = AsyncMock(return_value={"synced": 0, "failed": 1, "skipped": 0, "unchanged": 0})
+    with patch("backend.routers.stock_sync.sync_products_to_marketplace", new=sync):
+        await StockOutbox.process_pending(db)
+    
+    db.stock_outbox.delete_many.assert_not_called()
+    retry = db.stock_outbox.update_many.call_args_list[2]
+    assert retry.args[0]["seller_id"] == seller_id
+    update = retry.args[1]
+    assert update["$inc"] == {"attempts": 1}
+    assert update["$set"]["status"] == "pending"
+    assert update["$set"]["retry_at"] > datetime.utcnow()
+    # после MAX_ATTEMPTS события помечаются failed
+    assert db.stock_outbox.update_many.call_args_list[3].args[1] == {"$set": {"status": "failed"}}
+
+
+@pytest.mark.asyncio
+async def test_inventory_adjustment_enqueues_catalog_article():
+    """Корректировка товара старой коллекции products ставит в очередь артикул каталога"""
+    from backend.routers import inventory
+    
+    seller_id = str(ObjectId())
+    product_id = ObjectId()
+    db = MagicMock()
+    db.products.find_one = AsyncMock(return_value={"_id": product_id, "sku": "legacy-sku"})
+    db.product_catalog.find_one = AsyncMock(return_value={"_id": ObjectId(), "article": "ART-1"})
+    
+    with patch.object(inventory, "get_database", AsyncMock(return_value=db)), \
+            patch.object(StockOutbox, "enqueue", AsyncMock()) as enqueue:
+        await inventory.sync_stock_to_marketplaces(db, str(product_id), seller_id, 5)
+    
+    query = db.product_catalog.find_one.call_args.args[0]
+    assert query["$or"] == [{"_id": product_id}, {"article": "legacy-sku"}]
+    assert enqueue.call_args.args[2] == ["ART-1"]
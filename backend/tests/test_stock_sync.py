@@ -0,0 +1,128 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from backend.routers import stock_sync
+from backend.services import credentials
+from backend.services.credentials import CredentialRegistry
+from backend.tests.fakes import FakeCursor
+
+
+@pytest.fixture(autouse=True)
+def clear_credentials():
+    CredentialRegistry.invalidate("user-1")
+
+
+def make_db(products, snapshot=None):
+    """Минимальная замена Motor db для sync_products_to_marketplace"""
+    db = MagicMock()
+    db.warehouses.find_one = AsyncMock(return_value={"_id": "wh-1", "name": "Main", "transfer_stock": True})
+    db.warehouse_links.find = MagicMock(return_value=FakeCursor([
+        {"id": "link-ozon", "marketplace_name": "ozon", "marketplace_warehouse_id": "1001"},
+        {"id": "link-wb", "marketplace_name": "wb", "marketplace_warehouse_id": "2002"},
+    ]))
+    db.product_catalog.find = MagicMock(return_value=FakeCursor(products))
+    db.seller_profiles.find_one = AsyncMock(return_value={"api_keys": [
+        {"marketplace": "ozon", "client_id": "c", "api_key": "k1"},
+        {"marketplace": "wb", "client_id": "", "api_key": "k2"},
+    ]})
+    db.stock_sync_history.insert_many = AsyncMock()
+    db.stock_push_snapshots.find = MagicMock(return_value=FakeCursor(snapshot or []))
+    db.stock_push_snapshots.bulk_write = AsyncMock()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_bulk_sync_uses_marketplace_batch_limits():
+    """Ozon получает пачки по 100, WB - по 1000, справочники читаются один раз"""
+    products = [
+        {"article": f"A{i}", "marketplace_data": {"ozon": {"id": f"A{i}"}, "wb": {"barcode": f"B{i}"}}}
+        for i in range(250)
+    ]
+    db = make_db(products)
+    connector = MagicMock()
+    connector.update_stock = AsyncMock(return_value={"success": True})
+    
+    with patch.object(credentials, "get_connector", return_value=connector) as get_connector:
+        stats = await stock_sync.sync_products_to_marketplace(
+            db, "user-1", "wh-1", [(f"A{i}", i) for i in range(250)]
+        )
+    
+    sizes = [len(call.args[1]) for call in connector.update_stock.call_args_list]
+    assert sizes == [100, 100, 50, 250]
+    assert stats == {"synced": 500, "failed": 0, "skipped": 0, "unchanged": 0}
+    assert get_connector.call_count == 2
+    db.product_catalog.find.assert_called_once()
+    db.seller_profiles.find_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_bulk_sync_skips_products_not_on_marketplace():
+    """Товары без marketplace_data для МП не отправляются"""
+    products = [{"article": "A1", "marketplace_data": {"ozon": {"id": "A1"}}}]
+    db = make_db(products)
+    connector = MagicMock()
+    connector.update_stock = AsyncMock(return_value={"success": True})
+    
+    with patch.object(credentials, "get_connector", return_value=connector):
+        stats = await stock_sync.sync_products_to_marketplace(db, "user-1", "wh-1", [("A1", 5)])
+    
+    connector.update_stock.assert_called_once_with("1001", [{"offer_id": "A1", "stock": 5}])
+    assert stats == {"synced": 1, "failed": 0, "skipped": 1, "unchanged": 0}
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_sends_only_changed_quantities():
+    """only_changed=True отправляет только остатки, отличные от последней отправки"""
+    products = [
+        {"article": "A1", "marketplace_data": {"ozon": {"id": "A1"}}},
+        {"article": "A2", "marketplace_data": {"ozon": {"id": "A2"}}},
+    ]
+    db = make_db(products, snapshot=[{"mp_sku": "A1", "quantity": 5}, {"mp_sku": "A2", "quantity": 1}])
+    connector = MagicMock()
+    connector.update_stock = AsyncMock(return_value={"success": True})
+    
+    with patch.object(credentials, "get_connector", return_value=connector):
+        stats = await stock_sync.sync_products_to_marketplace(
+            db, "user-1", "wh-1", [("A1", 5), ("A2", 7)], only_changed=True
+        )
+    
+    connector.update_stock.assert_called_once_with("1001", [{"offer_id": "A2", "stock": 7}])
+    assert stats["synced"] == 1
+    assert stats["unchanged"] == 1
+    
+    # Снимок обновлён только для отправленной позиции
+    requests = db.stock_push_snapshots.bulk_write.call_args.args[0]
+    assert len(requests) == 1
+    assert requests[0]._filter == {"link_id": "link-ozon", "mp_sku": "A2"}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_splits_seller_jobs_per_marketplace_host():
+    """Задача на (продавец, маркетплейс) с host = маркетплейс - действует лимит на хост"""
+    from backend import stock_scheduler
+    
+    db = MagicMock()
+    db.inventory.aggregate = MagicMock(return_value=FakeCursor([{"_id": "user-1"}]))
+    db.seller_profiles.find = MagicMock(return_value=FakeCursor([
+        {"user_id": "user-1", "api_keys": [{"marketplace": "ozon"}, {"marketplace": "wb"}, {"marketplace": "ozon"}]},
+    ]))
+    pool_run = AsyncMock(return_value={"results": {}})
+    
+    with patch.object(stock_scheduler, "get_database", new=AsyncMock(return_value=db)), \
+            patch.object(stock_scheduler._pool, "run", new=pool_run):
+        await stock_scheduler.sync_all_stocks_job()
+    
+    jobs = pool_run.await_args.args[0]
+    assert [(job.seller_id, job.key, job.host) for job in jobs] == [
+        ("user-1", "user-1:ozon", "ozon"),
+        ("user-1", "user-1:wb", "wb"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_sync_limits_links_to_marketplace():
+    """С marketplace читаются только связи склада с этим маркетплейсом"""
+    db = make_db([])
+    
+    await stock_sync.sync_products_to_marketplace(db, "user-1", "wh-1", [("A1", 5)], marketplace="wb")
+    
+    db.warehouse_links.find.assert_called_once_with({"warehouse_id": "wh-1", "marketplace_name": "wb"})
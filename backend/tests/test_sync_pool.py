@@ -0,0 +1,58 @@
+import pytest
+import asyncio
+from backend.services.sync_pool import SellerJobPool, SyncJob
+
+
+@pytest.mark.asyncio
+async def test_pool_round_robin_and_host_limit():
+    """Продавцы чередуются, на хост не больше host_concurrency задач"""
+    pool = SellerJobPool("test", concurrency=4, host_concurrency=1)
+    started = []
+    active = {"ozon": 0, "wb": 0}
+    peak = {"ozon": 0, "wb": 0}
+    
+    def job(seller, integration, host):
+        async def run():
+            started.append(f"{seller}:{integration}")
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+            return integration
+        return SyncJob(seller_id=seller, key=f"{seller}:{integration}", run=run, host=host)
+    
+    jobs = [job("a", 1, "ozon"), job("a", 2, "wb"), job("a", 3, "ozon"), job("b", 1, "wb"), job("c", 1, "ozon")]
+    
+    assert [j.key for j in SellerJobPool.round_robin(jobs)] == ["a:1", "b:1", "c:1", "a:2", "a:3"]
+    
+    result = await pool.run(jobs)
+    
+    assert result["started"] == 5 and result["failed"] == 0
+    assert peak == {"ozon": 1, "wb": 1}
+    assert started[:2] == ["a:1", "b:1"]
+    assert pool.metrics["a:1"]["runs"] == 1 and pool.metrics["a:1"]["last_status"] == "ok"
+
+
+@pytest.mark.asyncio
+async def test_pool_skips_job_still_running_and_records_failures():
+    """Задача пропускается, пока её прошлый запуск не завершился; ошибки в метриках"""
+    pool = SellerJobPool("test", concurrency=2, host_concurrency=2)
+    release = asyncio.Event()
+    
+    async def slow():
+        await release.wait()
+    
+    async def broken():
+        raise RuntimeError("timeout")
+    
+    first = asyncio.create_task(pool.run([SyncJob("slow", "slow", slow)]))
+    await asyncio.sleep(0)
+    
+    second = await pool.run([SyncJob("slow", "slow", slow), SyncJob("broken", "broken", broken)])
+    release.set()
+    await first
+    
+    assert second["skipped"] == 1 and second["failed"] == 1
+    assert pool.metrics["broken"]["failures"] == 1
+    assert pool.metrics["slow"]["runs"] == 1
+    assert not pool.is_running("slow")
@@ -34,6 +34,28 @@ async def test_wb_get_products_success():
         assert len(products) > 0
         assert products[0]["sku"] == "WB-TEST-001"
 
+@pytest.mark.asyncio
+async def test_wb_iter_products_follows_cursor():
+    """Каталог читается по курсору updatedAt + nmID до неполной страницы"""
+    connector = WildberriesConnector(client_id="", api_key="test_key")
+    
+    def card(nm_id):
+        return {"nmID": nm_id, "vendorCode": f"WB-{nm_id}", "title": "Card", "sizes": [{"skus": [str(nm_id)], "techSize": "0"}]}
+    
+    responses = [
+        {"cards": [card(i) for i in range(100)], "cursor": {"updatedAt": "2024-01-01T00:00:00Z", "nmID": 99, "total": 100}},
+        {"cards": [card(i) for i in range(100, 130)], "cursor": {"updatedAt": "2024-01-02T00:00:00Z", "nmID": 129, "total": 30}},
+    ]
+    request = AsyncMock(side_effect=responses)
+    
+    with patch.object(connector, '_make_request', new=request):
+        pages = [page async for page in connector.iter_products()]
+    
+    assert [len(page) for page in pages] == [100, 30]
+    assert request.call_count == 2
+    second_cursor = request.call_args_list[1].kwargs["json_data"]["settings"]["cursor"]
+    assert second_cursor == {"limit": 100, "updatedAt": "2024-01-01T00:00:00Z", "nmID": 99}
+
 @pytest.mark.asyncio
 async def test_wb_update_prices():
     """Тест обновления цен на WB"""
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from backend.core.windowed import iter_windows
+
+
+def pending_tasks():
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+
+async def endless_window(start, end, queue):
+    """Окно, которое отдаёт страницы, пока его не отменят"""
+    page = 0
+    while True:
+        await queue.put([f"{start}-{page}"])
+        page += 1
+
+
+@pytest.mark.asyncio
+async def test_window_error_cancels_other_windows():
+    """Ошибка одного окна поднимается у потребителя, остальные окна не висят на очереди"""
+    async def fetch_window(start, end, queue):
+        if start == 2:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("window failed")
+        await endless_window(start, end, queue)
+
+    pages = iter_windows([(i, i + 1) for i in range(6)], fetch_window, concurrency=3)
+    with pytest.raises(RuntimeError, match="window failed"):
+        async for _ in pages:
+            await asyncio.sleep(0)
+
+    await asyncio.sleep(0)
+    assert pending_tasks() == []
+
+
+@pytest.mark.asyncio
+async def test_consumer_stop_cancels_producer():
+    """Потребитель прочитал часть страниц и закрыл генератор - задачи окон отменены"""
+    received = []
+    pages = iter_windows([(i, i + 1) for i in range(4)], endless_window, concurrency=2)
+    async for page in pages:
+        received.append(page)
+        if len(received) == 5:
+            break
+    await pages.aclose()
+
+    assert len(received) == 5
+    assert pending_tasks() == []
+
+
+@pytest.mark.asyncio
+async def test_all_windows_are_streamed():
+    async def fetch_window(start, end, queue):
+        for page in range(3):
+            await queue.put([(start, page)])
+
+    pages = [page async for page in iter_windows([(i, i + 1) for i in range(5)], fetch_window, concurrency=2)]
+
+    assert sorted(item for page in pages for item in page) == [(i, p) for i in range(5) for p in range(3)]
@@ -8,6 +8,9 @@ from datetime import datetime
 from typing import List, Dict, Any
 import logging
 
+from backend.services.category_search import CategorySearch
+from backend.services.category_preload import replace_category_tree, get_tree_version
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,28 +32,32 @@ class WBCategoryManager:
             # Получить parent categories
             categories = await connector.get_categories()
             
-            # Сохранить в БД
-            saved_count = 0
             for category in categories:
-                category['loaded_at'] = datetime.utcnow()
                 category['source'] = 'api_parent'
-                
-                # Upsert
-                await self.collection.replace_one(
-                    {
-                        'marketplace': 'wb',
-                        'category_id': category['category_id']
-                    },
-                    category,
-                    upsert=True
-                )
-                saved_count += 1
-            
-            logger.info(f"[WBCategoryManager] Saved {saved_count} parent categories to DB")
+            
+            # Сохранить в БД: только изменения, на месте.
+            # Subjects из импорта товаров (source=product_import) не трогаем
+            result = await replace_category_tree(
+                self.db,
+                'wb_categories_cache',
+                categories,
+                key_fields=('marketplace', 'category_id'),
+                scope={'marketplace': 'wb', 'source': 'api_parent'}
+            )
+            saved_count = result['total']
+            
+            logger.info(f"[WBCategoryManager] Saved {saved_count} parent categories to DB (version {result['version']})")
+            
+            # Перестроить индекс поиска по новым данным
+            await CategorySearch.load(self.db, 'wb')
             
             return {
                 'success': True,
                 'loaded': saved_count,
+                'inserted': result['inserted'],
+                'updated': result['updated'],
+                'deleted': result['deleted'],
+                'version': result['version'],
                 'message': f'Загружено {saved_count} родительских категорий WB'
             }
             
@@ -94,6 +101,9 @@ class WBCategoryManager:
             )
             
             logger.info(f"[WBCategoryManager] Subject {subject_id} saved")
+            
+            # Индекс поиска перестроится при следующем поиске
+            CategorySearch.invalidate('wb')
             return True
             
         except Exception as e:
@@ -122,19 +132,11 @@ class WBCategoryManager:
     
     async def search_categories(self, query: str) -> List[Dict[str, Any]]:
         """
-        Поиск категорий в БД
-        Быстро, без запросов к API
+        Поиск категорий по индексу в памяти (CategorySearch)
+        Быстро, без запросов к API и БД
         """
         try:
-            categories = await self.collection.find({
-                'marketplace': 'wb',
-                'name': {'$regex': query, '$options': 'i'}
-            }).limit(100).to_list(100)
-            
-            # Убрать _id
-            for cat in categories:
-                if '_id' in cat:
-                    cat.pop('_id')
+            categories = await CategorySearch.search(self.db, 'wb', query, limit=100)
             
             logger.info(f"[WBCategoryManager] Search '{query}': found {len(categories)} categories")
             return categories
@@ -172,16 +174,14 @@ class WBCategoryManager:
             subjects = await self.collection.count_documents({'marketplace': 'wb', 'is_parent': False})
             
             # Последнее обновление
-            last_updated = await self.collection.find_one(
-                {'marketplace': 'wb'},
-                sort=[('loaded_at', -1)]
-            )
+            version = await get_tree_version(self.db, 'wb_categories_cache')
             
             return {
                 'total': total,
                 'parents': parents,
                 'subjects': subjects,
-                'last_updated': last_updated.get('loaded_at') if last_updated else None
+                'version': version.get('version'),
+                'last_updated': version.get('loaded_at')
             }
             
         except Exception as e:
@@ -9,20 +9,31 @@ function FBOOrdersList() {
   const [orders, setOrders] = useState([])
   const [loading, setLoading] = useState(false)
   const [showImportModal, setShowImportModal] = useState(false)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [totalCount, setTotalCount] = useState(0)
 
   useEffect(() => {
     loadOrders()
   }, [])
 
-  const loadOrders = async () => {
+  // Заказы грузятся страницами (курсор следующей - в заголовке X-Next-Cursor,
+  // число заказов - в X-Total-Count первой страницы)
+  const loadOrders = async (cursor = null) => {
     try {
-      setLoading(true)
-      const response = await api.get('/api/orders/fbo')
-      setOrders(response.data)
+      cursor ? setLoadingMore(true) : setLoading(true)
+      const params = new URLSearchParams()
+      if (cursor) params.append('cursor', cursor)
+
+      const response = await api.get(`/api/orders/fbo?${params.toString()}`)
+      setOrders(prev => cursor ? [...prev, ...response.data] : response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
+      if (!cursor) setTotalCount(Number(response.headers['x-total-count'] ?? response.data.length))
     } catch (error) {
       console.error('Failed to load FBO orders:', error)
     } finally {
       setLoading(false)
+      setLoadingMore(false)
     }
   }
 
@@ -53,7 +64,7 @@ function FBOOrdersList() {
       {/* Кнопка импорта */}
       <div className="flex justify-between items-center">
         <p className="text-sm text-mm-text-secondary font-mono">
-          Всего заказов: <span className="text-mm-purple">{orders.length}</span>
+          Всего заказов: <span className="text-mm-purple">{totalCount}</span>
         </p>
         <button
           onClick={() => setShowImportModal(true)}
@@ -137,6 +148,18 @@ function FBOOrdersList() {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center">
+              <button
+                onClick={() => loadOrders(nextCursor)}
+                disabled={loadingMore}
+                className="btn-neon"
+                data-testid="load-more-orders"
+              >
+                {loadingMore ? 'Загрузка...' : 'Загрузить ещё'}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -145,7 +168,7 @@ function FBOOrdersList() {
         <ImportOrdersModal
           type="fbo"
           onClose={() => setShowImportModal(false)}
-          onSuccess={loadOrders}
+          onSuccess={() => loadOrders()}
         />
       )}
     </div>
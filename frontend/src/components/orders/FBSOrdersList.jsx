@@ -20,48 +20,42 @@ function FBSOrdersList() {
   const [stats, setStats] = useState({})
   const [refreshingStatuses, setRefreshingStatuses] = useState(false)
   const [searchQuery, setSearchQuery] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     loadOrders()
-  }, [])
+  }, [activeStatusFilter])
 
   useEffect(() => {
     applyFilters()
   }, [orders, activeStatusFilter, searchQuery])
 
-  const loadOrders = async () => {
+  // Заказы грузятся страницами (курсор следующей - в заголовке X-Next-Cursor),
+  // количество по статусам считает сервер
+  const loadOrders = async (cursor = null) => {
     try {
-      setLoading(true)
-      const response = await api.get('/api/orders/fbs')
-      setOrders(response.data)
-      calculateStats(response.data)
+      cursor ? setLoadingMore(true) : setLoading(true)
+      const params = new URLSearchParams()
+      if (activeStatusFilter !== 'all') params.append('status', activeStatusFilter)
+      if (cursor) params.append('cursor', cursor)
+
+      const response = await api.get(`/api/orders/fbs?${params.toString()}`)
+      setOrders(prev => cursor ? [...prev, ...response.data] : response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
+
+      if (!cursor) {
+        const statsResponse = await api.get('/api/orders/fbs/stats')
+        setStats(statsResponse.data)
+      }
     } catch (error) {
       console.error('Failed to load FBS orders:', error)
     } finally {
       setLoading(false)
+      setLoadingMore(false)
     }
   }
 
-  const calculateStats = (ordersList) => {
-    const newStats = {
-      total: ordersList.length,
-      new: 0,
-      imported: 0,
-      awaiting_shipment: 0,
-      delivering: 0,
-      delivered: 0,
-      cancelled: 0
-    }
-
-    ordersList.forEach(order => {
-      if (newStats.hasOwnProperty(order.status)) {
-        newStats[order.status]++
-      }
-    })
-
-    setStats(newStats)
-  }
-
   const applyFilters = () => {
     let filtered = orders
     
@@ -122,6 +116,12 @@ function FBSOrdersList() {
     }
   }
 
+  // PDF этикетки отдаётся только с токеном - открываем его как blob
+  const openLabel = async (url) => {
+    const response = await api.get(url, { responseType: 'blob' })
+    window.open(window.URL.createObjectURL(new Blob([response.data], { type: 'application/pdf' })), '_blank')
+  }
+
   const handleBulkPrintLabels = async () => {
     try {
       toast.loading('\u0417\u0430\u0433\u0440\u0443\u0437\u043a\u0430 \u044d\u0442\u0438\u043a\u0435\u0442\u043e\u043a...')
@@ -129,12 +129,17 @@ function FBSOrdersList() {
         order_ids: selectedOrderIds
       })
 
-      // \u041e\u0442\u043a\u0440\u044b\u0442\u044c \u043a\u0430\u0436\u0434\u0443\u044e \u044d\u0442\u0438\u043a\u0435\u0442\u043a\u0443
-      response.data.labels.forEach((label, idx) => {
-        setTimeout(() => {
-          window.open(label.label_url, '_blank')
-        }, idx * 500)
-      })
+      if (response.data.merged_label_url) {
+        // Все этикетки одним PDF
+        await openLabel(response.data.merged_label_url)
+      } else {
+        // \u041e\u0442\u043a\u0440\u044b\u0442\u044c \u043a\u0430\u0436\u0434\u0443\u044e \u044d\u0442\u0438\u043a\u0435\u0442\u043a\u0443
+        response.data.labels.forEach((label, idx) => {
+          setTimeout(() => {
+            openLabel(label.label_url).catch(() => toast.error('Ошибка загрузки этикетки'))
+          }, idx * 500)
+        })
+      }
 
       toast.dismiss()
       toast.success(`\u0417\u0430\u0433\u0440\u0443\u0436\u0435\u043d\u043e ${response.data.labels.length} \u044d\u0442\u0438\u043a\u0435\u0442\u043e\u043a`)
@@ -421,6 +426,18 @@ function FBSOrdersList() {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center">
+              <button
+                onClick={() => loadOrders(nextCursor)}
+                disabled={loadingMore}
+                className="btn-neon"
+                data-testid="load-more-orders"
+              >
+                {loadingMore ? 'Загрузка...' : 'Загрузить ещё'}
+              </button>
+            </div>
+          )}
         </div>
       )}
 
@@ -429,7 +446,7 @@ function FBSOrdersList() {
         <ImportOrdersModal
           type="fbs"
           onClose={() => setShowImportModal(false)}
-          onSuccess={loadOrders}
+          onSuccess={() => loadOrders()}
         />
       )}
 
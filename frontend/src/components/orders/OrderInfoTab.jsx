@@ -30,8 +30,9 @@ function OrderInfoTab({ order, onStatusUpdate }) {
       const response = await api.get(`/api/orders/fbs/${order.id}/label`)
       
       if (response.data.label_url) {
-        // Открыть PDF в новом окне
-        window.open(response.data.label_url, '_blank')
+        // Открыть PDF в новом окне (файл этикетки отдаётся только с токеном)
+        const file = await api.get(response.data.label_url, { responseType: 'blob' })
+        window.open(window.URL.createObjectURL(new Blob([file.data], { type: 'application/pdf' })), '_blank')
         toast.success('Этикетка загружена')
       } else {
         toast.error('Этикетка недоступна')
@@ -9,6 +9,9 @@ function RetailOrdersList() {
   const [orders, setOrders] = useState([])
   const [loading, setLoading] = useState(true)
   const [showForm, setShowForm] = useState(false)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [totalCount, setTotalCount] = useState(0)
   const [filters, setFilters] = useState({
     status: '',
     date_from: '',
@@ -19,21 +22,27 @@ function RetailOrdersList() {
     loadOrders()
   }, [filters])
 
-  const loadOrders = async () => {
+  // Заказы грузятся страницами (курсор следующей - в заголовке X-Next-Cursor,
+  // число заказов по фильтру - в X-Total-Count первой страницы)
+  const loadOrders = async (cursor = null) => {
     try {
-      setLoading(true)
+      cursor ? setLoadingMore(true) : setLoading(true)
       const params = new URLSearchParams()
       if (filters.status) params.append('status', filters.status)
       if (filters.date_from) params.append('date_from', filters.date_from)
       if (filters.date_to) params.append('date_to', filters.date_to)
+      if (cursor) params.append('cursor', cursor)
       
       const response = await api.get(`/api/orders/retail?${params.toString()}`)
-      setOrders(response.data)
+      setOrders(prev => cursor ? [...prev, ...response.data] : response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
+      if (!cursor) setTotalCount(Number(response.headers['x-total-count'] ?? response.data.length))
     } catch (error) {
       console.error('Failed to load retail orders:', error)
       toast.error('Ошибка загрузки розничных заказов')
     } finally {
       setLoading(false)
+      setLoadingMore(false)
     }
   }
 
@@ -128,7 +137,7 @@ function RetailOrdersList() {
       {/* Кнопка создания */}
       <div className="flex justify-between items-center">
         <p className="text-sm text-mm-text-secondary font-mono">
-          Найдено заказов: <span className="text-mm-green">{orders.length}</span>
+          Найдено заказов: <span className="text-mm-green">{totalCount}</span>
         </p>
         <button
           onClick={() => setShowForm(true)}
@@ -212,6 +221,18 @@ function RetailOrdersList() {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center">
+              <button
+                onClick={() => loadOrders(nextCursor)}
+                disabled={loadingMore}
+                className="btn-neon"
+                data-testid="load-more-orders"
+              >
+                {loadingMore ? 'Загрузка...' : 'Загрузить ещё'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -7,23 +7,30 @@ function OrdersPage() {
   const [orders, setOrders] = useState([])
   const [loading, setLoading] = useState(true)
   const [filter, setFilter] = useState({ status: '', source: '' })
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => {
     loadOrders()
   }, [filter])
 
-  const loadOrders = async () => {
+  // Orders are loaded page by page (next page cursor is in the X-Next-Cursor header)
+  const loadOrders = async (cursor = null) => {
     try {
+      if (cursor) setLoadingMore(true)
       const params = new URLSearchParams()
       if (filter.status) params.append('status', filter.status)
       if (filter.source) params.append('source', filter.source)
+      if (cursor) params.append('cursor', cursor)
       
       const response = await api.get(`/api/orders?${params.toString()}`)
-      setOrders(response.data)
+      setOrders(prev => cursor ? [...prev, ...response.data] : response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
     } catch (error) {
       console.error('Failed to load orders:', error)
     }
     setLoading(false)
+    setLoadingMore(false)
   }
 
   const getStatusIcon = (status) => {
@@ -146,6 +153,18 @@ function OrdersPage() {
               </tbody>
             </table>
           </div>
+          {nextCursor && (
+            <div className="p-4 text-center">
+              <button
+                onClick={() => loadOrders(nextCursor)}
+                disabled={loadingMore}
+                className="btn-neon"
+                data-testid="load-more-orders"
+              >
+                {loadingMore ? '// LOADING...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>